@@ -1,13 +1,15 @@
 import os
+import csv
+import hashlib
+import json
 from datetime import datetime
-import pandas as pd
-import requests
-import boto3
+
+import sie_client
 
 # Token de acceso Banxico
 BANXICO_TOKEN = os.getenv("BANXICO_TOKEN", "1e9f07d4e173151bf1210ce6d2224eccc8abb8839c9bbc5f0ff5f01c524faec7")
 
-BASE = "https://www.banxico.org.mx/SieAPIRest/service/v1"
+BASE = sie_client.BASE_URL
 
 # IDs correctos de CETES (rendimiento, fecha de subasta)
 CETES_SERIES = {
@@ -17,20 +19,42 @@ CETES_SERIES = {
     "CETES_364": "SF60636"
 }
 
+CSV_COLUMNS = ["serie_id", "titulo", "fecha", "tasa", "fetched_at", "source_url"]
+
+# Marcador con la huella del último snapshot escrito y la última revisión
+STATE_KEY = "banxico/_state/cetes.json"
+
+# Bucket de todas las capas; la variable BUCKET_NAME apunta la Lambda a otro
+# (p. ej. el del arnés local, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Cliente S3 compartido entre invocaciones del mismo contenedor
+_s3_client = None
+
+
+def get_s3_client():
+    """Crea el cliente S3 la primera vez que se necesita y lo reutiliza."""
+    global _s3_client
+    if _s3_client is None:
+        import boto3  # import diferido: solo se paga cuando hay algo que subir
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def to_float(value):
+    """Convierte el dato de Banxico a float; "N/E" y vacíos quedan como None."""
+    try:
+        return float(str(value).replace(",", ""))
+    except (TypeError, ValueError):
+        return None
+
 
 def obtener_tasa_oportuna(series_ids, token):
     """Obtiene el valor más reciente disponible de todas las series CETES."""
-    ids = ",".join(series_ids)
-    url = f"{BASE}/series/{ids}/datos/oportuno"
-    headers = {
-        "Bmx-Token": token,
-        "Accept": "application/json",
-    }
-    
+    client = sie_client.get_client(token)
+
     try:
-        r = requests.get(url, headers=headers, timeout=30)
-        r.raise_for_status()
-        return r.json()
+        return client.get_oportuno(series_ids)
     except Exception as e:
         print(f"Error fetching CETES data: {e}")
         raise
@@ -41,10 +65,10 @@ def fetch_cetes_data(token):
     print("Consultando tasas CETES mas recientes (ultima subasta Banxico)...")
     
     series_ids = list(CETES_SERIES.values())
-    data = obtener_tasa_oportuna(series_ids, token)
+    series = obtener_tasa_oportuna(series_ids, token)
     
-    # Convertir JSON a DataFrame
-    series = data.get("bmx", {}).get("series", [])
+    # Son 4 filas: se arman como lista de dicts, sin pandas
+    fetched_at = datetime.now().isoformat()
     rows = []
     for s in series:
         sid = s.get("idSerie")
@@ -55,35 +79,93 @@ def fetch_cetes_data(token):
                 "serie_id": sid,
                 "titulo": titulo,
                 "fecha": d.get("fecha"),
-                "tasa": d.get("dato")
+                "tasa": to_float(d.get("dato")),
+                "fetched_at": fetched_at,
+                "source_url": f"{BASE}/series"
             })
     
     if not rows:
         raise ValueError("No se recibieron datos. Verifica el token o las series.")
     
-    df = pd.DataFrame(rows)
-    df["tasa"] = pd.to_numeric(df["tasa"], errors="coerce")
-    df["fetched_at"] = datetime.now().isoformat()
-    df["source_url"] = f"{BASE}/series"
-    
-    print(f"Successfully fetched {len(df)} CETES records")
-    return df
+    print(f"Successfully fetched {len(rows)} CETES records")
+    return rows
+
+
+def write_csv(rows, csv_path):
+    """Escribe las filas con el mismo formato que DataFrame.to_csv(encoding="utf-8-sig")."""
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def fingerprint(rows):
+    """Huella del contenido (serie, fecha, tasa); ignora fetched_at y el orden."""
+    canonical = sorted((r["serie_id"], r["fecha"], r["tasa"]) for r in rows)
+    return hashlib.sha256(json.dumps(canonical).encode("utf-8")).hexdigest()
+
+
+def read_state(bucket_name, key=STATE_KEY):
+    """Lee el marcador de estado; None si todavía no existe."""
+    s3_client = get_s3_client()
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+
+def write_state(bucket_name, state, key=STATE_KEY):
+    get_s3_client().put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=json.dumps(state, indent=2).encode("utf-8"),
+        ContentType="application/json",
+    )
 
 
 def main(event):
     # Get token and bucket (optional, with defaults)
     token = event.get('token', BANXICO_TOKEN) if event else BANXICO_TOKEN
-    bucket_name = event.get('bucket', 'scrapping-divisas') if event else 'scrapping-divisas'
+    bucket_name = event.get('bucket', BUCKET_NAME) if event else BUCKET_NAME
+    force = event.get('force', False) if event else False
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    # Día del snapshot en la key (default hoy): el cleaner lo usa como dt de
+    # Silver; pipeline_harness.py lo fija al día de la grabación que reproduce
+    now = datetime.now()
+    day = datetime.strptime(event['date'], "%Y-%m-%d") if event and event.get('date') else now
+    timestamp = f"{day:%Y%m%d}_{now:%H%M%S}"
+    checked_at = now.isoformat()
 
     # Fetch data from Banxico API
-    df = fetch_cetes_data(token)
+    client = sie_client.get_client(token)
+    client.reset_stats()
+    rows = fetch_cetes_data(token)
+    api_stats = client.summary()
+    print(f"Banxico API stats: {api_stats}")
+
+    # datos/oportuno solo cambia tras cada subasta semanal: si la huella es la
+    # misma que la del último snapshot no se escribe nada nuevo
+    current_fingerprint = fingerprint(rows)
+    state = read_state(bucket_name) or {}
+    if not force and state.get('fingerprint') == current_fingerprint:
+        state.update({'last_checked_at': checked_at, 'last_result': 'unchanged'})
+        write_state(bucket_name, state)
+        print(f"Sin cambios desde {state.get('last_changed_at')}; no se escribe snapshot")
+        return {
+            'statusCode': 200,
+            'message': 'CETES Banxico sin cambios desde el último snapshot',
+            'bucket_name': bucket_name,
+            'csv_key': state.get('last_key'),
+            'records_count': len(rows),
+            'changed': False,
+            'api_stats': api_stats
+        }
 
     # Save CSV file
     print("Saving CSV file...")
     csv_path = f"/tmp/banxico_cetes_{timestamp}.csv"
-    df.to_csv(csv_path, index=False, encoding="utf-8-sig")
+    write_csv(rows, csv_path)
 
     # Upload file to S3
     try:
@@ -92,7 +174,7 @@ def main(event):
 
         csv_key = f"banxico/cetes/banxico_cetes_{timestamp}.csv"
 
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
 
         # Upload CSV
         s3_client.upload_file(csv_path, bucket_name, csv_key)
@@ -109,14 +191,24 @@ def main(event):
     except Exception as e:
         print(f"Warning: Could not clean up temp files: {e}")
 
-    print(f"{len(df)} registros de CETES Banxico procesados correctamente")
+    write_state(bucket_name, {
+        'fingerprint': current_fingerprint,
+        'last_key': csv_key,
+        'last_changed_at': checked_at,
+        'last_checked_at': checked_at,
+        'last_result': 'written',
+    })
+
+    print(f"{len(rows)} registros de CETES Banxico procesados correctamente")
 
     return {
         'statusCode': 200,
-        'message': f'CETES Banxico extraidos correctamente: {len(df)} registros',
+        'message': f'CETES Banxico extraidos correctamente: {len(rows)} registros',
         'bucket_name': bucket_name,
         'csv_key': csv_key,
-        'records_count': len(df)
+        'records_count': len(rows),
+        'changed': True,
+        'api_stats': api_stats
     }
 
 
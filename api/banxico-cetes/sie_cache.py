@@ -0,0 +1,295 @@
+"""
+Caché local en disco (SQLite) para respuestas de la API SIE de Banxico.
+
+- Observaciones por (serie, fecha). Las fechas con más de `settle_days` días
+  de antigüedad se consideran definitivas y no se vuelven a pedir.
+- Cobertura por serie: los rangos ya consultados. Una consulta de rango solo
+  pide a la API los huecos que faltan y mezcla el resultado con lo guardado.
+  Los días sin publicación (fines de semana, feriados) quedan cubiertos
+  aunque no tengan observación.
+- Dato oportuno con TTL (`oportuno_ttl` segundos).
+
+Las respuestas se devuelven con la misma forma que bmx.series de la API, así
+que quien llama no nota la diferencia. sie_stream usa la variante por filas
+(get_rows): guarda las observaciones ya decodificadas sin pasar por dicts.
+
+Este archivo es idéntico en api/banxico-cetes y api/banxico-divisas (cada
+Lambda se construye solo con su directorio); si se modifica, copiarlo a ambos.
+"""
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    serie_id TEXT NOT NULL,
+    fecha    TEXT NOT NULL,  -- YYYY-MM-DD
+    dato     TEXT,
+    PRIMARY KEY (serie_id, fecha)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    serie_id TEXT NOT NULL,
+    start    TEXT NOT NULL,
+    end      TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS series_meta (
+    serie_id TEXT PRIMARY KEY,
+    titulo   TEXT
+);
+CREATE TABLE IF NOT EXISTS oportuno (
+    serie_id   TEXT PRIMARY KEY,
+    fecha      TEXT,
+    dato       TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+
+def to_iso(fecha_sie):
+    """"31/10/2025" -> "2025-10-31"."""
+    return datetime.strptime(fecha_sie, "%d/%m/%Y").date().isoformat()
+
+
+def to_sie(fecha_iso):
+    """"2025-10-31" -> "31/10/2025"."""
+    return date.fromisoformat(fecha_iso).strftime("%d/%m/%Y")
+
+
+def merge_intervals(intervals):
+    """Une intervalos [inicio, fin] (date) que se traslapan o son contiguos."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(start, end, covered):
+    """Partes de [start, end] que no están en `covered` (lista ya unida y ordenada)."""
+    gaps = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end < cursor or c_start > end:
+            continue
+        if c_start > cursor:
+            gaps.append((cursor, c_start - timedelta(days=1)))
+        cursor = max(cursor, c_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+
+class SIECache:
+    """
+    Caché SQLite de observaciones SIE.
+
+    Args:
+        path: Archivo SQLite (se crea si no existe).
+        settle_days: Días hacia atrás que todavía se consideran revisables.
+        oportuno_ttl: Segundos de vigencia del dato oportuno.
+    """
+
+    def __init__(self, path, settle_days=3, oportuno_ttl=3600):
+        self.path = path
+        self.settle_days = settle_days
+        self.oportuno_ttl = oportuno_ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.counters = {"range_queries": 0, "gaps_fetched": 0, "oportuno_hits": 0, "oportuno_misses": 0}
+
+    def close(self):
+        self.conn.close()
+
+    def _count(self, key, n=1):
+        with self.lock:
+            self.counters[key] += n
+
+    # Rangos
+
+    def _covered(self, serie_id):
+        rows = self.conn.execute(
+            "SELECT start, end FROM coverage WHERE serie_id = ?", (serie_id,)
+        ).fetchall()
+        return merge_intervals((date.fromisoformat(s), date.fromisoformat(e)) for s, e in rows)
+
+    def missing_ranges(self, serie_id, start, end):
+        """Huecos de [start, end] (date) que no están en caché para la serie."""
+        with self.lock:
+            covered = self._covered(serie_id)
+        return subtract_intervals(start, end, covered)
+
+    def _store(self, serie_id, titulo, observations, start, settled_until):
+        """Guarda (fecha ISO, dato) de una serie y extiende su cobertura hasta settled_until."""
+        if titulo is not None:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO series_meta (serie_id, titulo) VALUES (?, ?)", (serie_id, titulo)
+            )
+        else:
+            # El decodificador en streaming no lee titulo: no pisar uno ya guardado
+            self.conn.execute("INSERT OR IGNORE INTO series_meta (serie_id) VALUES (?)", (serie_id,))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO observations (serie_id, fecha, dato) VALUES (?, ?, ?)",
+            ((serie_id, fecha, dato) for fecha, dato in observations),
+        )
+        if start <= settled_until:
+            covered = merge_intervals(self._covered(serie_id) + [(start, settled_until)])
+            self.conn.execute("DELETE FROM coverage WHERE serie_id = ?", (serie_id,))
+            self.conn.executemany(
+                "INSERT INTO coverage (serie_id, start, end) VALUES (?, ?, ?)",
+                ((serie_id, s.isoformat(), e.isoformat()) for s, e in covered),
+            )
+
+    def _settled_until(self, end):
+        return min(end, date.today() - timedelta(days=self.settle_days))
+
+    def store_series(self, series, start, end):
+        """Guarda lo recibido para [start, end] y marca como cubierto lo ya definitivo."""
+        settled_until = self._settled_until(end)
+        with self.lock, self.conn:
+            for serie in series:
+                observations = ((to_iso(d["fecha"]), d.get("dato")) for d in serie.get("datos", []))
+                self._store(serie["idSerie"], serie.get("titulo"), observations, start, settled_until)
+
+    def store_rows(self, rows, serie_ids, start, end):
+        """
+        Como store_series pero con filas ya decodificadas.
+
+        Args:
+            rows: Iterable de (serie_id, fecha ISO, dato texto o None).
+            serie_ids: idSerie presentes en la respuesta, incluidas las que no traen datos.
+        """
+        by_serie = {serie_id: [] for serie_id in serie_ids}
+        for serie_id, fecha, dato in rows:
+            by_serie.setdefault(serie_id, []).append((fecha, dato))
+        settled_until = self._settled_until(end)
+        with self.lock, self.conn:
+            for serie_id, observations in by_serie.items():
+                self._store(serie_id, None, observations, start, settled_until)
+
+    def read_series(self, serie_ids, start, end):
+        """Arma bmx.series para [start, end] desde la caché."""
+        result = []
+        with self.lock:
+            for serie_id in serie_ids:
+                meta = self.conn.execute(
+                    "SELECT titulo FROM series_meta WHERE serie_id = ?", (serie_id,)
+                ).fetchone()
+                rows = self.conn.execute(
+                    "SELECT fecha, dato FROM observations WHERE serie_id = ? AND fecha BETWEEN ? AND ? ORDER BY fecha",
+                    (serie_id, start.isoformat(), end.isoformat()),
+                ).fetchall()
+                serie = {"idSerie": serie_id, "titulo": meta[0] if meta else None}
+                if rows:
+                    serie["datos"] = [{"fecha": to_sie(f), "dato": d} for f, d in rows]
+                result.append(serie)
+        return result
+
+    def read_rows(self, serie_ids, start, end):
+        """
+        Filas (serie_id, fecha ISO, dato) de [start, end] desde la caché.
+
+        Returns:
+            tuple: (lista de filas ordenadas por serie y fecha, idSerie que la API ha devuelto alguna vez)
+        """
+        rows, present = [], []
+        with self.lock:
+            for serie_id in serie_ids:
+                if self.conn.execute(
+                    "SELECT 1 FROM series_meta WHERE serie_id = ?", (serie_id,)
+                ).fetchone():
+                    present.append(serie_id)
+                rows.extend(
+                    (serie_id, fecha, dato) for fecha, dato in self.conn.execute(
+                        "SELECT fecha, dato FROM observations WHERE serie_id = ? AND fecha BETWEEN ? AND ? ORDER BY fecha",
+                        (serie_id, start.isoformat(), end.isoformat()),
+                    )
+                )
+        return rows, present
+
+    def _fetch_missing(self, fetch, store, serie_ids, start, end):
+        """Pide a la API solo los huecos de [start, end] y los guarda con `store`."""
+        self._count("range_queries")
+
+        # Series con exactamente los mismos huecos se piden juntas
+        gaps_by_range = {}
+        for serie_id in serie_ids:
+            for gap in self.missing_ranges(serie_id, start, end):
+                gaps_by_range.setdefault(gap, []).append(serie_id)
+
+        for (gap_start, gap_end), ids in gaps_by_range.items():
+            self._count("gaps_fetched")
+            store(fetch(ids, gap_start.isoformat(), gap_end.isoformat()), gap_start, gap_end)
+
+    def get_range(self, fetch, serie_ids, start_date, end_date):
+        """
+        Observaciones de [start_date, end_date] pidiendo a la API solo los huecos.
+
+        Args:
+            fetch: fetch(serie_ids, start, end) -> bmx.series (fechas YYYY-MM-DD).
+        """
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        self._fetch_missing(fetch, self.store_series, serie_ids, start, end)
+        return self.read_series(serie_ids, start, end)
+
+    def get_rows(self, fetch, serie_ids, start_date, end_date):
+        """
+        Como get_range pero con filas decodificadas (ver read_rows).
+
+        Args:
+            fetch: fetch(serie_ids, start, end) -> (filas, idSerie presentes).
+        """
+        start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+        self._fetch_missing(
+            fetch, lambda result, s, e: self.store_rows(result[0], result[1], s, e), serie_ids, start, end
+        )
+        return self.read_rows(serie_ids, start, end)
+
+    # Dato oportuno
+
+    def get_oportuno(self, fetch, serie_ids):
+        """Dato oportuno de cada serie; solo se piden los vencidos o ausentes."""
+        now = time.time()
+        with self.lock:
+            fresh = {
+                row[0]: row for row in self.conn.execute(
+                    f"SELECT serie_id, fecha, dato, fetched_at FROM oportuno WHERE serie_id IN ({','.join('?' * len(serie_ids))})",
+                    list(serie_ids),
+                )
+                if now - row[3] < self.oportuno_ttl
+            }
+        stale = [serie_id for serie_id in serie_ids if serie_id not in fresh]
+        self._count("oportuno_hits", len(serie_ids) - len(stale))
+        self._count("oportuno_misses", len(stale))
+
+        if stale:
+            series = fetch(stale)
+            with self.lock, self.conn:
+                for serie in series:
+                    datos = serie.get("datos") or [{}]
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO series_meta (serie_id, titulo) VALUES (?, ?)",
+                        (serie["idSerie"], serie.get("titulo")),
+                    )
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO oportuno (serie_id, fecha, dato, fetched_at) VALUES (?, ?, ?, ?)",
+                        (serie["idSerie"], datos[0].get("fecha"), datos[0].get("dato"), now),
+                    )
+
+        result = []
+        with self.lock:
+            for serie_id in serie_ids:
+                row = self.conn.execute(
+                    "SELECT o.fecha, o.dato, m.titulo FROM oportuno o LEFT JOIN series_meta m USING (serie_id) WHERE o.serie_id = ?",
+                    (serie_id,),
+                ).fetchone()
+                serie = {"idSerie": serie_id, "titulo": row[2] if row else None}
+                if row and row[0] is not None:
+                    serie["datos"] = [{"fecha": row[0], "dato": row[1]}]
+                result.append(serie)
+        return result
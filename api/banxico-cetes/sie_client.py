@@ -0,0 +1,321 @@
+"""
+Cliente compartido para la API SIE de Banxico.
+
+- Una sesión HTTP con pool de conexiones (reutiliza TLS entre peticiones).
+- Respuestas comprimidas (Accept-Encoding: gzip).
+- Reintentos con backoff exponencial y jitter para 429/5xx y errores de red,
+  también si la conexión se corta a mitad del cuerpo (ver `stream`).
+- Limitador token-bucket con las cuotas publicadas por token.
+- Fan-out concurrente cuando hay más series de las que caben en una consulta.
+- Latencia y reintentos por petición en `client.stats`.
+- Caché opcional en disco (sie_cache.SIECache): solo se piden los huecos.
+
+Este archivo es idéntico en api/banxico-cetes y api/banxico-divisas (cada
+Lambda se construye solo con su directorio); si se modifica, copiarlo a ambos.
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sie_cache import SIECache
+
+BASE_URL = "https://www.banxico.org.mx/SieAPIRest/service/v1"
+
+# El SIE acepta hasta 20 series separadas por coma en una misma consulta
+MAX_SERIES_PER_REQUEST = 20
+
+# Cuotas publicadas por token: (consultas, segundos). Cada tipo de consulta
+# tiene su propio contador en Banxico.
+QUOTAS = {
+    "rango": [(200, 5 * 60), (10000, 24 * 60 * 60)],
+    "oportuno": [(40000, 24 * 60 * 60)],
+}
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Errores al leer el cuerpo ya con los encabezados recibidos (corte de conexión,
+# read timeout, gzip truncado); con stream=True aparecen al consumir iter_content
+BODY_ERRORS = (
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.ContentDecodingError,
+    requests.ConnectionError,
+    requests.Timeout,
+)
+
+
+class TokenBucket:
+    """Token bucket thread-safe: `capacity` consultas que se reponen en `period` segundos."""
+
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Bloquea hasta tener un token disponible y lo consume. Devuelve segundos esperados."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """Agrupa varios buckets (p. ej. por 5 minutos y por día) que deben cumplirse a la vez."""
+
+    def __init__(self, quotas):
+        self.buckets = [TokenBucket(capacity, period) for capacity, period in quotas]
+
+    def acquire(self):
+        return sum(bucket.acquire() for bucket in self.buckets)
+
+
+def chunk_series(serie_ids, size=MAX_SERIES_PER_REQUEST):
+    """Parte la lista de series en grupos de a lo más `size` IDs."""
+    return [serie_ids[i:i + size] for i in range(0, len(serie_ids), size)]
+
+
+class SIEClient:
+    """
+    Cliente de la API SIE con sesión compartida, reintentos y límite de cuota.
+
+    Args:
+        token: Token Bmx de Banxico.
+        base_url: Raíz del servicio (se puede apuntar a un servidor de prueba).
+        max_retries: Reintentos por petición después del primer intento.
+        backoff_base: Segundos base del backoff exponencial.
+        backoff_cap: Tope de segundos de espera entre reintentos.
+        timeout: Timeout por petición en segundos.
+        max_workers: Peticiones simultáneas en el fan-out (y tamaño del pool).
+        quotas: Cuotas por tipo de consulta, ver QUOTAS.
+        cache: SIECache opcional; sin ella cada consulta va a la API.
+    """
+
+    def __init__(self, token, base_url=BASE_URL, max_retries=4, backoff_base=0.5,
+                 backoff_cap=10.0, timeout=30, max_workers=4, quotas=QUOTAS, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.limiters = {kind: RateLimiter(q) for kind, q in quotas.items()}
+        self.cache = cache
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Bmx-Token": token,
+            "Accept": "application/json",
+            "Accept-Encoding": "gzip, deflate",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.stats = []
+        self.body_retries = 0
+        self._stats_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _backoff(self, attempt, response=None):
+        """Segundos a esperar antes del reintento `attempt` (full jitter, respeta Retry-After)."""
+        if response is not None and response.headers.get("Retry-After"):
+            try:
+                return min(self.backoff_cap, float(response.headers["Retry-After"]))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _record(self, path, status, started, retries, throttled):
+        with self._stats_lock:
+            self.stats.append({
+                "path": path,
+                "status": status,
+                "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                "retries": retries,
+                "throttled_s": round(throttled, 3),
+            })
+
+    def request(self, path, kind="rango", stream=False):
+        """
+        GET a `path` (relativo a base_url) con límite de cuota y reintentos.
+
+        Con stream=True el cuerpo no se descarga todavía (ver sie_stream) y la
+        latencia registrada es hasta recibir los encabezados.
+
+        Returns:
+            requests.Response: Respuesta exitosa.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        limiter = self.limiters.get(kind)
+        started = time.perf_counter()
+        throttled = 0.0
+        attempt = 0
+        while True:
+            if limiter:
+                throttled += limiter.acquire()
+            response = None
+            try:
+                response = self.session.get(url, timeout=self.timeout, stream=stream)
+                if response.status_code not in RETRY_STATUS:
+                    self._record(path, response.status_code, started, attempt, throttled)
+                    if not response.ok:
+                        response.close()
+                        response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} para {url}", response=response)
+                # Sin esto, con stream=True la conexión del intento fallido queda tomada
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+
+            if attempt >= self.max_retries:
+                self._record(path, getattr(response, "status_code", None), started, attempt, throttled)
+                raise error
+            delay = self._backoff(attempt, response)
+            print(f"Reintentando {path} en {delay:.2f}s ({error})")
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, path, kind="rango"):
+        return self.request(path, kind).json()
+
+    def stream(self, path, consume, kind="rango", chunk_size=1 << 16):
+        """
+        GET en streaming: `consume(bloques de bytes)` procesa el cuerpo conforme llega.
+
+        request() solo reintenta hasta recibir los encabezados; si la conexión
+        se corta o vence el timeout mientras se lee el cuerpo, aquí se repite
+        la petición completa (con su cuota) y `consume` empieza de nuevo.
+
+        Returns:
+            Lo que devuelva `consume`.
+        """
+        attempt = 0
+        while True:
+            with self.request(path, kind, stream=True) as response:
+                try:
+                    return consume(response.iter_content(chunk_size))
+                except BODY_ERRORS as e:
+                    error = e
+            if attempt >= self.max_retries:
+                raise error
+            with self._stats_lock:
+                self.body_retries += 1
+            delay = self._backoff(attempt)
+            print(f"Reintentando {path} en {delay:.2f}s (cuerpo incompleto: {error})")
+            time.sleep(delay)
+            attempt += 1
+
+    def _fan_out(self, paths, kind):
+        """Ejecuta las peticiones en paralelo (acotado a max_workers) y conserva el orden."""
+        if len(paths) == 1:
+            return [self.get_json(paths[0], kind)]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(paths))) as executor:
+            return list(executor.map(lambda p: self.get_json(p, kind), paths))
+
+    def get_series(self, serie_ids, start_date, end_date):
+        """
+        Observaciones de varias series en un rango de fechas (YYYY-MM-DD).
+
+        Returns:
+            list[dict]: Entradas de bmx.series (idSerie, titulo, datos).
+        """
+        if self.cache is not None:
+            return self.cache.get_range(self.fetch_series, list(serie_ids), start_date, end_date)
+        return self.fetch_series(serie_ids, start_date, end_date)
+
+    def fetch_series(self, serie_ids, start_date, end_date):
+        """Como get_series pero siempre contra la API."""
+        paths = [
+            f"series/{','.join(batch)}/datos/{start_date}/{end_date}"
+            for batch in chunk_series(list(serie_ids))
+        ]
+        return [s for data in self._fan_out(paths, "rango") for s in data["bmx"]["series"]]
+
+    def get_oportuno(self, serie_ids):
+        """Último dato publicado de varias series."""
+        if self.cache is not None:
+            return self.cache.get_oportuno(self.fetch_oportuno, list(serie_ids))
+        return self.fetch_oportuno(serie_ids)
+
+    def fetch_oportuno(self, serie_ids):
+        """Como get_oportuno pero siempre contra la API."""
+        paths = [f"series/{','.join(batch)}/datos/oportuno" for batch in chunk_series(list(serie_ids))]
+        return [s for data in self._fan_out(paths, "oportuno") for s in data["bmx"]["series"]]
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.stats = []
+            self.body_retries = 0
+        if self.cache is not None:
+            self.cache.counters = dict.fromkeys(self.cache.counters, 0)
+
+    def summary(self):
+        """Resumen de las peticiones hechas: cantidad, latencias y reintentos."""
+        with self._stats_lock:
+            latencies = sorted(s["latency_ms"] for s in self.stats)
+            retries = sum(s["retries"] for s in self.stats) + self.body_retries
+            throttled = sum(s["throttled_s"] for s in self.stats)
+        summary = {"requests": len(latencies), "retries": retries}
+        if latencies:
+            summary.update({
+                "latency_ms_p50": latencies[len(latencies) // 2],
+                "latency_ms_max": latencies[-1],
+                "throttled_s": round(throttled, 3),
+            })
+        if self.cache is not None:
+            summary["cache"] = dict(self.cache.counters)
+        return summary
+
+
+# Caché por defecto; BANXICO_CACHE_PATH="" la desactiva. En Lambda vive en /tmp
+# y sirve mientras el contenedor siga caliente.
+DEFAULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), "banxico_sie_cache.sqlite")
+
+# Un cliente por token y por contenedor Lambda
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(token, base_url=None):
+    """Devuelve el cliente compartido para `token`, creándolo la primera vez."""
+    base_url = base_url or os.getenv("BANXICO_BASE_URL", BASE_URL)
+    key = (token, base_url)
+    with _clients_lock:
+        if key not in _clients:
+            # La caché por defecto es solo para la API real (no para servidores de prueba)
+            default_path = DEFAULT_CACHE_PATH if base_url == BASE_URL else ""
+            cache_path = os.getenv("BANXICO_CACHE_PATH", default_path)
+            cache = SIECache(
+                cache_path,
+                oportuno_ttl=int(os.getenv("BANXICO_OPORTUNO_TTL", "3600")),
+            ) if cache_path else None
+            _clients[key] = SIEClient(token, base_url=base_url, cache=cache)
+        return _clients[key]
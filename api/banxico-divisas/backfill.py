@@ -0,0 +1,200 @@
+"""
+Backfill histórico de divisas Banxico a Parquet particionado por fecha.
+
+Parte el rango [--start, --end] en ventanas de --chunk-days días, las descarga
+en paralelo con el cliente SIE compartido (que respeta la cuota del token y
+su caché en disco: lo ya guardado no se vuelve a pedir), las decodifica en
+streaming a columnas Arrow (sie_stream) y escribe cada
+ventana en cuanto llega como `dt=YYYY-MM-DD/chunk-<ventana>-0.parquet`.
+No se acumula nada en memoria más allá de las ventanas en vuelo.
+
+Cada ventana terminada se anota en un archivo de checkpoint; si el proceso se
+interrumpe, volver a correr el mismo comando continúa con las que faltan.
+Reescribir una ventana produce los mismos nombres de archivo, así que repetirla
+no duplica datos.
+
+Uso:
+    python api/banxico-divisas/backfill.py --start 2015-01-01 --end 2025-10-31 \\
+        --output output/banxico_divisas
+"""
+import argparse
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import sie_client
+import sie_stream
+from lambda_function import BANXICO_TOKEN, SERIES
+
+SCHEMA = pa.schema([
+    ("divisa", pa.string()),
+    ("serie_id", pa.string()),
+    ("fecha", pa.date32()),
+    ("valor", pa.float64()),
+    ("dt", pa.string()),
+])
+
+
+def split_range(start, end, chunk_days):
+    """Ventanas [inicio, fin] consecutivas de a lo más `chunk_days` días."""
+    windows = []
+    current = start
+    while current <= end:
+        window_end = min(end, current + timedelta(days=chunk_days - 1))
+        windows.append((current, window_end))
+        current = window_end + timedelta(days=1)
+    return windows
+
+
+def window_key(window):
+    return f"{window[0].isoformat()}_{window[1].isoformat()}"
+
+
+def load_checkpoint(path, series_ids):
+    """Ventanas ya escritas. Falla si el checkpoint es de otra lista de series."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if sorted(checkpoint.get("series", [])) != sorted(series_ids):
+        raise ValueError(
+            f"El checkpoint {path} es de otras series ({checkpoint.get('series')}); "
+            "usa otro --checkpoint o --reset."
+        )
+    return set(checkpoint.get("done", []))
+
+
+def save_checkpoint(path, series_ids, done):
+    """Escritura atómica: un archivo temporal y luego os.replace."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "series": sorted(series_ids),
+            "done": sorted(done),
+            "updated_at": datetime.now().isoformat(),
+        }, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def with_partition_columns(table, divisa_by_serie):
+    """Agrega divisa y dt (YYYY-MM-DD) a la tabla de sie_stream, con SCHEMA."""
+    serie_ids = list(divisa_by_serie)
+    positions = pc.index_in(table["serie_id"], value_set=pa.array(serie_ids))
+    divisa = pc.take(pa.array([divisa_by_serie[s] for s in serie_ids]), positions)
+    return pa.table({
+        "divisa": divisa,
+        "serie_id": table["serie_id"],
+        "fecha": table["fecha"],
+        "valor": table["valor"],
+        "dt": pc.cast(table["fecha"], pa.string()),
+    }, schema=SCHEMA)
+
+
+def write_window(table, output, window):
+    """Escribe la ventana particionada por dt con nombres deterministas."""
+    if table.num_rows == 0:
+        return
+    pq.write_to_dataset(
+        table,
+        root_path=output,
+        partition_cols=["dt"],
+        basename_template=f"chunk-{window_key(window)}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def backfill(token, start, end, output, series=None, chunk_days=90,
+             workers=4, checkpoint=None, client=None):
+    """
+    Descarga [start, end] en ventanas y las escribe en `output`.
+
+    Returns:
+        dict: Ventanas escritas, saltadas por checkpoint, filas y stats de la API.
+    """
+    series = series or SERIES
+    divisa_by_serie = {serie_id: divisa for divisa, serie_id in series.items()}
+    series_ids = list(divisa_by_serie)
+    checkpoint = checkpoint or os.path.join(output, "_backfill_checkpoint.json")
+    os.makedirs(output, exist_ok=True)
+
+    done = load_checkpoint(checkpoint, series_ids)
+    windows = [w for w in split_range(start, end, chunk_days) if window_key(w) not in done]
+    skipped = len(split_range(start, end, chunk_days)) - len(windows)
+    print(f"Backfill {start} -> {end}: {len(windows)} ventanas pendientes, {skipped} ya hechas")
+
+    client = client or sie_client.get_client(token)
+    rows = 0
+    pending = {}
+    remaining = iter(windows)
+
+    def fetch(window):
+        # El checkpoint evita repetir ventanas en esta salida; la caché, volver a
+        # descargar rangos ya definitivos (p. ej. con --reset u otra --output)
+        table, _ = sie_stream.get_series_table(
+            client, series_ids, window[0].isoformat(), window[1].isoformat()
+        )
+        return with_partition_columns(table, divisa_by_serie)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # A lo más 2 * workers ventanas en vuelo: memoria acotada aunque el rango sea de años
+        for window in remaining:
+            pending[executor.submit(fetch, window)] = window
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                window = pending.pop(future)
+                table = future.result()
+                write_window(table, output, window)
+                done.add(window_key(window))
+                save_checkpoint(checkpoint, series_ids, done)
+                rows += table.num_rows
+                print(f"  {window_key(window)}: {table.num_rows} filas")
+                next_window = next(remaining, None)
+                if next_window is not None:
+                    pending[executor.submit(fetch, next_window)] = next_window
+
+    return {
+        "windows_written": len(windows),
+        "windows_skipped": skipped,
+        "rows": rows,
+        "api_stats": client.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today() - timedelta(days=1), help="YYYY-MM-DD (default: ayer)")
+    parser.add_argument("--output", required=True, help="directorio raíz del dataset Parquet")
+    parser.add_argument("--series", help="DIVISA=SERIE separados por coma (default: SERIES)")
+    parser.add_argument("--chunk-days", type=int, default=90, help="días por consulta")
+    parser.add_argument("--workers", type=int, default=4, help="ventanas descargadas en paralelo")
+    parser.add_argument("--checkpoint", help="archivo de checkpoint (default: <output>/_backfill_checkpoint.json)")
+    parser.add_argument("--reset", action="store_true", help="ignorar el checkpoint existente")
+    parser.add_argument("--token", default=BANXICO_TOKEN)
+    args = parser.parse_args()
+
+    series = None
+    if args.series:
+        series = dict(item.split("=", 1) for item in args.series.split(","))
+
+    checkpoint = args.checkpoint or os.path.join(args.output, "_backfill_checkpoint.json")
+    if args.reset and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    result = backfill(
+        args.token, args.start, args.end, args.output,
+        series=series, chunk_days=args.chunk_days, workers=args.workers, checkpoint=checkpoint,
+    )
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
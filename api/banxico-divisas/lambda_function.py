@@ -1,8 +1,10 @@
 import os
+import hashlib
+import json
 from datetime import datetime, timedelta
-import pandas as pd
-import requests
-import boto3
+
+import sie_client
+import sie_stream
 
 # Token de acceso Banxico
 BANXICO_TOKEN = os.getenv("BANXICO_TOKEN", "1e9f07d4e173151bf1210ce6d2224eccc8abb8839c9bbc5f0ff5f01c524faec7")
@@ -15,32 +17,79 @@ SERIES = {
     "JPY": "SF46406",
 }
 
-BASE_URL = "https://www.banxico.org.mx/SieAPIRest/service/v1/series"
+# Marcador con la huella del último snapshot escrito y la última revisión
+STATE_KEY = "banxico/_state/divisas.json"
 
+# Bucket de todas las capas; la variable BUCKET_NAME apunta la Lambda a otro
+# (p. ej. el del arnés local, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
 
-def fetch_series_data(serie_id, token, start_date, end_date):
-    """Descarga datos de una serie específica"""
-    url = f"{BASE_URL}/{serie_id}/datos/{start_date}/{end_date}"
-    headers = {"Bmx-Token": token}
+# Cliente S3 compartido entre invocaciones del mismo contenedor
+_s3_client = None
 
-    try:
-        r = requests.get(url, headers=headers, timeout=30)
-        r.raise_for_status()
 
-        data = r.json()
-        serie = data["bmx"]["series"][0]["datos"]
+def get_s3_client():
+    """Crea el cliente S3 la primera vez que se necesita y lo reutiliza."""
+    global _s3_client
+    if _s3_client is None:
+        import boto3  # import diferido: solo se paga cuando hay algo que subir
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def fetch_series_frame(serie_ids, token, start_date, end_date):
+    """
+    Descarga varias series con el cliente SIE compartido.
+
+    El cliente agrupa los IDs en consultas de hasta 20 series y descarga los
+    grupos en paralelo respetando la cuota del token. La respuesta se
+    decodifica en streaming directo a columnas Arrow (sie_stream), sin pasar
+    por r.json() ni por una lista de dicts. Con la caché del cliente solo se
+    descargan los rangos que aún no están guardados como definitivos.
+
+    Returns:
+        tuple: (DataFrame con serie_id, fecha "dd/mm/YYYY", valor; lista de
+        idSerie presentes en la respuesta, incluidas las que no traen datos)
+    """
+    client = sie_client.get_client(token)
 
-        df = pd.DataFrame(serie)
-        df.columns = ["fecha", "valor"]
-        df["valor"] = pd.to_numeric(df["valor"], errors="coerce")
-        return df
+    try:
+        table, returned_ids = sie_stream.get_series_table(client, serie_ids, start_date, end_date)
     except Exception as e:
-        print(f"Error fetching series {serie_id}: {e}")
+        print(f"Error fetching series {','.join(serie_ids)}: {e}")
         raise
 
+    df = table.to_pandas(date_as_object=False)
+    df["fecha"] = df["fecha"].dt.strftime("%d/%m/%Y")
+    return df, returned_ids
+
+
+def fetch_series_batch(serie_ids, token, start_date, end_date):
+    """
+    Returns:
+        dict: {serie_id: DataFrame con columnas fecha, valor}. Las series sin
+        observaciones en el rango regresan un DataFrame vacío.
+    """
+    df, returned_ids = fetch_series_frame(serie_ids, token, start_date, end_date)
+    return {
+        serie_id: df.loc[df["serie_id"] == serie_id, ["fecha", "valor"]].reset_index(drop=True)
+        for serie_id in returned_ids
+    }
+
 
-def fetch_banxico_data(token, start_date=None, end_date=None):
-    """Descarga varias divisas desde la API de Banxico"""
+def fetch_series_data(serie_id, token, start_date, end_date):
+    """Descarga datos de una serie específica"""
+    return fetch_series_batch([serie_id], token, start_date, end_date)[serie_id]
+
+
+def fetch_banxico_data(token, start_date=None, end_date=None, series=None):
+    """
+    Descarga varias divisas desde la API de Banxico.
+
+    Todas las series salen en una consulta por cada 20 IDs (en paralelo si
+    hay más de una), así que agregar divisas no agrega una petición por divisa.
+    """
+    series = series or SERIES
     if not end_date:
         end_date = datetime.now().strftime("%Y-%m-%d")
     if not start_date:
@@ -48,21 +97,18 @@ def fetch_banxico_data(token, start_date=None, end_date=None):
 
     print(f"Fetching Banxico data from {start_date} to {end_date}")
 
-    all_data = []
-    for divisa, serie_id in SERIES.items():
-        print(f"Descargando {divisa} ({serie_id}) ...")
-        try:
-            df = fetch_series_data(serie_id, token, start_date, end_date)
-            df["divisa"] = divisa
-            all_data.append(df)
-        except Exception as e:
-            print(f"Warning: Failed to fetch {divisa}: {e}")
-            continue
-
-    if not all_data:
+    divisa_by_serie = {serie_id: divisa for divisa, serie_id in series.items()}
+    print(f"Descargando {len(divisa_by_serie)} series ...")
+    result, returned_ids = fetch_series_frame(list(divisa_by_serie), token, start_date, end_date)
+
+    for serie_id, divisa in divisa_by_serie.items():
+        if serie_id not in returned_ids:
+            print(f"Warning: Failed to fetch {divisa}")
+
+    if not returned_ids:
         raise ValueError("No data could be fetched from any series")
 
-    result = pd.concat(all_data, ignore_index=True)
+    result["divisa"] = result["serie_id"].map(divisa_by_serie)
     result["fetched_at"] = datetime.now().isoformat()
     result["source_url"] = "https://www.banxico.org.mx/SieAPIRest/service/v1/"
     result = result[["divisa", "fecha", "valor", "fetched_at", "source_url"]]
@@ -71,15 +117,42 @@ def fetch_banxico_data(token, start_date=None, end_date=None):
     return result
 
 
+def fingerprint(df):
+    """Huella del contenido (divisa, fecha, valor); ignora fetched_at y el orden."""
+    canonical = df[["divisa", "fecha", "valor"]].sort_values(["divisa", "fecha"])
+    return hashlib.sha256(canonical.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def read_state(bucket_name, key=STATE_KEY):
+    """Lee el marcador de estado; None si todavía no existe."""
+    s3_client = get_s3_client()
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    except s3_client.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+
+def write_state(bucket_name, state, key=STATE_KEY):
+    get_s3_client().put_object(
+        Bucket=bucket_name,
+        Key=key,
+        Body=json.dumps(state, indent=2).encode("utf-8"),
+        ContentType="application/json",
+    )
+
+
 def main(event):
     # Get token and bucket (optional, with defaults)
     token = event.get('token', BANXICO_TOKEN) if event else BANXICO_TOKEN
-    bucket_name = event.get('bucket', 'scrapping-divisas') if event else 'scrapping-divisas'
+    bucket_name = event.get('bucket', BUCKET_NAME) if event else BUCKET_NAME
+    force = event.get('force', False) if event else False
 
-    # Calculate previous day's date (for scheduled invocation at 00:05 AM UTC-6)
+    # Calculate previous day's date (for scheduled invocation at 00:05 AM UTC-6);
+    # event["date"] (YYYY-MM-DD) pide otro día, p. ej. al reproducir una grabación
     today = datetime.now()
     previous_day = today - timedelta(days=1)
-    end_date = previous_day.strftime("%Y-%m-%d")
+    end_date = (event.get('date') if event else None) or previous_day.strftime("%Y-%m-%d")
     
     # Set start_date to the same as end_date to retrieve only the previous day
     start_date = end_date
@@ -87,9 +160,38 @@ def main(event):
     print(f"Fetching data for previous day: {end_date} (from {start_date} to {end_date})")
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    checked_at = datetime.now().isoformat()
 
     # Fetch data from Banxico API
+    client = sie_client.get_client(token)
+    client.reset_stats()
     df = fetch_banxico_data(token, start_date, end_date)
+    api_stats = client.summary()
+    print(f"Banxico API stats: {api_stats}")
+
+    # No se escribe si Banxico aún no publica el día o si es idéntico al último snapshot
+    state = read_state(bucket_name) or {}
+    current_fingerprint = fingerprint(df)
+    if not df["valor"].notna().any():
+        result = 'no_data'
+    elif state.get('fingerprint') == current_fingerprint:
+        result = 'unchanged'
+    else:
+        result = 'written'
+
+    if result != 'written' and not force:
+        state.update({'last_checked_at': checked_at, 'last_result': result, 'last_checked_date': end_date})
+        write_state(bucket_name, state)
+        print(f"No se escribe snapshot ({result}) para {end_date}")
+        return {
+            'statusCode': 200,
+            'message': f'Divisas Banxico sin datos nuevos para {end_date} ({result})',
+            'bucket_name': bucket_name,
+            'csv_key': state.get('last_key'),
+            'records_count': len(df),
+            'changed': False,
+            'api_stats': api_stats
+        }
 
     # Save CSV file
     print("Saving CSV file...")
@@ -103,7 +205,7 @@ def main(event):
 
         csv_key = f"banxico/divisas/banxico_divisas_{timestamp}.csv"
 
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
 
         # Upload CSV
         s3_client.upload_file(csv_path, bucket_name, csv_key)
@@ -120,6 +222,15 @@ def main(event):
     except Exception as e:
         print(f"Warning: Could not clean up temp files: {e}")
 
+    write_state(bucket_name, {
+        'fingerprint': current_fingerprint,
+        'last_key': csv_key,
+        'last_changed_at': checked_at,
+        'last_checked_at': checked_at,
+        'last_checked_date': end_date,
+        'last_result': 'written',
+    })
+
     print(f"{len(df)} registros de divisas Banxico procesados correctamente")
 
     return {
@@ -127,7 +238,9 @@ def main(event):
         'message': f'Divisas Banxico extraídas correctamente: {len(df)} registros',
         'bucket_name': bucket_name,
         'csv_key': csv_key,
-        'records_count': len(df)
+        'records_count': len(df),
+        'changed': True,
+        'api_stats': api_stats
     }
 
 
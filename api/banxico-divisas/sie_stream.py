@@ -0,0 +1,306 @@
+"""
+Decodificador incremental de respuestas de rango de la API SIE.
+
+Recorre bmx.series[].datos[] conforme llegan los bytes y guarda cada
+observación directo en buffers tipados (array de días, array de doubles y
+máscara de nulos), sin armar la lista de dicts de `r.json()` ni un DataFrame
+intermedio. Al final los buffers se convierten en una tabla Arrow:
+
+    serie_id: string, fecha: date32, valor: float64 (null para "N/E")
+
+Uso típico:
+
+    table, serie_ids = get_series_table(client, ["SF43718", "SF46410"], "2015-01-01", "2025-10-31")
+
+get_series_table pasa por la caché del cliente (sie_cache) si la tiene: solo
+se descargan en streaming los huecos y lo decodificado se guarda en la caché.
+fetch_series_table siempre va a la API.
+"""
+import codecs
+import json
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+import sie_client
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+WHITESPACE = " \t\r\n"
+TRIM_THRESHOLD = 1 << 16
+
+SCHEMA = pa.schema([
+    ("serie_id", pa.string()),
+    ("fecha", pa.date32()),
+    ("valor", pa.float64()),
+])
+
+# Estados del recorrido
+_SEEK_SERIES, _IN_SERIES, _IN_OBJECT, _IN_DATOS, _DONE = range(5)
+
+
+class _NeedMore(Exception):
+    """El buffer termina a mitad de un token; hay que esperar más bytes."""
+
+
+class SeriesStreamDecoder:
+    """
+    Decodificador incremental: llamar feed() con cada bloque de bytes y
+    close() al final; luego to_table().
+    """
+
+    def __init__(self):
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._state = _SEEK_SERIES
+
+        # Una entrada por objeto de bmx.series (el idSerie puede llegar después de datos)
+        self.serie_ids = []
+        self._slot = -1
+
+        # Buffers por columna
+        self._serie_idx = array("i")
+        self._days = array("i")
+        self._values = array("d")
+        self._nulls = bytearray()
+
+    def __len__(self):
+        return len(self._days)
+
+    # Lectura de tokens sobre el buffer
+
+    def _skip(self, chars=WHITESPACE):
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+        self._pos = pos
+        if pos >= len(buf):
+            raise _NeedMore()
+        return buf[pos]
+
+    def _value(self):
+        """Decodifica un valor JSON completo en la posición actual."""
+        self._skip()
+        try:
+            value, end = self._json.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._eof:
+                raise
+            raise _NeedMore()
+        # Un número al final del buffer puede estar cortado
+        if end >= len(self._buf) and not self._eof:
+            raise _NeedMore()
+        self._pos = end
+        return value
+
+    def _expect(self, char):
+        if self._skip() != char:
+            raise ValueError(f"Se esperaba '{char}' en la posición {self._pos}")
+        self._pos += 1
+
+    # Recorrido
+
+    def _append(self, dato):
+        fecha = dato.get("fecha") or ""
+        # "dd/mm/yyyy" -> días desde 1970-01-01
+        self._days.append(
+            date(int(fecha[6:10]), int(fecha[3:5]), int(fecha[0:2])).toordinal() - EPOCH_ORDINAL
+        )
+        try:
+            self._values.append(float(dato.get("dato", "").replace(",", "")))
+            self._nulls.append(0)
+        except (AttributeError, ValueError):
+            self._values.append(0.0)
+            self._nulls.append(1)
+        self._serie_idx.append(self._slot)
+
+    def _step(self):
+        """Avanza lo más posible con el buffer actual."""
+        while True:
+            if self._state == _SEEK_SERIES:
+                idx = self._buf.find('"series"', self._pos)
+                if idx < 0:
+                    # Conservar lo suficiente por si la clave quedó partida
+                    self._pos = max(self._pos, len(self._buf) - len('"series"'))
+                    raise _NeedMore()
+                self._pos = idx + len('"series"')
+                try:
+                    self._expect(":")
+                    self._expect("[")
+                except _NeedMore:
+                    self._pos = idx
+                    raise
+                self._state = _IN_SERIES
+
+            elif self._state == _IN_SERIES:
+                char = self._skip(WHITESPACE + ",")
+                if char == "]":
+                    self._pos += 1
+                    self._state = _DONE
+                    return
+                if char != "{":
+                    raise ValueError(f"Se esperaba un objeto de serie en la posición {self._pos}")
+                self._pos += 1
+                self.serie_ids.append(None)
+                self._slot = len(self.serie_ids) - 1
+                self._state = _IN_OBJECT
+
+            elif self._state == _IN_OBJECT:
+                char = self._skip(WHITESPACE + ",")
+                if char == "}":
+                    self._pos += 1
+                    self._state = _IN_SERIES
+                    continue
+                start = self._pos
+                try:
+                    key = self._value()
+                    self._expect(":")
+                    if key == "datos":
+                        self._expect("[")
+                        self._state = _IN_DATOS
+                        continue
+                    value = self._value()
+                except _NeedMore:
+                    self._pos = start
+                    raise
+                if key == "idSerie":
+                    self.serie_ids[self._slot] = value
+
+            elif self._state == _IN_DATOS:
+                char = self._skip(WHITESPACE + ",")
+                if char == "]":
+                    self._pos += 1
+                    self._state = _IN_OBJECT
+                    continue
+                self._append(self._value())
+
+            else:
+                return
+
+    def feed(self, data, final=False):
+        """Agrega bytes y decodifica las observaciones completas que ya estén disponibles."""
+        self._buf = self._buf[self._pos:] + self._utf8.decode(data, final)
+        self._pos = 0
+        self._eof = final
+        try:
+            self._step()
+        except _NeedMore:
+            if final:
+                raise ValueError("Respuesta SIE incompleta")
+        if self._pos > TRIM_THRESHOLD:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+
+    def close(self):
+        self.feed(b"", final=True)
+        if self._state != _DONE:
+            raise ValueError("Respuesta SIE sin bmx.series completo")
+
+    def to_table(self):
+        """Tabla Arrow con SCHEMA construida desde los buffers (sin lista de objetos)."""
+        n = len(self._days)
+        ids = pa.array([serie_id or "" for serie_id in self.serie_ids], pa.string())
+        serie_id = pa.DictionaryArray.from_arrays(
+            pa.array(np.frombuffer(self._serie_idx, dtype=np.int32) if n else [], pa.int32()), ids
+        ).cast(pa.string())
+        fecha = pa.Array.from_buffers(pa.date32(), n, [None, pa.py_buffer(self._days)])
+        valor = pa.array(
+            np.frombuffer(self._values, dtype=np.float64),
+            mask=np.frombuffer(bytes(self._nulls), dtype=np.bool_),
+            type=pa.float64(),
+        )
+        return pa.Table.from_arrays([serie_id, fecha, valor], schema=SCHEMA)
+
+
+def decode_series(chunks):
+    """
+    Decodifica un iterable de bloques de bytes de una respuesta de rango.
+
+    Returns:
+        tuple: (pyarrow.Table con SCHEMA, lista de idSerie presentes en la respuesta)
+    """
+    decoder = SeriesStreamDecoder()
+    for chunk in chunks:
+        decoder.feed(chunk)
+    decoder.close()
+    return decoder.to_table(), [serie_id for serie_id in decoder.serie_ids if serie_id]
+
+
+def fetch_series_table(client, serie_ids, start_date, end_date, chunk_size=1 << 16):
+    """
+    Descarga un rango de varias series y lo decodifica en streaming.
+
+    Usa la sesión, reintentos y cuota del cliente (SIEClient.stream repite la
+    descarga completa si la conexión se corta a mitad del cuerpo); los grupos
+    de 20 series se descargan en paralelo.
+
+    Returns:
+        tuple: (pyarrow.Table con SCHEMA, lista de idSerie presentes en la respuesta)
+    """
+    def fetch(batch):
+        path = f"series/{','.join(batch)}/datos/{start_date}/{end_date}"
+        return client.stream(path, decode_series, "rango", chunk_size)
+
+    batches = sie_client.chunk_series(list(serie_ids))
+    if len(batches) == 1:
+        results = [fetch(batches[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(client.max_workers, len(batches))) as executor:
+            results = list(executor.map(fetch, batches))
+
+    table = pa.concat_tables([t for t, _ in results]) if results else SCHEMA.empty_table()
+    return table, [serie_id for _, ids in results for serie_id in ids]
+
+
+def table_rows(table):
+    """Filas (serie_id, fecha ISO, dato) para sie_cache; repr conserva el float exacto."""
+    return zip(
+        table["serie_id"].to_pylist(),
+        pc.cast(table["fecha"], pa.string()).to_pylist(),
+        [None if v is None else repr(v) for v in table["valor"].to_pylist()],
+    )
+
+
+def rows_table(rows):
+    """Tabla con SCHEMA desde filas de sie_cache ("N/E" y similares quedan en null)."""
+    serie_ids, fechas, valores = [], [], []
+    for serie_id, fecha, dato in rows:
+        serie_ids.append(serie_id)
+        fechas.append(fecha)
+        try:
+            valores.append(float(dato.replace(",", "")))
+        except (AttributeError, ValueError):
+            valores.append(None)
+    return pa.Table.from_arrays([
+        pa.array(serie_ids, pa.string()),
+        pc.cast(pa.array(fechas, pa.string()), pa.date32()),
+        pa.array(valores, pa.float64()),
+    ], schema=SCHEMA)
+
+
+def get_series_table(client, serie_ids, start_date, end_date, chunk_size=1 << 16):
+    """
+    Como fetch_series_table pero a través de la caché del cliente, si tiene.
+
+    Solo los huecos que la caché no cubre se descargan en streaming; las filas
+    decodificadas se guardan y el resultado sale de la caché, ordenado por
+    serie y fecha.
+
+    Returns:
+        tuple: (pyarrow.Table con SCHEMA, lista de idSerie presentes en la respuesta)
+    """
+    if client.cache is None:
+        return fetch_series_table(client, serie_ids, start_date, end_date, chunk_size)
+
+    def fetch(ids, gap_start, gap_end):
+        table, returned_ids = fetch_series_table(client, ids, gap_start, gap_end, chunk_size)
+        return table_rows(table), returned_ids
+
+    rows, present = client.cache.get_rows(fetch, list(serie_ids), start_date, end_date)
+    return rows_table(rows), present
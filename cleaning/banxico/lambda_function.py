@@ -1,9 +1,35 @@
 import boto3
+from botocore.exceptions import ClientError
+import os
 import pandas as pd
+import pyarrow.parquet as pq
 import re
+import tempfile
 from datetime import datetime
 from io import BytesIO
 
+from s3_events import combine_results, objects_from_event
+from silver_manifest import append_to_manifest, silver_part_key, source_processed, to_silver_table
+
+# Bucket of every layer; the BUCKET_NAME variable points the Lambda at another
+# one (e.g. the local harness, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Bronze CSVs written by the CETES API Lambda
+PARENT_FOLDER = 'banxico/cetes/'
+
+# S3 client shared across invocations of the same container
+_s3_client = None
+
+
+def get_s3_client():
+    """Create the S3 client on first use and reuse it afterwards."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
 def read_csv_from_s3(bucket_name, object_key):
     """
     Read CSV file from S3 directly into a pandas DataFrame.
@@ -15,7 +41,7 @@ def read_csv_from_s3(bucket_name, object_key):
     Returns:
         pandas.DataFrame: The CSV data as a DataFrame
     """
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     
     # Get object from S3
     response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
@@ -25,6 +51,12 @@ def read_csv_from_s3(bucket_name, object_key):
     
     return df
 
+def date_from_key(object_key):
+    """Date in a bronze key (banxico/cetes/banxico_cetes_<YYYYMMDD>_<HHMMSS>.csv); None if the key has none."""
+    date_match = re.search(r'(\d{8})_\d{6}', object_key)
+    return datetime.strptime(date_match.group(1), "%Y%m%d") if date_match else None
+
+
 def get_most_recent_file_from_s3(bucket_name, parent_folder):
     """
     Get the most recent file from S3 bucket.
@@ -36,7 +68,7 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
     Returns:
         tuple: (extracted_date, object_key) or None if no files found
     """
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=parent_folder)
     
     # Sort objects by LastModified in descending order (most recent first)
@@ -45,17 +77,25 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
         
     response['Contents'] = sorted(response['Contents'], key=lambda x: x['LastModified'], reverse=True)
     object_key = response['Contents'][0]['Key']
-    extracted_date = None
-    # Match YYYYMMDD in the object key, e.g., banxico/divisas/banxico_divisas_20251108_020959.csv
-    date_match = re.search(r'(\d{8})_\d{6}', object_key)
-    if date_match:
-        date_str = date_match.group(1)  # e.g. "20251108"
-        extracted_date = datetime.strptime(date_str, "%Y%m%d")
+    # Match YYYYMMDD in the object key, e.g., banxico/cetes/banxico_cetes_20251108_020959.csv
+    extracted_date = date_from_key(object_key)
+    if extracted_date:
         return extracted_date, object_key
     else:
         return None
 
-def lambda_handler(event, context):
+def clean_object(bucket_name, object_key, force=False):
+    """
+    Turn one CETES CSV into a new Banxico silver part of its date.
+
+    Args:
+        bucket_name: S3 bucket name
+        object_key: Bronze key under banxico/cetes/ (<YYYYMMDD>_<HHMMSS> in the key)
+        force: Rebuild even if this version of the object is already in silver
+
+    Returns:
+        dict: Lambda result (records_count, csv_key of the new part; skipped=True if nothing to do)
+    """
     ENTITY_ID = 1
     PRODUCT_ID_MAP = {
         'SF60633': 26,
@@ -64,18 +104,35 @@ def lambda_handler(event, context):
         'SF60636': 29,
     }
 
-    bucket_name = 'scrapping-divisas'
-    parent_folder = 'banxico/cetes/'
-
-    file_data = get_most_recent_file_from_s3(bucket_name, parent_folder)
+    extracted_date = date_from_key(object_key) if object_key.startswith(PARENT_FOLDER) else None
+    if not extracted_date:
+        return {
+            'statusCode': 400,
+            'body': f'{object_key} no es un archivo de CETES ({PARENT_FOLDER}..._<YYYYMMDD>_<HHMMSS>.csv)'
+        }
 
-    if not file_data:
+    s3_client = get_s3_client()
+    try:
+        etag = s3_client.head_object(Bucket=bucket_name, Key=object_key)['ETag']
+    except ClientError as err:
+        if err.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
         return {
             'statusCode': 404,
-            'body': 'No se encontró el archivo más reciente en S3.'
+            'body': f'{object_key} ya no existe en S3.'
         }
 
-    extracted_date, object_key = file_data
+    # Duplicate notifications and polls with nothing new leave silver as it is
+    if not force and source_processed(s3_client, bucket_name, extracted_date.strftime('%Y-%m-%d'),
+                                      'banxico', object_key, etag):
+        print(f"{object_key} ({etag}) is already in silver, skipping")
+        return {
+            'statusCode': 200,
+            'message': f'CETES Banxico sin cambios: {object_key} ya procesado',
+            'bucket_name': bucket_name,
+            'records_count': 0,
+            'skipped': True
+        }
 
     df = read_csv_from_s3(bucket_name, object_key)
 
@@ -100,16 +157,23 @@ def lambda_handler(event, context):
         })
         
     new_df = pd.DataFrame(new_rows)
-    tmp_path = f"/tmp/fact_rates_staging.parquet"
-    new_df_s3_key = f"silver/banxico/{extracted_date.strftime('%Y-%m-%d')}/fact_rates_staging.parquet"
-    new_df.to_parquet(tmp_path)
 
-    print(f"Uploading {tmp_path} to {new_df_s3_key}")
+    # Each write is a new part: silver/entity=banxico/dt=<YYYY-MM-DD>/part-<ts>-<id>.parquet
+    new_df_s3_key = silver_part_key('banxico', extracted_date.strftime('%Y-%m-%d'))
 
-    s3_client = boto3.client('s3')
-    s3_client.upload_file(tmp_path, bucket_name, new_df_s3_key)
+    # A private staging directory per write, so concurrent runs on one host never share a file
+    with tempfile.TemporaryDirectory(prefix='banxico_') as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, 'fact_rates_staging.parquet')
+        pq.write_table(to_silver_table(new_df), tmp_path)
+        print(f"Uploading {tmp_path} to {new_df_s3_key}")
+        s3_client.upload_file(tmp_path, bucket_name, new_df_s3_key)
     print(f"Saved {len(new_df)} rows to {new_df_s3_key}")
 
+    # The fact job reads only the files listed in the day's manifest
+    append_to_manifest(s3_client, bucket_name, extracted_date.strftime('%Y-%m-%d'), new_df_s3_key, 'banxico', len(new_df),
+                       source_key=object_key, source_etag=etag)
+    print(f"Registered {new_df_s3_key} in the silver manifest")
+
     return {
         'statusCode': 200,
         'message': f'CETES Banxico extraidos correctamente: {len(new_df)} registros',
@@ -118,6 +182,27 @@ def lambda_handler(event, context):
         'records_count': len(new_df)
     }
 
+
+def lambda_handler(event, context):
+    event = event or {}
+    force = event.get('force', False)
+
+    # Object-created events name the objects; a scheduled run polls for the latest one
+    objects = objects_from_event(event)
+    if not objects:
+        bucket_name = event.get('bucket', BUCKET_NAME)
+        file_data = get_most_recent_file_from_s3(bucket_name, PARENT_FOLDER)
+
+        if not file_data:
+            return {
+                'statusCode': 404,
+                'body': 'No se encontró el archivo más reciente en S3.'
+            }
+        objects = [(bucket_name, file_data[1])]
+
+    return combine_results([clean_object(bucket_name, object_key, force) for bucket_name, object_key in objects])
+
+
 if __name__ == "__main__":
     event = {}
     context = {}
@@ -0,0 +1,96 @@
+import boto3
+import json
+import os
+
+from s3_events import objects_from_event
+
+# Bucket of every layer; the BUCKET_NAME variable points the Lambda at another
+# one (e.g. the local harness, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Bronze prefix -> cleaner Lambda that turns it into silver. The first prefix
+# that matches wins. Only .csv keys are routed: html/, silver/, gold/, the
+# compressed HTML next to the Banamex CSVs and the API state files are ignored.
+ROUTES = [
+    ('banxico/cetes/', 'banxico-cleaner'),
+    ('klar/', 'klar-cleaner'),
+    ('nu/', 'nu-cleaner'),
+    ('stori/', 'stori-cleaner'),
+    # Raw FX CSVs (buy/sell and Banxico FIX): the FX cleaner rebuilds each
+    # (source, day) they touch
+    ('banxico/divisas/', 'fx-cleaner'),
+    ('banamex/', 'fx-cleaner'),
+    ('bbva/', 'fx-cleaner'),
+    ('banregio/', 'fx-cleaner'),
+    ('wise/', 'fx-cleaner'),
+]
+
+# Lambda client shared across invocations of the same container
+_lambda_client = None
+
+
+def get_lambda_client():
+    """Create the Lambda client on first use and reuse it afterwards."""
+    global _lambda_client
+    if _lambda_client is None:
+        _lambda_client = boto3.client('lambda')
+    return _lambda_client
+
+
+def route(object_key):
+    """Cleaner Lambda for a bronze key; None if no cleaner handles it."""
+    if not object_key.endswith('.csv'):
+        return None
+    for prefix, function_name in ROUTES:
+        if object_key.startswith(prefix):
+            return function_name
+    return None
+
+
+def lambda_handler(event, context):
+    """
+    Forward each created bronze object to its cleaner.
+
+    The event is an S3 object-created notification, a batch of them from an
+    SQS queue, an EventBridge event or {"bucket", "keys"}. Keys are grouped
+    per cleaner and bucket, in order, and each group is sent as one
+    asynchronous invocation {"bucket", "keys"}: with the notifications going
+    through SQS with a batching window, a burst of FX files costs one FX
+    cleaner run. Lambda retries failed asynchronous invocations on its own.
+    """
+    batches = {}
+    ignored = []
+    for bucket_name, object_key in objects_from_event(event):
+        function_name = route(object_key)
+        if function_name is None:
+            ignored.append(object_key)
+            continue
+        batches.setdefault((function_name, bucket_name), []).append(object_key)
+
+    lambda_client = get_lambda_client()
+    dispatched = []
+    for (function_name, bucket_name), keys in batches.items():
+        lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps({'bucket': bucket_name, 'keys': keys}).encode('utf-8'),
+        )
+        print(f"Sent {len(keys)} objects from {bucket_name} to {function_name}")
+        dispatched.append({'function': function_name, 'bucket': bucket_name, 'keys': keys})
+
+    if ignored:
+        print(f"Ignored {len(ignored)} objects with no cleaner: {ignored[:5]}")
+
+    return {
+        'statusCode': 200,
+        'message': f'{sum(len(d["keys"]) for d in dispatched)} objects sent to {len(dispatched)} cleaners',
+        'dispatched': dispatched,
+        'ignored': ignored
+    }
+
+
+if __name__ == "__main__":
+    event = {'bucket': BUCKET_NAME, 'keys': []}
+    context = {}
+    result = lambda_handler(event, context)
+    print(result)
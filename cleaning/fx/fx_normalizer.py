@@ -0,0 +1,149 @@
+"""
+Columnar normalizer for the FX sources configured in fx_sources.py.
+
+The raw CSVs of a batch are concatenated per source and converted with
+column operations only: currency names are resolved once per distinct name,
+the side columns (compra/venta, or Banxico's fix) are melted into one row per
+(currency, side) with its product id, and rates, dates and timestamps are
+parsed column-wise. There is no per-row Python loop, so one invocation
+handles every file of every source for one or many days.
+
+The result has the silver columns plus `source` (entity folder) and `dt`
+(date in the raw key, the silver folder date), one staging file per
+(source, dt). It does not depend on boto3: lambda_function.py does the S3
+side.
+"""
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from fx_sources import CURRENCY_ALIASES, FX_CURRENCIES, FX_PRODUCT_BASE, FX_SIDES, SOURCES, normalize_name
+
+KEY_TIMESTAMP = re.compile(r"(\d{8})_(\d{6})\.csv$")
+SILVER_COLUMNS = ["date", "entity__id", "product__id", "rate", "ingestion_ts", "source_file"]
+
+
+def key_timestamp(key):
+    """Scrape time encoded in a raw key (..._YYYYMMDD_HHMMSS.csv); None if the key does not follow the layout."""
+    match = KEY_TIMESTAMP.search(key)
+    return datetime.strptime("".join(match.groups()), "%Y%m%d%H%M%S") if match else None
+
+
+def source_of(key):
+    """Source whose key_prefix matches `key`; None if no source does."""
+    for source, config in SOURCES.items():
+        if key.startswith(config["key_prefix"]):
+            return source
+    return None
+
+
+def resolve_currencies(names, aliases=None):
+    """
+    ISO code for each value of `names` (null when unknown). Each distinct
+    name is resolved once and the result is mapped back to the column.
+    """
+    table = {**CURRENCY_ALIASES, **{normalize_name(name): code for name, code in (aliases or {}).items()}}
+    codes = {}
+    for name in names.dropna().unique():
+        normalized = normalize_name(name)
+        code = table.get(normalized, normalized.upper())
+        codes[name] = code if code in FX_CURRENCIES else None
+    return names.map(codes)
+
+
+def parse_rates(values):
+    """Rates as printed by the sources ("$18.45", "1,234.5", 18.45) -> float; unparseable values become NaN."""
+    text = values.astype("string").str.replace(r"[$,\s]", "", regex=True)
+    return pd.to_numeric(text, errors="coerce").astype("float64")
+
+
+def normalize(raw, source):
+    """
+    Silver rows for the raw CSV rows of one source.
+
+    Args:
+        raw: Concatenated CSV rows with two extra columns, source_file (URI of
+            the raw file) and file_ts (scrape time from its key)
+        source: Key of SOURCES
+
+    Returns:
+        pandas.DataFrame: SILVER_COLUMNS plus source and dt
+    """
+    config = SOURCES[source]
+    frame = raw
+    if config.get("quote_column"):
+        quote = frame[config["quote_column"]].astype("string").str.strip().str.upper()
+        frame = frame[quote.eq(config["quote_currency"]).fillna(False).to_numpy(dtype=bool)]
+
+    currency = resolve_currencies(frame[config["currency_column"]], config.get("aliases"))
+    position = currency.map({code: i for i, code in enumerate(FX_CURRENCIES)})
+
+    timestamp_column = config.get("timestamp_column")
+    if timestamp_column in frame:
+        ts = pd.to_datetime(frame[timestamp_column], format="ISO8601", errors="coerce")
+        ts = ts.fillna(frame["file_ts"])
+    else:
+        ts = pd.to_datetime(frame["file_ts"])
+    if config.get("date_column"):
+        # Unparseable dates stay null: the fact job quarantines them (NULL_date)
+        dates = pd.to_datetime(frame[config["date_column"]], format=config["date_format"], errors="coerce")
+        dates = dates.dt.strftime("%Y-%m-%d")
+    else:
+        dates = ts.dt.strftime("%Y-%m-%d")
+    ingestion = ts.dt.strftime("%Y-%m-%dT%H:%M:%S.%f")
+    dts = frame["file_ts"].dt.strftime("%Y-%m-%d")
+
+    # One block per side: same rows, product id and rate column of that side
+    sides = []
+    for side, column in config["sides"].items():
+        sides.append(pd.DataFrame({
+            "date": dates,
+            "entity__id": config["entity_id"],
+            "product__id": (FX_PRODUCT_BASE + 10 * position + FX_SIDES.index(side)).astype("Int64"),
+            "rate": parse_rates(frame[column]),
+            "ingestion_ts": ingestion,
+            "source_file": frame["source_file"],
+            "source": source,
+            "dt": dts,
+        }))
+    return pd.concat(sides, ignore_index=True)
+
+
+def normalize_batch(files):
+    """
+    Normalize a batch of raw files from any of the sources in one pass.
+
+    Args:
+        files: [(key, source_file, DataFrame)] with the raw key (it selects
+            the source and carries the scrape time), the URI recorded in
+            silver and the CSV as read
+
+    Returns:
+        pandas.DataFrame: SILVER_COLUMNS plus source and dt, sorted by
+        source, dt and ingestion_ts
+
+    Raises:
+        ValueError: If a key matches no source or has no timestamp.
+    """
+    by_source = {}
+    for key, source_file, frame in files:
+        source, file_ts = source_of(key), key_timestamp(key)
+        if source is None or file_ts is None:
+            raise ValueError(f"{key} does not match any FX source layout (<key_prefix><YYYYMMDD>_<HHMMSS>.csv)")
+        by_source.setdefault(source, []).append((source_file, file_ts, frame))
+
+    parts = []
+    for source, entries in by_source.items():
+        # source_file and file_ts are repeated per file after the concat: one
+        # assign per file costs more than normalizing the whole batch
+        lengths = [len(frame) for _, _, frame in entries]
+        raw = pd.concat([frame for _, _, frame in entries], ignore_index=True)
+        raw["source_file"] = np.repeat([source_file for source_file, _, _ in entries], lengths)
+        raw["file_ts"] = pd.to_datetime(np.repeat([file_ts for _, file_ts, _ in entries], lengths))
+        parts.append(normalize(raw, source))
+    if not parts:
+        return pd.DataFrame(columns=SILVER_COLUMNS + ["source", "dt"])
+    silver = pd.concat(parts, ignore_index=True)
+    return silver.sort_values(["source", "dt", "ingestion_ts"], kind="stable").reset_index(drop=True)
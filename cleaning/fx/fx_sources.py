@@ -0,0 +1,129 @@
+"""
+Mapping configs for the FX sources: the buy/sell scrapers (Banamex, BBVA,
+Banregio, Wise) and the Banxico FIX snapshots of api/banxico-divisas.
+
+Each source declares where its raw CSVs live and how their columns map to the
+silver schema; fx_normalizer.py applies them. Adding a source that publishes
+rates per currency is a new entry here, not a new cleaner:
+
+    entity_id         entity__id written to silver
+    key_prefix        raw CSV keys are <key_prefix><YYYYMMDD>_<HHMMSS>.csv
+    currency_column   column with the currency name as the source prints it
+    quote_column      column with the quote currency, if the source has one;
+                      rows not quoted in quote_currency are dropped
+    sides             {side: column}: compra and venta each come from a column
+                      (Wise publishes one mid-market rate for both; Banxico
+                      publishes only the fix)
+    timestamp_column  scrape time (ISO); falls back to the time in the key
+    date_column       column with the date the rate applies to, if it is not
+                      the scrape date (Banxico's fecha is the previous day)
+    date_format       strptime format of date_column
+    aliases           extra source-specific names -> ISO code, on top of
+                      CURRENCY_ALIASES
+
+Names are matched after normalize_name (lowercase, no accents, only letters
+and single spaces). A name that matches no alias and is not an ISO code in
+FX_CURRENCIES gets a null product__id, so the fact job quarantines the row
+(NULL_product_id) instead of guessing.
+
+FX product ids are the same as fact-build/fact_rules.py (FX_CURRENCIES,
+FX_SIDES, FX_PRODUCT_BASE): currencies are only ever appended, since the
+position is part of the id.
+"""
+import re
+import unicodedata
+
+FX_CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CAD", "CHF", "AUD", "CNY"]
+FX_SIDES = ["fix", "compra", "venta"]
+FX_PRODUCT_BASE = 100
+
+
+def fx_product_id(currency, side):
+    return FX_PRODUCT_BASE + 10 * FX_CURRENCIES.index(currency) + FX_SIDES.index(side)
+
+
+def normalize_name(name):
+    """ "Dólar Americano " -> "dolar americano"."""
+    text = unicodedata.normalize("NFKD", str(name))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return re.sub(r"[^a-z]+", " ", text).strip()
+
+
+# Names shared by the Mexican banks, already normalized
+CURRENCY_ALIASES = {
+    "dolar": "USD",
+    "dolares": "USD",
+    "dolar americano": "USD",
+    "dolar estadounidense": "USD",
+    "dolar eua": "USD",
+    "dolar usa": "USD",
+    "euro": "EUR",
+    "euros": "EUR",
+    "libra": "GBP",
+    "libra esterlina": "GBP",
+    "yen": "JPY",
+    "yen japones": "JPY",
+    "dolar canadiense": "CAD",
+    "franco suizo": "CHF",
+    "dolar australiano": "AUD",
+    "yuan": "CNY",
+    "yuan chino": "CNY",
+    "renminbi": "CNY",
+}
+
+SOURCES = {
+    # banamex/banamex_divisas_<ts>.csv: divisa (USD, EURO, LIBRA, YEN), compra, venta, fetched_at, source_url
+    "banamex": {
+        "entity_id": 5,
+        "key_prefix": "banamex/banamex_divisas_",
+        "currency_column": "divisa",
+        "quote_column": None,
+        "sides": {"compra": "compra", "venta": "venta"},
+        "timestamp_column": "fetched_at",
+        "aliases": {},
+    },
+    # bbva/bbva_divisas_<ts>.csv: divisa (display name), compra, venta, fetched_at, source_url
+    "bbva": {
+        "entity_id": 6,
+        "key_prefix": "bbva/bbva_divisas_",
+        "currency_column": "divisa",
+        "quote_column": None,
+        "sides": {"compra": "compra", "venta": "venta"},
+        "timestamp_column": "fetched_at",
+        "aliases": {},
+    },
+    # banregio/banregio_divisas_<ts>.csv: divisa (table header), compra, venta, fetched_at, source_url
+    "banregio": {
+        "entity_id": 7,
+        "key_prefix": "banregio/banregio_divisas_",
+        "currency_column": "divisa",
+        "quote_column": None,
+        "sides": {"compra": "compra", "venta": "venta"},
+        "timestamp_column": "fetched_at",
+        "aliases": {},
+    },
+    # wise/wise_rates_<ts>.csv: base_currency, quote_currency, exchange_rate, source_url, fetched_at
+    "wise": {
+        "entity_id": 8,
+        "key_prefix": "wise/wise_rates_",
+        "currency_column": "base_currency",
+        "quote_column": "quote_currency",
+        "quote_currency": "MXN",
+        "sides": {"compra": "exchange_rate", "venta": "exchange_rate"},
+        "timestamp_column": "fetched_at",
+        "aliases": {},
+    },
+    # banxico/divisas/banxico_divisas_<ts>.csv: divisa (USD, EUR, GBP, JPY), fecha (dd/mm/YYYY), valor,
+    # fetched_at, source_url. The FIX the marts compare every bank against (BANXICO_ENTITY_ID)
+    "banxico-divisas": {
+        "entity_id": 1,
+        "key_prefix": "banxico/divisas/banxico_divisas_",
+        "currency_column": "divisa",
+        "quote_column": None,
+        "sides": {"fix": "valor"},
+        "timestamp_column": "fetched_at",
+        "date_column": "fecha",
+        "date_format": "%d/%m/%Y",
+        "aliases": {},
+    },
+}
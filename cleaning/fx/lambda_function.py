@@ -0,0 +1,144 @@
+import boto3
+import os
+import pandas as pd
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from fx_normalizer import key_timestamp, normalize_batch, source_of
+from fx_sources import SOURCES
+from s3_events import objects_from_event
+from silver_manifest import append_to_manifest, silver_part_key, to_silver_table
+
+# Bucket of every layer; the BUCKET_NAME variable points the Lambda at another
+# one (e.g. the local harness, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+# Raw CSVs fetched from S3 at the same time
+READ_THREADS = 16
+
+# S3 client shared across invocations of the same container
+_s3_client = None
+
+
+def get_s3_client():
+    """Create the S3 client on first use and reuse it afterwards."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
+def read_csv_from_s3(bucket_name, object_key):
+    """
+    Read CSV file from S3 directly into a pandas DataFrame.
+
+    Args:
+        bucket_name: S3 bucket name
+        object_key: S3 object key (path to file)
+
+    Returns:
+        pandas.DataFrame: The CSV data as a DataFrame
+    """
+    response = get_s3_client().get_object(Bucket=bucket_name, Key=object_key)
+    return pd.read_csv(BytesIO(response['Body'].read()), encoding='utf-8-sig')
+
+
+def targets_from_event(event):
+    """
+    (source, dt) pairs to rebuild.
+
+    An object-created event for new raw CSVs (S3 notification or the
+    dispatcher's bucket/keys) rebuilds the days of those files; otherwise
+    event["sources"] x event["dates"] (default: every source, today).
+    Each pair is rebuilt from all of its raw files, so the staging file of a
+    day always holds every scrape of that day.
+    """
+    targets = set()
+    for _, key in objects_from_event(event):
+        source, file_ts = source_of(key), key_timestamp(key)
+        if source and file_ts:
+            targets.add((source, file_ts.strftime('%Y-%m-%d')))
+    if targets:
+        return sorted(targets)
+    sources = event.get('sources') or list(SOURCES)
+    unknown = sorted(set(sources) - set(SOURCES))
+    if unknown:
+        raise ValueError(f"Unknown FX sources: {unknown} (configured: {list(SOURCES)})")
+    dates = event.get('dates') or [datetime.now().strftime('%Y-%m-%d')]
+    return sorted((source, dt) for source in sources for dt in dates)
+
+
+def list_raw_keys(bucket_name, source, dt):
+    """Raw CSV keys of one source and day: the key prefix plus YYYYMMDD narrows the listing to that day."""
+    prefix = f"{SOURCES[source]['key_prefix']}{dt.replace('-', '')}"
+    paginator = get_s3_client().get_paginator('list_objects_v2')
+    keys = []
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        keys += [obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.csv')]
+    return sorted(keys)
+
+
+def write_silver(s3_client, bucket_name, source, dt, frame):
+    """
+    Write (source, dt) as a new silver part and record it in the day's
+    manifest, where it replaces the previous part of that source.
+    """
+    silver_key = silver_part_key(source, dt)
+    buffer = BytesIO()
+    pq.write_table(to_silver_table(frame), buffer)
+    s3_client.put_object(Bucket=bucket_name, Key=silver_key, Body=buffer.getvalue())
+    # The fact job reads only the files listed in the day's manifest
+    append_to_manifest(s3_client, bucket_name, dt, silver_key, source, len(frame))
+    return silver_key
+
+
+def lambda_handler(event, context):
+    event = event or {}
+    # An S3 notification names its bucket in the records
+    objects = objects_from_event(event)
+    bucket_name = objects[0][0] if objects else event.get('bucket', BUCKET_NAME)
+    targets = targets_from_event(event)
+
+    keys = [key for source, dt in targets for key in list_raw_keys(bucket_name, source, dt)]
+    if not keys:
+        # Nothing scraped yet for those days is not a failure: the orchestrator must not retry it
+        return {
+            'statusCode': 200,
+            'status': 'no_data',
+            'message': f'No raw FX files in S3 for {targets}',
+            'bucket_name': bucket_name,
+            'files_read': 0,
+            'written': [],
+            'records_count': 0
+        }
+
+    with ThreadPoolExecutor(READ_THREADS) as pool:
+        frames = list(pool.map(lambda key: read_csv_from_s3(bucket_name, key), keys))
+    print(f"Read {len(keys)} raw files for {len(targets)} (source, dt) pairs")
+
+    # One columnar pass over every file of every source
+    silver = normalize_batch([(key, f"s3://{bucket_name}/{key}", frame) for key, frame in zip(keys, frames)])
+
+    s3_client = get_s3_client()
+    written = []
+    for (source, dt), frame in silver.groupby(['source', 'dt'], sort=True):
+        silver_key = write_silver(s3_client, bucket_name, source, dt, frame)
+        print(f"Saved {len(frame)} rows to {silver_key} and registered it in the silver manifest")
+        written.append({'key': silver_key, 'rows': len(frame)})
+
+    return {
+        'statusCode': 200,
+        'message': f'FX normalizados correctamente: {len(silver)} registros de {len(keys)} archivos',
+        'bucket_name': bucket_name,
+        'files_read': len(keys),
+        'written': written,
+        'records_count': len(silver)
+    }
+
+
+if __name__ == "__main__":
+    event = {}
+    context = {}
+    result = lambda_handler(event, context)
+    print(result)
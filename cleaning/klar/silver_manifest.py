@@ -0,0 +1,215 @@
+"""
+Silver output schema, business hash, part keys and per-day manifest shared by
+the cleaning Lambdas.
+
+Silver is a Hive-partitioned dataset. Every write uploads a new part with a
+unique name, never overwriting an existing object:
+
+    silver/entity=<entity>/dt=<YYYY-MM-DD>/part-<YYYYMMDDTHHMMSS>-<id>.parquet
+
+Every cleaner writes its part with SILVER_SCHEMA, including business_hash
+computed exactly as the fact job does (so the job reuses it instead of
+hashing every row again), and then records it in
+silver/_manifests/<YYYY-MM-DD>.json, one manifest per dt:
+
+    {"dt": "2025-11-08",
+     "files": [{"path": "s3://scrapping-divisas/silver/entity=klar/dt=2025-11-08/part-20251108T021016-1a2b3c4d.parquet",
+                "entity": "klar", "rows": 12, "bytes": 3456, "written_at": "2025-11-08T02:10:16",
+                "source": {"path": "s3://scrapping-divisas/klar/2025-11-08/data.csv", "etag": "\"9b2c...\""}}],
+     "superseded": [{"path": "s3://scrapping-divisas/silver/entity=klar/dt=2025-11-08/part-...parquet",
+                     "at": "2025-11-08T02:10:16"}]}
+
+The fact-build Glue job reads exactly the paths listed in "files" with a
+declared schema, so it never lists S3 or infers a schema from footers, and
+files that are not in a manifest are ignored.
+
+A new entry replaces the one with the same path, and the one of the same
+entity built from the same bronze object (for the FX cleaner, which rebuilds
+a whole (source, day) without a single source, the previous one of that
+source). Entries from other bronze objects are kept: parts of the same day
+are appended and the fact job keeps the latest row per business key. A
+replaced part moves to "superseded" and stays in S3 until
+fact-build/silver_dataset.py (compaction) deletes it, so a job that read
+the manifest just before can still read it.
+
+Several cleaners can update the same day concurrently. The manifest is
+updated with S3 conditional writes (If-Match on the ETag that was read, or
+If-None-Match for the first writer) and retried on conflict, so no entry is
+lost.
+
+"source" is the bronze object (and its ETag) the part was built from, when
+the cleaner builds it from a single object; source_processed() lets the
+cleaner skip an object it has already turned into silver. A compacted part
+lists the sources of the parts it merged in "sources".
+
+This file is identical in every cleaning/<entity> directory (each Lambda is
+built from its own directory only); if you change it, copy it to all of them.
+"""
+import hashlib
+import json
+import math
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal
+
+import pandas as pd
+import pyarrow as pa
+from botocore.exceptions import ClientError
+
+SILVER_PREFIX = "silver"
+MANIFEST_PREFIX = f"{SILVER_PREFIX}/_manifests"
+
+# Columns and types of every silver part
+SILVER_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("entity__id", pa.int64()),
+    ("product__id", pa.int64()),
+    ("rate", pa.float64()),
+    ("ingestion_ts", pa.string()),
+    ("source_file", pa.string()),
+    ("business_hash", pa.string()),
+])
+
+CONFLICT_CODES = {"PreconditionFailed", "ConditionalRequestConflict"}
+
+
+def java_double_str(value):
+    """Spark's text for a double (Java Double.toString): 20.5 -> "20.5", 17.0 -> "17.0", 0.0001 -> "1.0E-4"."""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    if value == 0:
+        return "-0.0" if math.copysign(1.0, value) < 0 else "0.0"
+    if 1e-3 <= abs(value) < 1e7:
+        return repr(value)
+    sign = "-" if value < 0 else ""
+    _, digits, exponent = Decimal(repr(abs(value))).as_tuple()
+    sci_exponent = len(digits) + exponent - 1
+    significant = "".join(map(str, digits)).rstrip("0") or "0"
+    return f"{sign}{significant[0]}.{significant[1:] or '0'}E{sci_exponent}"
+
+
+def business_hashes(df):
+    """
+    sha2(date||entity_id||product_id||rate, 256) per row, with the same text
+    for each value that the fact job gets after casting. The key strings
+    are built column-wise; rows with a null date, id or rate get null (the
+    fact job rejects them anyway).
+    """
+    dates = pd.to_datetime(df["date"], format="%Y-%m-%d", errors="coerce")
+    entity_ids = pd.to_numeric(df["entity__id"], errors="coerce").astype("Int64")
+    product_ids = pd.to_numeric(df["product__id"], errors="coerce").astype("Int64")
+    rates = pd.to_numeric(df["rate"], errors="coerce").astype("float64")
+    complete = (dates.notna() & entity_ids.notna() & product_ids.notna() & rates.notna()).to_numpy(dtype=bool)
+
+    keys = (
+        dates[complete].dt.strftime("%Y-%m-%d")
+        + "||" + entity_ids[complete].astype(str)
+        + "||" + product_ids[complete].astype(str)
+        + "||" + rates[complete].map(java_double_str)
+    )
+    hashes = pd.Series(None, index=df.index, dtype=object)
+    hashes[complete] = [hashlib.sha256(key.encode("utf-8")).hexdigest() for key in keys]
+    return hashes
+
+
+def to_silver_table(df):
+    """pandas DataFrame -> pyarrow Table with SILVER_SCHEMA and business_hash (fails on missing columns or bad types)."""
+    if df.empty:
+        return SILVER_SCHEMA.empty_table()
+    df = df.assign(business_hash=business_hashes(df))
+    return pa.Table.from_pandas(df[SILVER_SCHEMA.names], schema=SILVER_SCHEMA, preserve_index=False)
+
+
+def silver_part_key(entity, dt):
+    """New unique key for a silver part of (entity, dt): appending never overwrites an object."""
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    return f"{SILVER_PREFIX}/entity={entity}/dt={dt}/part-{stamp}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def manifest_key(dt):
+    return f"{MANIFEST_PREFIX}/{dt}.json"
+
+
+def _read_manifest(s3_client, bucket_name, key, dt):
+    """Current manifest and its ETag; (empty manifest, None) if it does not exist yet."""
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+            return {"dt": dt, "files": []}, None
+        raise
+    return json.loads(response["Body"].read()), response["ETag"]
+
+
+def source_processed(s3_client, bucket_name, dt, entity, source_key, source_etag):
+    """True if the manifest of dt has a part of entity built from this version (ETag) of source_key."""
+    manifest, _ = _read_manifest(s3_client, bucket_name, manifest_key(dt), dt)
+    source = {"path": f"s3://{bucket_name}/{source_key}", "etag": source_etag}
+    return any(f["entity"] == entity and (f.get("source") == source or source in f.get("sources", []))
+               for f in manifest["files"])
+
+
+def _replaces(old, new):
+    """True if the manifest entry `new` takes the place of `old`."""
+    if old["path"] == new["path"]:
+        return True
+    if old["entity"] != new["entity"] or "sources" in old:
+        return False
+    return (old.get("source") or {}).get("path") == (new.get("source") or {}).get("path")
+
+
+def append_to_manifest(s3_client, bucket_name, dt, silver_key, entity, rows, max_attempts=8,
+                       source_key=None, source_etag=None):
+    """
+    Record silver_key in the manifest of dt, replacing the entry of the same
+    entity and bronze object (see the module docstring).
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket_name: Bucket of both the silver file and the manifest
+        dt: Silver folder date (YYYY-MM-DD)
+        silver_key: Key of the silver part that was just uploaded (silver_part_key)
+        entity: Entity folder name (klar, nu, ...)
+        rows: Number of rows in the file
+        source_key: Bronze object the file was built from (optional)
+        source_etag: ETag of that object when it was read
+
+    Returns:
+        dict: The manifest as written
+    """
+    key = manifest_key(dt)
+    path = f"s3://{bucket_name}/{silver_key}"
+    size = s3_client.head_object(Bucket=bucket_name, Key=silver_key)["ContentLength"]
+    entry = {"path": path, "entity": entity, "rows": rows, "bytes": size,
+             "written_at": datetime.now().isoformat()}
+    if source_key:
+        entry["source"] = {"path": f"s3://{bucket_name}/{source_key}", "etag": source_etag}
+
+    for attempt in range(max_attempts):
+        manifest, etag = _read_manifest(s3_client, bucket_name, key, dt)
+        replaced = [f for f in manifest["files"] if _replaces(f, entry)]
+        manifest["files"] = [f for f in manifest["files"] if not _replaces(f, entry)] + [entry]
+        if any(f["path"] != path for f in replaced):
+            manifest["superseded"] = manifest.get("superseded", []) + [
+                {"path": f["path"], "at": entry["written_at"]} for f in replaced if f["path"] != path
+            ]
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=key,
+                Body=json.dumps(manifest, indent=2).encode("utf-8"),
+                ContentType="application/json",
+                **condition,
+            )
+            return manifest
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in CONFLICT_CODES:
+                raise
+            # Another cleaner updated the manifest in between: read it again
+            time.sleep(0.2 * (attempt + 1))
+    raise RuntimeError(f"Could not update {key} after {max_attempts} attempts")
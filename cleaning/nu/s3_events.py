@@ -0,0 +1,64 @@
+"""
+Object-created events for the cleaning Lambdas.
+
+A cleaner runs in one of two ways:
+
+- event-driven: cleaning/dispatcher forwards new bronze objects as
+  {"bucket": ..., "keys": [...]}, or an S3 / EventBridge object-created
+  notification (directly or through SQS) invokes the cleaner; the cleaner
+  processes exactly those objects
+- scheduled fallback: an event without keys makes the cleaner poll for the
+  most recent object under its prefix, as before
+
+Either way a cleaner skips an object whose current ETag is already recorded
+as the source of its silver file (see silver_manifest.source_processed), so
+duplicate notifications and polls with nothing new do not rewrite silver.
+
+This file is identical in every cleaning/<entity> directory and in
+cleaning/dispatcher (each Lambda is built from its own directory only); if
+you change it, copy it to all of them.
+"""
+import json
+from urllib.parse import unquote_plus
+
+
+def objects_from_event(event):
+    """
+    (bucket, key) pairs named by an invocation event, in order.
+
+    Understands S3 notifications ({"Records": [{"s3": ...}]}, keys are
+    URL-encoded), the same notifications batched by SQS (one per record
+    "body"), EventBridge "Object Created" events ({"detail": {"bucket":
+    {"name"}, "object": {"key"}}}) and the dispatcher's {"bucket", "key"} /
+    {"bucket", "keys"}. Returns [] for a scheduled invocation.
+    """
+    event = event or {}
+    objects = []
+    for record in event.get('Records', []):
+        if 's3' in record:
+            objects.append((record['s3']['bucket']['name'], unquote_plus(record['s3']['object']['key'])))
+        elif record.get('eventSource') == 'aws:sqs':
+            # S3 -> SQS -> Lambda: each message body is a notification (or an s3:TestEvent without Records)
+            objects += objects_from_event(json.loads(record['body']))
+    detail = event.get('detail') or {}
+    if 'object' in detail:
+        objects.append((detail['bucket']['name'], detail['object']['key']))
+    keys = event.get('keys') or ([event['key']] if event.get('key') else [])
+    if keys:
+        if not event.get('bucket'):
+            raise ValueError("An event with 'key' or 'keys' also needs 'bucket'")
+        objects += [(event['bucket'], key) for key in keys]
+    return objects
+
+
+def combine_results(results):
+    """One Lambda result for several processed objects (a single one is returned as is)."""
+    if len(results) == 1:
+        return results[0]
+    failed = [r for r in results if r['statusCode'] != 200]
+    return {
+        'statusCode': failed[0]['statusCode'] if failed else 200,
+        'message': f'{len(results) - len(failed)} of {len(results)} objects processed',
+        'results': results,
+        'records_count': sum(r.get('records_count', 0) for r in results),
+    }
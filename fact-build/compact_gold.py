@@ -0,0 +1,203 @@
+# Glue 4.0 / Spark 3.x
+#
+# Compacta particiones dt de la tabla Gold: reescribe cada una en archivos de
+# ~--target_file_mb ordenados por (entity_id, product_id, date), con row groups
+# de --row_group_mb para que las estadísticas min/max sirvan al filtrar.
+#
+# Los archivos de cada dt salen del snapshot vigente (gold_snapshots.py), sin
+# listar S3. La partición compactada se escribe en
+# <gold_path>/fact_rates/run=compact-<run_id>/dt=<dt>/, se valida el número de
+# filas, se confirma como un snapshot "compact" y solo entonces el catálogo
+# cambia la ubicación de la partición (SET LOCATION). Si rates.py reescribió
+# ese dt mientras tanto el commit falla (CommitConflict), la compactación se
+# descarta y el dt queda como lo dejó rates.py. Si lo reescribe entre el commit
+# y el SET LOCATION, la partición vuelve a la ubicación del snapshot vigente.
+#
+# Los archivos anteriores siguen en los snapshots viejos (time travel) y se
+# borran al expirar, después de --snapshot_retention_days.
+#
+# Requiere fact_rules.py, gold_catalog.py y gold_snapshots.py en --extra-py-files y
+# --additional-python-modules boto3>=1.36 (commit con If-None-Match, ver rates.py).
+import sys
+import json
+import time
+from datetime import date, datetime, timedelta
+
+import gold_catalog
+import gold_snapshots
+from fact_rules import CLUSTER_COLUMNS, ROW_GROUP_BYTES, TARGET_FILE_BYTES, plan_file_count
+
+MB = 1024 * 1024
+
+
+def hadoop_fs(spark, path):
+    jvm = spark.sparkContext._jvm
+    hpath = jvm.org.apache.hadoop.fs.Path(path)
+    return hpath, hpath.getFileSystem(spark.sparkContext._jsc.hadoopConfiguration())
+
+
+def delete_location(spark, location):
+    hpath, fs = hadoop_fs(spark, location)
+    if fs.exists(hpath):
+        fs.delete(hpath, True)
+
+
+def scan_seconds(spark, paths, entity_id):
+    """Tiempo de una consulta típica (una entidad) sobre los archivos."""
+    from pyspark.sql import functions as F
+
+    started = time.perf_counter()
+    spark.read.parquet(*paths).where(F.col("entity_id") == entity_id).agg(F.sum("rate")).collect()
+    return time.perf_counter() - started
+
+
+def candidate_dts(location, dts=None, lookback_days=30):
+    """dt a revisar: los indicados, o los del snapshot vigente de los últimos `lookback_days` (0 = todos)."""
+    if dts:
+        return sorted(dts)
+    snapshot = gold_snapshots.current_snapshot(location)
+    current = sorted(snapshot["partitions"]) if snapshot else []
+    if lookback_days <= 0:
+        return current
+    since = (date.today() - timedelta(days=lookback_days)).isoformat()
+    return [dt for dt in current if dt >= since]
+
+
+def compact_partition(spark, table, location, dt, run_id, target_bytes=TARGET_FILE_BYTES,
+                      row_group_bytes=ROW_GROUP_BYTES, min_files=2):
+    """
+    Compacta una partición, la confirma como snapshot y cambia su ubicación en
+    el catálogo.
+
+    Returns:
+        dict: Reporte con archivos/bytes/tiempo de escaneo antes y después.
+    """
+    from pyspark.sql import functions as F
+
+    try:
+        snapshot, planned = gold_snapshots.plan_files(location, [("dt", "=", dt)])
+    except LookupError:
+        # Tabla sin snapshot todavía (p. ej. --dts antes de la primera corrida de rates.py)
+        return {"dt": dt, "snapshot_id": None, "files_before": 0, "bytes_before": 0, "status": "skipped"}
+    paths = [entry["path"] for _, entry in planned]
+    rows = sum(entry["rows"] for _, entry in planned)
+    report = {"dt": dt, "snapshot_id": snapshot["snapshot_id"], "files_before": len(paths),
+              "bytes_before": sum(entry["bytes"] for _, entry in planned)}
+    if len(paths) < min_files:
+        return {**report, "status": "skipped"}
+
+    df = spark.read.parquet(*paths)
+    entity_id = df.agg(F.min("entity_id")).first()[0]
+    report["scan_s_before"] = round(scan_seconds(spark, paths, entity_id), 3)
+
+    # Rango por las columnas de orden: cada archivo cubre un tramo disjunto de
+    # (entity_id, product_id, date) y sus estadísticas no se traslapan
+    compact_run = f"compact-{run_id}"
+    new_location = gold_snapshots.data_location(location, compact_run, dt)
+    n_files = plan_file_count(report["bytes_before"], target_bytes)
+    (df
+     .repartitionByRange(n_files, *CLUSTER_COLUMNS)
+     .sortWithinPartitions(*CLUSTER_COLUMNS)
+     .write
+     .mode("errorifexists")
+     .option("parquet.block.size", str(row_group_bytes))
+     .option("compression", "snappy")
+     .parquet(new_location)
+    )
+
+    written_rows = spark.read.parquet(new_location).count()
+    if written_rows != rows:
+        delete_location(spark, new_location)
+        raise RuntimeError(f"dt={dt}: la compactación escribió {written_rows} filas de {rows}; no se cambió nada")
+
+    # Commit: falla si rates.py cambió el dt desde el snapshot que se leyó
+    new_files = gold_snapshots.run_files(gold_snapshots.run_location(location, compact_run))[dt]
+    try:
+        committed = gold_snapshots.commit(location, {dt: new_files}, "compact", compact_run,
+                                          read_snapshot_id=snapshot["snapshot_id"])
+    except gold_snapshots.CommitConflict as e:
+        delete_location(spark, new_location)
+        return {**report, "status": "conflict", "error": str(e)}
+
+    # Swap en el catálogo: un solo cambio de metadatos
+    gold_catalog.set_partition_locations(spark.sql, table, {dt: new_location})
+    # rates.py pudo confirmar este dt y apuntar el catálogo entre el commit y el
+    # swap: la partición sigue al snapshot vigente, no a esta compactación
+    status, expected = "compacted", new_location
+    current = gold_snapshots.current_snapshot(location)
+    if current["snapshot_id"] != committed["snapshot_id"]:
+        expected = gold_snapshots.snapshot_partition_location(location, current, dt)
+        if expected is None:
+            gold_catalog.drop_partitions(spark.sql, table, [dt])
+            status = "superseded"
+        elif expected.rstrip("/") != new_location.rstrip("/"):
+            gold_catalog.set_partition_locations(spark.sql, table, {dt: expected})
+            status = "superseded"
+    if (gold_catalog.catalog_location(spark.sql, table, dt) or "").rstrip("/") != (expected or "").rstrip("/"):
+        raise RuntimeError(f"dt={dt}: el catálogo no quedó apuntando a {expected or 'ninguna ubicación'}")
+
+    partition = committed["partitions"][dt]
+    report.update({
+        "status": status,
+        "rows": rows,
+        "snapshot_id": committed["snapshot_id"],
+        "location": new_location,
+        "files_after": partition["files"],
+        "bytes_after": partition["bytes"],
+        "scan_s_after": round(scan_seconds(spark, new_files, entity_id), 3),
+    })
+    return report
+
+
+def main():
+    from awsglue.utils import getResolvedOptions
+    from pyspark.context import SparkContext
+    from awsglue.context import GlueContext
+
+    args = getResolvedOptions(sys.argv, ["JOB_NAME", "gold_path", "catalog_db", "gold_table"])
+    defaults = {"dts": "", "lookback_days": "30", "min_files": "2",
+                "target_file_mb": str(TARGET_FILE_BYTES // MB), "row_group_mb": str(ROW_GROUP_BYTES // MB),
+                "snapshot_retention_days": str(gold_snapshots.RETENTION_DAYS)}
+    present = [name for name in defaults if f"--{name}" in sys.argv]
+    options = {**defaults, **(getResolvedOptions(sys.argv, present) if present else {})}
+
+    sc = SparkContext.getOrCreate()
+    spark = GlueContext(sc).spark_session
+
+    table = f"{args['catalog_db']}.{args['gold_table']}"
+    location = f"{args['gold_path'].rstrip('/')}/fact_rates"
+    gold_snapshots.require_conditional_put(location)
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    dts = candidate_dts(location, [d for d in options["dts"].split(",") if d], int(options["lookback_days"]))
+    print(f"Compactando {table}: {len(dts)} dt candidatos (run={run_id})")
+
+    reports = []
+    for dt in dts:
+        report = compact_partition(
+            spark, table, location, dt, run_id,
+            target_bytes=int(options["target_file_mb"]) * MB,
+            row_group_bytes=int(options["row_group_mb"]) * MB,
+            min_files=int(options["min_files"]),
+        )
+        print(json.dumps(report))
+        reports.append(report)
+
+    # Lo reemplazado sigue en los snapshots de la ventana de time travel
+    expired = gold_snapshots.expire_snapshots(location, float(options["snapshot_retention_days"]))
+
+    compacted = [r for r in reports if r["status"] == "compacted"]
+    print(json.dumps({
+        "compacted": len(compacted),
+        "skipped": sum(r["status"] == "skipped" for r in reports),
+        "conflicts": sum(r["status"] == "conflict" for r in reports),
+        "superseded": sum(r["status"] == "superseded" for r in reports),
+        "expired": expired,
+        "files_before": sum(r["files_before"] for r in compacted),
+        "files_after": sum(r["files_after"] for r in compacted),
+        "scan_s_before": round(sum(r["scan_s_before"] for r in compacted), 3),
+        "scan_s_after": round(sum(r["scan_s_after"] for r in compacted), 3),
+    }))
+
+
+if __name__ == "__main__":
+    main()
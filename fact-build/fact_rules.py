@@ -0,0 +1,107 @@
+"""
+Reglas del fact de tasas compartidas por el job de Glue (spark_engine.py) y el
+motor local (local_engine.py). No depende de Spark ni de pandas.
+"""
+import re
+
+# Silver es un dataset particionado al estilo Hive (ver silver_dataset.py):
+# silver/entity=<entidad>/dt=<YYYY-MM-DD>/part-<id>.parquet, un part nuevo por
+# escritura. El layout anterior, silver/<entidad>/<YYYY-MM-DD>/fact_rates_staging.parquet
+# (un archivo por entidad y día que se sobrescribía), se sigue leyendo
+SILVER_FILE = "fact_rates_staging.parquet"
+SILVER_PART_GLOB = "part-*.parquet"
+_SILVER_NAME = r"(?:" + re.escape(SILVER_FILE) + r"|part-[^/]+\.parquet)$"
+DT_PATTERN = r"/(?:dt=)?(\d{4}-\d{2}-\d{2})/" + _SILVER_NAME
+PARTITION_PATTERN = r"/(?:entity=)?([^/=]+)/(?:dt=)?(\d{4}-\d{2}-\d{2})/" + _SILVER_NAME
+
+# Esquema declarado de Silver (el que escriben los cleaners, ver
+# cleaning/*/silver_manifest.py): se lee con él en lugar de inferirlo
+SILVER_SCHEMA_DDL = (
+    "date STRING, entity__id BIGINT, product__id BIGINT, rate DOUBLE, ingestion_ts STRING, source_file STRING, "
+    "business_hash STRING"
+)
+
+# Manifest por día: silver/_manifests/<YYYY-MM-DD>.json con los archivos escritos
+MANIFEST_DIR = "_manifests"
+
+# Validación: rate en el intervalo abierto (RATE_MIN, RATE_MAX)
+RATE_MIN = 0.0
+RATE_MAX = 200.0
+
+# Clave de negocio: se conserva la fila con ingestion_ts más reciente
+BUSINESS_KEY = ["date", "entity_id", "product_id"]
+
+GOLD_COLUMNS = ["date", "entity_id", "product_id", "rate", "ingestion_ts", "source_file", "business_hash", "dt"]
+REJECT_COLUMNS = ["date", "entity_id", "product_id", "rate", "ingestion_ts", "source_file", "dt", "reject_reason"]
+
+# Historia de cambios (SCD2): un tramo [valid_from, valid_to] por racha con el
+# mismo rate_hash para (entity_id, product_id); los días sin observación no la
+# cortan y valid_to llega al día anterior al tramo siguiente
+HISTORY_KEY = ["entity_id", "product_id"]
+HISTORY_COLUMNS = ["entity_id", "product_id", "rate", "rate_hash", "valid_from", "valid_to", "ingestion_ts", "source_file"]
+HISTORY_DIR = "fact_rates_history"
+HISTORY_SCHEMA_DDL = (
+    "entity_id INT, product_id INT, rate DOUBLE, rate_hash STRING, valid_from DATE, valid_to DATE, "
+    "ingestion_ts TIMESTAMP, source_file STRING"
+)
+
+# Tipos de cambio (pesos por unidad de divisa): Banxico (entity_id 1) publica el
+# FIX y los bancos su compra y venta. product_id = FX_PRODUCT_BASE + 10 * i + lado,
+# con i la posición de la divisa en FX_CURRENCIES y lado la de FX_SIDES (solo se
+# agregan divisas al final: la posición es parte del id). Los cleaners tienen
+# la misma tabla en cleaning/fx/fx_sources.py
+BANXICO_ENTITY_ID = 1
+FX_CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CAD", "CHF", "AUD", "CNY"]
+FX_SIDES = ["fix", "compra", "venta"]
+FX_PRODUCT_BASE = 100
+
+
+def fx_product_id(currency, side):
+    return FX_PRODUCT_BASE + 10 * FX_CURRENCIES.index(currency) + FX_SIDES.index(side)
+
+
+# {product_id: (divisa, lado)}
+FX_PRODUCTS = {fx_product_id(c, s): (c, s) for c in FX_CURRENCIES for s in FX_SIDES}
+
+# Motivos de rechazo, en orden de prioridad (una fila lleva solo el primero que aplique)
+REJECT_REASONS = ["NULL_date", "NULL_entity_id", "NULL_product_id", "NULL_rate", "rate_out_of_range"]
+
+
+def silver_dt(path):
+    """dt (YYYY-MM-DD) de la carpeta Silver de un archivo; None si no sigue el layout."""
+    match = re.search(DT_PATTERN, path)
+    return match.group(1) if match else None
+
+
+def silver_partition(path):
+    """(entidad, dt) de un archivo Silver en cualquiera de los dos layouts; None si no sigue ninguno."""
+    match = re.search(PARTITION_PATTERN, path)
+    return (match.group(1), match.group(2)) if match else None
+
+
+def manifest_path(silver_path, dt):
+    return f"{silver_path.rstrip('/')}/{MANIFEST_DIR}/{dt}.json"
+
+
+def manifest_files(manifest, dt):
+    """
+    Rutas Silver del manifest de `dt`. Falla si una entrada no pertenece a ese
+    dt: el manifest es la lista exacta de entrada del job.
+    """
+    paths = sorted({entry["path"] for entry in manifest.get("files", [])})
+    foreign = [path for path in paths if silver_dt(path) != dt]
+    if foreign:
+        raise ValueError(f"El manifest de dt={dt} lista archivos de otro dt: {foreign}")
+    return paths
+
+
+# Compactación de Gold: archivos de ~TARGET_FILE_BYTES ordenados por CLUSTER_COLUMNS,
+# escritos en una carpeta nueva por corrida (gold_snapshots.data_location)
+CLUSTER_COLUMNS = ["entity_id", "product_id", "date"]
+TARGET_FILE_BYTES = 128 * 1024 * 1024
+ROW_GROUP_BYTES = 32 * 1024 * 1024
+
+
+def plan_file_count(total_bytes, target_bytes=TARGET_FILE_BYTES):
+    """Archivos de salida para `total_bytes` de entrada (al menos 1)."""
+    return max(1, -(-total_bytes // target_bytes))
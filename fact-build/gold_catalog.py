@@ -0,0 +1,131 @@
+"""
+Registro de particiones de la tabla Gold en el catálogo (Glue / Hive metastore).
+
+En lugar de `MSCK REPAIR TABLE`, que recorre toda la ubicación de la tabla para
+encontrar las particiones nuevas, se registran exactamente las que escribió el
+job con `ALTER TABLE ... ADD IF NOT EXISTS PARTITION` (varias por sentencia) y
+después se confirma en el catálogo que están todas.
+
+Gold se versiona con snapshots (gold_snapshots.py): cada corrida, y cada
+compactación, escribe sus dt en una carpeta nueva (run=<run_id>/dt=<dt>) y,
+después del commit, el catálogo solo cambia la ubicación de la partición (SET
+LOCATION). Athena y quien lea por el catálogo ven lo mismo que el último
+snapshot y nunca una partición a medio escribir. La historia de cambios
+(fact_rates_history, sin particiones) se versiona igual a nivel de tabla.
+
+Las funciones reciben `sql`, algo que ejecute una sentencia y regrese un objeto
+con .collect(): `spark.sql` en Glue o playground/local_metastore.py en local.
+Se distribuye junto a rates.py (--extra-py-files).
+"""
+import re
+
+PARTITION_BATCH_SIZE = 100
+DT_FORMAT = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+def partition_location(table_location, dt):
+    return f"{table_location.rstrip('/')}/dt={dt}"
+
+
+def _check_dts(dts):
+    for dt in dts:
+        if not DT_FORMAT.match(dt):
+            raise ValueError(f"dt inválido: {dt!r} (se espera YYYY-MM-DD)")
+
+
+def add_partitions(sql, table, table_location, dts, batch_size=PARTITION_BATCH_SIZE):
+    """
+    Registra las particiones dt indicadas; las que ya existen se dejan igual.
+
+    Returns:
+        int: Número de sentencias ALTER TABLE ejecutadas.
+    """
+    dts = sorted(set(dts))
+    _check_dts(dts)
+    statements = 0
+    for i in range(0, len(dts), batch_size):
+        specs = " ".join(
+            f"PARTITION (dt='{dt}') LOCATION '{partition_location(table_location, dt)}'"
+            for dt in dts[i:i + batch_size]
+        )
+        sql(f"ALTER TABLE {table} ADD IF NOT EXISTS {specs}")
+        statements += 1
+    return statements
+
+
+def drop_partitions(sql, table, dts, batch_size=PARTITION_BATCH_SIZE):
+    """Quita del catálogo las particiones dt indicadas (las que no existen se ignoran)."""
+    dts = sorted(set(dts))
+    _check_dts(dts)
+    for i in range(0, len(dts), batch_size):
+        specs = ", ".join(f"PARTITION (dt='{dt}')" for dt in dts[i:i + batch_size])
+        sql(f"ALTER TABLE {table} DROP IF EXISTS {specs}")
+
+
+def set_partition_locations(sql, table, locations):
+    """
+    Apunta cada partición a su ubicación ({dt: ruta}). Es un cambio de
+    metadatos: quien consulte ve la ubicación anterior completa o la nueva.
+    """
+    _check_dts(locations)
+    for dt, location in sorted(locations.items()):
+        sql(f"ALTER TABLE {table} PARTITION (dt='{dt}') SET LOCATION '{location}'")
+
+
+def catalog_location(sql, table, dt):
+    """Ubicación registrada de una partición (DESCRIBE FORMATTED); None si no existe."""
+    _check_dts([dt])
+    try:
+        rows = sql(f"DESCRIBE FORMATTED {table} PARTITION (dt='{dt}')").collect()
+    except Exception:
+        return None
+    for row in rows:
+        if (row[0] or "").strip() == "Location":
+            return (row[1] or "").strip()
+    return None
+
+
+def table_location(sql, table):
+    """Ubicación registrada de una tabla sin particiones; None si no existe."""
+    try:
+        rows = sql(f"DESCRIBE FORMATTED {table}").collect()
+    except Exception:
+        return None
+    for row in rows:
+        if (row[0] or "").strip() == "Location":
+            return (row[1] or "").strip()
+    return None
+
+
+def set_table_location(sql, table, location):
+    """Apunta la tabla a otra carpeta (cambio de metadatos, como set_partition_locations)."""
+    sql(f"ALTER TABLE {table} SET LOCATION '{location}'")
+
+
+def registered_partitions(sql, table, dts):
+    """dt de la lista que ya están en el catálogo (consulta solo esos, no la tabla entera)."""
+    _check_dts(dts)
+    found = set()
+    for dt in sorted(set(dts)):
+        for row in sql(f"SHOW PARTITIONS {table} PARTITION (dt='{dt}')").collect():
+            # Cada fila es "dt=YYYY-MM-DD"
+            found.add(row[0].split("=", 1)[1])
+    return found
+
+
+def register_partitions(sql, table, table_location, dts, batch_size=PARTITION_BATCH_SIZE, locations=None):
+    """
+    Registra y verifica las particiones escritas por el job. `locations`
+    ({dt: ruta}) indica dónde quedó cada dt; sin él, <table_location>/dt=<dt>.
+
+    Raises:
+        RuntimeError: Si después de registrarlas alguna no aparece en el catálogo.
+    """
+    statements = add_partitions(sql, table, table_location, dts, batch_size)
+    # Una partición ya registrada puede apuntar a la carpeta de otra corrida
+    set_partition_locations(sql, table, locations or {dt: partition_location(table_location, dt) for dt in dts})
+    missing = sorted(set(dts) - registered_partitions(sql, table, dts))
+    if missing:
+        raise RuntimeError(f"Particiones no registradas en {table}: {missing}")
+    print(f"{len(set(dts))} particiones registradas en {table} ({statements} sentencias ADD PARTITION)")
+    return sorted(set(dts))
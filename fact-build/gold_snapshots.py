@@ -0,0 +1,636 @@
+"""
+Snapshots de la tabla Gold: cada escritura se confirma con un snapshot atómico
+y quien lee planea qué archivos abrir desde los manifests, sin listar S3.
+
+Layout bajo la ubicación de la tabla (<gold_path>/fact_rates):
+
+    run=<run_id>/dt=<dt>/part-*.parquet          datos; una carpeta por corrida, nunca se reescriben
+    _snapshots/snap-00000042.json                snapshot 42: manifest vigente de cada dt
+    _snapshots/manifests/<run_id>/dt=<dt>.json   archivos de un dt con filas, bytes y min/max/nulos por columna
+    _snapshots/latest                            pista del último snapshot (puede quedar atrasada)
+
+Confirmar es crear snap-<n+1>.json solo si no existe (link atómico en local,
+If-None-Match en S3). Si otro escritor ganó ese número se relee el último y
+se reintenta encima: un reemplazo de dt (rates.py) gana siempre la última
+escritura, como un overwrite; una compactación, que reescribe lo que leyó de
+un snapshot, falla con CommitConflict si otro cambió esos dt. Mientras el
+snapshot no existe nadie ve los archivos nuevos: una escritura que falla a
+medias no deja nada visible y expire_snapshots borra lo que quedó huérfano.
+
+Lectura: plan_files devuelve los archivos del snapshot pedido (el último, uno
+por id o el vigente en una fecha: time travel) que pueden tener filas según
+el dt y las estadísticas de cada archivo; read_table los lee con pyarrow.
+
+Las carpetas dt=<dt> que haya antes del primer snapshot (Gold escrito sin
+snapshots) se adoptan en el primer commit, listando la tabla esa única vez.
+
+No depende de Spark: rates.py y compact_gold.py lo usan desde el driver y
+local_engine.py desde la Lambda. Se distribuye junto a rates.py (--extra-py-files).
+En S3 el commit necesita If-None-Match en PutObject, que el boto3 del runtime de
+Glue 4.0 no trae: los jobs se despliegan con --additional-python-modules
+boto3>=1.36 y require_conditional_put falla antes de escribir Gold si falta.
+
+Uso:
+    python fact-build/gold_snapshots.py --location output/gold/fact_rates log
+    python fact-build/gold_snapshots.py --location output/gold/fact_rates files --as-of 2025-11-08T12:00 --filter entity_id=3
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+SNAPSHOT_DIR = "_snapshots"
+LATEST_HINT = "latest"
+CONFLICT_CODES = {"PreconditionFailed", "ConditionalRequestConflict"}
+# If-None-Match (commit) e If-Match (manifests de Silver) en PutObject: botocore
+# los conoce desde 1.35 y 1.35.x tardío; boto3 1.36 trae ambos
+CONDITIONAL_PUT_REQUIREMENT = "boto3>=1.36"
+# Esquemas con creación exclusiva para el commit (_create_exclusive)
+COMMIT_SCHEMES = ("file", "s3", "s3a")
+RETENTION_DAYS = 7
+READ_THREADS = 16
+
+
+class CommitConflict(RuntimeError):
+    """Otro escritor confirmó cambios sobre los mismos dt desde que empezó la corrida."""
+
+
+# Rutas
+
+def resolve(location):
+    """(filesystem, ruta sin esquema) para rutas locales o URIs (s3://...)."""
+    if "://" in location:
+        return pafs.FileSystem.from_uri(location.rstrip("/"))
+    return pafs.LocalFileSystem(), os.path.abspath(location).rstrip("/")
+
+
+def file_uri(location, fs_path):
+    """Ruta del filesystem -> la forma en que se guarda en los manifests (con el esquema de la tabla)."""
+    if "://" in location:
+        return f"{location.split('://', 1)[0]}://{fs_path}"
+    return fs_path
+
+
+def _fs_path(uri):
+    return uri.split("://", 1)[1] if "://" in uri else uri
+
+
+def run_location(location, run_id):
+    return f"{location.rstrip('/')}/run={run_id}"
+
+
+def data_location(location, run_id, dt):
+    """Carpeta de los archivos de un dt escritos por una corrida."""
+    return f"{run_location(location, run_id)}/dt={dt}"
+
+
+def _snapshot_path(root, snapshot_id):
+    return f"{root}/{SNAPSHOT_DIR}/snap-{snapshot_id:08d}.json"
+
+
+# JSON en el filesystem de la tabla
+
+def _read_json(fs, path):
+    try:
+        with fs.open_input_stream(path) as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _write_json(fs, path, document):
+    fs.create_dir(path.rsplit("/", 1)[0])
+    with fs.open_output_stream(path) as f:
+        f.write(json.dumps(document, indent=2).encode("utf-8"))
+
+
+def _exists(fs, path):
+    return fs.get_file_info(path).type != pafs.FileType.NotFound
+
+
+def require_conditional_put(location):
+    """
+    Falla si no se puede confirmar un snapshot en `location`: el commit solo
+    sabe crear archivos en exclusiva en disco local y en S3, y en S3 necesita
+    un botocore que acepte IfNoneMatch/IfMatch en PutObject. Se llama al
+    inicio de cada job, antes de escribir Gold: sin esto el commit fallaría
+    después de escribir los datos.
+
+    Raises:
+        ValueError: Si `location` no es local ni S3.
+        RuntimeError: Si el botocore instalado no tiene escrituras condicionales.
+    """
+    scheme = location.split("://", 1)[0] if "://" in location else "file"
+    if scheme not in COMMIT_SCHEMES:
+        raise ValueError(f"{location}: el commit de snapshots necesita disco local o S3 ({scheme}:// no tiene "
+                         f"creación exclusiva)")
+    if scheme == "file":
+        return
+    import botocore
+    import botocore.session
+
+    members = botocore.session.get_session().get_service_model("s3").operation_model("PutObject").input_shape.members
+    missing = [name for name in ("IfNoneMatch", "IfMatch") if name not in members]
+    if missing:
+        raise RuntimeError(
+            f"botocore {botocore.__version__} no acepta {', '.join(missing)} en PutObject; el commit de "
+            f"{location} necesita escrituras condicionales. En Glue agrega "
+            f"--additional-python-modules {CONDITIONAL_PUT_REQUIREMENT}"
+        )
+
+
+def _create_exclusive(fs, path, body):
+    """Crea `path` con `body` solo si no existe. True si lo creó."""
+    if isinstance(fs, pafs.LocalFileSystem):
+        # Se escribe aparte y se enlaza: el link falla si ya existe y nadie ve el archivo a medias
+        staging = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(staging, "wb") as f:
+            f.write(body)
+        try:
+            os.link(staging, path)
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(staging)
+    if isinstance(fs, pafs.S3FileSystem):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        bucket, key = path.split("/", 1)
+        try:
+            boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json",
+                                          IfNoneMatch="*")
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in CONFLICT_CODES:
+                return False
+            raise
+    raise TypeError(f"{type(fs).__name__} no tiene creación exclusiva: el commit necesita disco local o S3")
+
+
+# Estadísticas por archivo
+
+def _stat_value(value):
+    """Valor de estadística o de filtro en su forma JSON (fechas ISO, comparables como texto)."""
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    return value
+
+
+def file_entry(fs, uri):
+    """
+    Entrada de manifest de un Parquet: filas, bytes y por columna min, max y
+    nulos sumando sus row groups (sin min/max si algún row group no los trae).
+    """
+    path = _fs_path(uri)
+    with fs.open_input_file(path) as f:
+        size = f.size()
+        metadata = pq.ParquetFile(f).metadata
+    stats = {}
+    for i in range(metadata.num_columns):
+        name = metadata.schema.column(i).name
+        chunks = [metadata.row_group(rg).column(i).statistics for rg in range(metadata.num_row_groups)]
+        column = {"nulls": sum(s.null_count for s in chunks if s is not None and s.has_null_count)}
+        if chunks and all(s is not None and s.has_min_max for s in chunks):
+            column["min"] = min(_stat_value(s.min) for s in chunks)
+            column["max"] = max(_stat_value(s.max) for s in chunks)
+        stats[name] = column
+    return {"path": uri, "rows": metadata.num_rows, "bytes": size, "stats": stats}
+
+
+def _schema_text(fs, uri):
+    with fs.open_input_file(_fs_path(uri)) as f:
+        schema = pq.ParquetFile(f).schema_arrow
+    return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+
+def _schema(snapshot):
+    encoded = snapshot.get("schema")
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(encoded))) if encoded else None
+
+
+def run_files(run_uri):
+    """
+    {dt: [archivos]} de la carpeta de una corrida (run=<run_id>/dt=<dt>/...),
+    p. ej. la que acaba de escribir Spark. Lista solo esa carpeta.
+    """
+    fs, root = resolve(run_uri)
+    files = {}
+    for info in fs.get_file_info(pafs.FileSelector(root, recursive=True, allow_not_found=True)):
+        if info.type != pafs.FileType.File or not info.path.endswith(".parquet"):
+            continue
+        folder = info.path[len(root) + 1:].split("/", 1)[0]
+        if folder.startswith("dt="):
+            files.setdefault(folder[3:], []).append(file_uri(run_uri, info.path))
+    return {dt: sorted(paths) for dt, paths in files.items()}
+
+
+# Snapshots
+
+def _parse_ts(value):
+    """datetime o ISO -> datetime con zona (sin zona = UTC, como Glue)."""
+    ts = value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _list_snapshot_ids(fs, root):
+    selector = pafs.FileSelector(f"{root}/{SNAPSHOT_DIR}", allow_not_found=True)
+    return sorted(
+        int(info.base_name[len("snap-"):-len(".json")])
+        for info in fs.get_file_info(selector)
+        if info.base_name.startswith("snap-") and info.base_name.endswith(".json")
+    )
+
+
+def current_snapshot(location):
+    """Último snapshot confirmado; None si la tabla todavía no tiene."""
+    fs, root = resolve(location)
+    hint = _read_json(fs, f"{root}/{SNAPSHOT_DIR}/{LATEST_HINT}") or 0
+    snapshot_id = hint
+    while _exists(fs, _snapshot_path(root, snapshot_id + 1)):
+        snapshot_id += 1
+    if snapshot_id and _exists(fs, _snapshot_path(root, snapshot_id)):
+        return _read_json(fs, _snapshot_path(root, snapshot_id))
+    # La pista apunta a un snapshot ya expirado: se lista la carpeta de metadatos
+    ids = _list_snapshot_ids(fs, root)
+    return _read_json(fs, _snapshot_path(root, ids[-1])) if ids else None
+
+
+def load_snapshot(location, snapshot_id=None, as_of=None):
+    """
+    Snapshot por id, el vigente en `as_of` (datetime o ISO; el último
+    confirmado en o antes de ese momento) o el último.
+
+    Raises:
+        LookupError: Si no existe (o ya expiró) el snapshot pedido.
+    """
+    fs, root = resolve(location)
+    if snapshot_id is not None:
+        snapshot = _read_json(fs, _snapshot_path(root, int(snapshot_id)))
+        if snapshot is None:
+            raise LookupError(f"{location}: no existe el snapshot {snapshot_id}")
+        return snapshot
+    snapshot = current_snapshot(location)
+    if as_of is not None:
+        as_of = _parse_ts(as_of)
+        while snapshot is not None and _parse_ts(snapshot["committed_at"]) > as_of:
+            parent = snapshot["parent_id"]
+            snapshot = _read_json(fs, _snapshot_path(root, parent)) if parent else None
+    if snapshot is None:
+        raise LookupError(f"{location}: no hay snapshot" + (f" en o antes de {as_of}" if as_of else ""))
+    return snapshot
+
+
+def snapshots(location):
+    """Snapshots que existen, del más reciente al más viejo."""
+    fs, root = resolve(location)
+    found = []
+    snapshot = current_snapshot(location)
+    while snapshot is not None:
+        found.append(snapshot)
+        parent = snapshot["parent_id"]
+        snapshot = _read_json(fs, _snapshot_path(root, parent)) if parent else None
+    return found
+
+
+def _write_manifest(fs, root, location, dt, uris, run_id):
+    """Escribe el manifest de un dt y devuelve su entrada para el snapshot."""
+    with ThreadPoolExecutor(READ_THREADS) as pool:
+        entries = list(pool.map(lambda uri: file_entry(fs, uri), sorted(uris)))
+    relative = f"{SNAPSHOT_DIR}/manifests/{run_id}/dt={dt}.json"
+    _write_json(fs, f"{root}/{relative}", {"dt": dt, "files": entries})
+    return {
+        "manifest": relative,
+        "files": len(entries),
+        "rows": sum(e["rows"] for e in entries),
+        "bytes": sum(e["bytes"] for e in entries),
+    }
+
+
+def _existing_partitions(fs, root, location):
+    """{dt: [archivos]} de las carpetas dt=<dt> escritas antes de los snapshots."""
+    found = {}
+    for info in fs.get_file_info(pafs.FileSelector(root, recursive=True, allow_not_found=True)):
+        relative = info.path[len(root) + 1:]
+        if info.type == pafs.FileType.File and relative.startswith("dt=") and relative.endswith(".parquet"):
+            found.setdefault(relative.split("/", 1)[0][3:], []).append(file_uri(location, info.path))
+    return found
+
+
+def _check_conflicts(fs, root, location, head, since_id, dts):
+    """Falla si algún snapshot posterior a `since_id` (hasta `head`) cambió alguno de `dts`."""
+    snapshot = head
+    while snapshot is not None and snapshot["snapshot_id"] > since_id:
+        overlap = set(snapshot["changed"]) & set(dts)
+        if overlap:
+            raise CommitConflict(
+                f"{location}: el snapshot {snapshot['snapshot_id']} ({snapshot['operation']}, "
+                f"run={snapshot['run_id']}) también cambió {sorted(overlap)}"
+            )
+        parent = snapshot["parent_id"]
+        snapshot = _read_json(fs, _snapshot_path(root, parent)) if parent else None
+
+
+def commit(location, files_by_dt, operation, run_id, read_snapshot_id=None, max_attempts=8):
+    """
+    Confirma un snapshot nuevo que reemplaza los dt de `files_by_dt`.
+
+    Args:
+        location: Ubicación de la tabla
+        files_by_dt: {dt: [archivos]}; una lista vacía quita el dt de la tabla
+        operation: "replace" (rates.py) o "compact" (compact_gold.py)
+        run_id: Id de la corrida (nombra los manifests)
+        read_snapshot_id: Snapshot del que se leyeron los datos que se
+            reescriben (compactación); si después otro cambió esos dt, falla.
+            Sin él gana la última escritura, como el overwrite de rates.py:
+            si otro confirmó antes, el snapshot se arma sobre el suyo y los
+            dt de `files_by_dt` quedan con estos archivos
+
+    Returns:
+        dict: El snapshot confirmado
+
+    Raises:
+        CommitConflict: Con `read_snapshot_id`, si un snapshot posterior tocó alguno de estos dt.
+    """
+    fs, root = resolve(location)
+    base = current_snapshot(location)
+    if read_snapshot_id is not None:
+        _check_conflicts(fs, root, location, base, read_snapshot_id, files_by_dt)
+    if base is None:
+        # Primer snapshot: se adopta Gold escrito antes (carpetas dt=) que no se reemplaza aquí
+        adopted = {dt: uris for dt, uris in _existing_partitions(fs, root, location).items() if dt not in files_by_dt}
+    else:
+        adopted = {}
+    changes = {
+        dt: _write_manifest(fs, root, location, dt, uris, run_id) if uris else None
+        for dt, uris in sorted({**adopted, **files_by_dt}.items())
+    }
+    schema_uri = next((uris[0] for uris in files_by_dt.values() if uris), None) \
+        or next((uris[0] for uris in adopted.values() if uris), None)
+
+    parent = base
+    for _ in range(max_attempts):
+        partitions = dict(parent["partitions"]) if parent else {}
+        for dt, entry in changes.items():
+            if entry is None:
+                partitions.pop(dt, None)
+            else:
+                partitions[dt] = entry
+        snapshot_id = parent["snapshot_id"] + 1 if parent else 1
+        snapshot = {
+            "snapshot_id": snapshot_id,
+            "parent_id": parent["snapshot_id"] if parent else None,
+            "committed_at": datetime.now(timezone.utc).isoformat(),
+            "operation": operation,
+            "run_id": run_id,
+            "changed": sorted(files_by_dt),
+            "schema": _schema_text(fs, schema_uri) if schema_uri else (parent or {}).get("schema"),
+            "summary": {
+                "dts": len(partitions),
+                "files": sum(p["files"] for p in partitions.values()),
+                "rows": sum(p["rows"] for p in partitions.values()),
+                "bytes": sum(p["bytes"] for p in partitions.values()),
+            },
+            "partitions": dict(sorted(partitions.items())),
+        }
+        body = json.dumps(snapshot, indent=2).encode("utf-8")
+        fs.create_dir(f"{root}/{SNAPSHOT_DIR}")
+        if _create_exclusive(fs, _snapshot_path(root, snapshot_id), body):
+            _write_json(fs, f"{root}/{SNAPSHOT_DIR}/{LATEST_HINT}", snapshot_id)
+            return snapshot
+
+        # Otro escritor confirmó antes: se rebasa sobre su snapshot (la
+        # compactación solo si no tocó los mismos dt)
+        parent = current_snapshot(location)
+        if read_snapshot_id is not None:
+            _check_conflicts(fs, root, location, parent, read_snapshot_id, files_by_dt)
+    raise RuntimeError(f"{location}: no se pudo confirmar el snapshot después de {max_attempts} intentos")
+
+
+# Lectura
+
+def _may_match(stats, op, value):
+    """False solo si min/max garantizan que ningún valor del archivo cumple (column op value)."""
+    if "min" not in stats:
+        return True
+    low, high = stats["min"], stats["max"]
+    try:
+        if op in ("=", "=="):
+            return low <= _stat_value(value) <= high
+        if op == "in":
+            return any(low <= _stat_value(v) <= high for v in value)
+        if op == "<":
+            return low < _stat_value(value)
+        if op == "<=":
+            return low <= _stat_value(value)
+        if op == ">":
+            return high > _stat_value(value)
+        if op == ">=":
+            return high >= _stat_value(value)
+    except TypeError:
+        pass
+    return True
+
+
+def _dt_matches(dt, filters):
+    return all(_may_match({"min": dt, "max": dt}, op, value) for column, op, value in filters if column == "dt")
+
+
+def plan_files(location, filters=None, snapshot_id=None, as_of=None):
+    """
+    Archivos de un snapshot que pueden tener filas para `filters`.
+
+    Args:
+        filters: [(columna, op, valor)] unidos con AND; op es =, <, <=, >, >=
+            o in (como los filtros de pyarrow). Los de dt descartan
+            particiones sin leer su manifest; los demás descartan archivos con
+            las estadísticas min/max.
+
+    Returns:
+        tuple: (snapshot, [(dt, entrada del manifest)])
+    """
+    filters = list(filters or [])
+    snapshot = load_snapshot(location, snapshot_id, as_of)
+    fs, root = resolve(location)
+    dts = [dt for dt in snapshot["partitions"] if _dt_matches(dt, filters)]
+    with ThreadPoolExecutor(READ_THREADS) as pool:
+        manifests = pool.map(lambda dt: _read_json(fs, f"{root}/{snapshot['partitions'][dt]['manifest']}"), dts)
+        planned = []
+        for dt, manifest in zip(dts, manifests):
+            for entry in manifest["files"]:
+                if all(_may_match(entry["stats"].get(column, {}), op, value)
+                       for column, op, value in filters if column != "dt"):
+                    planned.append((dt, entry))
+    return snapshot, planned
+
+
+def snapshot_partition_location(location, snapshot, dt):
+    """
+    Carpeta de los archivos de `dt` en `snapshot`: la ubicación que le
+    corresponde a la partición en el catálogo. None si el dt no está.
+    """
+    entry = snapshot["partitions"].get(dt) if snapshot else None
+    if entry is None:
+        return None
+    fs, root = resolve(location)
+    files = _read_json(fs, f"{root}/{entry['manifest']}")["files"]
+    return files[0]["path"].rsplit("/", 1)[0] if files else None
+
+
+def read_table(location, columns=None, filters=None, snapshot_id=None, as_of=None):
+    """
+    Tabla pyarrow del snapshot pedido (columna dt incluida), leyendo solo los
+    archivos que deja plan_files y aplicando `filters` fila por fila.
+    """
+    filters = list(filters or [])
+    snapshot, planned = plan_files(location, filters, snapshot_id, as_of)
+    fs, _ = resolve(location)
+    schema = _schema(snapshot)
+    row_filters = [f for f in filters if f[0] != "dt"]
+    expression = pq.filters_to_expression(row_filters) if row_filters else None
+    file_columns = [c for c in columns if c != "dt"] if columns else None
+
+    by_dt = {}
+    for dt, entry in planned:
+        by_dt.setdefault(dt, []).append(_fs_path(entry["path"]))
+    tables = []
+    for dt, paths in sorted(by_dt.items()):
+        table = ds.dataset(paths, schema=schema, format="parquet", filesystem=fs).to_table(
+            columns=file_columns, filter=expression)
+        tables.append(table.append_column("dt", pa.array([dt] * table.num_rows, pa.string())))
+    if not tables:
+        empty = schema.empty_table() if schema else pa.table({})
+        tables = [empty.select(file_columns) if file_columns else empty]
+        tables[0] = tables[0].append_column("dt", pa.array([], pa.string()))
+    table = pa.concat_tables(tables)
+    return table.select(columns) if columns else table
+
+
+# Mantenimiento
+
+def expire_snapshots(location, retain_days=RETENTION_DAYS, now=None):
+    """
+    Borra los snapshots que dejaron de estar vigentes hace más de
+    `retain_days` (se conservan el último y el que estaba vigente al inicio de
+    la ventana, para poder leer cualquier momento dentro de ella) y los
+    archivos de datos y manifests que ya no referencia ningún snapshot
+    conservado. Los archivos sin snapshot (corridas que fallaron) se borran
+    cuando son más viejos que la ventana, no antes: pueden ser de una corrida
+    en curso.
+
+    Es la única operación que lista la tabla completa.
+
+    Returns:
+        dict: snapshots, archivos y carpetas borrados
+    """
+    fs, root = resolve(location)
+    now = _parse_ts(now) if now else datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=retain_days)
+    ids = _list_snapshot_ids(fs, root)
+    if not ids:
+        return {"snapshots": 0, "files": 0, "dirs": 0}
+
+    loaded = {snapshot_id: _read_json(fs, _snapshot_path(root, snapshot_id)) for snapshot_id in ids}
+    # Un snapshot sigue vigente hasta que se confirma el siguiente
+    keep = {ids[-1]}
+    for older, newer in zip(ids, ids[1:]):
+        if _parse_ts(loaded[newer]["committed_at"]) > cutoff:
+            keep.add(older)
+    expired = [snapshot_id for snapshot_id in ids if snapshot_id not in keep]
+
+    manifests = {entry["manifest"] for snapshot_id in keep for entry in loaded[snapshot_id]["partitions"].values()}
+    referenced = set()
+    for relative in manifests:
+        referenced.update(_fs_path(entry["path"]) for entry in _read_json(fs, f"{root}/{relative}")["files"])
+    referenced.update(f"{root}/{relative}" for relative in manifests)
+
+    for snapshot_id in expired:
+        fs.delete_file(_snapshot_path(root, snapshot_id))
+
+    # Datos (run=*/ y dt=* adoptados) y manifests sin referencia
+    removed, kept_dirs, candidate_dirs = 0, set(), set()
+    for info in fs.get_file_info(pafs.FileSelector(root, recursive=True, allow_not_found=True)):
+        relative = info.path[len(root) + 1:]
+        top = relative.split("/", 1)[0]
+        in_manifests = relative.startswith(f"{SNAPSHOT_DIR}/manifests/")
+        if not (top.startswith("run=") or top.startswith("dt=") or in_manifests):
+            continue
+        if info.type == pafs.FileType.Directory:
+            candidate_dirs.add(info.path)
+            continue
+        parent = info.path.rsplit("/", 1)[0]
+        stale = info.path not in referenced and info.mtime is not None and info.mtime.astimezone(timezone.utc) < cutoff
+        if stale:
+            fs.delete_file(info.path)
+            removed += 1
+        else:
+            while parent != root:
+                kept_dirs.add(parent)
+                parent = parent.rsplit("/", 1)[0]
+    # Carpetas que quedaron vacías (la más alta de cada rama)
+    empty = sorted(d for d in candidate_dirs if d not in kept_dirs and d != f"{root}/{SNAPSHOT_DIR}/manifests")
+    dirs = 0
+    for folder in empty:
+        if folder.rsplit("/", 1)[0] in empty:
+            continue
+        fs.delete_dir(folder)
+        dirs += 1
+    return {"snapshots": len(expired), "files": removed, "dirs": dirs}
+
+
+def _parse_filter(text):
+    for op in ("<=", ">=", "=", "<", ">"):
+        if op in text:
+            column, value = text.split(op, 1)
+            return column, op, int(value) if value.lstrip("-").isdigit() else value
+    raise ValueError(f"Filtro inválido: {text!r} (columna=valor, <, <=, >, >=)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--location", required=True, help="ubicación de la tabla (local o s3://)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("log", help="snapshots, del más reciente al más viejo")
+    files = commands.add_parser("files", help="archivos que leería una consulta")
+    files.add_argument("--snapshot-id", type=int)
+    files.add_argument("--as-of", help="fecha/hora ISO (UTC si no trae zona)")
+    files.add_argument("--filter", action="append", default=[], help="p. ej. entity_id=3, dt>=2025-11-01")
+    expire = commands.add_parser("expire", help="borrar snapshots y archivos fuera de la ventana")
+    expire.add_argument("--retain-days", type=float, default=RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "log":
+        for snapshot in snapshots(args.location):
+            print(json.dumps({key: snapshot[key] for key in
+                              ("snapshot_id", "committed_at", "operation", "run_id", "changed", "summary")}))
+    elif args.command == "files":
+        snapshot, planned = plan_files(args.location, [_parse_filter(f) for f in args.filter],
+                                       args.snapshot_id, args.as_of)
+        print(json.dumps({
+            "snapshot_id": snapshot["snapshot_id"],
+            "files_total": snapshot["summary"]["files"],
+            "files_planned": len(planned),
+            "rows_planned": sum(entry["rows"] for _, entry in planned),
+            "files": [entry["path"] for _, entry in planned],
+        }, indent=2))
+    else:
+        print(json.dumps(expire_snapshots(args.location, args.retain_days)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
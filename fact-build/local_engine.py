@@ -0,0 +1,517 @@
+"""
+Motor local del fact de tasas (pyarrow + pandas), con la misma semántica que el
+job de Glue (spark_engine.py):
+
+- tipos: date -> DATE, ingestion_ts -> TIMESTAMP (sesión Spark en UTC, como Glue),
+  entity__id/product__id -> INT, rate -> DOUBLE
+- validación rate en (0, 200) y motivo de rechazo (el primero que aplique)
+- dedup por (date, entity_id, product_id) conservando el ingestion_ts más reciente
+- business_hash = sha2(date||entity_id||product_id||rate) con el formato de
+  texto que usa Spark para cada tipo
+- escritura Gold por dt confirmada con un snapshot (gold_snapshots.py), que
+  reemplaza solo los dt escritos; la cuarentena sigue particionada por dt
+- compactación de una partición dt (compact_partition, como compact_gold.py)
+- historia de cambios (SCD2) en <gold_path>/fact_rates_history (merge_history)
+- marts de tipo de cambio en <gold_path>/marts, al día con el snapshot (marts.py)
+
+Para el volumen diario (decenas de filas por entidad) evita levantar un
+cluster. Corre en una laptop o en una Lambda (`handler`); las rutas pueden ser
+locales o s3://.
+
+Uso:
+    python fact-build/local_engine.py --silver-path output/silver --gold-path output/gold --dt 2025-11-08
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+import gold_snapshots
+import marts
+import silver_dataset
+from fact_rules import (
+    BUSINESS_KEY, CLUSTER_COLUMNS, GOLD_COLUMNS, HISTORY_COLUMNS, HISTORY_DIR, HISTORY_KEY, RATE_MAX, RATE_MIN,
+    REJECT_COLUMNS, REJECT_REASONS, ROW_GROUP_BYTES, TARGET_FILE_BYTES, plan_file_count, silver_dt,
+)
+
+GOLD_SCHEMA = pa.schema([
+    ("date", pa.date32()),
+    ("entity_id", pa.int32()),
+    ("product_id", pa.int32()),
+    ("rate", pa.float64()),
+    ("ingestion_ts", pa.timestamp("us")),
+    ("source_file", pa.string()),
+    ("business_hash", pa.string()),
+    ("dt", pa.string()),
+])
+REJECTS_SCHEMA = pa.schema([
+    GOLD_SCHEMA.field(name) for name in REJECT_COLUMNS if name != "reject_reason"
+] + [("reject_reason", pa.string())])
+HISTORY_SCHEMA = pa.schema([
+    ("entity_id", pa.int32()),
+    ("product_id", pa.int32()),
+    ("rate", pa.float64()),
+    ("rate_hash", pa.string()),
+    ("valid_from", pa.date32()),
+    ("valid_to", pa.date32()),
+    ("ingestion_ts", pa.timestamp("us")),
+    ("source_file", pa.string()),
+])
+
+# Lo que Spark acepta en to_date(string): yyyy-[m]m-[d]d, opcionalmente seguido de ' ' o 'T' y lo que sea
+DATE_PREFIX = r"^\s*(\d{4}-\d{1,2}-\d{1,2})(?:[T ].*)?\s*$"
+
+DOUBLE = pd.ArrowDtype(pa.float64())
+
+
+def _pandas_type(arrow_type):
+    """Flotantes como double[pyarrow]: conserva NaN distinto de null (Spark los trata distinto)."""
+    if pa.types.is_floating(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    if pa.types.is_integer(arrow_type):
+        return pd.Int64Dtype()
+    return None
+
+
+# Formato de texto de Spark (cast a string)
+
+def java_double_str(value):
+    """Double.toString de Java: 20.5 -> "20.5", 17.0 -> "17.0", 0.0001 -> "1.0E-4"."""
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "Infinity" if value > 0 else "-Infinity"
+    if value == 0:
+        return "-0.0" if math.copysign(1.0, value) < 0 else "0.0"
+    if 1e-3 <= abs(value) < 1e7:
+        return repr(value)
+    sign = "-" if value < 0 else ""
+    _, digits, exponent = Decimal(repr(abs(value))).as_tuple()
+    sci_exponent = len(digits) + exponent - 1
+    significant = "".join(map(str, digits)).rstrip("0") or "0"
+    return f"{sign}{significant[0]}.{significant[1:] or '0'}E{sci_exponent}"
+
+
+def business_hash(dates, entity_ids, product_ids, rates):
+    """sha2(concat_ws("||", ...), 256) fila por fila, igual que spark_engine.add_business_hash."""
+    return [
+        hashlib.sha256("||".join((
+            d.isoformat(), str(e), str(p), "" if r is None or r is pd.NA else java_double_str(r),
+        )).encode("utf-8")).hexdigest()
+        for d, e, p, r in zip(dates, entity_ids, product_ids, rates)
+    ]
+
+
+def rate_hash(entity_ids, product_ids, rates):
+    """sha2(concat_ws("||", entity_id, product_id, rate), 256), igual que spark_engine.add_rate_hash."""
+    return [
+        hashlib.sha256("||".join((
+            str(e), str(p), "" if r is None or r is pd.NA else java_double_str(r),
+        )).encode("utf-8")).hexdigest()
+        for e, p, r in zip(entity_ids, product_ids, rates)
+    ]
+
+
+# Casts con la semántica de Spark
+
+def _to_date(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        if series.dt.tz is not None:
+            series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        return series.dt.normalize()
+    # Objetos date/datetime quedan como "YYYY-MM-DD[ HH:MM:SS]", igual que un string
+    prefix = series.astype("string").str.extract(DATE_PREFIX, expand=False)
+    return pd.to_datetime(prefix, format="%Y-%m-%d", errors="coerce")
+
+
+def _to_timestamp(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.tz_convert("UTC").dt.tz_localize(None) if series.dt.tz is not None else series
+    parsed = pd.to_datetime(series.astype("string"), format="ISO8601", errors="coerce", utc=True)
+    return parsed.dt.tz_localize(None)
+
+
+def _to_int(series):
+    """cast(... as int): los decimales se truncan."""
+    numbers = pd.to_numeric(series, errors="coerce")
+    return np.trunc(numbers.astype("Float64")).astype("Int64").astype("Int32")
+
+
+def _to_double(series):
+    if isinstance(series.dtype, pd.ArrowDtype) and pa.types.is_floating(series.dtype.pyarrow_dtype):
+        return series.astype(DOUBLE)
+    return pd.to_numeric(series, errors="coerce").astype(DOUBLE)
+
+
+# Pipeline
+
+def cast_silver(df):
+    """Tipos + normalización de nombres (mismo resultado que spark_engine.cast_silver)."""
+    typed = pd.DataFrame({
+        "date": _to_date(df["date"]),
+        "entity_id": _to_int(df["entity__id"]),
+        "product_id": _to_int(df["product__id"]),
+        "rate": _to_double(df["rate"]),
+        "ingestion_ts": _to_timestamp(df["ingestion_ts"]),
+        "source_file": df["source_file"].astype("string"),
+        "dt": df["dt"].astype("string"),
+    })
+    if "business_hash" in df.columns:
+        typed["business_hash"] = df["business_hash"].astype("string")
+    return typed
+
+
+def reject_reasons(df):
+    """Motivo de rechazo (el primero que aplique); None si la fila es válida."""
+    in_range = ((df["rate"] > RATE_MIN) & (df["rate"] < RATE_MAX)).fillna(False).astype(bool)
+    reasons = np.select(
+        [df["date"].isna(), df["entity_id"].isna(), df["product_id"].isna(), df["rate"].isna(), ~in_range],
+        REJECT_REASONS,
+        default="",
+    )
+    return pd.Series(reasons, index=df.index, dtype="string").replace("", pd.NA)
+
+
+def tag_rows(silver):
+    """Silver crudo -> filas tipadas con reject_reason, en una sola pasada."""
+    df = cast_silver(silver)
+    df["reject_reason"] = reject_reasons(df)
+    return df
+
+
+def dedup_latest(df):
+    """Conserva por clave de negocio la fila con ingestion_ts más reciente (nulos al final)."""
+    ordered = df.sort_values(
+        BUSINESS_KEY + ["ingestion_ts"],
+        ascending=[True] * len(BUSINESS_KEY) + [False],
+        na_position="last",
+        kind="stable",
+    )
+    return ordered.drop_duplicates(BUSINESS_KEY, keep="first")
+
+
+def split(tagged):
+    """Filas etiquetadas -> (gold, rejects)."""
+    invalid = tagged["reject_reason"].notna()
+    gold = dedup_latest(tagged[~invalid]).copy()
+    # Si Silver ya trae el hash (cleaners) se usa ese; solo se calcula el que falte
+    if "business_hash" not in gold.columns:
+        gold["business_hash"] = pd.Series(pd.NA, index=gold.index, dtype="string")
+    missing = gold["business_hash"].isna()
+    gold.loc[missing, "business_hash"] = business_hash(
+        gold.loc[missing, "date"].dt.date, gold.loc[missing, "entity_id"],
+        gold.loc[missing, "product_id"], gold.loc[missing, "rate"],
+    )
+    rejects = tagged[invalid]
+    return gold[GOLD_COLUMNS].reset_index(drop=True), rejects[REJECT_COLUMNS].reset_index(drop=True)
+
+
+def reject_counts(tagged):
+    """{(dt, reject_reason): filas}; reject_reason None = filas válidas."""
+    counts = tagged.groupby(["dt", "reject_reason"], dropna=False).size()
+    return {(dt, None if pd.isna(reason) else reason): int(n) for (dt, reason), n in counts.items()}
+
+
+def build_fact(silver):
+    """
+    Silver crudo (con columna dt) -> (gold, rejects) como DataFrames de pandas.
+    """
+    return split(tag_rows(silver))
+
+
+# Historia de cambios (SCD2), igual que en spark_engine
+
+def history_intervals(daily):
+    """Filas diarias con rate_hash -> tramos; uno nuevo solo si cambia rate_hash (los días faltantes no lo cortan)."""
+    d = daily.sort_values(HISTORY_KEY + ["date"], kind="stable").reset_index(drop=True)
+    def same(frame, column, step=1):
+        return frame[column].eq(frame[column].shift(step)).to_numpy(dtype=bool, na_value=False)
+
+    continues = same(d, "entity_id") & same(d, "product_id") & same(d, "rate_hash")
+    starts = pd.Series(~continues, index=d.index)
+    interval = starts.cumsum()
+    intervals = d.assign(valid_from=d["date"])[starts].reset_index(drop=True)
+    # Hasta el día anterior al tramo siguiente de la clave; el último, hasta su última observación
+    last_seen = pd.Series(d.groupby(interval)["date"].max().to_numpy())
+    has_next = same(intervals, "entity_id", -1) & same(intervals, "product_id", -1)
+    next_from = intervals["valid_from"].shift(-1) - pd.Timedelta(days=1)
+    intervals["valid_to"] = next_from.where(has_next, last_seen)
+    # ingestion_ts/source_file: los de la observación más reciente del tramo
+    latest = d.sort_values("ingestion_ts", na_position="first", kind="stable").groupby(interval).tail(1).sort_index()
+    intervals["ingestion_ts"] = latest["ingestion_ts"].to_numpy()
+    intervals["source_file"] = latest["source_file"].to_numpy()
+    return intervals[HISTORY_COLUMNS]
+
+
+def expand_history(history):
+    """Tramos -> una fila por día."""
+    history = history.reset_index(drop=True)
+    days = (history["valid_to"] - history["valid_from"]).dt.days + 1
+    expanded = history.loc[history.index.repeat(days)]
+    expanded = expanded.assign(
+        date=expanded["valid_from"] + pd.to_timedelta(expanded.groupby(level=0).cumcount(), unit="D"),
+    )
+    return expanded[["date", *HISTORY_KEY, "rate", "rate_hash", "ingestion_ts", "source_file"]].reset_index(drop=True)
+
+
+def merge_history(history, gold):
+    """
+    Historia vigente + Gold de la corrida -> historia nueva (ver
+    spark_engine.merge_history). Solo agrega o corrige días: no retira los que
+    un dt reprocesado ya no trae.
+    """
+    daily = gold[["date", *HISTORY_KEY, "rate", "ingestion_ts", "source_file"]].copy()
+    daily["rate_hash"] = rate_hash(daily["entity_id"], daily["product_id"], daily["rate"])
+    since = daily.groupby(HISTORY_KEY)["date"].min().rename("since")
+    joined = history.join(since, on=HISTORY_KEY)
+    # Desde el tramo vigente el día anterior a since (o el último que empezó antes)
+    before = joined["valid_from"].where(joined["valid_from"] < joined["since"])
+    anchor = before.groupby([joined[c] for c in HISTORY_KEY]).transform("max").fillna(joined["since"])
+    touched = (joined["valid_from"] >= anchor).to_numpy(dtype=bool, na_value=False)
+
+    reopened = expand_history(history[touched])
+    # Mismo día en ambos: gana el ingestion_ts más reciente; en empate, la fila nueva
+    days = pd.concat([reopened.assign(new=0), daily[reopened.columns].assign(new=1)], ignore_index=True)
+    days = days.sort_values(
+        ["date", *HISTORY_KEY, "ingestion_ts", "new"], ascending=[True, True, True, False, False],
+        na_position="last", kind="stable",
+    ).drop_duplicates(["date", *HISTORY_KEY], keep="first")
+    rebuilt = history_intervals(days.drop(columns="new"))
+    return pd.concat([history[~touched], rebuilt], ignore_index=True)
+
+
+def to_arrow(frame, schema):
+    """DataFrame -> tabla Arrow con los tipos de la tabla del catálogo."""
+    columns = {}
+    for field in schema:
+        values = frame[field.name]
+        if pa.types.is_date(field.type):
+            values = values.dt.date
+        elif pa.types.is_timestamp(field.type):
+            columns[field.name] = pa.array(values, pa.timestamp("ns"), from_pandas=True).cast(field.type, safe=False)
+            continue
+        columns[field.name] = pa.array(values, field.type, from_pandas=True)
+    return pa.table(columns, schema=schema)
+
+
+# E/S
+
+def resolve(path):
+    """(filesystem, ruta) para rutas locales o URIs (s3://...)."""
+    if "://" in path:
+        return pafs.FileSystem.from_uri(path)
+    return pafs.LocalFileSystem(), os.path.abspath(path)
+
+
+def list_silver_files(silver_path, dts):
+    """
+    Archivos Silver de los dt pedidos: los del manifest de cada dt, o los de
+    sus carpetas si no tiene (silver_dataset.input_files). No lista Silver completo.
+    """
+    return silver_dataset.input_files(silver_path.rstrip("/"), dts)
+
+
+def read_silver(fs, paths):
+    """Lee los archivos Silver y agrega dt desde la ruta de cada uno."""
+    frames = []
+    for path in paths:
+        frame = pq.read_table(path, filesystem=fs).to_pandas(types_mapper=_pandas_type)
+        frame["dt"] = silver_dt(path)
+        frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=["date", "entity__id", "product__id", "rate", "ingestion_ts", "source_file", "dt"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_partitioned(frame, schema, location, dts):
+    """
+    Escribe `frame` particionado por dt reemplazando los dt de `dts`: los que
+    traen filas se reescriben y los que quedaron vacíos se borran.
+    """
+    fs, root = resolve(location.rstrip("/"))
+    written = sorted(frame["dt"].unique()) if not frame.empty else []
+    for dt in sorted(set(dts) - set(written)):
+        stale = f"{root}/dt={dt}"
+        if fs.get_file_info(stale).type == pafs.FileType.Directory:
+            fs.delete_dir(stale)
+    if written:
+        pq.write_to_dataset(
+            to_arrow(frame, schema),
+            root_path=root,
+            filesystem=fs,
+            partition_cols=["dt"],
+            basename_template="part-{i}.parquet",
+            existing_data_behavior="delete_matching",
+        )
+    return written
+
+
+def write_snapshot(frame, location, dts, run_id):
+    """
+    Escribe cada dt de `frame` en run=<run_id>/dt=<dt>/ y lo confirma como un
+    snapshot que reemplaza los dt de `dts` (los que quedaron sin filas salen
+    de la tabla). Hasta el commit nadie ve los archivos nuevos.
+    """
+    fs, root = resolve(location.rstrip("/"))
+    schema = pa.schema([field for field in GOLD_SCHEMA if field.name != "dt"])
+    files = {dt: [] for dt in dts}
+    for dt, rows in frame.groupby("dt", sort=True):
+        folder = gold_snapshots.data_location(root, run_id, dt)
+        fs.create_dir(folder)
+        pq.write_table(to_arrow(rows, schema), f"{folder}/part-0.parquet", filesystem=fs)
+        files[dt] = [gold_snapshots.file_uri(location, f"{folder}/part-0.parquet")]
+    return gold_snapshots.commit(location, files, "replace", run_id)
+
+
+def compact_partition(location, new_location, target_bytes=TARGET_FILE_BYTES, row_group_bytes=ROW_GROUP_BYTES):
+    """
+    Reescribe la partición de `location` en `new_location` con archivos de
+    ~target_bytes ordenados por CLUSTER_COLUMNS (tramos contiguos, como
+    repartitionByRange) y row groups de ~row_group_bytes. No toca `location`
+    ni el catálogo: el swap lo hace quien llama.
+
+    Returns:
+        dict: filas, archivos y bytes antes y después.
+    """
+    fs, root = resolve(location.rstrip("/"))
+    new_fs, new_root = resolve(new_location.rstrip("/"))
+    files = [
+        info for info in fs.get_file_info(pafs.FileSelector(root))
+        if info.type == pafs.FileType.File and info.path.endswith(".parquet")
+    ]
+    table = pa.concat_tables(pq.read_table(info.path, filesystem=fs) for info in files)
+    table = table.sort_by([(column, "ascending") for column in CLUSTER_COLUMNS])
+
+    bytes_before = sum(info.size for info in files)
+    n_files = plan_file_count(bytes_before, target_bytes)
+    rows_per_file = max(1, math.ceil(table.num_rows / n_files))
+    # Filas por row group a partir del tamaño en disco por fila de la entrada
+    bytes_per_row = max(1, bytes_before // max(1, table.num_rows))
+    row_group_rows = max(1, row_group_bytes // bytes_per_row)
+
+    if new_fs.get_file_info(new_root).type != pafs.FileType.NotFound:
+        raise FileExistsError(new_location)
+    new_fs.create_dir(new_root)
+    for i, offset in enumerate(range(0, table.num_rows, rows_per_file)):
+        pq.write_table(
+            table.slice(offset, rows_per_file),
+            f"{new_root}/part-{i:05d}.parquet",
+            filesystem=new_fs,
+            row_group_size=row_group_rows,
+            compression="snappy",
+            write_statistics=True,
+        )
+
+    written = pq.ParquetDataset(new_root, filesystem=new_fs)
+    rows_after = sum(fragment.count_rows() for fragment in written.fragments)
+    if rows_after != table.num_rows:
+        new_fs.delete_dir(new_root)
+        raise RuntimeError(f"la compactación escribió {rows_after} filas de {table.num_rows}")
+    return {
+        "rows": table.num_rows,
+        "files_before": len(files),
+        "bytes_before": bytes_before,
+        "files_after": len(written.files),
+        "bytes_after": sum(new_fs.get_file_info(path).size for path in written.files),
+    }
+
+
+def read_history(location):
+    """Historia escrita por write_history; vacía si todavía no existe."""
+    fs, root = resolve(location.rstrip("/"))
+    path = f"{root}/part-0.parquet"
+    table = pq.read_table(path, filesystem=fs) if fs.get_file_info(path).type == pafs.FileType.File \
+        else HISTORY_SCHEMA.empty_table()
+    history = table.to_pandas(types_mapper=_pandas_type, date_as_object=False)
+    return history.astype({"entity_id": "Int32", "product_id": "Int32", "rate_hash": "string", "source_file": "string",
+                           "valid_from": "datetime64[ns]", "valid_to": "datetime64[ns]"})
+
+
+def write_history(history, location):
+    """Reemplaza la historia (un archivo) escribiendo aparte y moviendo al final."""
+    fs, root = resolve(location.rstrip("/"))
+    fs.create_dir(root)
+    staging = f"{root}/_part-0.parquet.tmp"
+    pq.write_table(to_arrow(history, HISTORY_SCHEMA), staging, filesystem=fs)
+    fs.move(staging, f"{root}/part-0.parquet")
+
+
+def run(silver_path, gold_path, dts, refresh_marts=True):
+    """
+    Recalcula los dt indicados de Silver a Gold (<gold_path>/fact_rates) y
+    deja los rechazos en la cuarentena (<gold_path>/fact_rates_rejects).
+    Con `refresh_marts` recalcula las particiones de los marts que tocan.
+    """
+    gold_snapshots.require_conditional_put(gold_path)
+    fs, paths = list_silver_files(silver_path, dts)
+    tagged = tag_rows(read_silver(fs, paths))
+    gold, rejects = split(tagged)
+    counts = reject_counts(tagged)
+    # Solo se recalculan los dt que tienen Silver; sin Silver no se toca nada
+    input_dts = sorted(tagged["dt"].unique())
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    gold_location = f"{gold_path.rstrip('/')}/fact_rates"
+    snapshot = write_snapshot(gold, gold_location, input_dts, run_id) if input_dts else None
+    gold_snapshots.expire_snapshots(gold_location)
+    written = sorted(gold["dt"].unique()) if not gold.empty else []
+    write_partitioned(rejects, REJECTS_SCHEMA, f"{gold_path.rstrip('/')}/fact_rates_rejects", input_dts)
+    history_location = f"{gold_path.rstrip('/')}/{HISTORY_DIR}"
+    history = merge_history(read_history(history_location), gold)
+    write_history(history, history_location)
+    marts_report = marts.refresh(gold_path) if refresh_marts else None
+
+    reasons = {}
+    for (_, reason), n in counts.items():
+        if reason is not None:
+            reasons[reason] = reasons.get(reason, 0) + n
+    return {
+        "silver_files": len(paths),
+        "gold_rows": len(gold),
+        "rejects": len(rejects),
+        "reject_reasons": reasons,
+        "dts_written": written,
+        "history_rows": len(history),
+        "snapshot_id": snapshot["snapshot_id"] if snapshot else None,
+        "marts": marts_report,
+    }
+
+
+def handler(event, context):
+    """Lambda: {"silver_path": "s3://...", "gold_path": "s3://...", "dts": ["YYYY-MM-DD"]}."""
+    try:
+        dts = event.get("dts") or [datetime.now().strftime("%Y-%m-%d")]
+        result = run(event["silver_path"], event["gold_path"], dts)
+        print(json.dumps(result))
+        return {"statusCode": 200, **result}
+    except Exception as e:
+        print(f"Critical error in handler: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"statusCode": 500, "body": f"Critical error: {str(e)}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--silver-path", required=True)
+    parser.add_argument("--gold-path", required=True)
+    parser.add_argument("--dt", action="append", help="YYYY-MM-DD; se puede repetir (default: hoy)")
+    args = parser.parse_args()
+
+    result = run(args.silver_path, args.gold_path, args.dt or [datetime.now().strftime("%Y-%m-%d")])
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,502 @@
+"""
+Marts de tipo de cambio sobre Gold (fact_rates), mantenidos incrementalmente.
+
+    mart_fx_daily   una fila por (date, entity_id, divisa): compra, venta,
+                    spread (venta - compra), mid, el FIX de Banxico del día,
+                    compra y venta contra el FIX y promedios móviles de 7 y 30
+                    días naturales de compra, venta y spread
+    mart_fx_market  una fila por (date, divisa) entre bancos: mínimo, máximo y
+                    promedio de compra, venta y spread, bancos que publicaron
+                    y el FIX
+
+Los productos de cada divisa están en fact_rules.FX_PRODUCTS. Cada mart se
+particiona por divisa y mes, con un solo archivo por partición que se
+reemplaza completo:
+
+    <gold_path>/marts/<mart>/currency=<divisa>/month=<YYYY-MM>/part-0.parquet
+    <gold_path>/marts/_state.json     snapshot de Gold con el que se construyeron
+
+refresh() recorre los snapshots de Gold posteriores al del estado (las
+compactaciones no cambian filas y se saltan), junta los dt que cambiaron, lee
+de esos dt las (date, product_id) del snapshot anterior y del nuevo y
+recalcula solo las particiones (divisa, mes) de esas fechas y de los 29 días
+siguientes, cuyo promedio de 30 días las incluye. Cada divisa se lee de Gold
+filtrando por sus product_id y por fecha desde 29 días antes del mes (los
+filtros descartan archivos con las estadísticas del snapshot). Sin estado, o
+si su snapshot ya expiró, se reconstruye todo.
+
+check() recalcula todo desde el snapshot del estado y lo compara con lo
+escrito: particiones de más o de menos y filas distintas.
+
+Athena encuentra las particiones con partition projection (create_tables), sin
+registrarlas una por una.
+
+No depende de Spark: corre en el driver de rates.py, al final de
+local_engine.run, como Lambda (`handler`) o desde la línea de comandos.
+
+Uso:
+    python fact-build/marts.py --gold-path output/gold refresh [--full]
+    python fact-build/marts.py --gold-path output/gold check
+"""
+import argparse
+import json
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+import gold_snapshots
+from fact_rules import (
+    BANXICO_ENTITY_ID, BUSINESS_KEY, FX_CURRENCIES, FX_PRODUCT_BASE, FX_PRODUCTS, FX_SIDES, fx_product_id,
+)
+
+MARTS_DIR = "marts"
+STATE_FILE = "_state.json"
+DAILY = "mart_fx_daily"
+MARKET = "mart_fx_market"
+WINDOWS = [7, 30]
+LOOKBACK_DAYS = max(WINDOWS) - 1
+PROJECTION_START = "2020-01"
+# Tolerancia de check(): los promedios móviles pueden diferir en el último bit
+# según desde qué fecha se leyó
+RTOL = 1e-9
+
+MEASURES = ["compra", "venta", "spread"]
+DAILY_SCHEMA = pa.schema(
+    [("date", pa.date32()), ("entity_id", pa.int32())]
+    + [(name, pa.float64()) for name in MEASURES + ["mid", "fix", "compra_vs_fix", "venta_vs_fix"]]
+    + [(f"{name}_avg_{days}d", pa.float64()) for days in WINDOWS for name in MEASURES]
+)
+MARKET_SCHEMA = pa.schema(
+    [("date", pa.date32()), ("banks", pa.int32())]
+    + [(f"{name}_{agg}", pa.float64()) for name in MEASURES for agg in ("min", "max", "avg")]
+    + [("fix", pa.float64())]
+)
+SCHEMAS = {DAILY: DAILY_SCHEMA, MARKET: MARKET_SCHEMA}
+DDL_TYPES = {pa.date32(): "DATE", pa.int32(): "INT", pa.float64(): "DOUBLE"}
+KEYS = {DAILY: ["date", "entity_id"], MARKET: ["date"]}
+
+
+def gold_location(gold_path):
+    return f"{gold_path.rstrip('/')}/fact_rates"
+
+
+def marts_location(gold_path):
+    return f"{gold_path.rstrip('/')}/{MARTS_DIR}"
+
+
+def partition_path(root, mart, currency, month):
+    return f"{root}/{mart}/currency={currency}/month={month}"
+
+
+# Meses
+
+def month_of(day):
+    return day.strftime("%Y-%m")
+
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def month_bounds(month):
+    """(primer día, último día) de un mes YYYY-MM."""
+    start = date.fromisoformat(f"{month}-01")
+    return start, _next_month(start) - timedelta(days=1)
+
+
+def months_between(start, end):
+    """Meses YYYY-MM de `start` a `end` (ambos incluidos)."""
+    months, day = [], start.replace(day=1)
+    while day <= end:
+        months.append(month_of(day))
+        day = _next_month(day)
+    return months
+
+
+def _month_runs(months):
+    """Meses ordenados agrupados en tramos consecutivos: cada tramo se lee de Gold una vez."""
+    runs = []
+    for month in sorted(set(months)):
+        if runs and month_of(_next_month(month_bounds(runs[-1][-1])[0])) == month:
+            runs[-1].append(month)
+        else:
+            runs.append([month])
+    return runs
+
+
+# Cálculo
+
+def read_fx(location, snapshot_id, currencies, start=None, end=None):
+    """
+    Filas de Gold de las divisas (date, entity_id, currency, side, rate), una
+    por clave de negocio: un dt tardío puede traer la misma (date, entity_id,
+    product_id) que otro dt y gana el ingestion_ts más reciente, como en Gold.
+    """
+    filters = [("product_id", "in", [fx_product_id(c, side) for c in currencies for side in FX_SIDES])]
+    if start is not None:
+        # date <= dt siempre (las filas tardías traen un date anterior): los dt
+        # previos a `start` no se abren
+        filters += [("date", ">=", start), ("dt", ">=", start.isoformat())]
+    if end is not None:
+        filters.append(("date", "<=", end))
+    frame = gold_snapshots.read_table(
+        location, ["date", "entity_id", "product_id", "rate", "ingestion_ts"], filters, snapshot_id,
+    ).to_pandas(date_as_object=False)
+    frame = (frame
+             .sort_values(BUSINESS_KEY + ["ingestion_ts"], na_position="first", kind="stable")
+             .drop_duplicates(BUSINESS_KEY, keep="last"))
+    frame["currency"] = frame["product_id"].map(lambda product_id: FX_PRODUCTS[product_id][0])
+    frame["side"] = frame["product_id"].map(lambda product_id: FX_PRODUCTS[product_id][1])
+    return frame[["date", "entity_id", "currency", "side", "rate"]]
+
+
+def _empty(schema):
+    frame = schema.empty_table().to_pandas(date_as_object=False)
+    frame.insert(0, "currency", [])
+    return frame
+
+
+def daily_frame(fx):
+    """mart_fx_daily (con la columna currency) para todas las fechas de `fx` (salida de read_fx)."""
+    if not (fx["side"] != "fix").any():
+        return _empty(DAILY_SCHEMA)
+    fix = (fx[(fx["side"] == "fix") & (fx["entity_id"] == BANXICO_ENTITY_ID)]
+           .set_index(["currency", "date"])["rate"].rename("fix"))
+    quotes = fx[fx["side"] != "fix"]
+    frame = (quotes.pivot(index=["currency", "entity_id", "date"], columns="side", values="rate")
+             .reindex(columns=["compra", "venta"])
+             .reset_index()
+             .sort_values(["currency", "entity_id", "date"], kind="stable")
+             .reset_index(drop=True))
+    frame.columns.name = None
+    frame["spread"] = frame["venta"] - frame["compra"]
+    frame["mid"] = (frame["compra"] + frame["venta"]) / 2
+    frame = frame.join(fix, on=["currency", "date"])
+    frame["compra_vs_fix"] = frame["compra"] - frame["fix"]
+    frame["venta_vs_fix"] = frame["venta"] - frame["fix"]
+    # Ventanas de días naturales (t - N, t]: los días sin cotización no cuentan.
+    # groupby conserva el orden (currency, entity_id, date) del frame
+    by_entity = frame.set_index("date").groupby(["currency", "entity_id"])[MEASURES]
+    for days in WINDOWS:
+        rolled = by_entity.rolling(f"{days}D").mean()
+        for name in MEASURES:
+            frame[f"{name}_avg_{days}d"] = rolled[name].to_numpy()
+    return frame[["currency"] + DAILY_SCHEMA.names]
+
+
+def market_frame(daily):
+    """mart_fx_market (con la columna currency) a partir de mart_fx_daily."""
+    if daily.empty:
+        return _empty(MARKET_SCHEMA)
+    grouped = daily.groupby(["currency", "date"])
+    frame = grouped[MEASURES].agg(["min", "max", "mean"])
+    frame.columns = [f"{name}_{'avg' if agg == 'mean' else agg}" for name, agg in frame.columns]
+    frame["banks"] = grouped.size()
+    frame["fix"] = grouped["fix"].first()
+    return frame.reset_index()[["currency"] + MARKET_SCHEMA.names]
+
+
+def _by_partition(frame):
+    """{(divisa, mes): filas} sin la columna currency."""
+    month = frame["date"].dt.strftime("%Y-%m")
+    return {key: part.drop(columns="currency").reset_index(drop=True)
+            for key, part in frame.groupby([frame["currency"], month], sort=False)}
+
+
+def compute(location, snapshot_id, currencies, months=None):
+    """
+    Particiones de ambos marts para las divisas: {(mart, divisa, mes): DataFrame}.
+
+    Con `months` calcula solo esos meses (vacíos si ya no tienen filas),
+    leyendo de Gold desde 29 días antes de cada tramo de meses consecutivos;
+    sin `months`, todos los meses que tengan filas leyendo las divisas completas.
+    """
+    if months is None:
+        ranges = [(None, None, None)]
+    else:
+        ranges = [(run, month_bounds(run[0])[0] - timedelta(days=LOOKBACK_DAYS), month_bounds(run[-1])[1])
+                  for run in _month_runs(months)]
+    partitions = {}
+    for run, start, end in ranges:
+        daily = daily_frame(read_fx(location, snapshot_id, currencies, start, end))
+        for mart, frame in ((DAILY, daily), (MARKET, market_frame(daily))):
+            parts = _by_partition(frame)
+            empty = frame.iloc[:0].drop(columns="currency")
+            keys = parts if run is None else [(c, m) for c in currencies for m in run]
+            for currency, month in keys:
+                partitions[(mart, currency, month)] = parts.get((currency, month), empty)
+    return partitions
+
+
+# Escritura
+
+def write_partition(fs, root, mart, currency, month, frame):
+    """
+    Reemplaza el archivo de una partición. Se escribe a un temporal con
+    prefijo "_", que Athena ignora, y se mueve.
+
+    Returns:
+        int: Filas escritas.
+    """
+    folder = partition_path(root, mart, currency, month)
+    table = pa.Table.from_pandas(frame.sort_values(KEYS[mart]), schema=SCHEMAS[mart], preserve_index=False)
+    fs.create_dir(folder)
+    staging = f"{folder}/_part-0.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, staging, filesystem=fs, compression="snappy")
+    fs.move(staging, f"{folder}/part-0.parquet")
+    return table.num_rows
+
+
+def existing_partitions(fs, root):
+    """{(mart, divisa, mes)} escritas (lista solo la carpeta de los marts)."""
+    found = set()
+    selector = pafs.FileSelector(root, recursive=True, allow_not_found=True)
+    for info in fs.get_file_info(selector):
+        parts = info.path[len(root) + 1:].split("/")
+        if len(parts) == 4 and parts[0] in SCHEMAS and parts[3] == "part-0.parquet":
+            found.add((parts[0], parts[1].split("=", 1)[1], parts[2].split("=", 1)[1]))
+    return found
+
+
+def read_partition(fs, root, mart, currency, month):
+    path = f"{partition_path(root, mart, currency, month)}/part-0.parquet"
+    return pq.read_table(path, filesystem=fs).to_pandas(date_as_object=False)
+
+
+def read_state(fs, root):
+    try:
+        with fs.open_input_stream(f"{root}/{STATE_FILE}") as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def write_state(fs, root, state):
+    fs.create_dir(root)
+    with fs.open_output_stream(f"{root}/{STATE_FILE}") as f:
+        f.write(json.dumps(state, indent=2).encode("utf-8"))
+
+
+# Refresh
+
+def changed_dts(location, since_id, snapshot):
+    """
+    dt que cambiaron filas entre el snapshot `since_id` y `snapshot` (las
+    compactaciones no cuentan). None si la cadena de snapshots ya no llega a
+    `since_id` (expiró): hay que reconstruir.
+    """
+    dts = set()
+    while snapshot["snapshot_id"] != since_id:
+        if snapshot["operation"] != "compact":
+            dts.update(snapshot["changed"])
+        parent = snapshot["parent_id"]
+        if not parent or parent < since_id:
+            return None
+        try:
+            snapshot = gold_snapshots.load_snapshot(location, parent)
+        except LookupError:
+            return None
+    return dts
+
+
+def affected_partitions(location, dts, snapshot_ids):
+    """
+    {divisa: [meses]} a recalcular: los de cada fecha con productos FX en
+    `dts` (antes o después del cambio) y de los 29 días siguientes.
+    """
+    touched = set()
+    for snapshot_id in snapshot_ids:
+        table = gold_snapshots.read_table(
+            location, ["date", "product_id"],
+            [("dt", "in", sorted(dts)), ("product_id", ">=", FX_PRODUCT_BASE)], snapshot_id,
+        )
+        touched.update(zip(table.column("date").to_pylist(), table.column("product_id").to_pylist()))
+    affected = {}
+    for day, product_id in touched:
+        if product_id in FX_PRODUCTS:
+            months = months_between(day, day + timedelta(days=LOOKBACK_DAYS))
+            affected.setdefault(FX_PRODUCTS[product_id][0], set()).update(months)
+    return {currency: sorted(months) for currency, months in affected.items()}
+
+
+def refresh(gold_path, full=False):
+    """
+    Lleva los marts al último snapshot de Gold, recalculando solo las
+    particiones afectadas (o todas con `full`).
+
+    Returns:
+        dict: Modo (incremental | full | up_to_date | empty), snapshots,
+        particiones escritas y borradas, filas y segundos.
+    """
+    started = time.perf_counter()
+    location = gold_location(gold_path)
+    fs, root = gold_snapshots.resolve(marts_location(gold_path))
+    snapshot = gold_snapshots.current_snapshot(location)
+    if snapshot is None:
+        return {"mode": "empty"}
+    snapshot_id = snapshot["snapshot_id"]
+    state = None if full else read_state(fs, root)
+    since = state["snapshot_id"] if state else None
+    if since == snapshot_id:
+        return {"mode": "up_to_date", "snapshot_id": snapshot_id}
+
+    dts = changed_dts(location, since, snapshot) if since is not None else None
+    report = {"mode": "full" if dts is None else "incremental", "from_snapshot_id": since,
+              "snapshot_id": snapshot_id, "changed_dts": len(dts) if dts is not None else None,
+              "partitions": 0, "deleted": 0, "rows": {DAILY: 0, MARKET: 0}}
+    if dts is None:
+        groups = [(FX_CURRENCIES, None)]
+    else:
+        # Divisas con los mismos meses afectados se leen juntas
+        by_months = {}
+        for currency, months in (affected_partitions(location, dts, [since, snapshot_id]) if dts else {}).items():
+            by_months.setdefault(tuple(months), []).append(currency)
+        groups = [(currencies, list(months)) for months, currencies in by_months.items()]
+
+    existing = existing_partitions(fs, root)
+    computed, written = set(), set()
+    for currencies, months in groups:
+        for (mart, currency, month), frame in compute(location, snapshot_id, currencies, months).items():
+            computed.add((mart, currency, month))
+            if not frame.empty:
+                report["rows"][mart] += write_partition(fs, root, mart, currency, month, frame)
+                written.add((mart, currency, month))
+    # Particiones que se quedaron sin filas (en full, todas las que no se escribieron)
+    stale = existing - written if dts is None else (computed - written) & existing
+    for mart, currency, month in sorted(stale):
+        fs.delete_dir(partition_path(root, mart, currency, month))
+    report["partitions"], report["deleted"] = len(written), len(stale)
+
+    # El estado se escribe al final: si algo falla la siguiente corrida recalcula lo mismo
+    write_state(fs, root, {"snapshot_id": snapshot_id,
+                           "refreshed_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                           "mode": report["mode"]})
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+# Verificación
+
+def _differences(stored, expected, keys):
+    """Filas de `expected` ausentes, sobrantes o con algún valor distinto en `stored`."""
+    merged = stored.merge(expected, on=keys, how="outer", suffixes=("_stored", "_expected"), indicator=True)
+    differs = merged["_merge"] != "both"
+    for name in [c for c in expected.columns if c not in keys]:
+        a, b = merged[f"{name}_stored"].to_numpy(float), merged[f"{name}_expected"].to_numpy(float)
+        differs |= ~np.isclose(a, b, rtol=RTOL, atol=0.0, equal_nan=True)
+    return int(differs.sum())
+
+
+def check(gold_path):
+    """
+    Compara los marts con un recálculo completo desde el snapshot de Gold del
+    estado.
+
+    Returns:
+        dict: ok, particiones faltantes/sobrantes, filas distintas por
+        partición y si hay snapshots de Gold más nuevos que el estado (stale).
+    """
+    location = gold_location(gold_path)
+    fs, root = gold_snapshots.resolve(marts_location(gold_path))
+    state = read_state(fs, root)
+    if state is None:
+        return {"ok": False, "error": f"{root}/{STATE_FILE} no existe: falta correr refresh"}
+    try:
+        expected = compute(location, state["snapshot_id"], FX_CURRENCIES)
+    except LookupError as e:
+        return {"ok": False, "snapshot_id": state["snapshot_id"], "error": f"{e}; correr refresh --full"}
+
+    existing = existing_partitions(fs, root)
+    different = {}
+    for key in sorted(existing & set(expected)):
+        mart, currency, month = key
+        stored = read_partition(fs, root, mart, currency, month)
+        n = _differences(stored, expected[key], KEYS[mart])
+        if n:
+            different["/".join(key)] = n
+    missing = sorted("/".join(key) for key in set(expected) - existing)
+    extra = sorted("/".join(key) for key in existing - set(expected))
+    current = gold_snapshots.current_snapshot(location)
+    return {
+        "ok": not (missing or extra or different),
+        "snapshot_id": state["snapshot_id"],
+        "stale": bool(current) and current["snapshot_id"] != state["snapshot_id"],
+        "partitions": len(existing),
+        "missing": missing,
+        "extra": extra,
+        "different_rows": different,
+    }
+
+
+# Catálogo
+
+def create_tables(sql, catalog_db, gold_path):
+    """
+    Tablas de los marts en el catálogo, con partition projection de Athena:
+    divisa de FX_CURRENCIES y mes desde PROJECTION_START hasta hoy.
+    """
+    root = marts_location(gold_path)
+    for mart, schema in SCHEMAS.items():
+        ddl = ",\n".join(f"  `{field.name}` {DDL_TYPES[field.type]}" for field in schema)
+        sql(f"""
+CREATE EXTERNAL TABLE IF NOT EXISTS {catalog_db}.{mart} (
+{ddl}
+)
+PARTITIONED BY (`currency` STRING, `month` STRING)
+STORED AS PARQUET
+LOCATION '{root}/{mart}'
+TBLPROPERTIES (
+  'projection.enabled'='true',
+  'projection.currency.type'='enum',
+  'projection.currency.values'='{",".join(FX_CURRENCIES)}',
+  'projection.month.type'='date',
+  'projection.month.format'='yyyy-MM',
+  'projection.month.range'='{PROJECTION_START},NOW',
+  'projection.month.interval'='1',
+  'projection.month.interval.unit'='MONTHS',
+  'storage.location.template'='{root}/{mart}/currency=${{currency}}/month=${{month}}'
+)
+""")
+
+
+def handler(event, context):
+    """Lambda: {"gold_path": "s3://...", "action": "refresh" | "check", "full": false}."""
+    try:
+        if event.get("action", "refresh") == "check":
+            result = check(event["gold_path"])
+        else:
+            result = refresh(event["gold_path"], bool(event.get("full")))
+        print(json.dumps(result))
+        return {"statusCode": 200, **result}
+    except Exception as e:
+        print(f"Critical error in handler: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"statusCode": 500, "body": f"Critical error: {str(e)}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gold-path", required=True, help="carpeta Gold (local o s3://)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    refresh_cmd = commands.add_parser("refresh", help="llevar los marts al último snapshot de Gold")
+    refresh_cmd.add_argument("--full", action="store_true", help="reconstruir todas las particiones")
+    commands.add_parser("check", help="comparar los marts con un recálculo completo")
+    args = parser.parse_args()
+
+    if args.command == "refresh":
+        print(json.dumps(refresh(args.gold_path, args.full), indent=2))
+        return 0
+    report = check(args.gold_path)
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,102 +1,342 @@
 # Glue 4.0 / Spark 3.x
+#
+# Modos (--mode):
+#   daily        (default) procesa el dt de un solo día (--dt, default hoy)
+#   incremental  procesa los dt con archivos Silver nuevos o reescritos desde la
+#                última corrida, según la marca de agua en --state_path
+#   backfill     procesa todos los dt de --start_dt a --end_dt (ambos incluidos)
+#                en una sola corrida: un solo plan de Spark lee todo el rango y
+#                escribe cada partición dt, en lugar de un job por día
+#
+# En todos los modos cada dt afectado se recalcula con TODOS sus archivos Silver
+# y reemplaza al dt anterior: volver a correr un día lo reemplaza en lugar de
+# duplicarlo, y el costo depende solo de los dt tocados.
+#
+# Gold se escribe en una carpeta por corrida (fact_rates/run=<run_id>/dt=<dt>)
+# y se confirma con un snapshot (gold_snapshots.py): manifests con las
+# estadísticas de cada archivo, commit atómico y lectura de snapshots
+# anteriores. Hasta el commit nadie ve los archivos nuevos; después las
+# particiones del catálogo se apuntan a esas carpetas. Los snapshots de más de
+# --snapshot_retention_days y los archivos que ya nadie referencia se borran al
+# final de cada corrida.
+#
+# Entrada (--silver_input):
+#   manifest     (default) los archivos que los cleaners anotaron en
+#                silver/_manifests/<dt>.json, leídos con el esquema declarado
+#                (fact_rules.SILVER_SCHEMA_DDL): sin listar Silver ni inferir
+#                el esquema, y un archivo suelto que no esté en el manifest no
+#                entra al job
+#   listing      glob de silver/entity=*/dt=*/part-*.parquet y del layout
+#                anterior silver/*/*/fact_rates_staging.parquet con esquema
+#                inferido, para la historia anterior a los manifests; en daily
+#                y backfill el glob baja solo a las carpetas dt=<dt> del rango
+#
+# Silver es un dataset particionado entity=/dt= con un part nuevo por
+# escritura (silver_dataset.py, que también lo compacta); las rutas de los
+# manifests ya apuntan a los parts vigentes.
+#
+# Además de Gold (una fila por día) mantiene la historia de cambios
+# --history_table (SCD2: una fila por tramo con la misma tasa) y la vista
+# --daily_view que la expande de nuevo a días con la tasa vigente (fines de
+# semana y feriados llevan la del último día observado). El merge solo agrega
+# o corrige días: lo que un dt reprocesado deja de traer sigue en la historia.
+#
+# Con --refresh_marts true (default) al final lleva los marts de tipo de cambio
+# (marts.py: mart_fx_daily y mart_fx_market) al snapshot nuevo, recalculando
+# solo las particiones (divisa, mes) de los dt que cambiaron. Corre en el
+# driver con pandas: son unas cuantas filas por banco y día.
+#
+# awsglue solo se importa en main(): run() recibe una SparkSession cualquiera
+# (p. ej. local[*] en playground/bench_fact_build.py) y el `sql` del catálogo.
+#
+# Requiere fact_rules.py, spark_engine.py, gold_catalog.py, gold_snapshots.py y marts.py en --extra-py-files
+# (la misma lógica corre sin Spark en local_engine.py) y
+# --additional-python-modules boto3>=1.36: el commit del snapshot y los
+# manifests usan PutObject con If-None-Match/If-Match, que el boto3 de Glue 4.0
+# no conoce. run() lo verifica antes de leer Silver.
 import sys
-from awsglue.utils import getResolvedOptions
-from pyspark.sql import functions as F
-from pyspark.sql import Window
-from pyspark.sql.types import *
+import json
 
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
-args = getResolvedOptions(
-    sys.argv,
-    ["JOB_NAME", "silver_path", "gold_path", "catalog_db", "gold_table"]
+import gold_catalog
+import gold_snapshots
+import marts
+import spark_engine
+from fact_rules import (
+    HISTORY_DIR, HISTORY_SCHEMA_DDL, MANIFEST_DIR, REJECT_REASONS, SILVER_FILE, SILVER_PART_GLOB, SILVER_SCHEMA_DDL,
+    manifest_files, manifest_path, silver_dt,
 )
 
-silver_path   = args["silver_path"].rstrip("/")
-gold_path     = args["gold_path"].rstrip("/")
-catalog_db    = args["catalog_db"]
-gold_table    = args["gold_table"]
-dt            = datetime.now().strftime("%Y-%m-%d") #args["dt"]  # YYYY-MM-DD
-
-from pyspark.context import SparkContext
-from awsglue.context import GlueContext
-sc = SparkContext.getOrCreate()
-glue = GlueContext(sc)
-spark = glue.spark_session
-
-# 1) DB en Glue Catalog
-spark.sql(f"CREATE DATABASE IF NOT EXISTS {catalog_db}")
-
-# 2) Leer todos los Parquet Silver del día (todas las entidades)
-input_glob = f"{silver_path}/*/{dt}/fact_rates_staging.parquet"
-df = spark.read.parquet(input_glob)
-
-# Esperado en Silver:
-# date (string/obj), entity__id (long), product__id (long), rate (double),
-# ingestion_ts (string/obj), source_file (string)
-
-# 3) Tipos + normalización de nombres
-df = (
-    df
-    .withColumn("date", F.to_date("date"))  # a DATE
-    .withColumn("ingestion_ts", F.to_timestamp("ingestion_ts"))
-    .withColumnRenamed("entity__id", "entity_id")
-    .withColumnRenamed("product__id", "product_id")
-    .withColumn("entity_id", F.col("entity_id").cast(IntegerType()))
-    .withColumn("product_id", F.col("product_id").cast(IntegerType()))
-    .withColumn("rate", F.col("rate").cast(DoubleType()))
-    .withColumn("source_file", F.col("source_file").cast(StringType()))
-    .withColumn("dt", F.lit(dt))  # partición
-)
+REQUIRED_ARGS = ["JOB_NAME", "silver_path", "gold_path", "catalog_db", "gold_table"]
+OPTIONAL_ARGS = [
+    "mode", "dt", "start_dt", "end_dt", "state_path", "rejects_table",
+    "metrics_namespace", "dedup_strategy", "silver_input", "history_table", "daily_view",
+    "snapshot_retention_days", "refresh_marts",
+]
 
-# 4) Validaciones y rejects
-valid = (
-    F.col("date").isNotNull() &
-    F.col("entity_id").isNotNull() &
-    F.col("product_id").isNotNull() &
-    F.col("rate").isNotNull() &
-    (F.col("rate") > F.lit(0.0)) & (F.col("rate") < F.lit(200.0))
-)
 
-df_valid = df.where(valid)
-df_rejects = (
-    df
-    .withColumn(
-        "reject_reason",
-        F.when(F.col("date").isNull(), "NULL_date")
-         .when(F.col("entity_id").isNull(), "NULL_entity_id")
-         .when(F.col("product_id").isNull(), "NULL_product_id")
-         .when(F.col("rate").isNull(), "NULL_rate")
-         .when(~((F.col("rate") > 0.0) & (F.col("rate") < 200.0)), "rate_out_of_range")
-         .otherwise("unknown")
-    )
-    .where(~valid)
-)
+def job_options(args):
+    """
+    Opciones del job: las requeridas de `args` más las opcionales presentes;
+    el resto toma su default. Valida los valores.
+    """
+    gold_path = args["gold_path"].rstrip("/")
+    options = {
+        "mode": "daily",
+        "dt": datetime.now().strftime("%Y-%m-%d"),  # YYYY-MM-DD, solo en modo daily
+        "start_dt": "",  # YYYY-MM-DD, solo en modo backfill
+        "end_dt": "",    # YYYY-MM-DD, solo en modo backfill (incluido)
+        "state_path": f"{gold_path}/_state/fact_rates_watermark.json",
+        "rejects_table": f"{args['gold_table']}_rejects",
+        "history_table": f"{args['gold_table']}_history",
+        "daily_view": f"{args['gold_table']}_daily",
+        "metrics_namespace": "ProyectoDivisas/FactRates",  # vacío = no publicar en CloudWatch
+        "dedup_strategy": "window",  # window | max_struct (ver spark_engine.DEDUP_STRATEGIES)
+        "silver_input": "manifest",  # manifest | listing
+        "snapshot_retention_days": str(gold_snapshots.RETENTION_DAYS),  # time travel hacia atrás
+        "refresh_marts": "true",  # true | false
+        **args,
+        "silver_path": args["silver_path"].rstrip("/"),
+        "gold_path": gold_path,
+    }
+    if options["mode"] not in ("daily", "incremental", "backfill"):
+        raise ValueError(f"--mode debe ser daily, incremental o backfill, no {options['mode']!r}")
+    if options["mode"] == "backfill" and not (options["start_dt"] and options["end_dt"]):
+        raise ValueError("--mode backfill requiere --start_dt y --end_dt")
+    if options["silver_input"] not in ("manifest", "listing"):
+        raise ValueError(f"--silver_input debe ser manifest o listing, no {options['silver_input']!r}")
+    try:
+        options["snapshot_retention_days"] = float(options["snapshot_retention_days"])
+    except ValueError:
+        raise ValueError(f"--snapshot_retention_days debe ser un número, no {options['snapshot_retention_days']!r}")
+    if options["refresh_marts"] not in ("true", "false"):
+        raise ValueError(f"--refresh_marts debe ser true o false, no {options['refresh_marts']!r}")
+    if options["dedup_strategy"] not in spark_engine.DEDUP_STRATEGIES:
+        raise ValueError(
+            f"--dedup_strategy debe ser una de {list(spark_engine.DEDUP_STRATEGIES)}, no {options['dedup_strategy']!r}"
+        )
+    return options
 
-# 5) Dedup por clave de negocio (date, entity_id, product_id) – conserva el más reciente por ingestion_ts
-w = Window.partitionBy("date", "entity_id", "product_id").orderBy(F.col("ingestion_ts").desc_nulls_last())
-df_dedup = (
-    df_valid
-    .withColumn("rn", F.row_number().over(w))
-    .where(F.col("rn") == 1)
-    .drop("rn")
-)
 
-# Hash de negocio (auditoría)
-df_dedup = df_dedup.withColumn(
-    "business_hash",
-    F.sha2(F.concat_ws("||",
-                       F.col("date").cast("string"),
-                       F.col("entity_id").cast("string"),
-                       F.col("product_id").cast("string"),
-                       F.coalesce(F.col("rate").cast("string"), F.lit(""))
-    ), 256)
-)
+def configure(spark):
+    """Ajustes de la sesión para el job; devuelve las particiones de shuffle."""
+    # Solo se reemplazan las particiones dt presentes en el DataFrame que se escribe
+    spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
+
+    # Particiones de shuffle según el tamaño del cluster (núcleos de todos los
+    # workers), no el 200 fijo: un backfill de meses usa todo el cluster y un día
+    # suelto no deja cientos de tareas vacías (AQE junta las que queden chicas)
+    shuffle_partitions = max(8, 2 * spark.sparkContext.defaultParallelism)
+    spark.conf.set("spark.sql.shuffle.partitions", str(shuffle_partitions))
+    spark.conf.set("spark.sql.adaptive.enabled", "true")
+    spark.conf.set("spark.sql.adaptive.coalescePartitions.enabled", "true")
+    return shuffle_partitions
+
+
+def hadoop_path(spark, path):
+    jvm = spark.sparkContext._jvm
+    hpath = jvm.org.apache.hadoop.fs.Path(path)
+    return hpath, hpath.getFileSystem(spark.sparkContext._jsc.hadoopConfiguration())
+
+
+def delete_path(spark, path):
+    hpath, fs = hadoop_path(spark, path)
+    if fs.exists(hpath):
+        fs.delete(hpath, True)
+
+
+def date_range(start, end):
+    """dt de `start` a `end` (YYYY-MM-DD, ambos incluidos)."""
+    first, last = date.fromisoformat(start), date.fromisoformat(end)
+    if first > last:
+        raise ValueError(f"--start_dt {start} es posterior a --end_dt {end}")
+    return [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+
+
+def list_silver_files(spark, root, dts=None):
+    """
+    {ruta: modificationTime (ms)} de los archivos Silver en los dos layouts
+    (entity=*/dt=*/part-*.parquet y */<dt>/fact_rates_staging.parquet). Con
+    `dts` el glob recorre solo las carpetas de esos dt.
+    """
+    dt_glob = "{" + ",".join(sorted(dts)) + "}" if dts else "*"
+    files = {}
+    for pattern in (f"{root}/entity=*/dt={dt_glob}/{SILVER_PART_GLOB}", f"{root}/*/{dt_glob}/{SILVER_FILE}"):
+        hpattern, fs = hadoop_path(spark, pattern)
+        statuses = fs.globStatus(hpattern) or []
+        files.update({status.getPath().toString(): status.getModificationTime() for status in statuses})
+    return files
+
+
+def list_manifests(spark, root):
+    """{dt: modificationTime (ms)} de los manifests de Silver (una sola carpeta, sin recorrer Silver)."""
+    hpath, fs = hadoop_path(spark, f"{root}/{MANIFEST_DIR}")
+    if not fs.exists(hpath):
+        return {}
+    return {
+        status.getPath().getName()[:-len(".json")]: status.getModificationTime()
+        for status in fs.listStatus(hpath)
+        if status.getPath().getName().endswith(".json")
+    }
+
+
+def read_json(spark, path, default):
+    """JSON en S3/HDFS (marca de agua, manifests); `default` si no existe."""
+    hpath, fs = hadoop_path(spark, path)
+    if not fs.exists(hpath):
+        return default
+    stream = fs.open(hpath)
+    try:
+        text = spark.sparkContext._jvm.org.apache.commons.io.IOUtils.toString(stream, "UTF-8")
+    finally:
+        stream.close()
+    return json.loads(text)
+
+
+def write_json(spark, path, state):
+    hpath, fs = hadoop_path(spark, path)
+    stream = fs.create(hpath, True)
+    try:
+        stream.write(bytearray(json.dumps(state, indent=2, sort_keys=True).encode("utf-8")))
+    finally:
+        stream.close()
 
-# 6) Crear tabla Gold si no existe (Parquet particionado por dt)
-gold_location = f"{gold_path}/fact_rates"
-spark.sql(f"""
-CREATE EXTERNAL TABLE IF NOT EXISTS {catalog_db}.{gold_table} (
+
+def emit_metrics(counts, job_name, namespace):
+    """
+    Filas válidas y rechazadas por motivo como métricas de CloudWatch
+    (dimensiones JobName y Reason). Si falla solo se avisa en el log.
+    """
+    valid_rows = sum(n for (_, reason), n in counts.items() if reason is None)
+    by_reason = {}
+    for (_, reason), n in counts.items():
+        if reason is not None:
+            by_reason[reason] = by_reason.get(reason, 0) + n
+    print(json.dumps({"metric": "fact_rates", "valid_rows": valid_rows, "rejected_rows": by_reason}))
+    if not namespace:
+        return
+
+    job = [{"Name": "JobName", "Value": job_name}]
+    metric_data = [{"MetricName": "ValidRows", "Dimensions": job, "Value": valid_rows, "Unit": "Count"}]
+    metric_data += [
+        {"MetricName": "RejectedRows", "Dimensions": job + [{"Name": "Reason", "Value": reason}],
+         "Value": by_reason.get(reason, 0), "Unit": "Count"}
+        for reason in REJECT_REASONS
+    ]
+    try:
+        import boto3
+        boto3.client("cloudwatch").put_metric_data(Namespace=namespace, MetricData=metric_data)
+    except Exception as e:
+        print(f"Warning: no se pudieron publicar las métricas: {e}")
+
+
+def replace_partitions(spark, sql, frame, table, location, dts_with_rows, affected_dts, shuffle_partitions):
+    """
+    Overwrite dinámico de `frame` y registro de sus particiones. Los dt
+    afectados que ya no tienen filas se borran de S3 y del catálogo.
+    """
+    if dts_with_rows:
+        # Una tarea por (dt, entidad): con muchos dt el trabajo se reparte en
+        # todo el cluster y cada partición queda en pocos archivos
+        (frame
+         .repartition(shuffle_partitions, "dt", "entity_id")
+         .write.mode("overwrite").partitionBy("dt").parquet(location))
+        gold_catalog.register_partitions(sql, table, location, dts_with_rows)
+    stale = sorted(set(affected_dts) - set(dts_with_rows))
+    for stale_dt in stale:
+        delete_path(spark, gold_catalog.partition_location(location, stale_dt))
+    gold_catalog.drop_partitions(sql, table, stale)
+
+
+def commit_gold(sql, frame, table, location, dts_with_rows, affected_dts, shuffle_partitions, run_id):
+    """
+    Escribe Gold de la corrida en run=<run_id>/dt=<dt>, lo confirma como un
+    snapshot que reemplaza los dt afectados (los que ya no tienen filas salen
+    de la tabla) y apunta el catálogo a las carpetas nuevas.
+
+    Returns:
+        dict: El snapshot confirmado
+    """
+    files = {}
+    if dts_with_rows:
+        run_location = gold_snapshots.run_location(location, run_id)
+        # Una tarea por (dt, entidad), como el resto de la escritura
+        (frame
+         .repartition(shuffle_partitions, "dt", "entity_id")
+         .write.mode("errorifexists").partitionBy("dt").parquet(run_location))
+        files = gold_snapshots.run_files(run_location)
+    stale = sorted(set(affected_dts) - set(dts_with_rows))
+    snapshot = gold_snapshots.commit(location, {**{dt: [] for dt in stale}, **files}, "replace", run_id)
+    print(f"Snapshot {snapshot['snapshot_id']} de {table}: {json.dumps(snapshot['summary'])}")
+
+    if dts_with_rows:
+        gold_catalog.register_partitions(
+            sql, table, location, dts_with_rows,
+            locations={dt: gold_snapshots.data_location(location, run_id, dt) for dt in dts_with_rows},
+        )
+    gold_catalog.drop_partitions(sql, table, stale)
+    return snapshot
+
+
+def select_inputs(spark, options, watermark):
+    """
+    dt afectados y archivos Silver a leer según --mode y --silver_input.
+
+    Returns:
+        tuple: (dts, input_files, versions) donde `versions` es lo que se
+        guarda en la marca de agua al terminar ({dt: mtime} de los manifests
+        o {ruta: mtime} de los archivos)
+    """
+    silver_path, mode = options["silver_path"], options["mode"]
+
+    if options["silver_input"] == "manifest":
+        manifests = list_manifests(spark, silver_path)
+        if mode == "incremental":
+            # Manifests nuevos o que cambiaron (un cleaner escribió o reescribió
+            # un archivo de ese día) desde la última corrida
+            processed = watermark.get("manifests", {})
+            dts = sorted(manifest_dt for manifest_dt, mtime in manifests.items()
+                         if processed.get(manifest_dt) != mtime)
+        elif mode == "backfill":
+            dts = date_range(options["start_dt"], options["end_dt"])
+        else:
+            dts = [options["dt"]]
+        # Un dt afectado se recalcula completo: todo lo que lista su manifest
+        input_files = []
+        for input_dt in dts:
+            input_files += manifest_files(read_json(spark, manifest_path(silver_path, input_dt), {"files": []}), input_dt)
+        versions = {d: manifests[d] for d in dts if d in manifests}
+    else:
+        if mode == "incremental":
+            silver_files = list_silver_files(spark, silver_path)
+            # Nuevos o reescritos (p. ej. Banxico del día hábil anterior, o Silver que
+            # llegó después de la corrida) desde la última vez
+            processed = watermark.get("files", {})
+            changed = [path for path, mtime in silver_files.items() if processed.get(path) != mtime]
+            dts = sorted({silver_dt(path) for path in changed} - {None})
+        else:
+            dts = date_range(options["start_dt"], options["end_dt"]) if mode == "backfill" else [options["dt"]]
+            # El glob baja solo a las carpetas de esos dt
+            silver_files = list_silver_files(spark, silver_path, dts)
+        # Un dt afectado se recalcula completo: todas sus entidades, no solo lo nuevo
+        input_files = sorted(path for path in silver_files if silver_dt(path) in dts)
+        versions = {path: silver_files[path] for path in input_files}
+
+    if mode == "backfill":
+        # Días del rango sin Silver (fines de semana, antes de que existiera una
+        # fuente) no se tocan: su Gold, si lo hay, se queda como está
+        dts = sorted({silver_dt(path) for path in input_files})
+    return dts, input_files, versions
+
+
+def create_tables(sql, options, gold_location, rejects_location):
+    catalog_db = options["catalog_db"]
+    sql(f"CREATE DATABASE IF NOT EXISTS {catalog_db}")
+
+    # Gold (Parquet particionado por dt)
+    sql(f"""
+CREATE EXTERNAL TABLE IF NOT EXISTS {catalog_db}.{options['gold_table']} (
   `date`          DATE,
   `entity_id`     INT,
   `product_id`    INT,
@@ -110,14 +350,204 @@ STORED AS PARQUET
 LOCATION '{gold_location}'
 """)
 
-# 7) Escribir Gold (append particionado)
-(df_dedup
- .select("date","entity_id","product_id","rate","ingestion_ts","source_file","business_hash","dt")
- .write
- .mode("append")
- .partitionBy("dt")
- .parquet(gold_location)
+    # Cuarentena: mismas columnas que Silver tipado + motivo, junto a Gold
+    sql(f"""
+CREATE EXTERNAL TABLE IF NOT EXISTS {catalog_db}.{options['rejects_table']} (
+  `date`          DATE,
+  `entity_id`     INT,
+  `product_id`    INT,
+  `rate`          DOUBLE,
+  `ingestion_ts`  TIMESTAMP,
+  `source_file`   STRING,
+  `reject_reason` STRING
+)
+PARTITIONED BY (`dt` STRING)
+STORED AS PARQUET
+LOCATION '{rejects_location}'
+""")
+
+
+def update_history(spark, sql, options, gold, run_id):
+    """
+    Integra el Gold de la corrida a la historia de cambios (spark_engine.merge_history).
+
+    Cada versión se escribe completa en <gold_path>/fact_rates_history/v=<run_id>
+    y solo al final la tabla se apunta ahí (SET LOCATION), así que quien
+    consulta ve la versión anterior o la nueva. Se conservan esas dos.
+    """
+    catalog_db = options["catalog_db"]
+    table = f"{catalog_db}.{options['history_table']}"
+    root = f"{options['gold_path']}/{HISTORY_DIR}"
+    sql(f"""
+CREATE EXTERNAL TABLE IF NOT EXISTS {table} (
+  `entity_id`     INT,
+  `product_id`    INT,
+  `rate`          DOUBLE,
+  `rate_hash`     STRING,
+  `valid_from`    DATE,
+  `valid_to`      DATE,
+  `ingestion_ts`  TIMESTAMP,
+  `source_file`   STRING
 )
+STORED AS PARQUET
+LOCATION '{root}/v=0'
+""")
+
+    current = gold_catalog.table_location(sql, table)
+    hpath, fs = hadoop_path(spark, current)
+    if fs.exists(hpath) and any(s.getPath().getName().endswith(".parquet") for s in fs.listStatus(hpath)):
+        history = spark.read.schema(HISTORY_SCHEMA_DDL).parquet(current)
+    else:
+        history = spark.createDataFrame([], HISTORY_SCHEMA_DDL)
+
+    new_location = f"{root}/v={run_id}"
+    (spark_engine.merge_history(history, gold)
+     .repartition("entity_id")
+     .sortWithinPartitions("entity_id", "product_id", "valid_from")
+     .write.mode("errorifexists").parquet(new_location))
+    gold_catalog.set_table_location(sql, table, new_location)
+
+    keep = {f"v={run_id}", current.rstrip("/").rsplit("/", 1)[-1]}
+    root_path, root_fs = hadoop_path(spark, root)
+    for status in root_fs.listStatus(root_path):
+        if status.isDirectory() and status.getPath().getName() not in keep:
+            delete_path(spark, status.getPath().toString())
+
+    # Vista diaria: cada tramo expandido a sus días (una fila por día y producto, como Gold)
+    sql(f"""
+CREATE OR REPLACE VIEW {catalog_db}.{options['daily_view']} AS
+SELECT d.`date`, h.entity_id, h.product_id, h.rate, h.rate_hash, h.valid_from, h.valid_to
+FROM {table} h
+LATERAL VIEW explode(sequence(h.valid_from, h.valid_to)) d AS `date`
+""")
+    return new_location
+
+
+def run(spark, options, sql=None):
+    """
+    Corre el job con una SparkSession ya creada.
+
+    Args:
+        spark: SparkSession (Glue o local)
+        options: Salida de job_options
+        sql: Callable para el catálogo (default spark.sql; p. ej. LocalMetastore().sql)
+
+    Returns:
+        dict: dt afectados, archivos leídos, filas válidas/rechazadas y dt escritos
+    """
+    sql = sql or spark.sql
+    from pyspark import StorageLevel
+
+    # Antes de escribir nada: sin escrituras condicionales el commit no puede ser atómico
+    gold_snapshots.require_conditional_put(options["gold_path"])
+    mode, silver_input = options["mode"], options["silver_input"]
+    shuffle_partitions = configure(spark)
+
+    # 0) Qué archivos Silver hay que leer. La marca de agua guarda el
+    #    modificationTime de cada manifest (o de cada archivo, con listing)
+    watermark = read_json(spark, options["state_path"], {"files": {}})
+    dts, input_files, versions = select_inputs(spark, options, watermark)
+    print(f"[{mode}/{silver_input}] dt afectados: {dts or 'ninguno'} ({len(input_files)} archivos Silver)")
+
+    # 1-2) Leer los Parquet Silver de los dt afectados (todas las entidades) en
+    #      un solo DataFrame: en backfill todo el rango entra al mismo plan
+    if not input_files:
+        if mode == "daily":
+            raise FileNotFoundError(f"No hay archivos Silver para dt={options['dt']} en {options['silver_path']}")
+        if mode == "backfill":
+            raise FileNotFoundError(
+                f"No hay archivos Silver entre {options['start_dt']} y {options['end_dt']} en {options['silver_path']}"
+            )
+        print("Sin archivos Silver nuevos desde la última corrida; nada que hacer")
+        return {"dts": [], "silver_files": 0}
+    if silver_input == "manifest":
+        df = spark.read.schema(SILVER_SCHEMA_DDL).parquet(*input_files)
+    else:
+        df = spark.read.parquet(*input_files)
+
+    # 3-4) Tipos y motivo de rechazo por fila en una sola pasada. Se persiste una
+    #      vez: de aquí salen Gold, la cuarentena y las métricas sin releer Silver
+    tagged = spark_engine.tag_rows(df).persist(StorageLevel.MEMORY_AND_DISK)
+    counts = spark_engine.reject_counts(tagged)  # materializa el persist
+    emit_metrics(counts, options["JOB_NAME"], options["metrics_namespace"])
+
+    # 5) Dedup por clave de negocio (--dedup_strategy) y hash (spark_engine).
+    #    Gold se usa tres veces (dt, escritura, historia): se persiste también
+    df_dedup, df_rejects = spark_engine.split(tagged, options["dedup_strategy"])
+    df_dedup = df_dedup.persist(StorageLevel.MEMORY_AND_DISK)
+
+    # 6) Crear las tablas Gold y de cuarentena si no existen
+    gold_location = f"{options['gold_path']}/fact_rates"
+    rejects_location = f"{options['gold_path']}/fact_rates_rejects"
+    create_tables(sql, options, gold_location, rejects_location)
+
+    # 7-8) Escribir Gold (snapshot nuevo con solo los dt recalculados) y la
+    #      cuarentena (overwrite dinámico) y registrar en Glue Catalog
+    #      exactamente esas particiones (sin MSCK REPAIR, que recorre toda la
+    #      historia de la tabla)
+    catalog_db = options["catalog_db"]
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    gold_dts = sorted(row["dt"] for row in df_dedup.select("dt").distinct().collect())
+    reject_dts = sorted({row_dt for (row_dt, reason) in counts if reason is not None})
+    snapshot = commit_gold(sql, df_dedup, f"{catalog_db}.{options['gold_table']}", gold_location,
+                           gold_dts, dts, shuffle_partitions, run_id)
+    replace_partitions(spark, sql, df_rejects, f"{catalog_db}.{options['rejects_table']}", rejects_location,
+                       reject_dts, dts, shuffle_partitions)
+
+    # 8b) Historia de cambios y vista diaria
+    history_location = update_history(spark, sql, options, df_dedup, run_id)
+    df_dedup.unpersist()
+    tagged.unpersist()
+
+    # 8c) Snapshots fuera de la ventana de time travel y archivos sin referencia
+    print(json.dumps({"expired": gold_snapshots.expire_snapshots(gold_location, options["snapshot_retention_days"])}))
+
+    # 8d) Marts de tipo de cambio: solo las particiones de los dt que cambiaron
+    marts_report = None
+    if options["refresh_marts"] == "true":
+        marts.create_tables(sql, catalog_db, options["gold_path"])
+        marts_report = marts.refresh(options["gold_path"])
+        print(json.dumps({"marts": marts_report}))
+
+    # 9) Avanzar la marca de agua solo después de escribir Gold: si algo falla,
+    #    la siguiente corrida vuelve a tomar los mismos dt
+    key = "manifests" if silver_input == "manifest" else "files"
+    write_json(spark, options["state_path"], {
+        "files": watermark.get("files", {}),
+        "manifests": watermark.get("manifests", {}),
+        key: {**watermark.get(key, {}), **versions},
+        "last_run_at": datetime.now().isoformat(),
+        "last_mode": mode,
+        "last_dts": dts,
+    })
+    return {
+        "dts": dts,
+        "silver_files": len(input_files),
+        "valid_rows": sum(n for (_, reason), n in counts.items() if reason is None),
+        "rejected_rows": sum(n for (_, reason), n in counts.items() if reason is not None),
+        "gold_dts": gold_dts,
+        "snapshot_id": snapshot["snapshot_id"],
+        "history_location": history_location,
+        "marts": marts_report,
+    }
+
+
+def main():
+    from awsglue.utils import getResolvedOptions
+    from pyspark.context import SparkContext
+    from awsglue.context import GlueContext
+
+    args = getResolvedOptions(sys.argv, REQUIRED_ARGS)
+    # getResolvedOptions solo acepta argumentos presentes; el resto toma su default
+    present = [name for name in OPTIONAL_ARGS if f"--{name}" in sys.argv]
+    if present:
+        args.update(getResolvedOptions(sys.argv, present))
+    options = job_options(args)
+
+    sc = SparkContext.getOrCreate()
+    spark = GlueContext(sc).spark_session
+    print(json.dumps(run(spark, options)))
+
 
-# 8) Registrar particiones en Glue Catalog
-spark.sql(f"MSCK REPAIR TABLE {catalog_db}.{gold_table}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
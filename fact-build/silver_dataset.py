@@ -0,0 +1,499 @@
+"""
+Silver como dataset de Arrow particionado al estilo Hive: escritura por
+append, manifests por dt, compactación periódica y un resumen _metadata.
+
+Layout bajo <silver_path> (p. ej. s3://scrapping-divisas/silver):
+
+    entity=<entidad>/dt=<YYYY-MM-DD>/part-<ts>-<id>.parquet   datos; cada escritura agrega un part, nada se sobrescribe
+    _manifests/<YYYY-MM-DD>.json                              parts vigentes de cada dt y los reemplazados
+    _metadata                                                 footers de los parts vigentes (resumen del dataset)
+    _common_metadata                                          solo el esquema
+
+Los cleaners (cleaning/*/silver_manifest.py) suben un part con nombre único y
+lo anotan en el manifest del dt; un part nuevo reemplaza en el manifest al de
+la misma entidad y el mismo objeto de bronze, y el reemplazado pasa a
+"superseded". El layout anterior, <entidad>/<dt>/fact_rates_staging.parquet,
+se sigue leyendo y compact lo migra.
+
+Las rutas de un manifest se resuelven relativas a <silver_path> (sus tres
+últimos segmentos): el manifest que escribieron las Lambdas en S3 sirve igual
+sobre una copia local del bucket (playground/pipeline_harness.py).
+
+Lectura, sin listar Silver completo:
+- input_files(silver_path, dts): los archivos de esos dt según su manifest; los
+  dt sin manifest (historia anterior) se listan solo en sus carpetas. Es lo que
+  lee local_engine.py; rates.py lee los mismos manifests desde Spark.
+- dataset(silver_path, dts=None, entities=None): pyarrow Dataset con las
+  columnas de partición entity y dt, solo con los archivos de las particiones
+  pedidas. Para los dt cuyo manifest no cambió desde el último resumen, los
+  fragments salen de _metadata con las estadísticas de cada row group: un
+  filtro descarta row groups sin abrir los archivos. Los dt que cambiaron
+  después se leen de su manifest.
+
+Mantenimiento (compact, periódico; p. ej. una vez al día):
+- junta los parts de cada (entidad, dt) de más de --min-age-days en uno solo,
+  ordenado por producto y fecha, y lo cambia en el manifest con una escritura
+  condicional (If-Match en S3); si un cleaner escribió en medio, ese dt se
+  deja para la siguiente corrida
+- borra los archivos reemplazados hace más de GRACE_HOURS: un job que leyó el
+  manifest anterior todavía puede leerlos
+- reescribe _metadata y _common_metadata con los footers de todos los parts
+  vigentes (los dt con archivos del layout anterior sin migrar quedan fuera)
+
+No depende de Spark; corre en una laptop o en una Lambda programada (`handler`).
+
+Uso:
+    python fact-build/silver_dataset.py --silver-path output/silver compact
+    python fact-build/silver_dataset.py --silver-path output/silver files --dt 2025-11-08 --entity klar
+    python fact-build/silver_dataset.py --silver-path output/silver summary
+"""
+import argparse
+import json
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+from fact_rules import MANIFEST_DIR, SILVER_FILE, manifest_files, silver_partition
+from gold_snapshots import require_conditional_put, resolve
+
+# Mismo esquema que escriben los cleaners (cleaning/*/silver_manifest.py)
+SILVER_SCHEMA = pa.schema([
+    ("date", pa.string()),
+    ("entity__id", pa.int64()),
+    ("product__id", pa.int64()),
+    ("rate", pa.float64()),
+    ("ingestion_ts", pa.string()),
+    ("source_file", pa.string()),
+    ("business_hash", pa.string()),
+])
+PARTITION_SCHEMA = pa.schema([("entity", pa.string()), ("dt", pa.string())])
+SUMMARY_FILE = "_metadata"
+COMMON_METADATA_FILE = "_common_metadata"
+# {dt: mtime del manifest} que refleja el resumen, en los metadatos del esquema
+SUMMARY_KEY = b"silver.manifests"
+SORT_KEYS = [("product__id", "ascending"), ("date", "ascending"), ("ingestion_ts", "ascending")]
+CONFLICT_CODES = {"PreconditionFailed", "ConditionalRequestConflict"}
+MIN_AGE_DAYS = 1
+LOOKBACK_DAYS = 30
+GRACE_HOURS = 6
+READ_THREADS = 16
+
+
+# Rutas
+
+def _fs_path(uri):
+    return uri.split("://", 1)[1] if "://" in uri else uri
+
+
+def local_path(root, path):
+    """Ruta en el filesystem de <silver_path> de un archivo de manifest (sus tres últimos segmentos)."""
+    return f"{root}/{'/'.join(_fs_path(path).split('/')[-3:])}"
+
+
+def is_part(path):
+    return os.path.basename(path).startswith("part-") and "/entity=" in path
+
+
+def part_path(root, entity, dt):
+    """Ruta nueva y única de un part de (entidad, dt)."""
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    return f"{root}/entity={entity}/dt={dt}/part-{stamp}-{uuid.uuid4().hex[:8]}.parquet"
+
+
+def _same_prefix(like, path, root):
+    """`path` escrita como las rutas del manifest (p. ej. s3://bucket/silver/...), a partir de una de ellas."""
+    return f"{like.rsplit('/', 3)[0]}/{path[len(root) + 1:]}"
+
+
+def _stamp(mtime):
+    return mtime.isoformat() if mtime else None
+
+
+# Manifests
+
+def list_manifests(fs, root):
+    """{dt: mtime} de los manifests (una sola carpeta, sin recorrer Silver)."""
+    selector = pafs.FileSelector(f"{root}/{MANIFEST_DIR}", allow_not_found=True)
+    return {
+        info.base_name[:-len(".json")]: info.mtime
+        for info in fs.get_file_info(selector)
+        if info.type == pafs.FileType.File and info.base_name.endswith(".json")
+    }
+
+
+def manifest_location(root, dt):
+    return f"{root}/{MANIFEST_DIR}/{dt}.json"
+
+
+def read_manifest(fs, root, dt):
+    """Manifest de `dt`; None si no existe."""
+    try:
+        with fs.open_input_stream(manifest_location(root, dt)) as f:
+            return json.loads(f.read())
+    except FileNotFoundError:
+        return None
+
+
+def _read_versioned(fs, path):
+    """(manifest, versión) para reemplazarlo después con _replace_if_unchanged."""
+    if isinstance(fs, pafs.S3FileSystem):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        bucket, key = path.split("/", 1)
+        try:
+            response = boto3.client("s3").get_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None, None
+            raise
+        return json.loads(response["Body"].read()), response["ETag"]
+    try:
+        with fs.open_input_stream(path) as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return None, None
+    return json.loads(raw), raw
+
+
+def _replace_if_unchanged(fs, path, version, document):
+    """
+    Escribe `document` en `path` solo si sigue en `version`. True si lo escribió.
+    En S3 es atómico (If-Match, como los cleaners); en local se compara y se
+    reemplaza, suficiente para pruebas con un solo escritor a la vez.
+    """
+    body = json.dumps(document, indent=2).encode("utf-8")
+    if isinstance(fs, pafs.S3FileSystem):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        bucket, key = path.split("/", 1)
+        try:
+            boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json",
+                                          IfMatch=version)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in CONFLICT_CODES:
+                return False
+            raise
+    with fs.open_input_stream(path) as f:
+        if f.read() != version:
+            return False
+    staging = f"{path}.{uuid.uuid4().hex}.tmp"
+    with fs.open_output_stream(staging) as f:
+        f.write(body)
+    fs.move(staging, path)
+    return True
+
+
+# Lectura
+
+def list_partition_files(fs, root, dts, entities=None):
+    """
+    Archivos de los dt sin manifest, listando solo sus carpetas:
+    entity=<e>/dt=<dt>/part-*.parquet y <e>/<dt>/fact_rates_staging.parquet.
+    """
+    if not dts:
+        return []
+    folders = [info for info in fs.get_file_info(pafs.FileSelector(root, allow_not_found=True))
+               if info.type == pafs.FileType.Directory and not info.base_name.startswith(("_", "."))]
+    paths, legacy = [], []
+    for folder in folders:
+        hive = folder.base_name.startswith("entity=")
+        entity = folder.base_name[len("entity="):] if hive else folder.base_name
+        if entities and entity not in entities:
+            continue
+        for dt in dts:
+            if not hive:
+                legacy.append(f"{folder.path}/{dt}/{SILVER_FILE}")
+                continue
+            selector = pafs.FileSelector(f"{folder.path}/dt={dt}", allow_not_found=True)
+            paths += [info.path for info in fs.get_file_info(selector)
+                      if info.type == pafs.FileType.File and is_part(info.path) and info.path.endswith(".parquet")]
+    paths += [info.path for info in fs.get_file_info(legacy) if info.type == pafs.FileType.File]
+    return sorted(paths)
+
+
+def _input_paths(fs, root, dts, entities=None):
+    paths, unlisted = [], []
+    for dt in sorted(set(dts)):
+        manifest = read_manifest(fs, root, dt)
+        if manifest is None:
+            unlisted.append(dt)
+            continue
+        paths += [local_path(root, path) for path in manifest_files(manifest, dt)
+                  if not entities or silver_partition(path)[0] in entities]
+    return paths + list_partition_files(fs, root, unlisted, entities)
+
+
+def input_files(silver_path, dts, entities=None):
+    """
+    (filesystem, rutas) de los archivos Silver de los dt pedidos: los que
+    lista el manifest de cada dt, o los de sus carpetas si el dt no tiene
+    manifest (Silver anterior a los manifests).
+    """
+    fs, root = resolve(silver_path)
+    return fs, _input_paths(fs, root, dts, entities)
+
+
+def read_summary(fs, root):
+    """(dataset del resumen, {dt: mtime del manifest que refleja}); None si no hay resumen."""
+    path = f"{root}/{SUMMARY_FILE}"
+    if fs.get_file_info(path).type != pafs.FileType.File:
+        return None
+    summary = ds.parquet_dataset(path, filesystem=fs, partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"))
+    recorded = json.loads((summary.schema.metadata or {}).get(SUMMARY_KEY, b"{}"))
+    return summary, recorded
+
+
+def _partition_filter(dts, entities=None):
+    expression = pc.field("dt").isin(dts)
+    if entities:
+        expression = expression & pc.field("entity").isin(entities)
+    return expression
+
+
+def dataset(silver_path, dts=None, entities=None, use_summary=True):
+    """
+    pyarrow Dataset de Silver (SILVER_SCHEMA más entity y dt) con solo los
+    archivos de los dt y entidades pedidos (dts=None: todos los dt con manifest).
+
+    Los dt que el resumen refleja al día salen de _metadata; el resto, de su
+    manifest o de sus carpetas.
+    """
+    fs, root = resolve(silver_path)
+    manifests = list_manifests(fs, root)
+    wanted = sorted(set(dts)) if dts is not None else sorted(manifests)
+    fragments, covered = [], set()
+    summary = read_summary(fs, root) if use_summary and wanted else None
+    if summary is not None:
+        summary_dataset, recorded = summary
+        covered = {dt for dt in wanted if dt in manifests and recorded.get(dt) == _stamp(manifests[dt])}
+        if covered:
+            fragments += summary_dataset.get_fragments(filter=_partition_filter(sorted(covered), entities))
+
+    file_format = ds.ParquetFileFormat()
+    for path in _input_paths(fs, root, [dt for dt in wanted if dt not in covered], entities):
+        entity, dt = silver_partition(path)
+        partition = (pc.field("entity") == entity) & (pc.field("dt") == dt)
+        fragments.append(file_format.make_fragment(path, fs, partition_expression=partition))
+    schema = pa.schema(list(SILVER_SCHEMA) + list(PARTITION_SCHEMA))
+    return ds.FileSystemDataset(fragments, schema, file_format, fs)
+
+
+# Mantenimiento
+
+def _read_conformed(fs, path):
+    """Un archivo Silver con SILVER_SCHEMA (los del layout anterior pueden no traer business_hash)."""
+    with fs.open_input_file(path) as f:
+        table = pq.ParquetFile(f).read()
+    columns = [
+        table.column(field.name).cast(field.type) if field.name in table.column_names
+        else pa.nulls(table.num_rows, field.type)
+        for field in SILVER_SCHEMA
+    ]
+    return pa.Table.from_arrays(columns, schema=SILVER_SCHEMA)
+
+
+def _merge(fs, root, dt, entity, entries, written_at):
+    """Escribe los archivos de `entries` como un solo part ordenado; entrada de manifest del part."""
+    table = pa.concat_tables([_read_conformed(fs, local_path(root, entry["path"])) for entry in entries])
+    path = part_path(root, entity, dt)
+    fs.create_dir(path.rsplit("/", 1)[0])
+    pq.write_table(table.sort_by(SORT_KEYS), path, filesystem=fs)
+    sources = [entry["source"] for entry in entries if entry.get("source")]
+    sources += [source for entry in entries for source in entry.get("sources", [])]
+    entry = {"path": _same_prefix(entries[0]["path"], path, root), "entity": entity, "rows": table.num_rows,
+             "bytes": fs.get_file_info(path).size, "written_at": written_at, "compacted_from": len(entries)}
+    if sources:
+        entry["sources"] = sources
+    return path, entry
+
+
+def compact_dt(fs, root, dt, now, merge=True, min_parts=2, grace_hours=GRACE_HOURS):
+    """
+    Compacta un dt: junta los archivos de cada entidad con `min_parts` o más
+    (o con alguno del layout anterior) y borra los reemplazados hace más de
+    `grace_hours`. No hace nada si el manifest no cambiaría.
+
+    Returns:
+        dict: entidades compactadas, archivos juntados y borrados; conflict=True
+        si un cleaner cambió el manifest en medio (se reintenta en la siguiente corrida)
+    """
+    path = manifest_location(root, dt)
+    manifest, version = _read_versioned(fs, path)
+    report = {"dt": dt, "entities": [], "merged": 0, "deleted": 0}
+    if manifest is None:
+        return report
+
+    by_entity = {}
+    for entry in manifest["files"]:
+        by_entity.setdefault(entry["entity"], []).append(entry)
+    written, merged, new_entries = [], [], []
+    for entity, entries in sorted(by_entity.items()) if merge else []:
+        if len(entries) < min_parts and all(is_part(entry["path"]) for entry in entries):
+            continue
+        part, entry = _merge(fs, root, dt, entity, entries, now.isoformat())
+        written.append(part)
+        merged += entries
+        new_entries.append(entry)
+        report["entities"].append(entity)
+
+    files = [entry for entry in manifest["files"] if entry not in merged] + new_entries
+    live = {entry["path"] for entry in files}
+    superseded = manifest.get("superseded", []) + [{"path": entry["path"], "at": now.isoformat()} for entry in merged]
+    cutoff = now - timedelta(hours=grace_hours)
+    expired = [entry for entry in superseded if datetime.fromisoformat(entry["at"]) < cutoff or entry["path"] in live]
+    if not merged and not expired:
+        return report
+
+    # Se borran antes de confirmar: si el manifest cambió, siguen en superseded y se reintentan
+    for entry in expired:
+        if entry["path"] in live:
+            continue
+        try:
+            fs.delete_file(local_path(root, entry["path"]))
+            report["deleted"] += 1
+        except FileNotFoundError:
+            pass
+    document = {**manifest, "files": files, "superseded": [entry for entry in superseded if entry not in expired]}
+    if not _replace_if_unchanged(fs, path, version, document):
+        for part in written:
+            fs.delete_file(part)
+        return {**report, "entities": [], "conflict": True}
+    report["merged"] = len(merged)
+    return report
+
+
+def write_summary(silver_path):
+    """
+    Reescribe _metadata con los footers de todos los parts vigentes (relativos
+    a <silver_path>, con entity y dt en la ruta) y _common_metadata con el
+    esquema. Guarda el mtime de cada manifest leído para que dataset() sepa
+    qué dt reflejaba.
+
+    Returns:
+        dict: dt, archivos y row groups del resumen
+    """
+    fs, root = resolve(silver_path)
+    # El mtime se toma antes de leer cada manifest: si cambia en medio, el dt queda como desactualizado
+    manifests = list_manifests(fs, root)
+    paths_by_dt = {}
+    for dt in sorted(manifests):
+        manifest = read_manifest(fs, root, dt)
+        if manifest is not None:
+            paths_by_dt[dt] = [local_path(root, path) for path in manifest_files(manifest, dt)]
+
+    def footer(path):
+        with fs.open_input_file(path) as f:
+            return pq.ParquetFile(f).metadata
+
+    everything = [path for paths in paths_by_dt.values() for path in paths]
+    with ThreadPoolExecutor(READ_THREADS) as pool:
+        footers = dict(zip(everything, pool.map(footer, everything)))
+
+    collected, recorded = [], {}
+    for dt, paths in paths_by_dt.items():
+        # Solo dt con todos sus archivos en el layout y con el esquema declarado
+        if not all(is_part(path) and footers[path].schema.to_arrow_schema().equals(SILVER_SCHEMA) for path in paths):
+            continue
+        for path in paths:
+            footers[path].set_file_path(path[len(root) + 1:])
+            collected.append(footers[path])
+        recorded[dt] = _stamp(manifests[dt])
+
+    schema = SILVER_SCHEMA.with_metadata({SUMMARY_KEY: json.dumps(recorded, sort_keys=True)})
+    for name, collector in ((COMMON_METADATA_FILE, None), (SUMMARY_FILE, collected)):
+        staging = f"{root}/_{name}.{uuid.uuid4().hex}.tmp"
+        pq.write_metadata(schema, staging, metadata_collector=collector, filesystem=fs)
+        fs.move(staging, f"{root}/{name}")
+    return {"dts": len(recorded), "files": len(collected), "row_groups": sum(m.num_row_groups for m in collected)}
+
+
+def compact(silver_path, dts=None, min_age_days=MIN_AGE_DAYS, lookback_days=LOOKBACK_DAYS, min_parts=2,
+            grace_hours=GRACE_HOURS, summary=True, now=None):
+    """
+    Compacta los dt indicados, o los que tienen manifest en los últimos
+    `lookback_days` (0 = todos). Solo se juntan parts de dt con más de
+    `min_age_days`, cuando los cleaners ya no escriben en ellos; los
+    reemplazados se borran en todos. Con `summary` reescribe el resumen al final.
+
+    Returns:
+        dict: reporte por dt, totales y el del resumen
+    """
+    # Los manifests se reemplazan con If-Match: verificarlo antes de escribir parts compactados
+    require_conditional_put(silver_path)
+    fs, root = resolve(silver_path)
+    now = now or datetime.now()
+    if dts is None:
+        dts = sorted(list_manifests(fs, root))
+        if lookback_days > 0:
+            since = (now - timedelta(days=lookback_days)).date().isoformat()
+            dts = [dt for dt in dts if dt >= since]
+    closed = (now - timedelta(days=min_age_days)).date().isoformat()
+    reports = [compact_dt(fs, root, dt, now, merge=dt <= closed, min_parts=min_parts, grace_hours=grace_hours)
+               for dt in sorted(dts)]
+    return {
+        "dts": len(reports),
+        "partitions_compacted": sum(len(report["entities"]) for report in reports),
+        "files_merged": sum(report["merged"] for report in reports),
+        "files_deleted": sum(report["deleted"] for report in reports),
+        "conflicts": [report["dt"] for report in reports if report.get("conflict")],
+        "summary": write_summary(silver_path) if summary else None,
+        "by_dt": [report for report in reports if report["entities"] or report["deleted"] or report.get("conflict")],
+    }
+
+
+def handler(event, context):
+    """Lambda programada: {"silver_path": "s3://...", "dts": [...] opcional, "min_age_days", "lookback_days"}."""
+    try:
+        result = compact(event["silver_path"], event.get("dts"), event.get("min_age_days", MIN_AGE_DAYS),
+                         event.get("lookback_days", LOOKBACK_DAYS))
+        print(json.dumps(result))
+        return {"statusCode": 200, **result}
+    except Exception as e:
+        print(f"Critical error in handler: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"statusCode": 500, "body": f"Critical error: {str(e)}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--silver-path", required=True, help="raíz de Silver (local o s3://)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compaction = commands.add_parser("compact", help="juntar parts, borrar reemplazados y reescribir el resumen")
+    compaction.add_argument("--dt", action="append", help="YYYY-MM-DD; se puede repetir (default: --lookback-days)")
+    compaction.add_argument("--min-age-days", type=int, default=MIN_AGE_DAYS)
+    compaction.add_argument("--lookback-days", type=int, default=LOOKBACK_DAYS, help="0 = todos los dt")
+    compaction.add_argument("--min-parts", type=int, default=2)
+    compaction.add_argument("--grace-hours", type=float, default=GRACE_HOURS)
+    compaction.add_argument("--no-summary", action="store_true")
+    commands.add_parser("summary", help="reescribir solo _metadata y _common_metadata")
+    files = commands.add_parser("files", help="archivos que leería una consulta")
+    files.add_argument("--dt", action="append", help="YYYY-MM-DD; se puede repetir (default: todos)")
+    files.add_argument("--entity", action="append")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        result = compact(args.silver_path, args.dt, args.min_age_days, args.lookback_days, args.min_parts,
+                         args.grace_hours, summary=not args.no_summary)
+    elif args.command == "summary":
+        result = write_summary(args.silver_path)
+    else:
+        planned = dataset(args.silver_path, args.dt, args.entity)
+        result = {"files": len(planned.files), "rows": planned.count_rows(), "paths": planned.files}
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Transformaciones Spark del fact de tasas: Silver -> Gold + rejects, y la
+historia de cambios (SCD2) que se mantiene a partir de Gold.
+
+Las usa rates.py en Glue; no dependen de awsglue, así que también corren con
+una SparkSession local (ver playground/fact_engine_parity.py).
+"""
+from pyspark.sql import functions as F
+from pyspark.sql import Window
+from pyspark.sql.types import *
+
+from fact_rules import (
+    BUSINESS_KEY, DT_PATTERN, GOLD_COLUMNS, HISTORY_COLUMNS, HISTORY_KEY, RATE_MAX, RATE_MIN, REJECT_COLUMNS,
+)
+
+
+def cast_silver(df):
+    """
+    Tipos + normalización de nombres.
+
+    Esperado en Silver:
+    date (string/obj), entity__id (long), product__id (long), rate (double),
+    ingestion_ts (string/obj), source_file (string) y, desde que los cleaners
+    lo calculan, business_hash (string; null en archivos anteriores)
+    """
+    return (
+        df
+        .withColumn("date", F.to_date("date"))  # a DATE
+        .withColumn("ingestion_ts", F.to_timestamp("ingestion_ts"))
+        .withColumnRenamed("entity__id", "entity_id")
+        .withColumnRenamed("product__id", "product_id")
+        .withColumn("entity_id", F.col("entity_id").cast(IntegerType()))
+        .withColumn("product_id", F.col("product_id").cast(IntegerType()))
+        .withColumn("rate", F.col("rate").cast(DoubleType()))
+        .withColumn("source_file", F.col("source_file").cast(StringType()))
+        .withColumn("dt", F.regexp_extract(F.input_file_name(), DT_PATTERN, 1))  # partición = carpeta Silver
+    )
+
+
+def reject_reason():
+    """Motivo de rechazo (el primero que aplique); null si la fila es válida."""
+    return (
+        F.when(F.col("date").isNull(), "NULL_date")
+         .when(F.col("entity_id").isNull(), "NULL_entity_id")
+         .when(F.col("product_id").isNull(), "NULL_product_id")
+         .when(F.col("rate").isNull(), "NULL_rate")
+         .when(~((F.col("rate") > RATE_MIN) & (F.col("rate") < RATE_MAX)), "rate_out_of_range")
+    )
+
+
+def tag_rows(df):
+    """Silver crudo -> filas tipadas con reject_reason, en una sola pasada."""
+    return cast_silver(df).withColumn("reject_reason", reject_reason())
+
+
+def dedup_latest(df):
+    """Dedup por clave de negocio (date, entity_id, product_id) – conserva el más reciente por ingestion_ts."""
+    w = Window.partitionBy(*BUSINESS_KEY).orderBy(F.col("ingestion_ts").desc_nulls_last())
+    return (
+        df
+        .withColumn("rn", F.row_number().over(w))
+        .where(F.col("rn") == 1)
+        .drop("rn")
+    )
+
+
+def dedup_latest_max_struct(df):
+    """
+    Misma dedup como agregación: max(struct(ingestion_ts, resto)) por clave.
+
+    Sin ventana: el agregado parcial deja una fila por clave en cada
+    partición antes del shuffle, así que con duplicados se mueven menos bytes
+    que con row_number (que manda todas las filas y las ordena). Como el
+    struct lleva strings, Spark lo ejecuta con SortAggregate: sigue habiendo
+    un sort local, pero sobre datos ya reducidos del lado del reduce.
+
+    En la comparación de structs el null es el menor, así que un ingestion_ts
+    no nulo gana, igual que desc_nulls_last. Con empates de ingestion_ts
+    decide el resto de las columnas (determinista; la ventana elige cualquiera).
+    """
+    others = [c for c in df.columns if c not in BUSINESS_KEY and c != "ingestion_ts"]
+    latest = F.max(F.struct(F.col("ingestion_ts"), *[F.col(c) for c in others])).alias("latest")
+    return (
+        df
+        .groupBy(*BUSINESS_KEY)
+        .agg(latest)
+        .select(*[F.col(c) if c in BUSINESS_KEY else F.col(f"latest.{c}").alias(c) for c in df.columns])
+    )
+
+
+DEDUP_STRATEGIES = {
+    "window": dedup_latest,
+    "max_struct": dedup_latest_max_struct,
+}
+
+
+def add_business_hash(df):
+    """Hash de negocio (auditoría). Si Silver ya lo trae (cleaners), se usa ese."""
+    computed = F.sha2(F.concat_ws("||",
+                                  F.col("date").cast("string"),
+                                  F.col("entity_id").cast("string"),
+                                  F.col("product_id").cast("string"),
+                                  F.coalesce(F.col("rate").cast("string"), F.lit(""))
+    ), 256)
+    if "business_hash" in df.columns:
+        computed = F.coalesce(F.col("business_hash"), computed)
+    return df.withColumn("business_hash", computed)
+
+
+def split(tagged, dedup="window"):
+    """
+    Filas etiquetadas -> (gold, rejects). Conviene persistir `tagged` antes: se lee dos veces.
+
+    Args:
+        dedup: Estrategia de DEDUP_STRATEGIES ("window" o "max_struct").
+    """
+    if dedup not in DEDUP_STRATEGIES:
+        raise ValueError(f"Estrategia de dedup desconocida: {dedup!r} (opciones: {', '.join(DEDUP_STRATEGIES)})")
+    valid = tagged.where(F.col("reject_reason").isNull()).drop("reject_reason")
+    gold = add_business_hash(DEDUP_STRATEGIES[dedup](valid)).select(*GOLD_COLUMNS)
+    rejects = tagged.where(F.col("reject_reason").isNotNull()).select(*REJECT_COLUMNS)
+    return gold, rejects
+
+
+def reject_counts(tagged):
+    """{(dt, reject_reason): filas}; reject_reason None = filas válidas."""
+    return {
+        (row["dt"], row["reject_reason"]): row["count"]
+        for row in tagged.groupBy("dt", "reject_reason").count().collect()
+    }
+
+
+def build_fact(df, dedup="window"):
+    """
+    Silver crudo -> (gold, rejects), ambos con las columnas de fact_rules.
+
+    `df` debe venir de spark.read.parquet sobre archivos con el layout Silver
+    (dt se toma de la ruta de cada archivo).
+    """
+    return split(tag_rows(df), dedup)
+
+
+# Historia de cambios (SCD2)
+
+def add_rate_hash(df):
+    """
+    Hash de lo que se versiona en la historia: sha2(entity_id||product_id||rate).
+    A diferencia de business_hash no lleva date, así que solo cambia cuando
+    cambia la tasa.
+    """
+    return df.withColumn(
+        "rate_hash",
+        F.sha2(F.concat_ws("||",
+                           F.col("entity_id").cast("string"),
+                           F.col("product_id").cast("string"),
+                           F.coalesce(F.col("rate").cast("string"), F.lit(""))
+        ), 256)
+    )
+
+
+def history_intervals(daily):
+    """
+    Filas diarias con rate_hash -> tramos de HISTORY_COLUMNS. Empieza un tramo
+    nuevo solo cuando cambia rate_hash: los días sin observación (fines de
+    semana, feriados, filas rechazadas) no lo cortan. Un tramo llega hasta el
+    día anterior al siguiente y el último hasta la última observación, así que
+    expand_history da la tasa vigente en cada día natural. ingestion_ts y
+    source_file son los de la observación más reciente del tramo.
+    """
+    w = Window.partitionBy(*HISTORY_KEY).orderBy("date")
+    prev_hash = F.lag("rate_hash").over(w)
+    starts = prev_hash.isNull() | (prev_hash != F.col("rate_hash"))
+    intervals = (
+        daily
+        .withColumn("starts", starts.cast("int"))
+        .withColumn("interval", F.sum("starts").over(w.rowsBetween(Window.unboundedPreceding, Window.currentRow)))
+        .groupBy(*HISTORY_KEY, "interval")
+        .agg(
+            F.min(F.struct("date", "rate", "rate_hash")).alias("first"),
+            F.max("date").alias("last_seen"),
+            F.max(F.struct("ingestion_ts", "source_file")).alias("latest"),
+        )
+        .select(*HISTORY_KEY, "interval", "first.rate", "first.rate_hash", F.col("first.date").alias("valid_from"),
+                "last_seen", "latest.ingestion_ts", "latest.source_file")
+    )
+    next_from = F.lead("valid_from").over(Window.partitionBy(*HISTORY_KEY).orderBy("interval"))
+    return (
+        intervals
+        .withColumn("valid_to", F.coalesce(F.date_sub(next_from, 1), F.col("last_seen")))
+        .select(*HISTORY_COLUMNS)
+    )
+
+
+def expand_history(history):
+    """Tramos -> una fila por día (date, clave, rate, rate_hash, ingestion_ts, source_file)."""
+    return history.select(
+        F.explode(F.sequence("valid_from", "valid_to")).alias("date"),
+        *HISTORY_KEY, "rate", "rate_hash", "ingestion_ts", "source_file",
+    )
+
+
+def merge_history(history, gold):
+    """
+    Historia vigente + filas Gold de la corrida -> historia nueva.
+
+    Por clave se reabre el tramo vigente antes de la fecha más temprana de la
+    corrida (aunque termine días antes: la fila nueva puede continuarlo) y los
+    que le siguen: se expanden a días, se juntan con las filas nuevas y se
+    vuelve a comprimir. Si un día viene en ambos gana el ingestion_ts más
+    reciente (empate: la fila nueva), igual que la dedup de Gold; volver a
+    correr un dt viejo con el mismo Silver no pisa una corrección que llegó
+    después. El resto de la historia pasa sin cambios, así que el costo
+    depende de lo que trae la corrida y no del largo de la historia.
+
+    Solo agrega o corrige días: un día que ya no sale en Gold (p. ej. un dt
+    reprocesado cuya fila ahora se rechaza) conserva en la historia la tasa
+    que tenía. Los días expandidos de un tramo cuentan como observados, así
+    que una fila tardía con otra tasa en un día que no se había observado
+    (fin de semana) cambia solo ese día, no los días sin observación que le
+    siguen. Para rehacerla desde Gold hay que reconstruirla completa.
+    """
+    daily = add_rate_hash(gold.select("date", *HISTORY_KEY, "rate", "ingestion_ts", "source_file"))
+    since = daily.groupBy(*HISTORY_KEY).agg(F.min("date").alias("since"))
+    joined = history.join(F.broadcast(since), HISTORY_KEY, "left")
+    # valid_from del tramo vigente el día anterior a since (o del último que empezó antes)
+    anchor = F.max(F.when(F.col("valid_from") < F.col("since"), F.col("valid_from"))).over(
+        Window.partitionBy(*HISTORY_KEY))
+    joined = joined.withColumn("anchor", F.coalesce(anchor, F.col("since")))
+    touched = F.col("since").isNotNull() & (F.col("valid_from") >= F.col("anchor"))
+
+    kept = joined.where(~touched).select(*HISTORY_COLUMNS)
+    reopened = expand_history(joined.where(touched).select(*HISTORY_COLUMNS))
+    w = Window.partitionBy("date", *HISTORY_KEY).orderBy(F.col("ingestion_ts").desc_nulls_last(), F.col("new").desc())
+    days = (
+        reopened.withColumn("new", F.lit(0))
+        .unionByName(daily.select(*reopened.columns).withColumn("new", F.lit(1)))
+        .withColumn("rn", F.row_number().over(w))
+        .where(F.col("rn") == 1)
+        .drop("rn", "new")
+    )
+    return kept.unionByName(history_intervals(days))
@@ -1,6 +1,407 @@
+"""
+Orquestador del pipeline: scrape -> clean -> fact build como un DAG.
+
+Cada nodo corre en cuanto terminan sus dependencias (el cleaner de Klar justo
+después del scraper de Klar, no a la hora fija de su cron), con a lo más
+--max-parallel nodos a la vez y reintentos con backoff para los que fallan.
+Si un nodo falla del todo, lo que depende de él no corre; el fact build
+corre con los cleaners que sí terminaron (basta uno).
+
+Backends:
+    aws    invoca las Lambdas desplegadas (RequestResponse) y el Glue job de
+           rates.py en modo incremental
+    local  corre el handler de cada lambda_function.py en un subproceso con su
+           directorio (como su contenedor) y local_engine.run para el fact
+           build; apunta a S3 real o a un emulador con AWS_ENDPOINT_URL_S3
+
+Al terminar imprime cada nodo (estado, intentos, espera, duración) y la ruta
+crítica: la cadena de nodos que fijó la hora de llegada a Gold. Con
+--record el reporte queda en s3://<bucket>/pipeline/_runs/<run_id>.json y en
+pipeline/_state/last_run.json; las duraciones de esa última corrida ordenan la
+cola de la siguiente (primero los nodos con la ruta restante más larga).
+
+Uso:
+    python main.py --backend aws --record
+    python main.py --backend local --date 2025-11-06 --silver-path /tmp/s3/silver --gold-path /tmp/s3/gold
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Bucket de todas las capas (mismo default y variable que las Lambdas)
+BUCKET_NAME = os.getenv("BUCKET_NAME", "scrapping-divisas")
+RUNS_PREFIX = "pipeline/_runs/"
+LAST_RUN_KEY = "pipeline/_state/last_run.json"
+FACT_JOB_NAME = os.getenv("FACT_JOB_NAME", "fact-rates")
+
+# Nodos: dependencias, código (directorio y función de entrada) y nombre de la
+# Lambda desplegada. BBVA, Banregio y Wise todavía no son Lambdas: el cleaner de
+# FX toma lo que haya en sus prefijos cuando terminan el scraper de Banamex y
+# la API de divisas de Banxico (el FIX contra el que se comparan los bancos).
+# trigger: all_success (default) corre si todas sus dependencias terminaron
+# bien; all_done corre cuando todas terminaron y al menos una salió bien
+NODES = {
+    "scrape/banxico-divisas": {"dir": "api/banxico-divisas", "entry": "handler", "function": "banxico-divisas-api"},
+    "scrape/banxico-cetes": {"dir": "api/banxico-cetes", "entry": "handler", "function": "banxico-cetes-api"},
+    "scrape/banamex": {"dir": "scrapping/banamex", "entry": "handler", "function": "banamex-scraper"},
+    "scrape/klar": {"dir": "scrapping/klar", "entry": "lambda_handler", "function": "klar-scraper"},
+    "scrape/nu": {"dir": "scrapping/nu", "entry": "lambda_handler", "function": "nu-scraper"},
+    "scrape/stori": {"dir": "scrapping/stori", "entry": "lambda_handler", "function": "stori-scraper"},
+    "clean/banxico": {"dir": "cleaning/banxico", "entry": "lambda_handler", "function": "banxico-cleaner",
+                      "deps": ["scrape/banxico-cetes"]},
+    "clean/klar": {"dir": "cleaning/klar", "entry": "lambda_handler", "function": "klar-cleaner",
+                   "deps": ["scrape/klar"]},
+    "clean/nu": {"dir": "cleaning/nu", "entry": "lambda_handler", "function": "nu-cleaner", "deps": ["scrape/nu"]},
+    "clean/stori": {"dir": "cleaning/stori", "entry": "lambda_handler", "function": "stori-cleaner",
+                    "deps": ["scrape/stori"]},
+    "clean/fx": {"dir": "cleaning/fx", "entry": "lambda_handler", "function": "fx-cleaner",
+                 "deps": ["scrape/banamex", "scrape/banxico-divisas"], "trigger": "all_done"},
+    "fact": {"deps": ["clean/banxico", "clean/klar", "clean/nu", "clean/stori", "clean/fx"],
+             "trigger": "all_done", "retries": 1},
+}
+
+# Salida del subproceso del backend local: la última línea con este prefijo
+RESULT_MARK = "__pipeline_result__ "
+LOCAL_RUNNER = (
+    "import json, sys\n"
+    "import lambda_function\n"
+    "result = getattr(lambda_function, sys.argv[1])(json.loads(sys.argv[2]), None)\n"
+    f"print({RESULT_MARK!r} + json.dumps(result, default=str))\n"
+)
+LOCAL_FACT_RUNNER = (
+    "import json, sys\n"
+    "import local_engine\n"
+    "result = local_engine.run(sys.argv[1], sys.argv[2], json.loads(sys.argv[3]))\n"
+    f"print({RESULT_MARK!r} + json.dumps(result, default=str))\n"
+)
+# silver/entity=<entidad>/dt=<dt>/part-*.parquet (o silver/<entidad>/<dt>/... del layout anterior)
+SILVER_DT = re.compile(r"silver/[^/]+/(?:dt=)?(\d{4}-\d{2}-\d{2})/")
+# Día de escritura en la key de un CSV crudo (..._YYYYMMDD_HHMMSS.csv)
+RAW_KEY_DAY = re.compile(r"_(\d{4})(\d{2})(\d{2})_\d{6}\.csv$")
+
+
+class NodeFailed(Exception):
+    """El nodo terminó pero su resultado no es un éxito (statusCode != 200, Glue FAILED...)."""
+
+
+def validate(nodes):
+    """Revisa que las dependencias existan y que no haya ciclos; devuelve un orden topológico."""
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Ciclo en el DAG: {' -> '.join(path + [name])}")
+        state[name] = "visiting"
+        for dep in nodes[name].get("deps", []):
+            if dep not in nodes:
+                raise ValueError(f"{name} depende de {dep}, que no está en el DAG")
+            visit(dep, path + [name])
+        state[name] = "done"
+        order.append(name)
+
+    for name in nodes:
+        visit(name, [])
+    return order
+
+
+def remaining_path(nodes, estimates):
+    """Para cada nodo, la duración estimada de la ruta más larga que empieza en él."""
+    children = {name: [] for name in nodes}
+    for name, node in nodes.items():
+        for dep in node.get("deps", []):
+            children[dep].append(name)
+    longest = {}
+    for name in reversed(validate(nodes)):
+        longest[name] = estimates.get(name, 1.0) + max((longest[child] for child in children[name]), default=0.0)
+    return longest
+
+
+def critical_path(nodes, results):
+    """
+    Desde el último nodo en terminar, sigue hacia atrás la dependencia que
+    terminó más tarde (la que lo liberó). Solo nodos que corrieron.
+    """
+    ran = {name: r for name, r in results.items() if r.get("ended_at") is not None}
+    if not ran:
+        return []
+    path = [max(ran, key=lambda name: ran[name]["ended_at"])]
+    while True:
+        deps = [dep for dep in nodes[path[-1]].get("deps", []) if dep in ran]
+        if not deps:
+            break
+        path.append(max(deps, key=lambda dep: ran[dep]["ended_at"]))
+    return path[::-1]
+
+
+def run_dag(nodes, execute, max_parallel=4, retries=2, backoff=5.0, estimates=None):
+    """
+    Corre el DAG. `execute(name, node, inputs)` corre un nodo con los resultados
+    de sus dependencias (`inputs`) y devuelve su resultado o lanza una excepción.
+
+    Returns:
+        dict: nodes (por nodo: status ok | failed | skipped, attempts, queued_s,
+        seconds, error, result), critical_path, critical_path_s, wall_s
+    """
+    validate(nodes)
+    priority = remaining_path(nodes, estimates or {})
+    results = {name: {"status": "pending", "attempts": 0} for name in nodes}
+    lock = threading.Lock()
+    started = time.monotonic()
+
+    def attempt(name):
+        node = nodes[name]
+        inputs = {dep: results[dep].get("result") for dep in node.get("deps", []) if results[dep]["status"] == "ok"}
+        tries = node.get("retries", retries) + 1
+        for i in range(tries):
+            with lock:
+                results[name]["attempts"] = i + 1
+            try:
+                return execute(name, node, inputs)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"[{name}] intento {i + 1}/{tries} falló: {error}")
+                if i + 1 == tries:
+                    raise
+                time.sleep(backoff * 2 ** i)
+
+    def ready(name):
+        """True/False si ya se puede decidir (correr/saltar); None si falta alguna dependencia."""
+        deps = [results[dep]["status"] for dep in nodes[name].get("deps", [])]
+        if any(status in ("pending", "running") for status in deps):
+            return None
+        if nodes[name].get("trigger", "all_success") == "all_done":
+            return not deps or "ok" in deps
+        return all(status == "ok" for status in deps)
+
+    running = {}
+    with ThreadPoolExecutor(max_parallel) as pool:
+        while True:
+            pending = [name for name, r in results.items() if r["status"] == "pending"]
+            queue = []
+            for name in pending:
+                decision = ready(name)
+                if decision is False:
+                    results[name].update(status="skipped", error="dependencias sin éxito")
+                elif decision:
+                    queue.append(name)
+            if any(results[name]["status"] == "skipped" for name in pending):
+                continue  # un salto puede decidir a otros nodos pendientes
+            # Con la cola llena va primero lo que tiene más trabajo por delante
+            queue.sort(key=lambda name: -priority[name])
+            now = time.monotonic()
+            for name in queue[:max_parallel - len(running)]:
+                deps_end = [results[dep]["ended_at"] for dep in nodes[name].get("deps", [])
+                            if results[dep].get("ended_at") is not None]
+                results[name].update(status="running", started_at=now - started,
+                                     ready_at=max(deps_end, default=0.0))
+                running[pool.submit(attempt, name)] = name
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                r = results[name]
+                r["ended_at"] = time.monotonic() - started
+                try:
+                    r["result"] = future.result()
+                    r["status"] = "ok"
+                except Exception as e:
+                    r.update(status="failed", error=f"{type(e).__name__}: {e}")
+
+    for r in results.values():
+        if "started_at" in r:
+            r["queued_s"] = r["started_at"] - r["ready_at"]
+            r["seconds"] = r["ended_at"] - r["started_at"]
+    path = critical_path(nodes, results)
+    return {
+        "nodes": results,
+        "critical_path": path,
+        # Lo que costó llegar al último nodo sin contar esperas: la frescura mínima posible
+        "critical_path_s": sum(results[name]["seconds"] for name in path),
+        "wall_s": time.monotonic() - started,
+    }
+
+
+# Backends
+
+def check_result(name, result):
+    """Las Lambdas señalan el éxito con statusCode 200 en su resultado."""
+    if not isinstance(result, dict):
+        raise NodeFailed(f"{name} no devolvió un dict: {result!r}")
+    if result.get("statusCode") != 200:
+        raise NodeFailed(f"{name} respondió {result.get('statusCode')}: {result.get('body') or result.get('message')}")
+    return result
+
+
+def node_event(name, bucket, date, inputs=None):
+    """Evento de cada nodo: el bucket y, donde aplica, el día a procesar."""
+    event = {"bucket": bucket}
+    if name == "scrape/banxico-divisas" and date:
+        event["date"] = date
+    if name == "clean/fx" and date:
+        # El snapshot del FIX de `date` queda con la fecha en que se escribió
+        # (hoy), no la del dato: ese día también se reconstruye
+        divisas = (inputs or {}).get("scrape/banxico-divisas") or {}
+        match = RAW_KEY_DAY.search(divisas.get("csv_key") or "") if divisas.get("changed") else None
+        event["dates"] = sorted({date} | ({"-".join(match.groups())} if match else set()))
+    return event
+
+
+def fact_dts(inputs, date):
+    """dt de los parts que escribieron los cleaners (silver/entity=<entidad>/dt=<dt>/...), más `date` si se dio."""
+    keys = []
+    for combined in inputs.values():
+        # Un cleaner que procesó varios objetos devuelve un resultado por objeto en "results"
+        for result in combined.get("results", [combined]):
+            keys.append(result.get("csv_key") or "")
+            keys.extend(item["key"] for item in result.get("written", []))
+    dts = {match.group(1) for key in keys for match in [SILVER_DT.search(key)] if match}
+    return sorted(dts | ({date} if date else set()))
+
+
+def aws_executor(bucket, date, poll_seconds=15):
+    import boto3
+    from botocore.config import Config
+
+    # Sin reintentos de botocore: un timeout de lectura no debe invocar dos veces
+    lambda_client = boto3.client("lambda", config=Config(read_timeout=910, retries={"max_attempts": 0}))
+    glue = boto3.client("glue")
+
+    def execute(name, node, inputs):
+        if name == "fact":
+            run_id = glue.start_job_run(JobName=FACT_JOB_NAME, Arguments={"--mode": "incremental"})["JobRunId"]
+            while True:
+                run = glue.get_job_run(JobName=FACT_JOB_NAME, RunId=run_id)["JobRun"]
+                if run["JobRunState"] == "SUCCEEDED":
+                    return {"statusCode": 200, "job_run_id": run_id, "execution_time": run.get("ExecutionTime")}
+                if run["JobRunState"] in ("FAILED", "STOPPED", "TIMEOUT", "ERROR", "EXPIRED"):
+                    raise NodeFailed(f"Glue {run_id} {run['JobRunState']}: {run.get('ErrorMessage', '')}")
+                time.sleep(poll_seconds)
+        response = lambda_client.invoke(
+            FunctionName=node["function"], InvocationType="RequestResponse",
+            Payload=json.dumps(node_event(name, bucket, date, inputs)).encode("utf-8"),
+        )
+        payload = json.loads(response["Payload"].read() or b"null")
+        if response.get("FunctionError"):
+            raise NodeFailed(f"{node['function']}: {payload}")
+        return check_result(name, payload)
+
+    return execute
+
+
+def local_executor(bucket, date, silver_path, gold_path, timeout=900):
+    """Cada nodo en su propio proceso: las Lambdas comparten nombres de módulos y /tmp."""
+    env = {**os.environ, "BUCKET_NAME": bucket, "PYTHONUNBUFFERED": "1"}
+
+    def run_script(name, script, cwd, args):
+        completed = subprocess.run([sys.executable, "-c", script, *args], cwd=cwd, env=env,
+                                   capture_output=True, text=True, timeout=timeout)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith(RESULT_MARK)]
+        if completed.returncode != 0 or not lines:
+            # La última línea de un traceback es la excepción
+            tail = (completed.stderr or completed.stdout).strip().splitlines()[-1:]
+            raise NodeFailed(f"{name} terminó con código {completed.returncode}: {''.join(tail)}")
+        return json.loads(lines[-1][len(RESULT_MARK):])
+
+    def execute(name, node, inputs):
+        if name == "fact":
+            dts = fact_dts(inputs, date)
+            result = run_script(name, LOCAL_FACT_RUNNER, os.path.join(REPO_ROOT, "fact-build"),
+                                [silver_path, gold_path, json.dumps(dts)])
+            return {"statusCode": 200, "dts": dts, **result}
+        event = node_event(name, bucket, date, inputs)
+        result = run_script(name, LOCAL_RUNNER, os.path.join(REPO_ROOT, node["dir"]),
+                            [node["entry"], json.dumps(event)])
+        return check_result(name, result)
+
+    return execute
+
+
+# Reporte
+
+def load_estimates(s3_client, bucket):
+    """Duraciones por nodo de la última corrida registrada; {} si no hay."""
+    try:
+        last = json.loads(s3_client.get_object(Bucket=bucket, Key=LAST_RUN_KEY)["Body"].read())
+    except s3_client.exceptions.NoSuchKey:
+        return {}
+    return {name: r["seconds"] for name, r in last["nodes"].items() if r.get("seconds") is not None}
+
+
+def record_run(s3_client, bucket, report):
+    body = json.dumps(report, indent=2, default=str).encode("utf-8")
+    key = f"{RUNS_PREFIX}{report['run_id']}.json"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=body, ContentType="application/json")
+    s3_client.put_object(Bucket=bucket, Key=LAST_RUN_KEY, Body=body, ContentType="application/json")
+    return key
+
+
+def print_report(report):
+    print(f"\n{'nodo':<24} {'estado':<8} {'intentos':>8} {'espera s':>9} {'s':>8}")
+    for name, r in sorted(report["nodes"].items(), key=lambda item: item[1].get("started_at", float("inf"))):
+        queued = f"{r['queued_s']:.2f}" if "queued_s" in r else "-"
+        seconds = f"{r['seconds']:.2f}" if "seconds" in r else "-"
+        print(f"{name:<24} {r['status']:<8} {r['attempts']:>8} {queued:>9} {seconds:>8}")
+        if r.get("error"):
+            print(f"    {r['error']}")
+    print(f"\nruta crítica: {' -> '.join(report['critical_path'])}")
+    print(f"duración de la ruta crítica {report['critical_path_s']:.2f} s; corrida completa {report['wall_s']:.2f} s")
+
+
 def main():
-    print("Hello from proyecto-divisas!")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["aws", "local"], default="aws")
+    parser.add_argument("--bucket", default=BUCKET_NAME)
+    parser.add_argument("--date", help="YYYY-MM-DD para banxico-divisas y el cleaner de FX (default: su propio día)")
+    parser.add_argument("--max-parallel", type=int, default=4, help="nodos corriendo a la vez")
+    parser.add_argument("--retries", type=int, default=2, help="reintentos por nodo (el fact build: 1)")
+    parser.add_argument("--backoff", type=float, default=5.0, help="segundos antes del primer reintento (se duplica)")
+    parser.add_argument("--silver-path", help="solo backend local (default: s3://<bucket>/silver)")
+    parser.add_argument("--gold-path", help="solo backend local (default: s3://<bucket>/gold)")
+    parser.add_argument("--record", action="store_true",
+                        help="guardar el reporte en el bucket y usar la última corrida para ordenar la cola")
+    parser.add_argument("--report", help="guardar el reporte en un archivo JSON")
+    args = parser.parse_args()
+    if args.max_parallel < 1:
+        parser.error("--max-parallel debe ser al menos 1")
+
+    if args.backend == "aws":
+        execute = aws_executor(args.bucket, args.date)
+    else:
+        execute = local_executor(args.bucket, args.date,
+                                 args.silver_path or f"s3://{args.bucket}/silver",
+                                 args.gold_path or f"s3://{args.bucket}/gold")
+    s3_client = None
+    estimates = {}
+    if args.record:
+        import boto3
+        s3_client = boto3.client("s3")
+        estimates = load_estimates(s3_client, args.bucket)
+
+    run_id = datetime.now().strftime("%Y%m%dT%H%M%S")
+    report = run_dag(NODES, execute, max_parallel=args.max_parallel, retries=args.retries,
+                     backoff=args.backoff, estimates=estimates)
+    report.update(run_id=run_id, backend=args.backend, bucket=args.bucket, date=args.date,
+                  max_parallel=args.max_parallel, finished_at=datetime.now().isoformat())
+    print_report(report)
+    if s3_client is not None:
+        print(f"Reporte en s3://{args.bucket}/{record_run(s3_client, args.bucket, report)}")
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return 0 if all(r["status"] == "ok" for r in report["nodes"].values()) else 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
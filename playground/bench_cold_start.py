@@ -0,0 +1,177 @@
+"""
+Benchmark de arranque en frío de los handlers Lambda.
+
+Para cada handler lanza un intérprete nuevo (igual que un contenedor recién
+creado) y mide:
+
+- import_ms: tiempo de importar el módulo del handler (la fase INIT de Lambda).
+- init_ms: import_ms más obtener el cliente S3 (lo que paga la primera invocación).
+- warm_s3_ms: obtener el cliente S3 por segunda vez. Con get_s3_client() es
+  ~0; las versiones que hacen boto3.client('s3') en cada llamada lo pagan
+  de nuevo en cada invocación (y varias veces por invocación).
+- top_imports: los módulos más caros según `python -X importtime`.
+
+Con --ref se mide también la versión del handler en esa revisión de git
+(extraída a un directorio temporal) para comparar antes/después:
+
+    python playground/bench_cold_start.py --ref HEAD~1 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HANDLERS = [
+    "api/banxico-cetes/lambda_function.py",
+    "api/banxico-divisas/lambda_function.py",
+    "cleaning/banxico/lambda_function.py",
+    "cleaning/klar/lambda_function.py",
+    "cleaning/nu/lambda_function.py",
+    "cleaning/stori/lambda_function.py",
+    "scrapping/klar/lambda_function.py",
+    "scrapping/nu/lambda_function.py",
+    "scrapping/stori/lambda_function.py",
+    "scrapping/wise/lambda_function.py",
+]
+
+# Se ejecuta en el intérprete hijo: importa el handler desde su directorio
+IMPORT_SNIPPET = """
+import importlib.util, json, sys, time
+path = sys.argv[1]
+sys.path.insert(0, __import__("os").path.dirname(path))
+t0 = time.perf_counter()
+spec = importlib.util.spec_from_file_location("lambda_function", path)
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+import_ms = (time.perf_counter() - t0) * 1000
+def s3_client():
+    if hasattr(module, "get_s3_client"):
+        return module.get_s3_client()
+    if hasattr(module, "boto3"):
+        return module.boto3.client("s3")
+s3_client()
+init_ms = (time.perf_counter() - t0) * 1000
+t1 = time.perf_counter()
+s3_client()
+warm_s3_ms = (time.perf_counter() - t1) * 1000
+heavy = sorted(m for m in ("pandas", "numpy", "pyarrow", "boto3", "bs4", "requests") if m in sys.modules)
+print(json.dumps({"import_ms": import_ms, "init_ms": init_ms, "warm_s3_ms": warm_s3_ms, "loaded": heavy}))
+"""
+
+
+def measure_once(path):
+    """Importa el handler en un proceso nuevo y devuelve la medición."""
+    env = dict(os.environ, AWS_DEFAULT_REGION=os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+    proc = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET, path],
+        capture_output=True, text=True, cwd=os.path.dirname(path), env=env
+    )
+    if proc.returncode != 0:
+        last_line = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "error"
+        return {"error": last_line}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def top_imports(path, limit=5):
+    """Módulos de primer nivel con mayor tiempo acumulado según -X importtime."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_SNIPPET, path],
+        capture_output=True, text=True, cwd=os.path.dirname(path)
+    )
+    costs = {}
+    for line in proc.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        # Solo módulos de primer nivel (importtime sangra los anidados)
+        name = parts[2][1:]
+        if name.startswith(" "):
+            continue
+        costs[name.strip()] = int(parts[1]) / 1000
+    ranked = sorted(costs.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [f"{name}={ms:.0f}ms" for name, ms in ranked]
+
+
+def measure(path, runs):
+    """Mediana de `runs` importaciones en frío."""
+    samples = [measure_once(path) for _ in range(runs)]
+    errors = [s["error"] for s in samples if "error" in s]
+    if errors:
+        return {"error": errors[0]}
+    return {
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "init_ms": statistics.median(s["init_ms"] for s in samples),
+        "warm_s3_ms": statistics.median(s["warm_s3_ms"] for s in samples),
+        "loaded": samples[-1]["loaded"],
+        "top_imports": top_imports(path),
+    }
+
+
+def export_ref(ref, relpath, dest_dir):
+    """Extrae `relpath` en la revisión `ref` a dest_dir (conservando la ruta)."""
+    dest = os.path.join(dest_dir, relpath)
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    proc = subprocess.run(
+        ["git", "show", f"{ref}:{relpath}"],
+        capture_output=True, cwd=REPO_ROOT
+    )
+    if proc.returncode != 0:
+        return None
+    with open(dest, "wb") as f:
+        f.write(proc.stdout)
+    return dest
+
+
+def format_result(result):
+    if "error" in result:
+        return f"ERROR ({result['error']})"
+    return (
+        f"import {result['import_ms']:7.1f} ms  init {result['init_ms']:7.1f} ms  "
+        f"warm_s3 {result['warm_s3_ms']:6.1f} ms  "
+        f"loaded={','.join(result['loaded']) or '-'}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="importaciones en frío por handler")
+    parser.add_argument("--ref", help="revisión de git con la que comparar (p. ej. HEAD~1)")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados en JSON")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for relpath in HANDLERS:
+            row = {"handler": relpath, "after": measure(os.path.join(REPO_ROOT, relpath), args.runs)}
+            if args.ref:
+                old_path = export_ref(args.ref, relpath, tmp)
+                row["before"] = measure(old_path, args.runs) if old_path else {"error": "no existe en ref"}
+            results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for row in results:
+        print(row["handler"])
+        if "before" in row:
+            print(f"  antes:   {format_result(row['before'])}")
+        print(f"  despues: {format_result(row['after'])}")
+        if "before" in row and "error" not in row["before"] and "error" not in row["after"]:
+            delta_import = row["before"]["import_ms"] - row["after"]["import_ms"]
+            delta_init = row["before"]["init_ms"] - row["after"]["init_ms"]
+            print(f"  ahorro:  import {delta_import:7.1f} ms  init {delta_init:7.1f} ms")
+        if "top_imports" in row["after"]:
+            print(f"  top:     {' '.join(row['after']['top_imports'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark de las estrategias de dedup del fact (spark_engine.DEDUP_STRATEGIES)
+con Spark local sobre datos sintéticos.
+
+Para cada tamaño genera las filas con spark.range (sin E/S de archivos), las
+etiqueta con tag_rows y ejecuta split(..., dedup=<estrategia>) hasta el final
+con el sink "noop". Reporta el tiempo y los bytes de shuffle escritos/leídos
+(de la API REST de la UI de Spark), y cuántos Sort tiene el plan físico.
+
+Requiere pyspark (y Java). Para 100M filas hace falta memoria de driver
+suficiente: --driver-memory 8g o más.
+
+Uso:
+    python playground/bench_dedup_strategies.py --sizes 10000,100000,1000000,10000000,100000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+
+
+def synthetic_silver(spark, rows, dup_factor, partitions):
+    """Silver crudo con ~rows/dup_factor claves distintas (date, entity, product)."""
+    from pyspark.sql import functions as F
+
+    keys = max(1, rows // dup_factor)
+    return (
+        spark.range(rows, numPartitions=partitions)
+        .withColumn("key", F.expr(f"pmod(xxhash64(id), {keys})"))
+        .select(
+            F.date_format(F.date_add(F.lit("2020-01-01"), (F.col("key") % 2000).cast("int")), "yyyy-MM-dd").alias("date"),
+            ((F.col("key") / 2000).cast("long") % 8 + 1).alias("entity__id"),
+            ((F.col("key") / 16000).cast("long") + 1).alias("product__id"),
+            (F.rand(7) * 30 + 1).alias("rate"),
+            F.date_format(
+                F.timestamp_seconds(F.lit(1735689600) + (F.rand(11) * 86400 * 30).cast("long")),
+                "yyyy-MM-dd'T'HH:mm:ss",
+            ).alias("ingestion_ts"),
+            F.concat(F.lit("s3://scrapping-divisas/html/synthetic/"), (F.col("id") % 1000).cast("string")).alias("source_file"),
+            F.lit("2025-01-01").alias("dt"),
+        )
+    )
+
+
+def stage_metrics(spark, group):
+    """Bytes de shuffle escritos/leídos por los jobs del grupo (API REST de la UI)."""
+    sc = spark.sparkContext
+    base = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}"
+    with urllib.request.urlopen(f"{base}/jobs") as response:
+        jobs = [job for job in json.load(response) if job.get("jobGroup") == group]
+    stage_ids = {stage_id for job in jobs for stage_id in job["stageIds"]}
+    with urllib.request.urlopen(f"{base}/stages") as response:
+        stages = [s for s in json.load(response) if s["stageId"] in stage_ids and s["status"] == "COMPLETE"]
+    return (
+        sum(s["shuffleWriteBytes"] for s in stages),
+        sum(s["shuffleReadBytes"] for s in stages),
+    )
+
+
+def count_sorts(df):
+    plan = df._jdf.queryExecution().executedPlan().toString()
+    return plan.count("Sort [")
+
+
+def run(spark, silver, strategy, group):
+    import spark_engine
+
+    gold, _ = spark_engine.split(spark_engine.tag_rows(silver), dedup=strategy)
+    spark.sparkContext.setJobGroup(group, f"dedup {strategy}")
+    started = time.perf_counter()
+    gold.write.format("noop").mode("overwrite").save()
+    elapsed = time.perf_counter() - started
+    time.sleep(0.5)  # la UI actualiza las métricas de forma asíncrona
+    written, read = stage_metrics(spark, group)
+    return elapsed, written, read, count_sorts(gold)
+
+
+def human(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000,10000000", help="filas por corrida")
+    parser.add_argument("--strategies", default="window,max_struct")
+    parser.add_argument("--dup-factor", type=int, default=4, help="filas por clave en promedio")
+    parser.add_argument("--partitions", type=int, default=8, help="particiones de entrada")
+    parser.add_argument("--shuffle-partitions", type=int, default=8)
+    parser.add_argument("--driver-memory", default="4g")
+    args = parser.parse_args()
+
+    try:
+        from pyspark.sql import SparkSession
+    except ImportError:
+        sys.exit("pyspark no está instalado")
+
+    spark = (
+        SparkSession.builder.master("local[*]")
+        .config("spark.driver.memory", args.driver_memory)
+        .config("spark.sql.session.timeZone", "UTC")
+        .config("spark.sql.shuffle.partitions", str(args.shuffle_partitions))
+        .config("spark.sql.adaptive.enabled", "false")  # planes comparables entre tamaños
+        .config("spark.ui.enabled", "true")
+        .getOrCreate()
+    )
+    spark.sparkContext.setLogLevel("WARN")
+
+    print(f"{'filas':>12} {'estrategia':>11} {'seg':>8} {'shuffle escr.':>14} {'shuffle leído':>14} {'sorts':>6}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        silver = synthetic_silver(spark, size, args.dup_factor, args.partitions)
+        for strategy in args.strategies.split(","):
+            group = f"dedup-{strategy}-{size}"
+            elapsed, written, read, sorts = run(spark, silver, strategy, group)
+            print(f"{size:>12,} {strategy:>11} {elapsed:8.2f} {human(written):>14} {human(read):>14} {sorts:>6}")
+    spark.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmark de escala del job de Glue (fact-build/rates.py) con Spark local.
+
+Para cada escala genera Silver sintético con silver_generator.py (la escala
+multiplica --scale-by: entidades, scrapes intradía o días) y corre rates.run
+en modo backfill sobre todo el rango, leyendo de los manifests, con una
+SparkSession local[*] y el catálogo de local_metastore.py (sin awsglue ni
+AWS; las métricas de CloudWatch se desactivan).
+
+Registra por escala: tiempo total, tiempo y shuffle escrito/leído de cada
+stage (API REST de la UI de Spark) y archivos Parquet escritos en Gold y en
+la cuarentena. Con --output guarda todo en JSON para comparar corridas.
+
+Requiere pyspark (y Java).
+
+Uso:
+    python playground/bench_fact_build.py --scales 1,10,100 --scale-by entities
+    python playground/bench_fact_build.py --scales 1,10 --scale-by samples --output /tmp/bench.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from local_metastore import LocalMetastore  # noqa: E402
+from silver_generator import generate_silver  # noqa: E402
+
+BASE = {"entities": 8, "products": 60, "days": 30, "samples": 4}
+
+
+def stage_metrics(spark, group):
+    """Stages completos de los jobs del grupo: nombre, segundos y shuffle (API REST de la UI)."""
+    sc = spark.sparkContext
+    base = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}"
+    with urllib.request.urlopen(f"{base}/jobs") as response:
+        jobs = [job for job in json.load(response) if job.get("jobGroup") == group]
+    stage_ids = {stage_id for job in jobs for stage_id in job["stageIds"]}
+    with urllib.request.urlopen(f"{base}/stages") as response:
+        stages = [s for s in json.load(response) if s["stageId"] in stage_ids and s["status"] == "COMPLETE"]
+
+    def seconds(stage):
+        fmt = "%Y-%m-%dT%H:%M:%S.%fGMT"
+        started = datetime.strptime(stage["submissionTime"], fmt)
+        return (datetime.strptime(stage["completionTime"], fmt) - started).total_seconds()
+
+    return [
+        {
+            "stage": s["stageId"],
+            "name": s["name"].split(" at ")[0],
+            "tasks": s["numTasks"],
+            "seconds": seconds(s),
+            "shuffle_write": s["shuffleWriteBytes"],
+            "shuffle_read": s["shuffleReadBytes"],
+        }
+        for s in sorted(stages, key=lambda s: s["stageId"])
+    ]
+
+
+def parquet_files(location):
+    return sum(name.endswith(".parquet") for _, _, names in os.walk(location) for name in names)
+
+
+def human(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+    return f"{n:.1f}TB"
+
+
+def run_scale(spark, scale, scale_by, base, tmp):
+    import rates
+
+    config = dict(base)
+    config[scale_by] *= scale
+    silver, gold = os.path.join(tmp, "silver"), os.path.join(tmp, "gold")
+    generated = generate_silver(silver, **config)
+
+    options = rates.job_options({
+        "JOB_NAME": "bench_fact_build",
+        "silver_path": silver,
+        "gold_path": gold,
+        "catalog_db": "divisas",
+        "gold_table": "fact_rates",
+        "mode": "backfill",
+        "start_dt": generated["dts"][0],
+        "end_dt": generated["dts"][-1],
+        "metrics_namespace": "",
+    })
+    group = f"fact-build-{scale_by}-{scale}"
+    spark.sparkContext.setJobGroup(group, f"fact build x{scale}")
+    started = time.perf_counter()
+    result = rates.run(spark, options, sql=LocalMetastore().sql)
+    elapsed = time.perf_counter() - started
+    time.sleep(0.5)  # la UI actualiza las métricas de forma asíncrona
+
+    stages = stage_metrics(spark, group)
+    return {
+        "scale": scale,
+        "config": config,
+        "silver_rows": generated["rows"],
+        "silver_files": generated["files"],
+        "seconds": elapsed,
+        "valid_rows": result["valid_rows"],
+        "rejected_rows": result["rejected_rows"],
+        "gold_files": parquet_files(os.path.join(gold, "fact_rates")),
+        "reject_files": parquet_files(os.path.join(gold, "fact_rates_rejects")),
+        "shuffle_write": sum(s["shuffle_write"] for s in stages),
+        "shuffle_read": sum(s["shuffle_read"] for s in stages),
+        "stages": stages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1,10,100")
+    parser.add_argument("--scale-by", choices=["entities", "samples", "days"], default="entities")
+    for name, default in BASE.items():
+        parser.add_argument(f"--{name}", type=int, default=default, help=f"valor a escala 1 (default {default})")
+    parser.add_argument("--driver-memory", default="4g")
+    parser.add_argument("--stages", action="store_true", help="imprimir el detalle por stage")
+    parser.add_argument("--output", help="archivo JSON con los resultados")
+    args = parser.parse_args()
+
+    try:
+        from pyspark.sql import SparkSession
+    except ImportError:
+        sys.exit("pyspark no está instalado")
+
+    spark = (
+        SparkSession.builder.master("local[*]")
+        .config("spark.driver.memory", args.driver_memory)
+        .config("spark.sql.session.timeZone", "UTC")  # como Glue
+        .config("spark.ui.enabled", "true")
+        .getOrCreate()
+    )
+    spark.sparkContext.setLogLevel("WARN")
+
+    base = {name: getattr(args, name) for name in BASE}
+    results = []
+    print(f"{'escala':>7} {'filas Silver':>13} {'seg':>8} {'filas/s':>10} {'shuffle escr.':>14} "
+          f"{'shuffle leído':>14} {'arch. Gold':>11} {'arch. rechazo':>14}")
+    for scale in (int(s) for s in args.scales.split(",")):
+        tmp = tempfile.mkdtemp(prefix="bench_fact_build_")
+        try:
+            result = run_scale(spark, scale, args.scale_by, base, tmp)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        results.append(result)
+        print(f"{'x' + str(scale):>7} {result['silver_rows']:>13,} {result['seconds']:8.2f} "
+              f"{result['silver_rows'] / result['seconds']:>10,.0f} {human(result['shuffle_write']):>14} "
+              f"{human(result['shuffle_read']):>14} {result['gold_files']:>11,} {result['reject_files']:>14,}")
+        if args.stages:
+            for stage in result["stages"]:
+                print(f"{'':>9}stage {stage['stage']:>4} {stage['name'][:40]:<40} {stage['tasks']:>5} tareas "
+                      f"{stage['seconds']:7.2f}s  escr. {human(stage['shuffle_write']):>9}  "
+                      f"leído {human(stage['shuffle_read']):>9}")
+    spark.stop()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"scale_by": args.scale_by, "base": base, "results": results}, f, indent=2)
+        print(f"\nResultados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
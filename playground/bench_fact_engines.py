@@ -0,0 +1,149 @@
+"""
+Benchmark del fact de tasas: motor local (pyarrow/pandas) vs Spark, para
+encontrar a partir de qué volumen conviene el cluster.
+
+Genera Silver sintético (8 entidades, ~10% de duplicados y ~2% de filas
+inválidas) para cada tamaño y mide de punta a punta: leer Silver, transformar
+y escribir Gold particionado.
+
+- local: local_engine.run en este proceso.
+- spark: si pyspark está instalado, una SparkSession local[*]; el arranque de
+  la sesión se mide aparte y se suma a cada corrida, como en un job nuevo.
+  En Glue el arranque real es mayor: se puede indicar con --spark-startup-s.
+  Sin pyspark, --spark-startup-s y --spark-rows-per-s (de los logs de un job
+  real) permiten estimar el cruce con un modelo lineal.
+
+Uso:
+    python playground/bench_fact_engines.py --sizes 100,10000,1000000
+    python playground/bench_fact_engines.py --spark-startup-s 60 --spark-rows-per-s 500000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+
+import local_engine  # noqa: E402
+
+ENTITIES = ["banxico", "klar", "nu", "stori", "banamex", "bbva", "banregio", "wise"]
+
+
+def write_silver(root, rows, days, seed=7):
+    """Silver sintético con el layout silver/<entidad>/<dt>/fact_rates_staging.parquet."""
+    rng = np.random.default_rng(seed)
+    dts = [(date(2025, 1, 1) + timedelta(days=i)).isoformat() for i in range(days)]
+    per_file = max(1, rows // (len(ENTITIES) * days))
+    written = 0
+    for entity_id, entity in enumerate(ENTITIES, start=1):
+        for dt in dts:
+            n = per_file
+            products = rng.integers(1, 60, n)
+            rates = rng.uniform(1, 30, n).round(4)
+            rates[rng.random(n) < 0.02] = -1.0  # rate_out_of_range
+            table = pa.table({
+                "date": pa.array([dt] * n),
+                "entity__id": pa.array(np.full(n, entity_id, dtype=np.int64)),
+                "product__id": pa.array(products.astype(np.int64)),
+                "rate": pa.array(rates),
+                "ingestion_ts": pa.array([f"{dt}T{h:02d}:{m:02d}:00" for h, m in
+                                          zip(rng.integers(0, 24, n), rng.integers(0, 60, n))]),
+                "source_file": pa.array([f"s3://scrapping-divisas/html/{entity}/{dt}.html"] * n),
+            })
+            path = os.path.join(root, entity, dt)
+            os.makedirs(path, exist_ok=True)
+            pq.write_table(table, os.path.join(path, "fact_rates_staging.parquet"))
+            written += n
+    return dts, written
+
+
+def time_local(silver, gold, dts):
+    started = time.perf_counter()
+    result = local_engine.run(silver, gold, dts)
+    return time.perf_counter() - started, result["gold_rows"]
+
+
+def spark_session():
+    try:
+        from pyspark.sql import SparkSession
+    except ImportError:
+        return None, None
+    started = time.perf_counter()
+    spark = (
+        SparkSession.builder.master("local[*]")
+        .config("spark.sql.session.timeZone", "UTC")
+        .config("spark.sql.sources.partitionOverwriteMode", "dynamic")
+        .config("spark.ui.enabled", "false")
+        .getOrCreate()
+    )
+    spark.range(1).collect()
+    return spark, time.perf_counter() - started
+
+
+def time_spark(spark, silver, gold, dts):
+    import spark_engine
+
+    fs, paths = local_engine.list_silver_files(silver, dts)
+    started = time.perf_counter()
+    gold_df, _ = spark_engine.build_fact(spark.read.parquet(*paths))
+    gold_df.write.mode("overwrite").partitionBy("dt").parquet(os.path.join(gold, "fact_rates"))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,100000,1000000", help="filas Silver por corrida")
+    parser.add_argument("--days", type=int, default=5, help="dt distintos por corrida")
+    parser.add_argument("--spark-startup-s", type=float, help="arranque fijo de Spark/Glue a usar en lugar del medido")
+    parser.add_argument("--spark-rows-per-s", type=float, help="throughput de Spark para el modelo si no hay pyspark")
+    args = parser.parse_args()
+
+    spark, measured_startup = spark_session()
+    startup = args.spark_startup_s if args.spark_startup_s is not None else measured_startup
+    if spark is None:
+        print("pyspark no está instalado: columna spark estimada con el modelo lineal" if startup and args.spark_rows_per_s
+              else "pyspark no está instalado: solo motor local (usa --spark-startup-s y --spark-rows-per-s para estimar)")
+    else:
+        print(f"arranque de SparkSession local: {measured_startup:.1f}s (usado: {startup:.1f}s)")
+
+    print(f"\n{'filas':>10} {'gold':>10} {'local s':>9} {'filas/s':>10} {'spark s':>9}  más rápido")
+    crossover = None
+    for size in (int(s) for s in args.sizes.split(",")):
+        tmp = tempfile.mkdtemp(prefix="bench_fact_")
+        try:
+            silver, gold = os.path.join(tmp, "silver"), os.path.join(tmp, "gold")
+            dts, rows = write_silver(silver, size, args.days)
+            local_s, gold_rows = time_local(silver, os.path.join(tmp, "gold_local"), dts)
+
+            spark_s = None
+            if spark is not None:
+                spark_s = startup + time_spark(spark, silver, gold, dts)
+            elif startup and args.spark_rows_per_s:
+                spark_s = startup + rows / args.spark_rows_per_s
+
+            winner = "-" if spark_s is None else ("local" if local_s <= spark_s else "spark")
+            if winner == "spark" and crossover is None:
+                crossover = rows
+            spark_col = f"{spark_s:9.2f}" if spark_s is not None else f"{'n/a':>9}"
+            print(f"{rows:>10,} {gold_rows:>10,} {local_s:9.2f} {rows / local_s:>10,.0f} {spark_col}  {winner}")
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if spark is not None:
+        spark.stop()
+    if crossover:
+        print(f"\nSpark gana a partir de ~{crossover:,} filas por corrida")
+    elif startup:
+        print("\nEl motor local gana en todos los tamaños probados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Benchmark y verificación de los marts de tipo de cambio (fact-build/marts.py).
+
+Genera Silver sintético de tipos de cambio (silver_generator --fx), construye
+Gold de la historia en una corrida y los marts con un refresh completo;
+después corre los últimos `--daily` días uno por uno con local_engine.run,
+que refresca los marts de forma incremental, y vuelve a correr un dt viejo
+sin uno de los bancos (filas que desaparecen de Gold). En cada paso
+marts.check compara los marts con un recálculo completo; al final se altera
+una partición y se borra otra para ver que check las detecta.
+
+Compara:
+
+- refresh incremental (particiones de los dt que cambiaron) contra refresh
+  completo de toda la historia
+- consulta típica (spread promedio de 30 días por banco en un mes de USD)
+  leyendo la partición del mart contra calcularla desde Gold
+
+Uso:
+    python playground/bench_fx_marts.py --days 365 --daily 10
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import local_engine  # noqa: E402
+import marts  # noqa: E402
+from silver_generator import generate_silver  # noqa: E402
+
+
+def month_of(dt):
+    return dt[:7]
+
+
+def checked(gold_path, label, failures):
+    report = marts.check(gold_path)
+    print(f"{'PASS' if report['ok'] else 'FAIL'}  check {label}: {report['partitions']} particiones"
+          + ("" if report["ok"] else f"  {json.dumps(report)[:300]}"))
+    if not report["ok"]:
+        failures.append(label)
+
+
+def query_from_mart(gold_path, month):
+    started = time.perf_counter()
+    path = f"{marts.partition_path(marts.marts_location(gold_path), marts.DAILY, 'USD', month)}/part-0.parquet"
+    frame = pq.read_table(path, columns=["entity_id", "spread_avg_30d"]).to_pandas()
+    result = frame.groupby("entity_id")["spread_avg_30d"].mean()
+    return time.perf_counter() - started, result
+
+
+def query_from_gold(gold_path, month):
+    started = time.perf_counter()
+    location = marts.gold_location(gold_path)
+    daily = marts.daily_frame(marts.read_fx(location, None, ["USD"]))
+    frame = daily[daily["date"].dt.strftime("%Y-%m") == month]
+    result = frame.groupby("entity_id")["spread_avg_30d"].mean()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=8, help="Banxico (FIX) + bancos (compra/venta)")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--daily", type=int, default=10, help="últimos días corridos uno por uno")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        silver, gold_path = os.path.join(tmp, "silver"), os.path.join(tmp, "gold")
+        dts = generate_silver(silver, entities=args.entities, days=args.days, samples=2, fx=True)["dts"]
+        history, recent = dts[:-args.daily], dts[-args.daily:]
+
+        local_engine.run(silver, gold_path, history, refresh_marts=False)
+        initial = marts.refresh(gold_path, full=True)
+        print(f"historia: {len(history)} dt en una corrida; refresh completo {initial['seconds']:.3f} s, "
+              f"{initial['partitions']} particiones")
+        checked(gold_path, "después del refresh completo", failures)
+
+        incremental = []
+        for dt in recent:
+            incremental.append(local_engine.run(silver, gold_path, [dt])["marts"])
+        checked(gold_path, f"después de {len(recent)} corridas diarias", failures)
+
+        # Un dt viejo vuelve a correr sin uno de los bancos: sus filas salen de Gold
+        late = history[len(history) // 2]
+        manifest_path = os.path.join(silver, "_manifests", f"{late}.json")
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for entry in manifest["files"]:
+            if entry["entity"] == "bbva":
+                os.remove(entry["path"])
+        manifest["files"] = [entry for entry in manifest["files"] if entry["entity"] != "bbva"]
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f)
+        rerun = local_engine.run(silver, gold_path, [late])["marts"]
+        checked(gold_path, f"después de reprocesar {late} sin bbva", failures)
+
+        full = marts.refresh(gold_path, full=True)
+        checked(gold_path, "después de otro refresh completo", failures)
+
+        # El checker detecta una partición alterada y una borrada
+        root = marts.marts_location(gold_path)
+        first, second = month_of(history[len(history) // 4]), month_of(history[3 * len(history) // 4])
+        altered = f"{marts.partition_path(root, marts.DAILY, 'EUR', first)}/part-0.parquet"
+        table = pq.read_table(altered)
+        pq.write_table(table.set_column(table.schema.get_field_index("spread"), "spread",
+                                        pc.multiply(table.column("spread"), 1.01)), altered)
+        shutil.rmtree(marts.partition_path(root, marts.MARKET, "GBP", second))
+        report = marts.check(gold_path)
+        detected = not report["ok"] and len(report["different_rows"]) == 1 and len(report["missing"]) == 1
+        print(f"{'PASS' if detected else 'FAIL'}  check detecta lo alterado: {report['different_rows']}, "
+              f"faltan {report['missing']}")
+        if not detected:
+            failures.append("check no detecta")
+        marts.refresh(gold_path, full=True)
+        checked(gold_path, "después de reparar con refresh --full", failures)
+
+        month = month_of(recent[0])
+        query_from_mart(gold_path, month)  # calienta la caché de páginas
+        mart_s, mart_result = query_from_mart(gold_path, month)
+        gold_s, gold_result = query_from_gold(gold_path, month)
+        if not mart_result.round(9).equals(gold_result.round(9)):
+            failures.append("consulta")
+
+    per_day = sum(r["seconds"] for r in incremental) / len(incremental)
+    print(f"\n{'':>34} {'s':>8} {'particiones':>12}")
+    print(f"{'refresh incremental (promedio)':>34} {per_day:>8.3f} "
+          f"{sum(r['partitions'] for r in incremental) / len(incremental):>12.1f}")
+    print(f"{f'refresh incremental {late}':>34} {rerun['seconds']:>8.3f} {rerun['partitions']:>12}")
+    print(f"{f'refresh completo ({len(dts)} dt)':>34} {full['seconds']:>8.3f} {full['partitions']:>12}")
+    print(f"\nspread_avg_30d por banco, USD {month}: mart {mart_s * 1000:.1f} ms, "
+          f"desde Gold {gold_s * 1000:.1f} ms")
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
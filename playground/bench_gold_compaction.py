@@ -0,0 +1,146 @@
+"""
+Benchmark de la compactación de Gold con el motor local y el metastore local.
+
+Genera --days particiones dt con --files-per-dt archivos pequeños y filas en
+orden aleatorio (como quedan tras muchas corridas incrementales), las registra
+en LocalMetastore y las compacta con local_engine.compact_partition + el swap
+de ubicación de gold_catalog.set_partition_locations, igual que compact_gold.py.
+
+Reporta archivos, bytes y el tiempo de una consulta filtrada por entity_id
+(leyendo las ubicaciones que dice el catálogo) antes y después, y cuántos row
+groups se pueden saltar con las estadísticas min/max.
+
+Uso:
+    python playground/bench_gold_compaction.py --days 30 --files-per-dt 200 --rows-per-dt 200000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gold_catalog  # noqa: E402
+import gold_snapshots  # noqa: E402
+import local_engine  # noqa: E402
+from local_metastore import LocalMetastore  # noqa: E402
+
+TABLE = "divisas.fact_rates"
+
+
+def write_fragmented(location, dts, files_per_dt, rows_per_dt, seed=7):
+    rng = np.random.default_rng(seed)
+    for dt in dts:
+        n = rows_per_dt
+        table = pa.table({
+            "date": pa.array(np.datetime64(dt) - rng.integers(0, 365, n).astype("timedelta64[D]"), pa.date32()),
+            "entity_id": pa.array(rng.integers(1, 9, n), pa.int32()),
+            "product_id": pa.array(rng.integers(1, 200, n), pa.int32()),
+            "rate": rng.uniform(1, 30, n),
+            "ingestion_ts": pa.array(np.full(n, np.datetime64(f"{dt}T12:00:00", "us")), pa.timestamp("us")),
+            "source_file": pa.array([f"s3://scrapping-divisas/html/{dt}/x.html"] * n),
+            "business_hash": pa.array([f"{i:064x}" for i in range(n)]),
+        })
+        os.makedirs(f"{location}/dt={dt}")
+        per_file = -(-n // files_per_dt)
+        for i, offset in enumerate(range(0, n, per_file)):
+            pq.write_table(table.slice(offset, per_file), f"{location}/dt={dt}/part-{i:05d}.parquet")
+
+
+def scan(metastore, entity_id):
+    """Consulta típica sobre las ubicaciones del catálogo: segundos, filas, row groups leídos/total."""
+    locations = metastore.partition_locations(TABLE)
+    started = time.perf_counter()
+    rows = 0
+    for location in locations.values():
+        dataset = ds.dataset(location, format="parquet")
+        table = dataset.to_table(columns=["rate"], filter=pc.field("entity_id") == entity_id)
+        rows += table.num_rows
+    elapsed = time.perf_counter() - started
+
+    read = total = 0
+    for location in locations.values():
+        for fragment in ds.dataset(location, format="parquet").get_fragments():
+            total += fragment.num_row_groups
+            read += len(fragment.split_by_row_group(filter=pc.field("entity_id") == entity_id))
+    return elapsed, rows, read, total
+
+
+def count_files(metastore):
+    files = size = 0
+    for location in metastore.partition_locations(TABLE).values():
+        for name in os.listdir(location):
+            if name.endswith(".parquet"):
+                files += 1
+                size += os.path.getsize(os.path.join(location, name))
+    return files, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--files-per-dt", type=int, default=200)
+    parser.add_argument("--rows-per-dt", type=int, default=200000)
+    parser.add_argument("--target-file-mb", type=float, default=128)
+    parser.add_argument("--row-group-mb", type=float, default=1,
+                        help="pequeño a propósito para que se vea el salto de row groups con pocas filas")
+    parser.add_argument("--entity-id", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        gold_path = os.path.join(tmp, "gold")
+        location = os.path.join(gold_path, "fact_rates")
+        dts = [(date(2025, 1, 1) + timedelta(days=i)).isoformat() for i in range(args.days)]
+        write_fragmented(location, dts, args.files_per_dt, args.rows_per_dt)
+
+        metastore = LocalMetastore()
+        metastore.sql("CREATE DATABASE IF NOT EXISTS divisas")
+        metastore.sql(f"CREATE EXTERNAL TABLE IF NOT EXISTS {TABLE} (`rate` DOUBLE) "
+                      f"PARTITIONED BY (`dt` STRING) STORED AS PARQUET LOCATION '{location}'")
+        gold_catalog.register_partitions(metastore.sql, TABLE, location, dts)
+
+        files_before, bytes_before = count_files(metastore)
+        scan(metastore, args.entity_id)  # calienta la caché de páginas
+        before = scan(metastore, args.entity_id)
+
+        started = time.perf_counter()
+        for dt in dts:
+            current = gold_catalog.catalog_location(metastore.sql, TABLE, dt)
+            new_location = gold_snapshots.data_location(location, "compact-bench", dt)
+            local_engine.compact_partition(
+                current, new_location,
+                target_bytes=int(args.target_file_mb * 1024 * 1024),
+                row_group_bytes=int(args.row_group_mb * 1024 * 1024),
+            )
+            gold_catalog.set_partition_locations(metastore.sql, TABLE, {dt: new_location})
+        compact_s = time.perf_counter() - started
+
+        files_after, bytes_after = count_files(metastore)
+        scan(metastore, args.entity_id)
+        after = scan(metastore, args.entity_id)
+
+    if before[1] != after[1]:
+        sys.exit(f"FAIL: la consulta devolvió {before[1]} filas antes y {after[1]} después")
+
+    print(f"{args.days} dt x {args.rows_per_dt:,} filas; compactación: {compact_s:.2f}s")
+    print(f"{'':>10} {'archivos':>9} {'MB':>8} {'consulta s':>11} {'row groups leídos':>18}")
+    for label, files, size, (elapsed, _, read, total) in (
+        ("antes", files_before, bytes_before, before),
+        ("después", files_after, bytes_after, after),
+    ):
+        print(f"{label:>10} {files:>9,} {size / 1024 / 1024:>8.1f} {elapsed:>11.3f} {f'{read}/{total}':>18}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
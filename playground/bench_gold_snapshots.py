@@ -0,0 +1,112 @@
+"""
+Benchmark de la lectura de Gold por snapshots (fact-build/gold_snapshots.py)
+contra descubrir los archivos listando la tabla.
+
+Genera Silver sintético, corre local_engine.run día por día (un snapshot por
+corrida) y vuelve a correr algunos dt, como cuando llega Silver tardío: las
+carpetas de las corridas reemplazadas siguen en la tabla hasta que expiran.
+
+Compara, para una consulta de un solo `date` sin filtro por dt:
+
+- listado: recorrer la tabla (cuántos objetos lista) y leer todo lo que hay,
+  con el filtro empujado a pyarrow. Lee también lo reemplazado, así que
+  devuelve filas de más.
+- snapshot: leer el snapshot y los manifests y abrir solo los archivos cuyo
+  min/max de `date` incluye la fecha.
+
+Además lee un snapshot anterior (time travel) y verifica que cada lectura dé
+lo mismo que el Gold en memoria de ese momento.
+
+Uso:
+    python playground/bench_gold_snapshots.py --days 90 --reruns 15
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gold_snapshots  # noqa: E402
+import local_engine  # noqa: E402
+from silver_generator import generate_silver  # noqa: E402
+
+
+def by_listing(location, day):
+    """(segundos, objetos listados, archivos leídos, filas) leyendo lo que haya en la tabla."""
+    started = time.perf_counter()
+    listed = [
+        os.path.join(folder, name)
+        for folder, _, names in os.walk(location) if gold_snapshots.SNAPSHOT_DIR not in folder
+        for name in names
+    ]
+    files = [path for path in listed if path.endswith(".parquet")]
+    rows = ds.dataset(files, format="parquet").to_table(filter=pc.field("date") == day).num_rows
+    return time.perf_counter() - started, len(listed), len(files), rows
+
+
+def by_snapshot(location, day, snapshot_id=None):
+    """(segundos, manifests leídos, archivos leídos, filas) planeando desde el snapshot."""
+    started = time.perf_counter()
+    snapshot, planned = gold_snapshots.plan_files(location, [("date", "=", day)], snapshot_id)
+    rows = gold_snapshots.read_table(location, filters=[("date", "=", day)], snapshot_id=snapshot_id).num_rows
+    return time.perf_counter() - started, len(snapshot["partitions"]), len(planned), rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=8)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--reruns", type=int, default=15, help="dt que se vuelven a correr al final")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        silver, gold_path = os.path.join(tmp, "silver"), os.path.join(tmp, "gold")
+        location = os.path.join(gold_path, "fact_rates")
+        dts = generate_silver(silver, entities=args.entities, products=args.products, days=args.days,
+                              samples=2)["dts"]
+        for dt in dts:
+            local_engine.run(silver, gold_path, [dt])
+        day = date.fromisoformat(dts[len(dts) // 2])
+        before_reruns = gold_snapshots.current_snapshot(location)["snapshot_id"]
+        travel_expected = gold_snapshots.read_table(location, filters=[("date", "=", day)]).num_rows
+        step = max(1, len(dts) // (args.reruns + 1))
+        for dt in dts[step::step][:args.reruns]:
+            local_engine.run(silver, gold_path, [dt])
+        current = gold_snapshots.current_snapshot(location)
+
+        # Lo que debe devolver la consulta: Gold del último snapshot filtrado en memoria
+        gold = gold_snapshots.read_table(location).to_pandas()
+        rows_expected = int((gold["date"] == day).sum())
+
+        by_listing(location, day)  # calienta la caché de páginas
+        listing = by_listing(location, day)
+        snapshot = by_snapshot(location, day)
+        travel = by_snapshot(location, day, before_reruns)
+
+    print(f"{len(dts)} corridas diarias + {current['snapshot_id'] - len(dts)} reprocesos; "
+          f"snapshot {current['snapshot_id']}: {current['summary']['files']} archivos, "
+          f"{current['summary']['rows']:,} filas")
+    print(f"consulta: date = {day}  (filas esperadas {rows_expected:,})")
+    print(f"{'':>28} {'s':>8} {'objetos/manifests':>18} {'archivos leídos':>16} {'filas':>8}")
+    for label, (elapsed, planned_from, files, rows) in (
+        ("listado", listing),
+        ("snapshot", snapshot),
+        (f"snapshot {before_reruns} (time travel)", travel),
+    ):
+        print(f"{label:>28} {elapsed:>8.3f} {planned_from:>18,} {files:>16,} {rows:>8,}")
+    if snapshot[3] != rows_expected or travel[3] != travel_expected:
+        sys.exit("FAIL: la lectura por snapshot no coincide con Gold")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
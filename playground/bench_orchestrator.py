@@ -0,0 +1,251 @@
+"""
+Orquestador DAG de main.py contra el esquema de crons fijos.
+
+Corre main.run_dag sobre el DAG real (main.NODES) con nodos que duermen lo que
+dura cada etapa (escalado con --scale) y compara la frescura (inicio del
+scrape -> Gold) con la de crons por capa: scrapers a la hora 0, cleaners
+--clean-offset minutos después y el fact build a --fact-offset minutos.
+
+Duraciones: las de un reporte de playground/pipeline_harness.py (--durations)
+o unas típicas de producción (scrapers con Chromium ~40 s, Glue ~90 s).
+
+También revisa el orquestador: dependencias respetadas, nunca más de
+--max-parallel nodos a la vez, reintentos, saltos tras un fallo, ruta
+crítica, y los dos runners del backend local (fact build sobre un Silver en
+disco y una Lambda sin S3 alcanzable).
+
+Uso:
+    python playground/bench_orchestrator.py [--scale 0.01] [--durations reporte.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import main as orchestrator  # noqa: E402
+
+# Segundos típicos por nodo en AWS
+DEFAULT_DURATIONS = {
+    "scrape/banxico-divisas": 3, "scrape/banxico-cetes": 2, "scrape/banamex": 40,
+    "scrape/klar": 6, "scrape/nu": 8, "scrape/stori": 5,
+    "clean/banxico": 4, "clean/klar": 4, "clean/nu": 4, "clean/stori": 4, "clean/fx": 12,
+    "fact": 90,
+}
+
+
+def durations_from_report(path):
+    """
+    Duraciones de un reporte de pipeline_harness.py (etapa scrape/klar -> nodo
+    scrape/klar). Banamex no corre en el arnés: conserva su duración típica.
+    """
+    with open(path) as f:
+        report = json.load(f)
+    durations = dict(DEFAULT_DURATIONS)
+    for stage in report["stages"]:
+        name = "fact" if stage["layer"] == "fact" else stage["stage"]
+        if name in durations:
+            durations[name] = stage["seconds"]
+    return durations
+
+
+class SleepExecutor:
+    """Nodos que duermen; registra concurrencia e intervalos y puede fallar a propósito."""
+
+    def __init__(self, durations, scale, fail=None, flaky=None):
+        self.durations = durations
+        self.scale = scale
+        self.fail = set(fail or [])
+        self.flaky = dict(flaky or {})  # nodo -> fallos antes de salir bien
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.intervals = {}
+
+    def __call__(self, name, node, inputs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        started = time.monotonic()
+        try:
+            time.sleep(self.durations[name] * self.scale)
+            with self.lock:
+                if name in self.fail:
+                    raise orchestrator.NodeFailed(f"{name} falla a propósito")
+                if self.flaky.get(name):
+                    self.flaky[name] -= 1
+                    raise orchestrator.NodeFailed(f"{name} falla una vez")
+            return {"statusCode": 200, "inputs": sorted(inputs)}
+        finally:
+            with self.lock:
+                self.active -= 1
+                self.intervals.setdefault(name, []).append((started, time.monotonic()))
+
+
+def expected_critical_path(durations):
+    """La cadena más larga del DAG según las duraciones (con paralelismo suficiente)."""
+    longest = {}
+    for name in orchestrator.validate(orchestrator.NODES):
+        deps = orchestrator.NODES[name].get("deps", [])
+        best = max(deps, key=lambda dep: longest[dep][0], default=None)
+        base = longest[best] if best else (0.0, [])
+        longest[name] = (base[0] + durations[name], base[1] + [name])
+    return max(longest.values())[1]
+
+
+def cron_freshness(durations, clean_offset, fact_offset):
+    """
+    Segundos de scrape -> Gold con crons por capa (None si el fact build
+    arranca antes de que terminen los cleaners) y los cleaners que arrancan
+    antes que su scraper termine: esos procesan el archivo de la corrida anterior.
+    """
+    late = [name for name, node in orchestrator.NODES.items() if name.startswith("clean/")
+            and any(durations[dep] > clean_offset for dep in node["deps"])]
+    clean_end = max(clean_offset + durations[name] for name in orchestrator.NODES if name.startswith("clean/"))
+    fresh = fact_offset + durations["fact"] if fact_offset >= clean_end else None
+    return fresh, late
+
+
+def local_runner_checks(check):
+    """Los subprocesos del backend local: fact build real y un error de Lambda que llega como fallo."""
+    sys.path.insert(0, os.path.join(REPO_ROOT, "playground"))
+    import pipeline_harness
+
+    with tempfile.TemporaryDirectory() as tmp:
+        recording = os.path.join(tmp, "grabacion")
+        pipeline_harness.synth(recording, "2025-11-06", scrapes=2)
+        s3_root = os.path.join(tmp, "s3")
+        report = pipeline_harness.run(recording, s3_root)
+        bucket_root = os.path.join(s3_root, pipeline_harness.BUCKET)
+        execute = orchestrator.local_executor(pipeline_harness.BUCKET, "2025-11-06",
+                                              os.path.join(bucket_root, "silver"),
+                                              os.path.join(tmp, "gold-dag"))
+        cleaned = {stage["stage"]: stage for stage in report["stages"]}
+        inputs = {"clean/fx": {"written": [{"key": "silver/banamex/2025-11-06/x.parquet"}]},
+                  "clean/klar": {"csv_key": "silver/klar/2025-11-06/fact_rates_staging.parquet"}}
+        result = execute("fact", orchestrator.NODES["fact"], inputs)
+        check("backend local: fact build en subproceso", result["dts"] == ["2025-11-06"]
+              and result["gold_rows"] > 0 and cleaned["fact/local_engine"]["status"] == "ok",
+              f"{result['gold_rows']} filas")
+
+        # Una Lambda con S3 inalcanzable: el error del subproceso llega como NodeFailed
+        # (el executor copia el entorno al crearse)
+        unreachable = {"AWS_ENDPOINT_URL_S3": "http://127.0.0.1:9", "AWS_ACCESS_KEY_ID": "x",
+                       "AWS_SECRET_ACCESS_KEY": "x", "AWS_DEFAULT_REGION": "us-east-1", "AWS_MAX_ATTEMPTS": "1"}
+        with pipeline_harness.environ(**unreachable):
+            execute = orchestrator.local_executor(pipeline_harness.BUCKET, "2025-11-06", "", "")
+        try:
+            execute("clean/klar", orchestrator.NODES["clean/klar"], {})
+            failed = None
+        except orchestrator.NodeFailed as e:
+            failed = str(e)
+        check("backend local: error de la Lambda -> NodeFailed", failed is not None, (failed or "")[:100])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=0.01, help="segundos reales por segundo simulado")
+    parser.add_argument("--durations", help="reporte JSON de pipeline_harness.py")
+    parser.add_argument("--max-parallel", type=int, default=4)
+    parser.add_argument("--clean-offset", type=float, default=30, help="minutos del cron de cleaners tras el scrape")
+    parser.add_argument("--fact-offset", type=float, default=60, help="minutos del cron del fact build tras el scrape")
+    parser.add_argument("--skip-local", action="store_true", help="no correr los checks del backend local")
+    args = parser.parse_args()
+    durations = durations_from_report(args.durations) if args.durations else DEFAULT_DURATIONS
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    # Corrida limpia
+    executor = SleepExecutor(durations, args.scale)
+    report = orchestrator.run_dag(orchestrator.NODES, executor, max_parallel=args.max_parallel, backoff=0)
+    orchestrator.print_report(report)
+    print()
+    ok = all(r["status"] == "ok" for r in report["nodes"].values())
+    check("todos los nodos ok", ok)
+    respected = all(
+        executor.intervals[name][0][0] >= executor.intervals[dep][-1][1]
+        for name, node in orchestrator.NODES.items() for dep in node.get("deps", [])
+    )
+    check("cada nodo empieza después de sus dependencias", respected)
+    check(f"a lo más {args.max_parallel} nodos a la vez", executor.max_active <= args.max_parallel,
+          f"máximo {executor.max_active}")
+    check("el fact build recibe los resultados de los cleaners",
+          report["nodes"]["fact"]["result"]["inputs"] == sorted(orchestrator.NODES["fact"]["deps"]))
+    unbounded = orchestrator.run_dag(orchestrator.NODES, SleepExecutor(durations, args.scale),
+                                     max_parallel=len(orchestrator.NODES), backoff=0)
+    expected = expected_critical_path(durations)
+    check("ruta crítica sin límite de paralelismo", unbounded["critical_path"] == expected,
+          " -> ".join(unbounded["critical_path"]))
+    overhead = unbounded["wall_s"] - unbounded["critical_path_s"]
+    check("corrida ~ suma de la ruta crítica", overhead < 0.05 + 0.1 * unbounded["critical_path_s"],
+          f"{unbounded['wall_s']:.3f} s vs {unbounded['critical_path_s']:.3f} s")
+
+    # Reintentos y fallos
+    flaky = SleepExecutor(durations, args.scale, flaky={"clean/klar": 1})
+    report = orchestrator.run_dag(orchestrator.NODES, flaky, max_parallel=args.max_parallel, backoff=0)
+    check("un fallo transitorio se reintenta", report["nodes"]["clean/klar"]["status"] == "ok"
+          and report["nodes"]["clean/klar"]["attempts"] == 2)
+    broken = SleepExecutor(durations, args.scale, fail={"scrape/nu"})
+    report = orchestrator.run_dag(orchestrator.NODES, broken, max_parallel=args.max_parallel, retries=1, backoff=0)
+    nodes = report["nodes"]
+    check("fallo persistente: se agotan los intentos", nodes["scrape/nu"]["status"] == "failed"
+          and nodes["scrape/nu"]["attempts"] == 2)
+    check("lo que depende de él se salta", nodes["clean/nu"]["status"] == "skipped")
+    check("el fact build corre con los demás cleaners", nodes["fact"]["status"] == "ok"
+          and "clean/nu" not in nodes["fact"]["result"]["inputs"])
+    report = orchestrator.run_dag(orchestrator.NODES, SleepExecutor(durations, args.scale, fail={"scrape/banxico-divisas"}),
+                                  max_parallel=args.max_parallel, retries=0, backoff=0)
+    check("sin FIX de Banxico el cleaner de FX corre con los bancos", report["nodes"]["clean/fx"]["status"] == "ok")
+    fix_day = orchestrator.node_event("clean/fx", "b", "2025-11-06", {"scrape/banxico-divisas": {
+        "changed": True, "csv_key": "banxico/divisas/banxico_divisas_20251107_000512.csv"}})
+    check("--date: el cleaner de FX también lee el día del snapshot FIX",
+          fix_day["dates"] == ["2025-11-06", "2025-11-07"], str(fix_day))
+    scrapers = [dep for name in orchestrator.NODES["fact"]["deps"] for dep in orchestrator.NODES[name]["deps"]]
+    report = orchestrator.run_dag(orchestrator.NODES, SleepExecutor(durations, args.scale, fail=scrapers),
+                                  max_parallel=args.max_parallel, retries=0, backoff=0)
+    check("sin ningún cleaner el fact build se salta", report["nodes"]["fact"]["status"] == "skipped")
+    try:
+        orchestrator.validate({"a": {"deps": ["b"]}, "b": {"deps": ["a"]}})
+        cycle = False
+    except ValueError:
+        cycle = True
+    check("un ciclo se rechaza", cycle)
+
+    # Prioridad: con un solo hueco, primero la rama larga (estimaciones de la corrida anterior)
+    serial = SleepExecutor(durations, args.scale)
+    orchestrator.run_dag(orchestrator.NODES, serial, max_parallel=1, backoff=0, estimates=durations)
+    first = min(serial.intervals, key=lambda name: serial.intervals[name][0][0])
+    check("con la cola llena va primero la ruta restante más larga", first == expected[0], first)
+
+    # Frescura: crons por capa vs DAG
+    cron, late = cron_freshness(durations, args.clean_offset * 60, args.fact_offset * 60)
+    dag = unbounded["wall_s"] / args.scale
+    bounded = orchestrator.run_dag(orchestrator.NODES, SleepExecutor(durations, args.scale),
+                                   max_parallel=args.max_parallel, backoff=0)["wall_s"] / args.scale
+    print(f"\nscrape -> Gold (segundos de producción; crons a +{args.clean_offset:g} y +{args.fact_offset:g} min):")
+    print(f"  crons por capa:                 {cron:.0f} s" if cron else
+          "  crons por capa:                 el fact build arranca antes de que terminen los cleaners")
+    if late:
+        print(f"  cleaners que leen el archivo de la corrida anterior: {late}")
+    print(f"  DAG, --max-parallel {args.max_parallel}:          {bounded:.0f} s")
+    print(f"  DAG sin límite:                 {dag:.0f} s "
+          f"(ruta crítica {unbounded['critical_path_s'] / args.scale:.0f} s)")
+
+    if not args.skip_local:
+        local_runner_checks(check)
+
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
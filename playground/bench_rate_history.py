@@ -0,0 +1,213 @@
+"""
+Benchmark y verificación de la historia de cambios (SCD2) con el motor local.
+
+Genera Silver sintético con pocas variaciones de tasa (--change-rate, como los
+depósitos de Klar, Nu y Stori) y corre local_engine.run día por día, como el
+job incremental; después vuelve a correr algunos dt ya procesados (Silver
+tardío o reproceso) para ejercitar el merge de tramos reabiertos. Salvo con
+--weekends, los dt de sábado y domingo no se corren: la historia tiene que
+cruzar esos huecos sin partir tramos.
+
+Contra Gold (su último snapshot: por fecha y producto la fila con
+ingestion_ts más reciente entre todas las particiones dt) verifica que la tasa
+vigente según la historia sea la de Gold en cada día que Gold trae, que la
+historia expandida cubra cada día natural entre la primera y la última fecha
+de Gold de la clave, y que no haya dos tramos seguidos con el mismo rate_hash.
+Reporta filas, bytes y el tiempo de una consulta filtrada por entity_id sobre
+Gold diario y sobre la historia.
+
+Con --spark (pyspark y un JDK soportado) repite las mismas corridas con
+spark_engine.build_fact y spark_engine.merge_history, escribiendo cada versión
+y leyéndola en la siguiente como rates.update_history; la historia de Spark
+pasa las mismas verificaciones y tiene que tener los mismos tramos que la
+del motor local.
+
+Uso:
+    python playground/bench_rate_history.py --entities 8 --products 60 --days 120 --change-rate 0.05
+    python playground/bench_rate_history.py --entities 2 --products 10 --days 30 --spark
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gold_snapshots  # noqa: E402
+import local_engine  # noqa: E402
+from fact_rules import HISTORY_COLUMNS, HISTORY_DIR, HISTORY_KEY, HISTORY_SCHEMA_DDL, SILVER_SCHEMA_DDL  # noqa: E402
+from silver_generator import generate_silver  # noqa: E402
+
+
+def size_of(location):
+    files = size = 0
+    for folder, _, names in os.walk(location):
+        for name in names:
+            if name.endswith(".parquet"):
+                files += 1
+                size += os.path.getsize(os.path.join(folder, name))
+    return files, size
+
+
+def scan(location, entity_id):
+    """Segundos y filas de una consulta típica: tasas de una entidad."""
+    started = time.perf_counter()
+    dataset = ds.dataset(location, format="parquet")
+    rows = dataset.to_table(columns=["rate"], filter=pc.field("entity_id") == entity_id).num_rows
+    return time.perf_counter() - started, rows
+
+
+def scan_gold(location, entity_id):
+    started = time.perf_counter()
+    rows = gold_snapshots.read_table(location, ["rate"], [("entity_id", "=", entity_id)]).num_rows
+    return time.perf_counter() - started, rows
+
+
+def gold_daily(location):
+    """Gold del último snapshot, una fila por fecha y producto (ingestion_ts más reciente)."""
+    gold = gold_snapshots.read_table(location).to_pandas()
+    gold = gold.sort_values(["date", *HISTORY_KEY, "ingestion_ts"], ascending=[True, True, True, False])
+    gold = gold.drop_duplicates(["date", *HISTORY_KEY])
+    return normalized(gold)
+
+
+def normalized(frame):
+    frame = frame[["date", *HISTORY_KEY, "rate"]].astype(
+        {"date": "datetime64[ns]", "entity_id": "int64", "product_id": "int64", "rate": "float64"})
+    return frame.sort_values(["date", *HISTORY_KEY]).reset_index(drop=True)
+
+
+def check_history(history, expected):
+    """Mensajes de error de la historia contra Gold diario (lista vacía si cuadra)."""
+    errors = []
+    days = normalized(local_engine.expand_history(history))
+    joined = expected.merge(days, on=["date", *HISTORY_KEY], how="left", suffixes=("", "_history"))
+    wrong = ~(joined["rate"].eq(joined["rate_history"]) | (joined["rate"].isna() & joined["rate_history"].isna()))
+    if wrong.any():
+        errors.append(f"{int(wrong.sum())} días de Gold con otra tasa (o sin tasa) en la historia")
+    if days.duplicated(["date", *HISTORY_KEY]).any():
+        errors.append("tramos encimados")
+    span = expected.groupby(HISTORY_KEY)["date"].agg(["min", "max"])
+    covered = days.groupby(HISTORY_KEY)["date"].agg(["min", "max", "count"])
+    covered = covered.reindex(span.index)
+    if not (covered["min"].eq(span["min"]) & covered["max"].eq(span["max"])
+            & covered["count"].eq((span["max"] - span["min"]).dt.days + 1)).all():
+        errors.append("la historia no cubre cada día entre la primera y la última fecha de Gold")
+    ordered = history.sort_values([*HISTORY_KEY, "valid_from"]).reset_index(drop=True)
+    same_key = ordered[HISTORY_KEY].eq(ordered[HISTORY_KEY].shift()).all(axis=1).to_numpy(dtype=bool)
+    same_hash = ordered["rate_hash"].eq(ordered["rate_hash"].shift()).to_numpy(dtype=bool, na_value=False)
+    if (same_key & same_hash).any():
+        errors.append("dos tramos seguidos con el mismo rate_hash")
+    return errors
+
+
+def spark_history(silver, run_dts, tmp):
+    """Las mismas corridas con spark_engine; cada versión se escribe y se lee en la siguiente."""
+    from pyspark.sql import SparkSession
+    import spark_engine
+
+    spark = (
+        SparkSession.builder.master("local[2]")
+        .config("spark.sql.session.timeZone", "UTC")  # como Glue
+        .config("spark.sql.shuffle.partitions", "4")
+        .config("spark.ui.enabled", "false")
+        .getOrCreate()
+    )
+    try:
+        history = spark.createDataFrame([], HISTORY_SCHEMA_DDL)
+        for version, dt in enumerate(run_dts):
+            _, paths = local_engine.list_silver_files(silver, [dt])
+            gold, _ = spark_engine.build_fact(spark.read.schema(SILVER_SCHEMA_DDL).parquet(*paths))
+            location = os.path.join(tmp, "spark_history", f"v={version}")
+            spark_engine.merge_history(history, gold).write.mode("errorifexists").parquet(location)
+            history = spark.read.schema(HISTORY_SCHEMA_DDL).parquet(location)
+        history = history.toPandas()
+    finally:
+        spark.stop()
+    return history.astype({"entity_id": "Int32", "product_id": "Int32", "rate_hash": "string", "source_file": "string",
+                           "valid_from": "datetime64[ns]", "valid_to": "datetime64[ns]"})
+
+
+def intervals(history):
+    """Tramos comparables entre motores, en orden estable."""
+    return sorted(tuple(str(v) for v in row) for row in history[HISTORY_COLUMNS].itertuples(index=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=8)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--days", type=int, default=120)
+    parser.add_argument("--samples", type=int, default=2)
+    parser.add_argument("--change-rate", type=float, default=0.05)
+    parser.add_argument("--reruns", type=int, default=5, help="dt ya procesados que se vuelven a correr al final")
+    parser.add_argument("--entity-id", type=int, default=3)
+    parser.add_argument("--weekends", action="store_true", help="correr también los dt de sábado y domingo")
+    parser.add_argument("--spark", action="store_true", help="repetir las corridas con spark_engine y comparar")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        silver, gold_path = os.path.join(tmp, "silver"), os.path.join(tmp, "gold")
+        generated = generate_silver(silver, entities=args.entities, products=args.products, days=args.days,
+                                    samples=args.samples, change_rate=args.change_rate)
+        dts = generated["dts"]
+        if not args.weekends:
+            dts = [dt for dt in dts if date.fromisoformat(dt).weekday() < 5]
+
+        started = time.perf_counter()
+        for dt in dts:
+            local_engine.run(silver, gold_path, [dt])
+        daily_s = time.perf_counter() - started
+        step = max(1, len(dts) // (args.reruns + 1))
+        reruns = dts[step::step][:args.reruns]
+        for dt in reruns:
+            local_engine.run(silver, gold_path, [dt])
+
+        gold_location, history_location = f"{gold_path}/fact_rates", f"{gold_path}/{HISTORY_DIR}"
+        history = local_engine.read_history(history_location)
+        expected = gold_daily(gold_location)
+        errors = check_history(history, expected)
+        if errors:
+            sys.exit("FAIL: " + "; ".join(errors))
+        if args.spark:
+            started = time.perf_counter()
+            from_spark = spark_history(silver, dts + reruns, tmp)
+            spark_s = time.perf_counter() - started
+            errors = [f"Spark: {error}" for error in check_history(from_spark, expected)]
+            if intervals(from_spark) != intervals(history):
+                errors.append(f"Spark: {len(set(intervals(from_spark)) ^ set(intervals(history)))} tramos distintos "
+                              "a los del motor local")
+            if errors:
+                sys.exit("FAIL: " + "; ".join(errors))
+
+        summary = gold_snapshots.current_snapshot(gold_location)["summary"]
+        gold_rows, gold_files, gold_bytes = summary["rows"], summary["files"], summary["bytes"]
+        history_files, history_bytes = size_of(history_location)
+        scan_gold(gold_location, args.entity_id)  # calienta la caché de páginas
+        scan(history_location, args.entity_id)
+        gold_scan = scan_gold(gold_location, args.entity_id)
+        history_scan = scan(history_location, args.entity_id)
+
+    print(f"{len(dts)} días, {args.entities} entidades x {args.products} productos, change_rate {args.change_rate}; "
+          f"{len(dts)} corridas diarias en {daily_s:.2f}s + {min(args.reruns, len(dts) - 1)} reprocesos")
+    print(f"historia == Gold en {len(expected):,} filas diarias, sin huecos ni tramos repetidos OK")
+    if args.spark:
+        print(f"spark_engine: {len(from_spark):,} tramos idénticos al motor local en {spark_s:.2f}s OK")
+    print(f"{'':>10} {'filas':>10} {'archivos':>9} {'KB':>9} {'consulta s':>11} {'filas leídas':>13}")
+    for label, rows, files, size, (elapsed, read) in (
+        ("Gold", gold_rows, gold_files, gold_bytes, gold_scan),
+        ("historia", len(history), history_files, history_bytes, history_scan),
+    ):
+        print(f"{label:>10} {rows:>10,} {files:>9,} {size / 1024:>9.1f} {elapsed:>11.4f} {read:>13,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
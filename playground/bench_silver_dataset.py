@@ -0,0 +1,315 @@
+"""
+Benchmark y pruebas de Silver como dataset particionado entity=/dt=
+(fact-build/silver_dataset.py).
+
+Genera el mismo Silver sintético dos veces: con el layout anterior (un
+archivo por entidad y día) y con el nuevo, con `--parts` parts por entidad y
+día como los que agregan los cleaners. Para una consulta de varias entidades
+y días compara cuántos listados y aperturas de objetos hace cada lectura:
+
+- layout anterior: la lectura de antes de local_engine (listar las entidades y
+  abrir todas las de esos dt, filtrando la entidad en memoria)
+- parts + manifests: dataset() antes de compactar, con poda por entity y dt
+- compactado + _metadata: dataset() después de compact, planeando desde el resumen
+
+Además verifica la compactación (mismas filas, un part por partición, Gold
+igual, los reemplazados se borran después de la gracia), la migración del
+layout anterior, el append de los cleaners con reemplazo por objeto de bronze
+y que un part agregado después del resumen se lea igual.
+
+Uso:
+    python playground/bench_silver_dataset.py --entities 8 --days 60 --parts 6
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import gold_snapshots  # noqa: E402
+import local_engine  # noqa: E402
+import silver_dataset  # noqa: E402
+from fact_rules import SILVER_FILE  # noqa: E402
+from local_s3 import LocalS3  # noqa: E402
+from pipeline_harness import load_lambda  # noqa: E402
+from silver_generator import generate_silver  # noqa: E402
+
+START = date(2025, 1, 1)
+
+
+class CountingHandler(pafs.FileSystemHandler):
+    """Filesystem local que cuenta listados y objetos abiertos para leer."""
+
+    def __init__(self):
+        self.fs = pafs.LocalFileSystem()
+        self.listings = self.opened = 0
+
+    def get_type_name(self):
+        return "counting"
+
+    def equals(self, other):
+        return self is other
+
+    def normalize_path(self, path):
+        return path
+
+    def get_file_info(self, paths):
+        return self.fs.get_file_info(paths)
+
+    def get_file_info_selector(self, selector):
+        self.listings += 1
+        return self.fs.get_file_info(selector)
+
+    def create_dir(self, path, recursive):
+        self.fs.create_dir(path, recursive=recursive)
+
+    def delete_dir(self, path):
+        self.fs.delete_dir(path)
+
+    def delete_dir_contents(self, path, missing_dir_ok=False):
+        self.fs.delete_dir_contents(path, missing_dir_ok=missing_dir_ok)
+
+    def delete_root_dir_contents(self):
+        raise NotImplementedError
+
+    def delete_file(self, path):
+        self.fs.delete_file(path)
+
+    def move(self, src, dest):
+        self.fs.move(src, dest)
+
+    def copy_file(self, src, dest):
+        self.fs.copy_file(src, dest)
+
+    def open_input_stream(self, path):
+        self.opened += 1
+        return self.fs.open_input_stream(path)
+
+    def open_input_file(self, path):
+        self.opened += 1
+        return self.fs.open_input_file(path)
+
+    def open_output_stream(self, path, metadata):
+        return self.fs.open_output_stream(path, metadata=metadata)
+
+    def open_append_stream(self, path, metadata):
+        return self.fs.open_append_stream(path, metadata=metadata)
+
+
+@contextmanager
+def counted():
+    """silver_dataset sobre un filesystem que cuenta; devuelve el contador."""
+    handler = CountingHandler()
+    original = silver_dataset.resolve
+    silver_dataset.resolve = lambda path: (pafs.PyFileSystem(handler), os.path.abspath(path).rstrip("/"))
+    try:
+        yield handler
+    finally:
+        silver_dataset.resolve = original
+
+
+def legacy_read(root, dts, entities):
+    """Lectura de antes: listar las entidades, abrir entidad x dt y filtrar la entidad en memoria."""
+    handler = CountingHandler()
+    fs = pafs.PyFileSystem(handler)
+    folders = [info.path for info in fs.get_file_info(pafs.FileSelector(root))
+               if info.type == pafs.FileType.Directory and not info.base_name.startswith("_")]
+    candidates = [f"{folder}/{dt}/{SILVER_FILE}" for folder in sorted(folders) for dt in dts]
+    paths = [info.path for info in fs.get_file_info(candidates) if info.type == pafs.FileType.File]
+    tables = []
+    for path in paths:
+        with fs.open_input_file(path) as f:
+            tables.append(pq.ParquetFile(f).read())
+    keep = [path.split("/")[-3] in entities for path in paths]
+    rows = sum(table.num_rows for table, kept in zip(tables, keep) if kept)
+    return handler, len(paths), rows
+
+
+def dataset_read(root, dts, entities):
+    with counted() as handler:
+        planned = silver_dataset.dataset(root, dts, entities)
+        table = planned.to_table()
+    return handler, len(planned.files), table
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def sorted_rows(table):
+    """Filas de Silver como DataFrame ordenado, para comparar sin importar el archivo."""
+    frame = table.select(silver_dataset.SILVER_SCHEMA.names).to_pandas()
+    return frame.sort_values(list(frame.columns), na_position="first").reset_index(drop=True)
+
+
+def read_manifest(root, dt):
+    with open(os.path.join(root, "_manifests", f"{dt}.json")) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entities", type=int, default=8)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--parts", type=int, default=6, help="parts por entidad y día antes de compactar")
+    parser.add_argument("--query-days", type=int, default=14)
+    parser.add_argument("--query-entities", type=int, default=2)
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    config = dict(entities=args.entities, products=args.products, days=args.days, samples=2, start=START)
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy, silver = os.path.join(tmp, "legacy"), os.path.join(tmp, "silver")
+        dts = generate_silver(legacy, layout="legacy", **config)["dts"]
+        generated = generate_silver(silver, parts=args.parts, **config)
+        entities = sorted({entry["entity"] for entry in read_manifest(silver, dts[0])["files"]})
+        query_dts = dts[len(dts) // 2:][:args.query_days]
+        query_entities = entities[1:1 + args.query_entities]
+        print(f"Silver: {args.entities} entidades x {args.days} días, {generated['files']:,} parts, "
+              f"{generated['rows']:,} filas")
+        print(f"consulta: {len(query_entities)} entidades x {len(query_dts)} días\n")
+
+        # Lo que debe devolver la consulta: todo Silver filtrado en memoria
+        everything = silver_dataset.dataset(silver).to_table()
+        expected = everything.filter(pc.field("dt").isin(query_dts) & pc.field("entity").isin(query_entities))
+        check("Silver completo por dataset() = lo generado", everything.num_rows == generated["rows"])
+
+        results = []
+        elapsed, (handler, files, rows) = timed(legacy_read, legacy, query_dts, query_entities)
+        results.append(("layout anterior", elapsed, handler, files, rows))
+        elapsed, (handler, files, table) = timed(dataset_read, silver, query_dts, query_entities)
+        results.append(("parts + manifests", elapsed, handler, files, table.num_rows))
+        check("parts + manifests: mismas filas que el filtro en memoria",
+              sorted_rows(table).equals(sorted_rows(expected)))
+        gold_before = os.path.join(tmp, "gold-antes")
+        local_engine.run(silver, gold_before, query_dts, refresh_marts=False)
+
+        # Compactación: todos los dt ya están cerrados
+        now = datetime.combine(START + timedelta(days=args.days + 1), datetime.min.time())
+        elapsed, report = timed(silver_dataset.compact, silver, None, 1, 0, 2, silver_dataset.GRACE_HOURS, True, now)
+        print(f"compact: {report['partitions_compacted']} particiones, {report['files_merged']:,} parts juntados "
+              f"en {elapsed:.2f} s; resumen {report['summary']['files']:,} archivos\n")
+        check("compact junta cada (entidad, dt)", report["partitions_compacted"] == args.entities * args.days)
+        manifest = read_manifest(silver, query_dts[0])
+        check("un part por partición en el manifest", len(manifest["files"]) == args.entities)
+        check("los reemplazados quedan en superseded, todavía en disco",
+              len(manifest["superseded"]) == args.entities * args.parts
+              and all(os.path.exists(entry["path"]) for entry in manifest["superseded"]))
+        check("el resumen cubre todos los dt", report["summary"]["dts"] == args.days)
+
+        elapsed, (handler, files, table) = timed(dataset_read, silver, query_dts, query_entities)
+        results.append(("compactado + _metadata", elapsed, handler, files, table.num_rows))
+        check("compactado: mismas filas", sorted_rows(table).equals(sorted_rows(expected)))
+        gold_after = os.path.join(tmp, "gold-despues")
+        local_engine.run(silver, gold_after, query_dts, refresh_marts=False)
+        columns = ["date", "entity_id", "product_id", "rate", "business_hash"]
+        gold = [gold_snapshots.read_table(os.path.join(path, "fact_rates")).to_pandas()[columns]
+                .sort_values(columns).reset_index(drop=True) for path in (gold_before, gold_after)]
+        check("Gold igual antes y después de compactar", gold[0].equals(gold[1]))
+
+        print(f"\n{'':>24} {'s':>8} {'listados':>9} {'abiertos':>9} {'archivos':>9} {'filas':>9}")
+        for label, seconds, counter, files, rows in results:
+            print(f"{label:>24} {seconds:>8.3f} {counter.listings:>9,} {counter.opened:>9,} {files:>9,} {rows:>9,}")
+        print()
+
+        # Historia completa con filtro por producto desde el resumen
+        product = int(everything.column("product__id").drop_null()[0].as_py())
+        with counted() as handler:
+            started = time.perf_counter()
+            history = silver_dataset.dataset(silver).to_table(filter=pc.field("product__id") == product)
+            seconds = time.perf_counter() - started
+        check("historia de un producto desde _metadata",
+              history.num_rows == everything.filter(pc.field("product__id") == product).num_rows,
+              f"{seconds:.3f} s, {handler.listings} listados, {handler.opened} abiertos")
+
+        # Después de la gracia los reemplazados se borran
+        later = now + timedelta(hours=silver_dataset.GRACE_HOURS + 1)
+        report = silver_dataset.compact(silver, None, 1, 0, 2, silver_dataset.GRACE_HOURS, False, later)
+        manifest = read_manifest(silver, query_dts[0])
+        check("vencida la gracia se borran los reemplazados",
+              report["files_deleted"] == args.entities * args.days * args.parts and not manifest["superseded"]
+              and report["partitions_compacted"] == 0)
+
+        # Cleaners: append por objeto de bronze (LocalS3 con el bucket en tmp/s3/b)
+        s3 = LocalS3(os.path.join(tmp, "s3"))
+        bucket_silver = os.path.join(s3.bucket_path("b"), "silver")
+        klar = load_lambda("cleaning/klar")
+        dt = "2025-11-06"
+
+        def clean(source, rows, etag):
+            key = klar.silver_part_key("klar", dt)
+            frame = pd.DataFrame({"date": [dt] * rows, "entity__id": 2, "product__id": range(1, rows + 1),
+                                  "rate": 10.0, "ingestion_ts": datetime.now().isoformat(), "source_file": source})
+            buffer = pa.BufferOutputStream()
+            pq.write_table(klar.to_silver_table(frame), buffer)
+            s3.put_object(Bucket="b", Key=key, Body=buffer.getvalue().to_pybytes())
+            klar.append_to_manifest(s3, "b", dt, key, "klar", rows, source_key=source, source_etag=etag)
+            return key
+
+        first = clean("klar/2025-11-06/data.csv", 3, '"v1"')
+        clean("klar/2025-11-06/data.csv", 4, '"v2"')
+        clean("klar/2025-11-06/extra.csv", 2, '"x1"')
+        manifest = read_manifest(bucket_silver, dt)
+        check("un objeto de bronze nuevo reemplaza su part; otro objeto se agrega",
+              len(manifest["files"]) == 2 and [e["path"] for e in manifest["superseded"]] == [f"s3://b/{first}"])
+        check("source_processed por entidad y ETag",
+              klar.source_processed(s3, "b", dt, "klar", "klar/2025-11-06/data.csv", '"v2"')
+              and not klar.source_processed(s3, "b", dt, "klar", "klar/2025-11-06/data.csv", '"v1"'))
+        check("rutas s3:// del manifest leídas sobre la copia local",
+              silver_dataset.dataset(bucket_silver, [dt]).count_rows() == 6)
+        silver_dataset.compact(bucket_silver, [dt], now=datetime(2025, 11, 8))
+        check("compactado, el part viejo ya no lo vuelve a procesar",
+              klar.source_processed(s3, "b", dt, "klar", "klar/2025-11-06/extra.csv", '"x1"'))
+        clean("klar/2025-11-06/late.csv", 5, '"l1"')
+        check("un part agregado después del resumen se lee de su manifest",
+              silver_dataset.dataset(bucket_silver, [dt]).count_rows() == 11)
+
+        # Layout anterior listado en un manifest: compact lo migra
+        old_dt = dts[0]
+        old_manifest = read_manifest(legacy, old_dt)
+        before = sorted_rows(silver_dataset.dataset(legacy, [old_dt]).to_table())
+        silver_dataset.compact(legacy, [old_dt], now=now, summary=False)
+        migrated = read_manifest(legacy, old_dt)
+        check("compact migra el layout anterior a entity=/dt=",
+              all(silver_dataset.is_part(e["path"]) for e in migrated["files"])
+              and len(migrated["superseded"]) == len(old_manifest["files"]))
+        check("misma data después de migrar", sorted_rows(silver_dataset.dataset(legacy, [old_dt]).to_table())
+              .equals(before))
+
+        # Un cleaner que escribe entre la lectura y el reemplazo del manifest gana
+        fs, root = silver_dataset.resolve(silver)
+        path = silver_dataset.manifest_location(root, query_dts[0])
+        _, version = silver_dataset._read_versioned(fs, path)
+        with open(path, "a") as f:
+            f.write(" ")
+        check("manifest cambiado en medio: compact no lo pisa",
+              not silver_dataset._replace_if_unchanged(fs, path, version, {"dt": query_dts[0], "files": []}))
+
+    print("\nOK" if not failures else f"\nFAIL: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""
+Paridad entre el motor local (fact-build/local_engine.py) y el de Spark
+(fact-build/spark_engine.py) sobre los mismos archivos Silver de prueba.
+
+Los fixtures cubren los casos de borde de las reglas: nulos en cada columna,
+rate en los límites 0 y 200, NaN, duplicados con ingestion_ts viejo o nulo,
+zonas horarias, fechas con hora, la misma clave en dos dt, columnas ya
+tipadas (DATE/TIMESTAMP) y rates que Spark escribe en notación científica.
+
+Siempre se verifican los resultados esperados del motor local; si pyspark
+está instalado (y Java), también se corre spark_engine con una SparkSession
+local y se compara Gold y rejects fila por fila.
+
+Uso:
+    python playground/fact_engine_parity.py
+"""
+import functools
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+
+import gold_snapshots  # noqa: E402
+import local_engine  # noqa: E402
+from fact_rules import GOLD_COLUMNS, REJECT_COLUMNS  # noqa: E402
+
+
+def klar_rows():
+    """Como las escribe cleaning/klar: todo string salvo ids y rate (pandas)."""
+    src = "s3://scrapping-divisas/html/klar/klar_20251108_101500.html"
+    rows = [
+        # fecha, producto, rate, ingestion_ts
+        ("2025-11-08", 1, 12.5, "2025-11-08T10:15:00.000001"),
+        ("2025-11-08", 1, 12.0, "2025-11-08T09:00:00"),          # duplicado más viejo
+        ("2025-11-08", 1, 11.0, None),                            # duplicado sin ingestion_ts
+        ("2025-11-08", 2, 0.0, "2025-11-08T10:15:00"),            # límite inferior
+        ("2025-11-08", 3, 200.0, "2025-11-08T10:15:00"),          # límite superior
+        ("2025-11-08", 4, None, "2025-11-08T10:15:00"),           # NULL_rate
+        ("2025-11-08", None, 9.5, "2025-11-08T10:15:00"),         # NULL_product_id
+        ("no-es-fecha", 5, 9.5, "2025-11-08T10:15:00"),           # NULL_date
+        (None, None, None, "2025-11-08T10:15:00"),                # varios nulos: gana NULL_date
+        ("2025-11-08T23:59:59", 6, 17.0, "2025-11-08T10:15:00"),  # fecha con hora
+        ("2025-11-08", 7, 0.0005, "2025-11-08T10:15:00"),         # "5.0E-4" en Spark
+        ("2025-11-08", 8, 199.99999, "2025-11-08T10:15:00"),
+        ("2025-11-08", 9, 13.25, "2025-11-08T10:00:00-06:00"),    # 16:00 UTC: gana
+        ("2025-11-08", 9, 13.00, "2025-11-08T15:00:00"),
+        ("2025-11-08", 10, 3.7, "2025-11-08"),                    # timestamp solo con fecha
+        ("2025-02-30", 11, 5.0, "2025-11-08T10:15:00"),           # fecha inexistente
+        ("2025-11-08", 12, 7.5, "no-es-ts"),                      # ts inválido: sigue siendo válida
+    ]
+    return pd.DataFrame({
+        "date": [r[0] for r in rows],
+        "entity__id": 2,
+        "product__id": [r[1] for r in rows],
+        "rate": [r[2] for r in rows],
+        "ingestion_ts": [r[3] for r in rows],
+        "source_file": src,
+    })
+
+
+def banxico_table(day, rates):
+    """Variante ya tipada (DATE, TIMESTAMP, NaN real) escrita con pyarrow."""
+    n = len(rates)
+    return pa.table({
+        "date": pa.array([pd.Timestamp(day).date()] * n, pa.date32()),
+        "entity__id": pa.array([1] * n, pa.int64()),
+        "product__id": pa.array(list(range(26, 26 + n)), pa.int64()),
+        "rate": pa.array(rates, pa.float64()),
+        "ingestion_ts": pa.array([pd.Timestamp(f"{day} 18:00:00")] * n, pa.timestamp("us")),
+        "source_file": pa.array([f"s3://scrapping-divisas/banxico/cetes/banxico_cetes_{day.replace('-', '')}.csv"] * n),
+    })
+
+
+def write_fixtures(silver):
+    def put(entity, dt, frame_or_table):
+        path = os.path.join(silver, entity, dt)
+        os.makedirs(path, exist_ok=True)
+        target = os.path.join(path, "fact_rates_staging.parquet")
+        if isinstance(frame_or_table, pd.DataFrame):
+            frame_or_table.to_parquet(target)
+        else:
+            pq.write_table(frame_or_table, target)
+
+    put("klar", "2025-11-08", klar_rows())
+    put("banxico", "2025-11-07", banxico_table("2025-11-07", [7.1, float("nan"), 7.3, -1.0]))
+    # Misma clave (2025-11-07, 1, 26) en el dt siguiente con ingestion_ts posterior
+    later = banxico_table("2025-11-07", [7.15]).set_column(
+        4, "ingestion_ts", pa.array([pd.Timestamp("2025-11-08 18:00:00")], pa.timestamp("us"))
+    )
+    put("banxico", "2025-11-08", later)
+    return ["2025-11-07", "2025-11-08"]
+
+
+def normalize(frame, columns):
+    """Forma comparable: tipos de Python, NaN/NA -> None, orden estable."""
+    out = pd.DataFrame({
+        "date": [d.isoformat() if pd.notna(d) else None for d in pd.to_datetime(frame["date"]).dt.date],
+        "entity_id": [None if pd.isna(v) else int(v) for v in frame["entity_id"]],
+        "product_id": [None if pd.isna(v) else int(v) for v in frame["product_id"]],
+        "rate": [None if v is None or v is pd.NA else ("NaN" if np.isnan(v) else float(v)) for v in frame["rate"]],
+        "ingestion_ts": [None if pd.isna(v) else pd.Timestamp(v).isoformat() for v in frame["ingestion_ts"]],
+        "source_file": list(frame["source_file"]),
+        "dt": list(frame["dt"]),
+    })
+    for extra in ("business_hash", "reject_reason"):
+        if extra in columns:
+            out[extra] = list(frame[extra])
+    out = out[[c for c in columns if c in out.columns]]
+    return sorted(tuple(str(v) for v in row) for row in out.itertuples(index=False))
+
+
+def spark_to_pandas(frame):
+    """toPandas conservando rate null distinto de NaN (toPandas convierte ambos en NaN)."""
+    from pyspark.sql import functions as F
+
+    out = frame.withColumn("_rate_is_null", F.col("rate").isNull()).toPandas()
+    out["rate"] = pd.Series(out["rate"], dtype=object).where(~out["_rate_is_null"], None)
+    return out.drop(columns="_rate_is_null")
+
+
+def run_spark(paths):
+    try:
+        from pyspark.sql import SparkSession
+        import spark_engine
+    except ImportError:
+        return None
+    spark = (
+        SparkSession.builder.master("local[1]")
+        .config("spark.sql.session.timeZone", "UTC")  # como Glue
+        .config("spark.ui.enabled", "false")
+        .getOrCreate()
+    )
+    try:
+        # Un solo scan no mezcla `date` DATE en un archivo y STRING en otro: cada
+        # fixture se lee con su esquema y la unión lleva esas columnas a STRING
+        frames = [spark.read.parquet(path) for path in paths]
+        raw = functools.reduce(lambda a, b: a.unionByName(b, allowMissingColumns=True), frames)
+        tagged = spark_engine.tag_rows(raw).cache()
+        gold, rejects = spark_engine.split(tagged)
+        gold_max_struct, _ = spark_engine.split(tagged, dedup="max_struct")
+        return (spark_to_pandas(gold), spark_to_pandas(rejects), spark_engine.reject_counts(tagged),
+                spark_to_pandas(gold_max_struct))
+    finally:
+        spark.stop()
+
+
+def main():
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        silver = os.path.join(tmp, "silver")
+        dts = write_fixtures(silver)
+        fs, paths = local_engine.list_silver_files(silver, dts)
+        gold, rejects = local_engine.build_fact(local_engine.read_silver(fs, paths))
+
+        # Resultados esperados del motor local
+        by_key = {(str(r.date.date()), r.entity_id, r.product_id): r for r in gold.itertuples()}
+        check("3 archivos Silver", len(paths) == 3)
+        check("dedup conserva el ingestion_ts más reciente", by_key[("2025-11-08", 2, 1)].rate == 12.5)
+        check("dedup compara en UTC", by_key[("2025-11-08", 2, 9)].rate == 13.25)
+        check("dedup entre dt", by_key[("2025-11-07", 1, 26)].rate == 7.15 and by_key[("2025-11-07", 1, 26)].dt == "2025-11-08")
+        check("fecha con hora", ("2025-11-08", 2, 6) in by_key)
+        check("ts inválido no rechaza la fila", pd.isna(by_key[("2025-11-08", 2, 12)].ingestion_ts))
+        expected_hash = hashlib.sha256(b"2025-11-08||2||1||12.5").hexdigest()
+        check("business_hash", by_key[("2025-11-08", 2, 1)].business_hash == expected_hash)
+        check("business_hash con notación de Spark",
+              by_key[("2025-11-08", 2, 7)].business_hash == hashlib.sha256(b"2025-11-08||2||7||5.0E-4").hexdigest())
+        check("business_hash de 17.0", by_key[("2025-11-08", 2, 6)].business_hash == hashlib.sha256(b"2025-11-08||2||6||17.0").hexdigest())
+        reasons = rejects["reject_reason"].value_counts().to_dict()
+        expected = {"rate_out_of_range": 4, "NULL_date": 3, "NULL_rate": 1, "NULL_product_id": 1}
+        check("motivos de rechazo", reasons == expected, str(reasons))
+        check("NaN es rate_out_of_range (no NULL_rate)",
+              rejects[(rejects["entity_id"] == 1) & (rejects["product_id"] == 27)]["reject_reason"].tolist() == ["rate_out_of_range"])
+        check("columnas Gold", list(gold.columns) == GOLD_COLUMNS)
+        check("columnas rejects", list(rejects.columns) == REJECT_COLUMNS)
+
+        # Escritura: un snapshot por corrida que reemplaza solo sus dt
+        gold_path = os.path.join(tmp, "gold")
+        gold_location = os.path.join(gold_path, "fact_rates")
+        first = local_engine.run(silver, gold_path, dts)
+        table = gold_snapshots.read_table(gold_location)
+        check("Gold particionado", sorted(gold_snapshots.load_snapshot(gold_location)["partitions"]) == dts)
+        check("tipos Gold", table.schema.field("date").type == pa.date32() and table.schema.field("entity_id").type == pa.int32())
+        check("Gold completo", table.num_rows == len(gold))
+        local_engine.run(silver, gold_path, dts)
+        check("repetir no duplica", gold_snapshots.read_table(gold_location).num_rows == table.num_rows)
+        local_engine.run(silver, gold_path, ["2025-11-07"])
+        after = gold_snapshots.read_table(gold_location).to_pandas()
+        check("solo reemplaza el dt escrito", (after["dt"] == "2025-11-08").sum() == (gold["dt"] == "2025-11-08").sum())
+
+        # Snapshots: time travel, poda por estadísticas y escrituras que no se confirmaron
+        log = gold_snapshots.snapshots(gold_location)
+        check("un snapshot por corrida", [s["snapshot_id"] for s in log] == [3, 2, 1] and first["snapshot_id"] == 1)
+        check("time travel por id", gold_snapshots.read_table(gold_location, snapshot_id=1).num_rows == table.num_rows)
+        check("time travel por fecha",
+              gold_snapshots.load_snapshot(gold_location, as_of=log[-1]["committed_at"])["snapshot_id"] == 1)
+        _, planned = gold_snapshots.plan_files(gold_location, [("entity_id", "=", 2)])
+        filtered = gold_snapshots.read_table(gold_location, filters=[("entity_id", "=", 2)]).to_pandas()
+        check("poda por min/max", len(planned) < log[0]["summary"]["files"] and set(filtered["entity_id"]) == {2},
+              f"{len(planned)} de {log[0]['summary']['files']} archivos")
+        check("poda por dt", {dt for dt, _ in gold_snapshots.plan_files(gold_location, [("dt", "=", "2025-11-08")])[1]}
+              == {"2025-11-08"})
+        orphan = gold_snapshots.data_location(gold_location, "fallida", "2025-11-08")
+        os.makedirs(orphan)
+        pq.write_table(pa.table({"rate": [1.0]}), os.path.join(orphan, "part-0.parquet"))
+        check("escritura sin commit invisible", gold_snapshots.read_table(gold_location).num_rows == len(after))
+        try:
+            gold_snapshots.commit(gold_location, {"2025-11-08": []}, "compact", "vieja", read_snapshot_id=1)
+            raised = False
+        except gold_snapshots.CommitConflict:
+            raised = True
+        check("conflicto con un commit posterior sobre el mismo dt", raised)
+        expired = gold_snapshots.expire_snapshots(gold_location, retain_days=0)
+        check("expirar conserva el último", [s["snapshot_id"] for s in gold_snapshots.snapshots(gold_location)] == [3]
+              and not os.path.exists(orphan) and gold_snapshots.read_table(gold_location).num_rows == len(after),
+              str(expired))
+        # Un reemplazo que pierde el número de snapshot contra una compactación se arma encima y gana
+        create_exclusive = gold_snapshots._create_exclusive
+        head = gold_snapshots.current_snapshot(gold_location)
+        current_files = [entry["path"] for _, entry in gold_snapshots.plan_files(gold_location, [("dt", "=", "2025-11-08")])[1]]
+
+        def compact_first(fs, path, body):
+            gold_snapshots._create_exclusive = create_exclusive
+            gold_snapshots.commit(gold_location, {"2025-11-08": current_files}, "compact", "carrera",
+                                  read_snapshot_id=head["snapshot_id"])
+            return create_exclusive(fs, path, body)
+
+        gold_snapshots._create_exclusive = compact_first
+        try:
+            replaced = gold_snapshots.commit(gold_location, {"2025-11-08": current_files[:1]}, "replace", "tarde")
+        finally:
+            gold_snapshots._create_exclusive = create_exclusive
+        check("reemplazo concurrente gana la última escritura",
+              replaced["parent_id"] == head["snapshot_id"] + 1
+              and gold_snapshots.load_snapshot(gold_location)["partitions"]["2025-11-08"]["files"] == 1)
+        check("ubicación de la partición según el snapshot",
+              gold_snapshots.snapshot_partition_location(gold_location, replaced, "2025-11-08")
+              == os.path.dirname(current_files[0])
+              and gold_snapshots.snapshot_partition_location(gold_location, replaced, "2024-01-01") is None)
+
+        # Cuarentena de rechazos
+        quarantine = os.path.join(gold_path, "fact_rates_rejects")
+        stored = pq.read_table(quarantine).to_pandas()
+        check("cuarentena particionada", sorted(os.listdir(quarantine)) == ["dt=2025-11-07", "dt=2025-11-08"])
+        check("cuarentena con todos los rechazos", len(stored) == len(rejects) and set(stored["reject_reason"]) == set(reasons))
+        counts = local_engine.reject_counts(local_engine.tag_rows(local_engine.read_silver(fs, paths)))
+        check("conteos por dt y motivo", counts[("2025-11-07", "rate_out_of_range")] == 2 and counts[("2025-11-07", None)] == 2, str(counts))
+        # Si se corrigen los rechazos de un dt, su partición de cuarentena desaparece
+        os.remove(os.path.join(silver, "banxico", "2025-11-07", "fact_rates_staging.parquet"))
+        pq.write_table(banxico_table("2025-11-07", [7.1, 7.2]), os.path.join(silver, "banxico", "2025-11-07", "fact_rates_staging.parquet"))
+        local_engine.run(silver, gold_path, ["2025-11-07"])
+        check("limpia cuarentena corregida", sorted(os.listdir(quarantine)) == ["dt=2025-11-08"])
+        local_engine.run(silver, gold_path, ["2024-01-01"])
+        check("dt sin Silver no borra nada", sorted(gold_snapshots.load_snapshot(gold_location)["partitions"]) == dts)
+        try:
+            local_engine.run(silver, "gs://divisas/gold", dts)
+            raised = False
+        except ValueError:
+            raised = True
+        check("filesystem sin creación exclusiva falla antes de leer Silver", raised)
+
+        # Paridad contra Spark
+        write_fixtures(silver)
+        spark_result = run_spark(paths)
+        if spark_result is None:
+            print("SKIP  paridad con Spark (pyspark no está instalado)")
+        else:
+            spark_gold, spark_rejects, spark_counts, spark_gold_max_struct = spark_result
+            check("dedup max_struct idéntico a window",
+                  normalize(spark_gold_max_struct, GOLD_COLUMNS) == normalize(spark_gold, GOLD_COLUMNS))
+            local_counts = local_engine.reject_counts(local_engine.tag_rows(local_engine.read_silver(fs, paths)))
+            check("conteos idénticos a Spark", local_counts == spark_counts, f"{local_counts} vs {spark_counts}")
+            local_rows, spark_rows = normalize(gold, GOLD_COLUMNS), normalize(spark_gold, GOLD_COLUMNS)
+            check("Gold idéntico a Spark", local_rows == spark_rows,
+                  f"solo local: {sorted(set(local_rows) - set(spark_rows))[:3]} solo spark: {sorted(set(spark_rows) - set(local_rows))[:3]}")
+            local_rows, spark_rows = normalize(rejects, REJECT_COLUMNS), normalize(spark_rejects, REJECT_COLUMNS)
+            check("rejects idénticos a Spark", local_rows == spark_rows,
+                  f"solo local: {sorted(set(local_rows) - set(spark_rows))[:3]} solo spark: {sorted(set(spark_rows) - set(local_rows))[:3]}")
+
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+"""
+Pruebas y benchmark del normalizador de tipos de cambio (cleaning/fx).
+
+Arma CSV con el formato que escribe cada scraper (Banamex con USD/EURO/LIBRA/
+YEN, BBVA y Banregio con nombres para mostrar, Wise con base_currency/
+exchange_rate, el FIX de api/banxico-divisas con fecha/valor) y verifica:
+
+- que los product_id de cleaning/fx/fx_sources.py sean los de
+  fact-build/fact_rules.py
+- divisa, lado, tasa, fecha e ingestion_ts de cada fuente; divisas
+  desconocidas con product__id nulo y pares de Wise que no son contra MXN fuera
+- que el FIX de Banxico tome la fecha del dato (el día hábil anterior)
+- que el resultado pase por to_silver_table y, escrito como Silver con sus
+  manifests, por local_engine.run hasta Gold y los marts (marts.check), con
+  las columnas fix y *_vs_fix llenas
+
+Después compara, sobre `--files` CSV en memoria, el lote columnar
+(normalize_batch) contra normalizar fila por fila como los cleaners de
+depósitos (iterrows), y que ambos den las mismas filas.
+
+Uso:
+    python playground/fx_normalizer_check.py --files 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "cleaning", "fx"))
+
+import fact_rules  # noqa: E402
+import fx_sources  # noqa: E402
+import local_engine  # noqa: E402
+import marts  # noqa: E402
+import silver_dataset  # noqa: E402
+from fx_normalizer import SILVER_COLUMNS, normalize_batch  # noqa: E402
+from silver_manifest import to_silver_table  # noqa: E402
+
+# Nombres como los imprime cada fuente
+NAMES = {
+    "banamex": {"USD": "USD", "EUR": "EURO", "GBP": "LIBRA", "JPY": "YEN"},
+    "bbva": {"USD": "Dólar Americano", "EUR": "Euro", "GBP": "Libra Esterlina", "JPY": "Yen Japonés",
+             "CAD": "Dólar Canadiense", "CHF": "Franco Suizo"},
+    "banregio": {"USD": "DÓLAR", "EUR": "EURO", "CAD": "DÓLAR CANADIENSE"},
+}
+MIDS = {"USD": 18.5, "EUR": 20.1, "GBP": 23.6, "JPY": 0.125, "CAD": 13.4, "CHF": 21.3, "AUD": 12.1, "CNY": 2.55}
+# Divisas de api/banxico-divisas (SERIES)
+FIX_CURRENCIES = ["USD", "EUR", "GBP", "JPY"]
+
+
+def previous_business_day(day):
+    day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+def raw_file(rng, source, ts):
+    """(key, DataFrame) de un scrape de `source` a la hora `ts`, como lo escribe su scraper."""
+    key = f"{fx_sources.SOURCES[source]['key_prefix']}{ts.strftime('%Y%m%d_%H%M%S')}.csv"
+    fetched_at = ts.isoformat(timespec="microseconds")
+    if source == "wise":
+        pairs = [(c, "MXN") for c in MIDS] + [("USD", "EUR")]
+        frame = pd.DataFrame({
+            "base_currency": [b for b, _ in pairs],
+            "quote_currency": [q for _, q in pairs],
+            "exchange_rate": [round(MIDS[b] * rng.uniform(0.99, 1.01), 4) if q == "MXN" else 0.92 for b, q in pairs],
+            "source_url": "https://wise.com/rates/live",
+            "fetched_at": fetched_at,
+        })
+        return key, frame
+    if source == "banxico-divisas":
+        # La Lambda corre de madrugada y pide el FIX del día anterior
+        fecha = previous_business_day(ts.date()).strftime("%d/%m/%Y")
+        frame = pd.DataFrame({
+            "divisa": FIX_CURRENCIES,
+            "fecha": fecha,
+            "valor": [round(MIDS[c] * rng.uniform(0.995, 1.005), 4) for c in FIX_CURRENCIES],
+            "fetched_at": fetched_at,
+            "source_url": "https://www.banxico.org.mx/SieAPIRest/service/v1/",
+        })
+        return key, frame
+    names = NAMES[source]
+    mids = np.array([MIDS[c] for c in names]) * rng.uniform(0.99, 1.01, len(names))
+    compra, venta = np.round(mids * 0.98, 4), np.round(mids * 1.02, 4)
+    frame = pd.DataFrame({"divisa": list(names.values()), "compra": compra, "venta": venta,
+                          "fetched_at": fetched_at, "source_url": f"https://{source}.example"})
+    if source == "banregio":
+        # Banregio imprime los precios con "$"
+        frame["compra"] = [f"${v}" for v in compra]
+        frame["venta"] = [f"${v}" for v in venta]
+    return key, frame
+
+
+def per_row(files):
+    """Referencia: normalizar fila por fila, como los cleaners de depósitos."""
+    rows = []
+    for key, source_file, frame in files:
+        source = next(s for s, c in fx_sources.SOURCES.items() if key.startswith(c["key_prefix"]))
+        config = fx_sources.SOURCES[source]
+        aliases = {**fx_sources.CURRENCY_ALIASES, **config["aliases"]}
+        dt = datetime.strptime(key[-19:-4], "%Y%m%d_%H%M%S").strftime("%Y-%m-%d")
+        for _, row in frame.iterrows():
+            quote = config.get("quote_column")
+            if quote and str(row[quote]).strip().upper() != config["quote_currency"]:
+                continue
+            name = fx_sources.normalize_name(row[config["currency_column"]])
+            code = aliases.get(name, name.upper())
+            fetched_at = datetime.fromisoformat(row[config["timestamp_column"]])
+            day = fetched_at
+            if config.get("date_column"):
+                day = datetime.strptime(row[config["date_column"]], config["date_format"])
+            for side, column in config["sides"].items():
+                value = str(row[column]).replace("$", "").replace(",", "").strip()
+                rows.append({
+                    "date": day.strftime("%Y-%m-%d"),
+                    "entity__id": config["entity_id"],
+                    "product__id": fx_sources.fx_product_id(code, side) if code in fx_sources.FX_CURRENCIES else None,
+                    "rate": float(value),
+                    "ingestion_ts": fetched_at.strftime("%Y-%m-%dT%H:%M:%S.%f"),
+                    "source_file": source_file,
+                    "source": source,
+                    "dt": dt,
+                })
+    return pd.DataFrame(rows)
+
+
+def write_local_silver(silver, root):
+    """Escribe un part por (fuente, dt) en silver/entity=<fuente>/dt=<dt>/ y los manifests, como la Lambda en S3."""
+    manifests = {}
+    for (source, dt), frame in silver.groupby(["source", "dt"]):
+        path = silver_dataset.part_path(os.path.abspath(root), source, dt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(to_silver_table(frame), path)
+        manifests.setdefault(dt, []).append({"path": path, "entity": source, "rows": len(frame),
+                                             "bytes": os.path.getsize(path)})
+    os.makedirs(os.path.join(root, fact_rules.MANIFEST_DIR), exist_ok=True)
+    for dt, files in manifests.items():
+        with open(os.path.join(root, fact_rules.MANIFEST_DIR, f"{dt}.json"), "w") as f:
+            json.dump({"dt": dt, "files": files}, f)
+    return sorted(manifests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000, help="CSV en memoria para el benchmark")
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    cleaner_ids = {fx_sources.fx_product_id(c, s): (c, s)
+                   for c in fx_sources.FX_CURRENCIES for s in fx_sources.FX_SIDES}
+    check("product_id iguales en cleaning/fx y fact_rules", cleaner_ids == fact_rules.FX_PRODUCTS)
+
+    rng = np.random.default_rng(7)
+    start = datetime(2025, 3, 3, 9, 0)
+    files = []
+    for day in range(3):
+        for source in fx_sources.SOURCES:
+            for scrape in range(2):
+                key, frame = raw_file(rng, source, start + timedelta(days=day, hours=6 * scrape))
+                files.append((key, f"s3://scrapping-divisas/{key}", frame))
+    # Una divisa que ninguna fuente publica y un precio ilegible
+    key, frame = raw_file(rng, "bbva", start + timedelta(hours=1))
+    frame.loc[len(frame)] = ["Peso Chileno", 0.02, 0.021, frame["fetched_at"][0], frame["source_url"][0]]
+    frame["compra"] = frame["compra"].astype(object)
+    frame.loc[0, "compra"] = "n/d"
+    files.append((key, f"s3://scrapping-divisas/{key}", frame))
+
+    silver = normalize_batch(files)
+    check("columnas Silver + source y dt", list(silver.columns) == SILVER_COLUMNS + ["source", "dt"])
+    eur_compra = fact_rules.fx_product_id("EUR", "compra")
+    banamex = silver[(silver["source"] == "banamex") & (silver["product__id"] == eur_compra)]
+    check("Banamex EURO -> EUR compra", len(banamex) == 6 and (banamex["entity__id"] == 5).all())
+    bbva_ids = set(silver.loc[silver["source"] == "bbva", "product__id"].dropna())
+    check("BBVA nombres para mostrar", {fact_rules.FX_PRODUCTS[i][0] for i in bbva_ids} == set(NAMES["bbva"]))
+    banregio = silver[silver["source"] == "banregio"]
+    check("Banregio precios con $", banregio["rate"].notna().all() and banregio["rate"].between(0.1, 30).all())
+    wise = silver[silver["source"] == "wise"]
+    compra = wise[wise["product__id"] % 10 == 1].reset_index(drop=True)
+    venta = wise[wise["product__id"] % 10 == 2].reset_index(drop=True)
+    check("Wise: un mid para compra y venta", compra["rate"].equals(venta["rate"]) and len(compra) == 6 * len(MIDS))
+    check("Wise: pares contra otra divisa fuera", not (wise["rate"] == 0.92).any())
+    unknown = silver[(silver["source"] == "bbva") & silver["product__id"].isna()]
+    check("divisa desconocida con product__id nulo", len(unknown) == 2)
+    check("precio ilegible -> rate nulo", silver["rate"].isna().sum() == 1)
+    banks = silver[silver["source"] != "banxico-divisas"]
+    check("date e ingestion_ts de fetched_at", banks["date"].eq(banks["dt"]).all()
+          and banks["ingestion_ts"].str[:10].eq(banks["date"]).all())
+    fix = silver[silver["source"] == "banxico-divisas"]
+    expected_dates = fix["dt"].map(lambda dt: previous_business_day(date.fromisoformat(dt)).isoformat())
+    check("FIX de Banxico con la fecha del dato", len(fix) == 6 * len(FIX_CURRENCIES)
+          and fix["date"].eq(expected_dates).all() and (fix["entity__id"] == fact_rules.BANXICO_ENTITY_ID).all()
+          and set(fix["product__id"]) == {fact_rules.fx_product_id(c, "fix") for c in FIX_CURRENCIES})
+
+    # Silver local -> Gold -> marts
+    with tempfile.TemporaryDirectory() as tmp:
+        silver_path, gold_path = os.path.join(tmp, "silver"), os.path.join(tmp, "gold")
+        dts = write_local_silver(silver, silver_path)
+        result = local_engine.run(silver_path, gold_path, dts)
+        rejected = result["reject_reasons"]
+        check("Gold desde el Silver normalizado", result["gold_rows"] > 0
+              and rejected == {"NULL_product_id": 2, "NULL_rate": 1}, json.dumps(rejected))
+        report = marts.check(gold_path)
+        daily = pq.read_table(os.path.join(marts.partition_path(
+            marts.marts_location(gold_path), marts.DAILY, "USD", "2025-03"), "part-0.parquet")).to_pandas()
+        check("marts con los cuatro bancos", report["ok"] and sorted(daily["entity_id"].unique()) == [5, 6, 7, 8])
+        check("spread de Wise en cero", (daily.loc[daily["entity_id"] == 8, "spread"] == 0).all())
+        # El FIX del 3 y 4 de marzo llega en los snapshots del 4 y 5; el del 28 de febrero no tiene bancos
+        days = daily["date"].astype(str)
+        with_fix = daily[days.isin(["2025-03-03", "2025-03-04"])]
+        check("fix y *_vs_fix llenos", len(with_fix) == 8 and with_fix["fix"].notna().all()
+              and ((with_fix["compra"] - with_fix["fix"]) - with_fix["compra_vs_fix"]).abs().max() < 1e-9
+              and daily.loc[days == "2025-03-05", "fix"].isna().all())
+
+    # Benchmark: lote columnar contra fila por fila
+    sources = list(fx_sources.SOURCES)
+    batch = []
+    for i in range(args.files):
+        key, frame = raw_file(rng, sources[i % len(sources)], start + timedelta(minutes=15 * (i // len(sources))))
+        batch.append((key, f"s3://scrapping-divisas/{key}", frame))
+    started = time.perf_counter()
+    columnar = normalize_batch(batch)
+    columnar_s = time.perf_counter() - started
+    started = time.perf_counter()
+    reference = per_row(batch)
+    per_row_s = time.perf_counter() - started
+
+    def canonical(frame):
+        frame = frame.astype({"product__id": "Int64", "entity__id": "int64"})
+        return frame.sort_values(["source_file", "product__id"]).reset_index(drop=True)[SILVER_COLUMNS + ["dt"]]
+
+    check("lote columnar = fila por fila", canonical(columnar).equals(canonical(reference)))
+    print(f"\n{args.files} archivos, {len(columnar):,} filas Silver: columnar {columnar_s:.3f} s, "
+          f"fila por fila {per_row_s:.3f} s ({per_row_s / columnar_s:.0f}x)")
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
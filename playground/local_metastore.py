@@ -0,0 +1,299 @@
+"""
+Metastore local (SQLite) que imita lo que el job Gold le pide al Glue Catalog,
+para probar fact-build/gold_catalog.py sin AWS ni Spark.
+
+Entiende las sentencias que usa el job:
+
+    CREATE DATABASE IF NOT EXISTS <db>
+    CREATE EXTERNAL TABLE IF NOT EXISTS <db>.<tabla> (...) PARTITIONED BY (`dt` STRING) ... LOCATION '<ruta>' [TBLPROPERTIES (...)]
+    ALTER TABLE <db>.<tabla> ADD IF NOT EXISTS PARTITION (dt='...') LOCATION '...' [PARTITION ...]
+    ALTER TABLE <db>.<tabla> DROP IF EXISTS PARTITION (dt='...')[, PARTITION ...]
+    ALTER TABLE <db>.<tabla> PARTITION (dt='...') SET LOCATION '...'
+    ALTER TABLE <db>.<tabla> SET LOCATION '...'
+    DESCRIBE FORMATTED <db>.<tabla> [PARTITION (dt='...')]   (solo la fila Location)
+    CREATE OR REPLACE VIEW <db>.<vista> AS ...   (guarda el texto, no la ejecuta)
+    SHOW PARTITIONS <db>.<tabla> [PARTITION (dt='...')]
+    MSCK REPAIR TABLE <db>.<tabla>
+
+y cuenta cuántas carpetas de la tabla tuvo que recorrer cada sentencia, para
+comparar el registro directo con MSCK REPAIR.
+
+Uso:
+    python playground/local_metastore.py --selftest [--days 2000]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS databases (name TEXT PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS tables (name TEXT PRIMARY KEY, location TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS views (name TEXT PRIMARY KEY, query TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS partitions (
+    table_name TEXT NOT NULL,
+    dt         TEXT NOT NULL,
+    location   TEXT NOT NULL,
+    PRIMARY KEY (table_name, dt)
+);
+"""
+
+PARTITION_SPEC = re.compile(r"PARTITION\s*\(\s*dt\s*=\s*'([^']+)'\s*\)(?:\s*LOCATION\s*'([^']+)')?", re.I)
+
+
+class Result:
+    """Lo mínimo de un DataFrame de spark.sql que usa el job: .collect()."""
+
+    def __init__(self, rows=()):
+        self.rows = [tuple(row) for row in rows]
+
+    def collect(self):
+        return list(self.rows)
+
+
+class LocalMetastore:
+    def __init__(self, path=":memory:"):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        self.statements = []
+        self.dirs_scanned = 0
+
+    def _table(self, name):
+        row = self.conn.execute("SELECT location FROM tables WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ValueError(f"Tabla no encontrada: {name}")
+        return row[0]
+
+    def sql(self, statement):
+        """Ejecuta una sentencia con la misma firma que spark.sql."""
+        text = " ".join(statement.split())
+        self.statements.append(text)
+
+        if match := re.match(r"CREATE DATABASE IF NOT EXISTS (\S+)$", text, re.I):
+            with self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO databases VALUES (?)", (match.group(1),))
+            return Result()
+
+        if match := re.match(r"CREATE EXTERNAL TABLE IF NOT EXISTS (\S+) .* LOCATION '([^']+)'(?: TBLPROPERTIES \(.*\))?$", text, re.I):
+            with self.conn:
+                self.conn.execute("INSERT OR IGNORE INTO tables VALUES (?, ?)", match.groups())
+            return Result()
+
+        if match := re.match(r"ALTER TABLE (\S+) ADD IF NOT EXISTS (PARTITION .*)$", text, re.I):
+            table = match.group(1)
+            table_location = self._table(table)
+            with self.conn:
+                for dt, location in PARTITION_SPEC.findall(match.group(2)):
+                    self.conn.execute(
+                        "INSERT OR IGNORE INTO partitions VALUES (?, ?, ?)",
+                        (table, dt, location or f"{table_location}/dt={dt}"),
+                    )
+            return Result()
+
+        if match := re.match(r"ALTER TABLE (\S+) DROP IF EXISTS (PARTITION .*)$", text, re.I):
+            table = match.group(1)
+            self._table(table)
+            with self.conn:
+                for dt, _ in PARTITION_SPEC.findall(match.group(2)):
+                    self.conn.execute("DELETE FROM partitions WHERE table_name = ? AND dt = ?", (table, dt))
+            return Result()
+
+        if match := re.match(r"ALTER TABLE (\S+) PARTITION \(dt='([^']+)'\) SET LOCATION '([^']+)'$", text, re.I):
+            table, dt, location = match.groups()
+            self._table(table)
+            with self.conn:
+                updated = self.conn.execute(
+                    "UPDATE partitions SET location = ? WHERE table_name = ? AND dt = ?", (location, table, dt)
+                ).rowcount
+            if not updated:
+                raise ValueError(f"Partición no encontrada: {table} dt={dt}")
+            return Result()
+
+        if match := re.match(r"ALTER TABLE (\S+) SET LOCATION '([^']+)'$", text, re.I):
+            table, location = match.groups()
+            self._table(table)
+            with self.conn:
+                self.conn.execute("UPDATE tables SET location = ? WHERE name = ?", (location, table))
+            return Result()
+
+        if match := re.match(r"DESCRIBE FORMATTED (\S+)$", text, re.I):
+            return Result([("Location", self._table(match.group(1)), "")])
+
+        if match := re.match(r"CREATE OR REPLACE VIEW (\S+) AS (.*)$", text, re.I):
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO views VALUES (?, ?)", match.groups())
+            return Result()
+
+        if match := re.match(r"DESCRIBE FORMATTED (\S+) PARTITION \(dt='([^']+)'\)$", text, re.I):
+            table, dt = match.groups()
+            self._table(table)
+            row = self.conn.execute(
+                "SELECT location FROM partitions WHERE table_name = ? AND dt = ?", (table, dt)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Partición no encontrada: {table} dt={dt}")
+            return Result([("Location", row[0], "")])
+
+        if match := re.match(r"SHOW PARTITIONS (\S+)(?: (PARTITION .*))?$", text, re.I):
+            table = match.group(1)
+            self._table(table)
+            query, params = "SELECT dt FROM partitions WHERE table_name = ?", [table]
+            if match.group(2):
+                query += " AND dt = ?"
+                params.append(PARTITION_SPEC.match(match.group(2)).group(1))
+            rows = self.conn.execute(query + " ORDER BY dt", params).fetchall()
+            return Result((f"dt={dt}",) for (dt,) in rows)
+
+        if match := re.match(r"MSCK REPAIR TABLE (\S+)$", text, re.I):
+            # Igual que Hive: recorre toda la ubicación de la tabla
+            table = match.group(1)
+            table_location = self._table(table)
+            found = []
+            for entry in os.scandir(table_location):
+                self.dirs_scanned += 1
+                if entry.is_dir() and entry.name.startswith("dt=") and any(os.scandir(entry.path)):
+                    found.append((table, entry.name[3:], entry.path))
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO partitions VALUES (?, ?, ?)", found)
+            return Result()
+
+        raise ValueError(f"Sentencia no soportada por el metastore local: {text[:80]}")
+
+    def partition_locations(self, table):
+        return dict(self.conn.execute(
+            "SELECT dt, location FROM partitions WHERE table_name = ? ORDER BY dt", (table,)
+        ))
+
+
+def make_gold_dirs(root, days, start=date(2019, 1, 1)):
+    """Carpetas dt=... con un archivo cada una, como las deja el job."""
+    dts = []
+    for i in range(days):
+        dt = (start + timedelta(days=i)).isoformat()
+        os.makedirs(os.path.join(root, f"dt={dt}"))
+        open(os.path.join(root, f"dt={dt}", "part-00000.parquet"), "wb").close()
+        dts.append(dt)
+    return dts
+
+
+def run_selftest(days):
+    import gold_catalog
+
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    table = "divisas.fact_rates"
+    with tempfile.TemporaryDirectory() as tmp:
+        location = os.path.join(tmp, "fact_rates")
+        os.makedirs(location)
+        history = make_gold_dirs(location, days)
+
+        metastore = LocalMetastore()
+        metastore.sql("CREATE DATABASE IF NOT EXISTS divisas")
+        metastore.sql(f"CREATE EXTERNAL TABLE IF NOT EXISTS {table} (`rate` DOUBLE) "
+                      f"PARTITIONED BY (`dt` STRING) STORED AS PARQUET LOCATION '{location}'")
+
+        # Historia ya registrada
+        gold_catalog.add_partitions(metastore.sql, table, location, history)
+        check("historia registrada", len(metastore.partition_locations(table)) == days)
+
+        # Corrida nueva: 3 dt (uno tardío que ya existía)
+        new_dts = make_gold_dirs(location, 2, start=date.fromisoformat(history[-1]) + timedelta(days=1))
+        written = new_dts + [history[10]]
+        metastore.statements.clear()
+        started = time.perf_counter()
+        gold_catalog.register_partitions(metastore.sql, table, location, written)
+        direct_s = time.perf_counter() - started
+        locations = metastore.partition_locations(table)
+        check("registra exactamente lo escrito", all(dt in locations for dt in written) and len(locations) == days + 2)
+        check("ubicación por partición", locations[new_dts[0]] == f"{location}/dt={new_dts[0]}")
+        adds = [s for s in metastore.statements if " ADD IF NOT EXISTS " in s]
+        check("un solo ADD PARTITION para el lote", len(adds) == 1, f"{len(metastore.statements)} sentencias en total")
+        check("no recorre la tabla", metastore.dirs_scanned == 0)
+
+        # Repetir la corrida no cambia nada
+        gold_catalog.register_partitions(metastore.sql, table, location, written)
+        check("idempotente", metastore.partition_locations(table) == locations)
+
+        # Lotes
+        many = make_gold_dirs(location, 250, start=date(2030, 1, 1))
+        statements = gold_catalog.add_partitions(metastore.sql, table, location, many, batch_size=100)
+        check("250 particiones en 3 sentencias", statements == 3)
+
+        # Cambio de ubicación (compactación) y vuelta a la canónica al reescribir
+        compacted = os.path.join(location, "run=compact-1", f"dt={new_dts[1]}")
+        gold_catalog.set_partition_locations(metastore.sql, table, {new_dts[1]: compacted})
+        check("SET LOCATION", gold_catalog.catalog_location(metastore.sql, table, new_dts[1]) == compacted)
+        gold_catalog.register_partitions(metastore.sql, table, location, [new_dts[1]])
+        check("registrar vuelve a la ubicación canónica",
+              gold_catalog.catalog_location(metastore.sql, table, new_dts[1]) == f"{location}/dt={new_dts[1]}")
+        run_location = os.path.join(location, "run=2", f"dt={new_dts[1]}")
+        gold_catalog.register_partitions(metastore.sql, table, location, [new_dts[1]], locations={new_dts[1]: run_location})
+        check("registrar en la carpeta de la corrida", gold_catalog.catalog_location(metastore.sql, table, new_dts[1]) == run_location)
+        check("ubicación de partición inexistente", gold_catalog.catalog_location(metastore.sql, table, "1999-01-01") is None)
+
+        # Quitar particiones que se quedaron sin filas
+        gold_catalog.drop_partitions(metastore.sql, table, [new_dts[0], "1999-01-01"])
+        check("drop solo lo indicado", new_dts[0] not in metastore.partition_locations(table)
+              and new_dts[1] in metastore.partition_locations(table))
+
+        # La verificación detecta lo que no quedó registrado
+        other = LocalMetastore()
+        other.sql(f"CREATE EXTERNAL TABLE IF NOT EXISTS {table} (`rate` DOUBLE) LOCATION '{location}'")
+        other_sql = lambda s: Result() if s.upper().startswith("ALTER") else other.sql(s)
+        try:
+            gold_catalog.register_partitions(other_sql, table, location, ["2031-01-01"])
+            raised = False
+        except RuntimeError:
+            raised = True
+        check("falla si el catálogo no quedó igual", raised)
+
+        try:
+            gold_catalog.add_partitions(metastore.sql, table, location, ["2025-01-01' OR '1"])
+            raised = False
+        except ValueError:
+            raised = True
+        check("rechaza dt mal formados", raised)
+
+        # Marts: tablas con partition projection (TBLPROPERTIES después de LOCATION)
+        import marts
+        marts.create_tables(metastore.sql, "divisas", tmp)
+        check("tablas de los marts", gold_catalog.table_location(metastore.sql, f"divisas.{marts.DAILY}")
+              == f"{tmp}/{marts.MARTS_DIR}/{marts.DAILY}")
+
+        # Comparación con MSCK REPAIR sobre la misma historia
+        metastore.dirs_scanned = 0
+        started = time.perf_counter()
+        metastore.sql(f"MSCK REPAIR TABLE {table}")
+        msck_s = time.perf_counter() - started
+        print(f"\nregistro directo: 0 carpetas recorridas, {direct_s * 1000:.1f} ms; "
+              f"MSCK REPAIR: {metastore.dirs_scanned} carpetas, {msck_s * 1000:.1f} ms")
+
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--selftest", action="store_true", help="ejecutar las pruebas de gold_catalog")
+    parser.add_argument("--days", type=int, default=2000, help="días de historia en la tabla de prueba")
+    args = parser.parse_args()
+
+    if args.selftest:
+        sys.exit(run_selftest(args.days))
+    parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
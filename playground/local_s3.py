@@ -0,0 +1,270 @@
+"""
+S3 local sobre el sistema de archivos, con la parte del cliente boto3 que usan
+las Lambdas (scrapers, API y cleaners), para correr el pipeline sin AWS.
+
+    <root>/<bucket>/<key>
+
+Entiende put_object (con IfMatch / IfNoneMatch="*", como el manifest de
+Silver), get_object, head_object, list_objects_v2 y su paginador,
+upload_file y download_file. Los errores son los de botocore, con el código
+que daría S3 (NoSuchKey, 404, PreconditionFailed), y client.exceptions.NoSuchKey
+existe como en boto3. Como el directorio de un bucket es una carpeta normal,
+fact-build/local_engine.py lee <root>/<bucket>/silver directamente.
+
+CountingS3 envuelve cualquier cliente (este o uno de boto3 contra un emulador
+como MinIO) y cuenta peticiones y bytes leídos/escritos, para el reporte por
+etapa de playground/pipeline_harness.py.
+"""
+import hashlib
+import io
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+TMP_DIR = ".tmp"
+
+
+class NoSuchKey(ClientError):
+    """Igual que client.exceptions.NoSuchKey de boto3 (subclase de ClientError)."""
+
+
+def _error(code, operation, message, cls=ClientError):
+    status = {"NoSuchKey": 404, "404": 404, "NoSuchBucket": 404, "PreconditionFailed": 412}.get(code, 400)
+    return cls({"Error": {"Code": code, "Message": message},
+                "ResponseMetadata": {"HTTPStatusCode": status}}, operation)
+
+
+def _etag(data):
+    return f'"{hashlib.md5(data).hexdigest()}"'
+
+
+class LocalS3:
+    """Cliente S3 respaldado por <root>/<bucket>/<key>. Los buckets se crean al primer uso."""
+
+    exceptions = SimpleNamespace(NoSuchKey=NoSuchKey, ClientError=ClientError)
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, TMP_DIR), exist_ok=True)
+        # Serializa la lectura del ETag y la escritura de un put condicional
+        self._lock = threading.Lock()
+
+    def bucket_path(self, bucket):
+        return os.path.join(self.root, bucket)
+
+    def _path(self, bucket, key):
+        parts = key.split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            raise _error("InvalidArgument", "PutObject", f"Key no soportada por el S3 local: {key!r}")
+        return os.path.join(self.root, bucket, *parts)
+
+    def _write(self, path, data):
+        """Escribe en .tmp/ y mueve: un lector nunca ve un objeto a medias."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = os.path.join(self.root, TMP_DIR, uuid.uuid4().hex)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _read(self, bucket, key, operation):
+        path = self._path(bucket, key)
+        try:
+            with open(path, "rb") as f:
+                return f.read(), os.stat(path)
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            if operation == "HeadObject":
+                raise _error("404", operation, "Not Found")
+            raise _error("NoSuchKey", operation, "The specified key does not exist.", NoSuchKey)
+
+    @staticmethod
+    def _body_bytes(body):
+        if body is None:
+            return b""
+        if isinstance(body, str):
+            return body.encode("utf-8")
+        if isinstance(body, (bytes, bytearray, memoryview)):
+            return bytes(body)
+        return body.read()
+
+    def put_object(self, Bucket, Key, Body=None, IfMatch=None, IfNoneMatch=None, **kwargs):
+        data = self._body_bytes(Body)
+        path = self._path(Bucket, Key)
+        with self._lock:
+            if IfMatch is not None or IfNoneMatch is not None:
+                current = None
+                if os.path.isfile(path):
+                    with open(path, "rb") as f:
+                        current = _etag(f.read())
+                if (IfNoneMatch == "*" and current is not None) or (IfMatch is not None and current != IfMatch):
+                    raise _error("PreconditionFailed", "PutObject",
+                                 "At least one of the pre-conditions you specified did not hold")
+            self._write(path, data)
+        return {"ETag": _etag(data)}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        data, stat = self._read(Bucket, Key, "GetObject")
+        return {
+            "Body": StreamingBody(io.BytesIO(data), len(data)),
+            "ContentLength": len(data),
+            "ETag": _etag(data),
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def head_object(self, Bucket, Key, **kwargs):
+        data, stat = self._read(Bucket, Key, "HeadObject")
+        return {
+            "ContentLength": len(data),
+            "ETag": _etag(data),
+            "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        }
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None, Callback=None, Config=None):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = os.path.join(self.root, TMP_DIR, uuid.uuid4().hex)
+        shutil.copyfile(Filename, tmp)
+        os.replace(tmp, path)
+
+    def download_file(self, Bucket, Key, Filename, ExtraArgs=None, Callback=None, Config=None):
+        data, _ = self._read(Bucket, Key, "GetObject")
+        with open(Filename, "wb") as f:
+            f.write(data)
+
+    def _keys(self, bucket, prefix):
+        """Keys del bucket que empiezan con `prefix`; solo recorre la carpeta del prefijo."""
+        bucket_root = self.bucket_path(bucket)
+        folder = prefix.rsplit("/", 1)[0] if "/" in prefix else ""
+        start = os.path.join(bucket_root, *folder.split("/")) if folder else bucket_root
+        keys = []
+        for dirpath, _, filenames in os.walk(start):
+            relative = os.path.relpath(dirpath, bucket_root)
+            for name in filenames:
+                key = name if relative == "." else f"{relative.replace(os.sep, '/')}/{name}"
+                if key.startswith(prefix):
+                    keys.append(key)
+        return sorted(keys)
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, StartAfter=None, **kwargs):
+        keys = self._keys(Bucket, Prefix)
+        after = ContinuationToken or StartAfter
+        if after:
+            keys = [key for key in keys if key > after]
+        page, truncated = keys[:MaxKeys], len(keys) > MaxKeys
+        response = {"Name": Bucket, "Prefix": Prefix, "KeyCount": len(page), "MaxKeys": MaxKeys,
+                    "IsTruncated": truncated}
+        if page:
+            contents = []
+            for key in page:
+                stat = os.stat(self._path(Bucket, key))
+                contents.append({"Key": key, "Size": stat.st_size,
+                                 "LastModified": datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)})
+            # Como S3: sin objetos no hay "Contents"
+            response["Contents"] = contents
+        if truncated:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def get_paginator(self, operation):
+        if operation != "list_objects_v2":
+            raise NotImplementedError(f"El S3 local solo pagina list_objects_v2, no {operation}")
+        return _ListPaginator(self)
+
+
+class _ListPaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, **kwargs):
+        token = None
+        while True:
+            page = self.client.list_objects_v2(**kwargs, **({"ContinuationToken": token} if token else {}))
+            yield page
+            if not page.get("IsTruncated"):
+                return
+            token = page["NextContinuationToken"]
+
+
+class CountingS3:
+    """
+    Envuelve un cliente S3 y cuenta, por operación, peticiones y bytes
+    (bytes_in: leídos de S3, bytes_out: escritos). Lo que no cuenta lo delega
+    tal cual al cliente envuelto.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.exceptions = client.exceptions
+        self.ops = {}
+        self._lock = threading.Lock()
+
+    def _count(self, operation, bytes_in=0, bytes_out=0):
+        with self._lock:
+            op = self.ops.setdefault(operation, {"requests": 0, "bytes_in": 0, "bytes_out": 0})
+            op["requests"] += 1
+            op["bytes_in"] += bytes_in
+            op["bytes_out"] += bytes_out
+
+    def totals(self):
+        with self._lock:
+            return {
+                "requests": sum(op["requests"] for op in self.ops.values()),
+                "bytes_in": sum(op["bytes_in"] for op in self.ops.values()),
+                "bytes_out": sum(op["bytes_out"] for op in self.ops.values()),
+            }
+
+    def put_object(self, **kwargs):
+        body = kwargs.get("Body")
+        if body is not None and not isinstance(body, (str, bytes, bytearray, memoryview)):
+            kwargs["Body"] = body = body.read()
+        size = len(body.encode("utf-8") if isinstance(body, str) else body or b"")
+        try:
+            return self.client.put_object(**kwargs)
+        finally:
+            self._count("PutObject", bytes_out=size)
+
+    def get_object(self, **kwargs):
+        try:
+            response = self.client.get_object(**kwargs)
+        except ClientError:
+            self._count("GetObject")
+            raise
+        self._count("GetObject", bytes_in=response.get("ContentLength", 0))
+        return response
+
+    def head_object(self, **kwargs):
+        self._count("HeadObject")
+        return self.client.head_object(**kwargs)
+
+    def list_objects_v2(self, **kwargs):
+        self._count("ListObjectsV2")
+        return self.client.list_objects_v2(**kwargs)
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        self._count("PutObject", bytes_out=os.path.getsize(Filename))
+        return self.client.upload_file(Filename, Bucket, Key, **kwargs)
+
+    def download_file(self, Bucket, Key, Filename, **kwargs):
+        result = self.client.download_file(Bucket, Key, Filename, **kwargs)
+        self._count("GetObject", bytes_in=os.path.getsize(Filename))
+        return result
+
+    def get_paginator(self, operation):
+        paginator = self.client.get_paginator(operation)
+        counting = self
+
+        class Paginator:
+            def paginate(self, **kwargs):
+                for page in paginator.paginate(**kwargs):
+                    counting._count("ListObjectsV2")
+                    yield page
+
+        return Paginator()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
@@ -0,0 +1,618 @@
+"""
+Arnés local del pipeline completo (scrape -> clean -> fact) sin AWS ni red.
+
+Todas las etapas corren con su código real (lambda_function.py de cada
+directorio y fact-build/local_engine.py) contra un mismo S3 de prueba:
+
+    --s3 DIR                    local_s3.LocalS3: <DIR>/<bucket>/<key> (default: temporal)
+    --s3 http://localhost:9000  un emulador (MinIO, moto server, LocalStack) vía
+                                AWS_ENDPOINT_URL_S3; el bucket tiene que existir
+
+y reproducen una grabación en lugar de salir a internet:
+
+    <grabación>/recording.json   {"date": "YYYY-MM-DD", "source": ..., "sie": {"<ruta SIE>": "sie/<archivo>.json"}}
+    <grabación>/s3/<key>         objetos que se siembran tal cual en el bucket: el HTML
+                                 de Klar, Nu y Stori (html/<entidad>/...) y los CSV crudos
+                                 de las fuentes que necesitan navegador (banamex/, bbva/,
+                                 banregio/, wise/)
+    <grabación>/sie/*.json       respuestas de la API SIE de Banxico
+
+Las respuestas SIE las sirve un servidor HTTP local (BANXICO_BASE_URL); una
+ruta que no está en la grabación responde 404 y la etapa falla en lugar de ir
+a Banxico. Los scrapers con Chromium (Banamex, BBVA, Banregio) no corren: la
+grabación trae sus CSV.
+
+Reporte por etapa: estado, segundos, filas, filas/s, peticiones S3, bytes
+leídos y escritos en S3 y peticiones HTTP (--report guarda el JSON).
+
+Grabaciones:
+    synth   páginas y CSV sintéticos con el markup que esperan los parsers; el
+            SIE se graba desde playground/sie_mock_server.py
+    record  copia los objetos del día desde el bucket real y graba el SIE real
+            pasando por un proxy
+
+Uso:
+    python playground/pipeline_harness.py synth --out /tmp/grabacion --date 2025-11-06
+    python playground/pipeline_harness.py record --out /tmp/grabacion --date 2025-11-06
+    python playground/pipeline_harness.py run --recording /tmp/grabacion [--s3 /tmp/s3] [--report r.json]
+    python playground/pipeline_harness.py --selftest
+"""
+import argparse
+import contextlib
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+
+import local_engine  # noqa: E402
+from fx_normalizer_check import raw_file  # noqa: E402
+from local_s3 import CountingS3, LocalS3  # noqa: E402
+from sie_mock_server import ROOT as SIE_ROOT, MockState, start_server  # noqa: E402
+
+BUCKET = "scrapping-divisas"
+
+# (capa, directorio, función) en orden de ejecución
+STAGES = [
+    ("scrape", "api/banxico-divisas", "handler"),
+    ("scrape", "api/banxico-cetes", "handler"),
+    ("scrape", "scrapping/klar", "lambda_handler"),
+    ("scrape", "scrapping/nu", "lambda_handler"),
+    ("scrape", "scrapping/stori", "lambda_handler"),
+    ("clean", "cleaning/banxico", "lambda_handler"),
+    ("clean", "cleaning/klar", "lambda_handler"),
+    ("clean", "cleaning/nu", "lambda_handler"),
+    ("clean", "cleaning/stori", "lambda_handler"),
+    ("clean", "cleaning/fx", "lambda_handler"),
+]
+API_STAGES = [stage for stage in STAGES if stage[1].startswith("api/")]
+HTML_PREFIXES = ["html/klar/", "html/nu/", "html/stori/"]
+
+# Módulos que se llaman igual en varios directorios de Lambdas: se descartan
+# antes de cargar cada una para que importe los de su propio directorio
+LAMBDA_SIBLINGS = ["lambda_function", "silver_manifest", "s3_events", "sie_client", "sie_cache", "sie_stream",
+                   "api_banxico", "fx_sources", "fx_normalizer"]
+
+
+def load_lambda(directory):
+    """Importa <directory>/lambda_function.py como lo haría su contenedor (solo con su directorio)."""
+    for name in LAMBDA_SIBLINGS:
+        sys.modules.pop(name, None)
+    path = os.path.join(REPO_ROOT, directory)
+    sys.path.insert(0, path)
+    try:
+        name = "harness_" + directory.replace("/", "_").replace("-", "_")
+        spec = importlib.util.spec_from_file_location(name, os.path.join(path, "lambda_function.py"))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(path)
+    return module
+
+
+@contextlib.contextmanager
+def environ(**values):
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+# API SIE: reproducir y grabar
+
+class SIEStandIn:
+    """
+    Servidor local en lugar de la API SIE. Sin `upstream` reproduce la
+    grabación (404 si la ruta no está); con `upstream` reenvía cada petición
+    y guarda la respuesta en la grabación.
+    """
+
+    def __init__(self, recording_dir, upstream=None):
+        self.recording_dir = recording_dir
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.payloads = dict(read_recording(recording_dir).get("sie", {})) if not upstream else {}
+        self.requests = 0
+        self.misses = []
+        self.lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stand_in.handle(self)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}{SIE_ROOT}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        with self.lock:
+            self.requests += 1
+        path = request.path[len(SIE_ROOT) + 1:] if request.path.startswith(SIE_ROOT + "/") else request.path
+        if self.upstream:
+            response = requests.get(f"{self.upstream}/{path}", timeout=60, headers={
+                "Bmx-Token": request.headers.get("Bmx-Token", ""), "Accept": "application/json"})
+            if response.status_code != 200:
+                return self.send(request, response.status_code, {"error": response.text[:200]})
+            payload = response.json()
+            name = f"sie/{hashlib.sha1(path.encode('utf-8')).hexdigest()[:16]}.json"
+            with open(os.path.join(self.recording_dir, name), "w") as f:
+                json.dump(payload, f)
+            with self.lock:
+                self.payloads[path] = name
+            return self.send(request, 200, payload)
+        if path not in self.payloads:
+            with self.lock:
+                self.misses.append(path)
+            return self.send(request, 404, {"error": f"{path} no está en la grabación"})
+        with open(os.path.join(self.recording_dir, self.payloads[path])) as f:
+            self.send(request, 200, json.load(f))
+
+    @staticmethod
+    def send(request, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        gzipped = "gzip" in request.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            request.send_header("Content-Encoding", "gzip")
+        request.end_headers()
+        request.wfile.write(body)
+
+
+# Grabaciones
+
+def read_recording(recording_dir):
+    with open(os.path.join(recording_dir, "recording.json")) as f:
+        return json.load(f)
+
+
+def write_recording(recording_dir, meta):
+    with open(os.path.join(recording_dir, "recording.json"), "w") as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+
+def write_object(recording_dir, key, data):
+    path = os.path.join(recording_dir, "s3", *key.split("/"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def record_sie(recording_dir, date, upstream):
+    """Corre las Lambdas de la API contra un proxy a `upstream` y guarda sus respuestas."""
+    proxy = SIEStandIn(recording_dir, upstream=upstream)
+    try:
+        with tempfile.TemporaryDirectory() as scratch, environ(BANXICO_BASE_URL=proxy.base_url):
+            results = run_lambdas(API_STAGES, LocalS3(scratch), BUCKET, date, proxy)
+    finally:
+        proxy.close()
+    failed = [stage["stage"] for stage in results if stage["status"] != "ok"]
+    if failed:
+        raise RuntimeError(f"No se pudo grabar el SIE desde {upstream}: {failed}")
+    return proxy.payloads
+
+
+def synth_pages(rng, date):
+    """HTML de Klar, Nu y Stori con el markup que buscan sus scrapers."""
+    klar_products = ["Cuenta", "Inversión flexible", "Inversión a 7 días", "Inversión a 30 días",
+                     "Inversión a 90 días", "Inversión a 180 días", "Inversión a 365 días"]
+    klar_rates = np.round(rng.uniform(6, 15, len(klar_products)), 2)
+
+    def column(header, cls, values):
+        cells = "".join(f'<div class="{cls}">{value}</div>' for value in values)
+        return f'<div class="long-detail"><div class="is-title">{header}</div>{cells}</div>'
+
+    klar = (
+        '<html><body><div class="layout508_component"><div class="chart-wrapper is-desktop is-3-col">'
+        + column("Producto", "is-title", klar_products)
+        + column("Klar", "is-chart-details", [f"{r}%" for r in klar_rates])
+        + column("Klar Plus y Platino", "is-chart-details", [f"{r + 1.5:.2f}%" for r in klar_rates])
+        + "</div></div></body></html>"
+    )
+    nu_products = [("Cajita", "Turbo"), ("Cajitas Nu", ""), ("Cajita a", "7 días"), ("Cajita a", "28 días"),
+                   ("Cajita a", "90 días"), ("Cajita a", "180 días")]
+    nu = "<html><body>" + "".join(
+        f'<div class="MobileYieldBox__StyledBox-sc-1x2y"><p class="MobileYieldBox__StyledRowTitle-sc-3z">{title}</p>'
+        f'<p>{subtitle}</p><span class="MobileYieldBox__StyledRowPercentage-sc-9q">{rate:.2f}%</span></div>'
+        for (title, subtitle), rate in zip(nu_products, rng.uniform(7, 15, len(nu_products)))
+    ) + "</body></html>"
+    stori_terms = ["Sin plazo", "30 días", "90 días", "180 días", "360 días"]
+    stori = "<html><body>" + "".join(
+        f'<div class="flex justify-between border-b py-3"><div class="md:w-1/4">{term}</div>'
+        f'<div class="md:w-3/4">{rate:.2f}% anual</div></div>'
+        for term, rate in zip(stori_terms, rng.uniform(8, 14, len(stori_terms)))
+    ) + "</body></html>"
+    return {
+        f"html/klar/klar_{date}.html": klar.encode("utf-8"),
+        f"html/nu/nu_{date}.html.gz": gzip.compress(nu.encode("utf-8")),
+        f"html/stori/stori_{date}.html": stori.encode("utf-8"),
+    }
+
+
+def synth(recording_dir, date, scrapes=4, seed=7):
+    """Grabación sintética de `date`: páginas, `scrapes` CSV por fuente de FX y el SIE del mock."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(os.path.join(recording_dir, "sie"), exist_ok=True)
+    for key, data in synth_pages(rng, date).items():
+        write_object(recording_dir, key, data)
+    fx = load_lambda("cleaning/fx")
+    day = datetime.strptime(date, "%Y-%m-%d")
+    for source in fx.SOURCES:
+        for i in range(scrapes):
+            key, frame = raw_file(rng, source, day.replace(hour=9 + 3 * i, minute=5))
+            write_object(recording_dir, key, frame.to_csv(index=False).encode("utf-8-sig"))
+
+    mock, upstream = start_server(MockState())
+    try:
+        sie = record_sie(recording_dir, date, upstream)
+    finally:
+        mock.shutdown()
+    write_recording(recording_dir, {"date": date, "source": "synth", "sie": sie})
+
+
+def record(recording_dir, date, source_client, bucket, sie_upstream):
+    """Copia los objetos de `date` del bucket real (HTML y CSV crudos de FX) y graba el SIE."""
+    os.makedirs(os.path.join(recording_dir, "sie"), exist_ok=True)
+    fx = load_lambda("cleaning/fx")
+    prefixes = HTML_PREFIXES + [f"{config['key_prefix']}{date.replace('-', '')}" for config in fx.SOURCES.values()]
+    copied = 0
+    for prefix in prefixes:
+        for page in source_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+            for obj in sorted(page.get("Contents", []), key=lambda o: o["LastModified"]):
+                # El HTML se guarda con la fecha en la key (lo que usan los scrapers)
+                if prefix in HTML_PREFIXES and date not in obj["Key"]:
+                    continue
+                body = source_client.get_object(Bucket=bucket, Key=obj["Key"])["Body"].read()
+                write_object(recording_dir, obj["Key"], body)
+                copied += 1
+    sie = record_sie(recording_dir, date, sie_upstream)
+    write_recording(recording_dir, {"date": date, "source": f"s3://{bucket}", "sie": sie})
+    return copied
+
+
+# Corrida
+
+def result_rows(result):
+    """Filas que reporta cada tipo de Lambda (records_processed en los scrapers, records_count en el resto)."""
+    body = result.get("body")
+    if isinstance(body, dict) and "records_processed" in body:
+        return body["records_processed"]
+    return result.get("records_count")
+
+
+def stage_event(directory, bucket, date):
+    """Evento de cada etapa, fijado al día de la grabación (ninguna toma el de hoy)."""
+    event = {"bucket": bucket}
+    if directory in ("api/banxico-divisas", "api/banxico-cetes"):
+        event["date"] = date
+    if directory == "cleaning/fx":
+        event["dates"] = [date]
+    return event
+
+
+def run_lambdas(stages, client, bucket, date, sie):
+    """Corre `stages` en orden; cada una con su propio contador de S3."""
+    report = []
+    for layer, directory, entry in stages:
+        counting = CountingS3(client)
+        http_before = sie.requests
+        log = io.StringIO()
+        started = time.perf_counter()
+        try:
+            module = load_lambda(directory)
+            module._s3_client = counting
+            with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+                result = getattr(module, entry)(stage_event(directory, bucket, date), None)
+            status = "ok" if result.get("statusCode") == 200 else f"error {result.get('statusCode')}"
+        except Exception:
+            result, status = {}, "error"
+            log.write(traceback.format_exc())
+        seconds = time.perf_counter() - started
+        report.append({
+            "stage": f"{layer}/{directory.split('/', 1)[1]}",
+            "layer": layer,
+            "status": status,
+            "seconds": seconds,
+            "rows": result_rows(result),
+            "http_requests": sie.requests - http_before,
+            **counting.totals(),
+            "s3_ops": counting.ops,
+            "log_tail": log.getvalue().strip().splitlines()[-5:] if status != "ok" else [],
+        })
+    return report
+
+
+def seed(client, bucket, recording_dir):
+    """Siembra <grabación>/s3 en el bucket, en orden de key."""
+    counting = CountingS3(client)
+    root = os.path.join(recording_dir, "s3")
+    started = time.perf_counter()
+    keys = sorted(
+        os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")
+        for dirpath, _, filenames in os.walk(root) for name in filenames
+    )
+    for key in keys:
+        counting.upload_file(os.path.join(root, *key.split("/")), bucket, key)
+    return {"stage": "seed", "layer": "seed", "status": "ok", "seconds": time.perf_counter() - started,
+            "rows": len(keys), "http_requests": 0, **counting.totals(), "s3_ops": counting.ops, "log_tail": []}
+
+
+def silver_dts(client, bucket):
+    """dt con manifest de Silver: lo que escribieron los cleaners en esta corrida."""
+    pages = client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix="silver/_manifests/")
+    return sorted(obj["Key"].rsplit("/", 1)[1][:-len(".json")] for page in pages for obj in page.get("Contents", []))
+
+
+def tree_bytes(path, since=None):
+    """Bytes de los archivos bajo `path` (modificados desde `since`, si se da)."""
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            stat = os.stat(os.path.join(dirpath, name))
+            if since is None or stat.st_mtime >= since:
+                total += stat.st_size
+    return total
+
+
+def run_fact(client, bucket, s3_target):
+    """local_engine.run sobre los dt que dejaron los cleaners (Gold y marts)."""
+    dts = silver_dts(client, bucket)
+    local = not s3_target.startswith(("http://", "https://"))
+    silver_path = os.path.join(s3_target, bucket, "silver") if local else f"s3://{bucket}/silver"
+    gold_path = os.path.join(s3_target, bucket, "gold") if local else f"s3://{bucket}/gold"
+    started, wall = time.perf_counter(), time.time()
+    log = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+            result = local_engine.run(silver_path, gold_path, dts)
+        status = "ok"
+    except Exception:
+        result, status = {}, "error"
+        log.write(traceback.format_exc())
+    seconds = time.perf_counter() - started
+    return {
+        "stage": "fact/local_engine", "layer": "fact", "status": status, "seconds": seconds,
+        "rows": result.get("gold_rows"), "http_requests": 0,
+        # pyarrow lee y escribe directo: los bytes se miden en disco (solo con --s3 DIR)
+        "requests": None,
+        "bytes_in": tree_bytes(silver_path) if local else None,
+        "bytes_out": tree_bytes(gold_path, since=wall) if local else None,
+        "s3_ops": {}, "dts": dts, "rejects": result.get("rejects"),
+        "log_tail": log.getvalue().strip().splitlines()[-5:] if status != "ok" else [],
+    }
+
+
+def make_client(s3_target):
+    if s3_target.startswith(("http://", "https://")):
+        import boto3
+        # Lo leen boto3 (Lambdas, gold_snapshots) y pyarrow (local_engine)
+        os.environ["AWS_ENDPOINT_URL_S3"] = s3_target
+        return boto3.client("s3", endpoint_url=s3_target)
+    return LocalS3(s3_target)
+
+
+def run(recording_dir, s3_target, bucket=BUCKET):
+    """Siembra la grabación, corre scrape -> clean -> fact y devuelve el reporte."""
+    meta = read_recording(recording_dir)
+    client = make_client(s3_target)
+    sie = SIEStandIn(recording_dir)
+    started = time.perf_counter()
+    try:
+        stages = [seed(client, bucket, recording_dir)]
+        with environ(BANXICO_BASE_URL=sie.base_url, BUCKET_NAME=bucket):
+            stages += run_lambdas(STAGES, client, bucket, meta["date"], sie)
+        stages.append(run_fact(client, bucket, s3_target))
+    finally:
+        sie.close()
+    return {
+        "recording": recording_dir,
+        "date": meta["date"],
+        "s3": s3_target,
+        "bucket": bucket,
+        "seconds": time.perf_counter() - started,
+        "sie_misses": sie.misses,
+        "stages": stages,
+        "ok": all(stage["status"] == "ok" for stage in stages) and not sie.misses,
+    }
+
+
+def print_report(report):
+    def kb(value):
+        return "-" if value is None else f"{value / 1024:.1f}"
+
+    print(f"\n{'etapa':<24} {'estado':<10} {'s':>7} {'filas':>6} {'filas/s':>8} {'S3 req':>6} "
+          f"{'leído KB':>9} {'escrito KB':>10} {'HTTP':>4}")
+    for stage in report["stages"]:
+        rows = stage["rows"]
+        rate = f"{rows / stage['seconds']:.0f}" if rows and stage["seconds"] else "-"
+        print(f"{stage['stage']:<24} {stage['status']:<10} {stage['seconds']:>7.3f} "
+              f"{rows if rows is not None else '-':>6} "
+              f"{rate:>8} {stage['requests'] if stage['requests'] is not None else '-':>6} "
+              f"{kb(stage['bytes_in']):>9} {kb(stage['bytes_out']):>10} {stage['http_requests']:>4}")
+        for line in stage["log_tail"]:
+            print(f"    {line}")
+    by_layer = {}
+    for stage in report["stages"]:
+        by_layer[stage["layer"]] = by_layer.get(stage["layer"], 0) + stage["seconds"]
+    print("\npor capa: " + ", ".join(f"{layer} {seconds:.3f} s" for layer, seconds in by_layer.items())
+          + f"; total {report['seconds']:.3f} s")
+    if report["sie_misses"]:
+        print(f"rutas SIE que no están en la grabación: {report['sie_misses']}")
+
+
+def run_selftest():
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # S3 local: errores, paginación y escrituras condicionales del manifest
+        client = LocalS3(os.path.join(tmp, "s3-basico"))
+        for i in range(5):
+            client.put_object(Bucket="b", Key=f"p/{i}.txt", Body=f"{i}")
+        pages = list(client.get_paginator("list_objects_v2").paginate(Bucket="b", Prefix="p/", MaxKeys=2))
+        check("paginación", [len(p["Contents"]) for p in pages] == [2, 2, 1])
+        check("sin objetos no hay Contents", "Contents" not in client.list_objects_v2(Bucket="b", Prefix="q/"))
+        try:
+            client.get_object(Bucket="b", Key="no/existe")
+            missing = False
+        except client.exceptions.NoSuchKey:
+            missing = True
+        check("NoSuchKey", missing)
+        etag = client.head_object(Bucket="b", Key="p/0.txt")["ETag"]
+        codes = []
+        for condition in ({"IfNoneMatch": "*"}, {"IfMatch": '"otro"'}):
+            try:
+                client.put_object(Bucket="b", Key="p/0.txt", Body="x", **condition)
+            except client.exceptions.ClientError as e:
+                codes.append(e.response["Error"]["Code"])
+        client.put_object(Bucket="b", Key="p/0.txt", Body="y", IfMatch=etag)
+        check("put condicional", codes == ["PreconditionFailed"] * 2)
+        manifest = load_lambda("cleaning/klar").append_to_manifest  # silver_manifest de cleaning/klar
+        for i in range(8):
+            client.put_object(Bucket="b", Key=f"silver/e{i}/2025-11-06/fact_rates_staging.parquet", Body=b"x")
+        threads = [threading.Thread(target=manifest, args=(client, "b", "2025-11-06",
+                                                           f"silver/e{i}/2025-11-06/fact_rates_staging.parquet",
+                                                           f"e{i}", 1)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        written = json.loads(client.get_object(Bucket="b", Key="silver/_manifests/2025-11-06.json")["Body"].read())
+        check("8 cleaners a la vez en el manifest", len(written["files"]) == 8)
+
+        # Grabación sintética -> corrida completa
+        recording = os.path.join(tmp, "grabacion")
+        synth(recording, "2025-11-06")
+        report = run(recording, os.path.join(tmp, "s3-1"))
+        print_report(report)
+        stages = {stage["stage"]: stage for stage in report["stages"]}
+        check("todas las etapas ok", report["ok"], str([s["stage"] for s in report["stages"] if s["status"] != "ok"]))
+        check("sin pedir rutas SIE fuera de la grabación", not report["sie_misses"])
+        check("la API solo habló con el servidor local", stages["scrape/banxico-divisas"]["http_requests"] > 0
+              and stages["scrape/banxico-cetes"]["http_requests"] > 0)
+        fact = stages["fact/local_engine"]
+        check("Gold solo con el día grabado", fact["rows"] and fact["dts"] == ["2025-11-06"], str(fact["dts"]))
+        check("S3 contado por etapa", all(s["requests"] and (s["bytes_in"] or s["bytes_out"])
+                                          for s in report["stages"] if s["layer"] != "fact"))
+
+        again = run(recording, os.path.join(tmp, "s3-2"))
+        check("reproducible", [(s["stage"], s["status"], s["rows"]) for s in again["stages"]]
+              == [(s["stage"], s["status"], s["rows"]) for s in report["stages"]])
+
+        # Una respuesta que falta: falla la etapa, no se sale a la red
+        broken = os.path.join(tmp, "incompleta")
+        shutil.copytree(recording, broken)
+        meta = read_recording(broken)
+        meta["sie"] = {path: name for path, name in meta["sie"].items() if "oportuno" not in path}
+        write_recording(broken, meta)
+        report = run(broken, os.path.join(tmp, "s3-3"))
+        stages = {stage["stage"]: stage for stage in report["stages"]}
+        check("ruta faltante -> etapa con error", stages["scrape/banxico-cetes"]["status"] != "ok"
+              and report["sie_misses"] and not report["ok"], str(report["sie_misses"]))
+
+        # record desde un bucket "remoto" (aquí otro S3 local) y el mock como SIE
+        remote = LocalS3(os.path.join(tmp, "remoto"))
+        seed(remote, BUCKET, recording)
+        remote.put_object(Bucket=BUCKET, Key="html/klar/klar_2025-11-05.html", Body=b"<html></html>")
+        copy = os.path.join(tmp, "copia")
+        mock, upstream = start_server(MockState())
+        try:
+            copied = record(copy, "2025-11-06", remote, BUCKET, upstream)
+        finally:
+            mock.shutdown()
+
+        def keys(path):
+            root = os.path.join(path, "s3")
+            return sorted(os.path.relpath(os.path.join(d, n), root) for d, _, names in os.walk(root) for n in names)
+
+        check("record copia solo los objetos del día",
+              keys(copy) == keys(recording) and copied == len(keys(recording)))
+        check("record graba las mismas rutas SIE",
+              set(read_recording(copy)["sie"]) == set(read_recording(recording)["sie"]))
+
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--selftest", action="store_true", help="pruebas del arnés (S3 local, replay, record)")
+    commands = parser.add_subparsers(dest="command")
+    synth_parser = commands.add_parser("synth", help="grabación sintética")
+    synth_parser.add_argument("--out", required=True)
+    synth_parser.add_argument("--date", required=True, help="YYYY-MM-DD")
+    synth_parser.add_argument("--scrapes", type=int, default=4, help="CSV por fuente de FX")
+    record_parser = commands.add_parser("record", help="grabar desde el bucket y la API reales")
+    record_parser.add_argument("--out", required=True)
+    record_parser.add_argument("--date", required=True, help="YYYY-MM-DD")
+    record_parser.add_argument("--bucket", default=BUCKET)
+    record_parser.add_argument("--sie-upstream", default="https://www.banxico.org.mx/SieAPIRest/service/v1")
+    run_parser = commands.add_parser("run", help="correr el pipeline sobre una grabación")
+    run_parser.add_argument("--recording", required=True)
+    run_parser.add_argument("--s3", help="directorio del S3 local o URL de un emulador (default: temporal)")
+    run_parser.add_argument("--bucket", default=BUCKET)
+    run_parser.add_argument("--report", help="guardar el reporte en JSON")
+    args = parser.parse_args()
+
+    if args.selftest:
+        return run_selftest()
+    if args.command == "synth":
+        synth(args.out, args.date, scrapes=args.scrapes)
+        print(f"Grabación sintética de {args.date} en {args.out}")
+    elif args.command == "record":
+        import boto3
+        copied = record(args.out, args.date, boto3.client("s3"), args.bucket, args.sie_upstream)
+        print(f"{copied} objetos y {len(read_recording(args.out)['sie'])} respuestas SIE en {args.out}")
+    elif args.command == "run":
+        with contextlib.ExitStack() as stack:
+            s3_target = args.s3 or stack.enter_context(tempfile.TemporaryDirectory())
+            report = run(args.recording, s3_target, args.bucket)
+        print_report(report)
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2, default=str)
+        return 0 if report["ok"] else 1
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Simulador local de eventos S3 -> dispatcher -> cleaners.
+
+EventedS3 envuelve un cliente S3 (local_s3.LocalS3) y, por cada objeto que se
+escribe, encola la notificación ObjectCreated que mandaría S3 (key
+URL-encoded, eTag, sequencer). LocalLambda hace de cliente de Lambda: el
+dispatcher (cleaning/dispatcher) invoca a los cleaners con InvocationType
+Event y LocalLambda los corre en proceso, con el mismo S3, cuando se drena la
+cola. Lo que escriben los cleaners (silver/...) también genera eventos, que el
+dispatcher ignora, como en el bucket real.
+
+Las notificaciones pendientes se entregan al dispatcher en lotes, como las
+entregaría una cola SQS con ventana de batching (S3 -> SQS -> dispatcher);
+con batch_size=1 cada objeto es una invocación, como S3 -> Lambda directo.
+
+Con `duplicate` cada evento se entrega dos veces (S3 entrega "al menos una
+vez"); los cleaners deben saltarse el duplicado.
+
+La prueba (--selftest, o sin argumentos) usa una grabación de
+pipeline_harness.py: corre los scrapers y las APIs con las notificaciones
+activas y revisa que cada CSV de bronze llegue a Silver sin ningún cron, que
+los duplicados y un poll sin nada nuevo no reescriban Silver, que el poll
+programado siga funcionando como respaldo cuando falta un evento, y mide la
+latencia de bronze -> Silver por objeto.
+
+Uso:
+    python playground/s3_event_simulator.py [--recording DIR]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import quote_plus
+
+from local_s3 import CountingS3, LocalS3
+import pipeline_harness
+from pipeline_harness import load_lambda
+
+# Nombre de la Lambda desplegada -> directorio (los de cleaning/dispatcher ROUTES)
+CLEANERS = {
+    "banxico-cleaner": "cleaning/banxico",
+    "klar-cleaner": "cleaning/klar",
+    "nu-cleaner": "cleaning/nu",
+    "stori-cleaner": "cleaning/stori",
+    "fx-cleaner": "cleaning/fx",
+}
+
+
+def sqs_batch(notifications):
+    """Lote de mensajes SQS cuyo cuerpo es cada notificación de S3."""
+    return {"Records": [{"eventSource": "aws:sqs", "messageId": str(i), "body": json.dumps(n)}
+                        for i, n in enumerate(notifications)]}
+
+
+def notification(bucket, key, size, etag, sequencer):
+    """Registro ObjectCreated:Put como lo manda S3."""
+    return {"Records": [{
+        "eventVersion": "2.1",
+        "eventSource": "aws:s3",
+        "eventTime": datetime.now(timezone.utc).isoformat(),
+        "eventName": "ObjectCreated:Put",
+        "s3": {
+            "bucket": {"name": bucket},
+            "object": {"key": quote_plus(key, safe="/"), "size": size, "eTag": etag.strip('"'),
+                       "sequencer": f"{sequencer:016X}"},
+        },
+    }]}
+
+
+class EventedS3(CountingS3):
+    """Cliente S3 que encola una notificación por cada objeto escrito (si `enabled`)."""
+
+    def __init__(self, client, queue):
+        super().__init__(client)
+        self.queue = queue
+        self.enabled = True
+        self.sequencer = 0
+
+    def _notify(self, bucket, key):
+        if not self.enabled:
+            return
+        head = self.client.head_object(Bucket=bucket, Key=key)
+        self.sequencer += 1
+        self.queue.append((time.perf_counter(), notification(bucket, key, head["ContentLength"], head["ETag"],
+                                                             self.sequencer)))
+
+    def put_object(self, **kwargs):
+        response = super().put_object(**kwargs)
+        self._notify(kwargs["Bucket"], kwargs["Key"])
+        return response
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        response = super().upload_file(Filename, Bucket, Key, **kwargs)
+        self._notify(Bucket, Key)
+        return response
+
+
+class LocalLambda:
+    """
+    Cliente de Lambda en proceso: el dispatcher recibe las notificaciones y
+    los cleaners las invocaciones asíncronas, en orden de llegada.
+    """
+
+    def __init__(self, s3, duplicate=False, batch_size=100, verbose=False):
+        self.queue = deque()
+        self.s3 = EventedS3(s3, self.queue)
+        self.duplicate = duplicate
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self.invocations = []
+        self.modules = {}
+        # Hora en que se escribió el bronze del lote que se está despachando
+        self.origin = None
+        self.dispatcher = self._load("cleaning/dispatcher")
+        self.dispatcher._lambda_client = self
+
+    def _load(self, directory):
+        if directory not in self.modules:
+            module = load_lambda(directory)
+            module._s3_client = self.s3
+            self.modules[directory] = module
+        return self.modules[directory]
+
+    def invoke(self, FunctionName, InvocationType="RequestResponse", Payload=b"{}"):
+        if FunctionName not in CLEANERS:
+            raise ValueError(f"Función desconocida: {FunctionName}")
+        event = json.loads(Payload)
+        if InvocationType == "Event":
+            self.queue.append((self.origin or time.perf_counter(), {"function": FunctionName, "event": event}))
+            return {"StatusCode": 202}
+        return {"StatusCode": 200, "Payload": self.call(FunctionName, event)}
+
+    def output(self):
+        """El log de las Lambdas solo se muestra con verbose."""
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def call(self, function_name, event, emitted_at=None):
+        started = time.perf_counter()
+        with self.output():
+            result = self._load(CLEANERS[function_name]).lambda_handler(event, None)
+        ended = time.perf_counter()
+        self.invocations.append({"function": function_name, "event": event, "result": result,
+                                 "seconds": ended - started,
+                                 "latency": ended - emitted_at if emitted_at is not None else None})
+        return result
+
+    def drain(self):
+        """Entrega todo lo encolado (notificaciones e invocaciones, y lo que estas generen)."""
+        delivered = 0
+        while self.queue:
+            emitted_at, item = self.queue.popleft()
+            if "Records" in item:
+                batch = [item]
+                while len(batch) < self.batch_size and self.queue and "Records" in self.queue[0][1]:
+                    batch.append(self.queue.popleft()[1])
+                self.origin = emitted_at
+                for _ in range(2 if self.duplicate else 1):
+                    with self.output():
+                        self.dispatcher.lambda_handler(sqs_batch(batch), None)
+                self.origin = None
+                delivered += len(batch)
+            else:
+                self.call(item["function"], item["event"], emitted_at)
+                delivered += 1
+        return delivered
+
+
+def silver_state(client, bucket):
+    """ETag de cada objeto de Silver (incluye los manifests)."""
+    pages = client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix="silver/")
+    return {obj["Key"]: client.head_object(Bucket=bucket, Key=obj["Key"])["ETag"]
+            for page in pages for obj in page.get("Contents", [])}
+
+
+def run_selftest(recording=None, verbose=False):
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    bucket = pipeline_harness.BUCKET
+    with tempfile.TemporaryDirectory() as tmp:
+        if recording is None:
+            recording = os.path.join(tmp, "grabacion")
+            pipeline_harness.synth(recording, "2025-11-06", scrapes=3)
+        meta = pipeline_harness.read_recording(recording)
+        s3 = LocalS3(os.path.join(tmp, "s3"))
+        lambdas = LocalLambda(s3, verbose=verbose)
+        sie = pipeline_harness.SIEStandIn(recording)
+        try:
+            # Bronze sembrado (HTML y CSV crudos de FX) y luego scrapers y APIs, con eventos
+            pipeline_harness.seed(lambdas.s3, bucket, recording)
+            lambdas.drain()
+            with pipeline_harness.environ(BANXICO_BASE_URL=sie.base_url, BUCKET_NAME=bucket):
+                scrape = [stage for stage in pipeline_harness.STAGES if stage[0] == "scrape"]
+                stages = pipeline_harness.run_lambdas(scrape, lambdas.s3, bucket, meta["date"], sie)
+            lambdas.drain()
+        finally:
+            sie.close()
+        check("scrapers y APIs ok", all(stage["status"] == "ok" for stage in stages))
+
+        by_function = {}
+        for invocation in lambdas.invocations:
+            by_function.setdefault(invocation["function"], []).append(invocation)
+        check("cada cleaner corrió por evento, sin cron", set(by_function) == set(CLEANERS), str(sorted(by_function)))
+        check("todas las invocaciones ok", all(i["result"]["statusCode"] == 200 for i in lambdas.invocations))
+        fx_runs = by_function.get("fx-cleaner", [])
+        # La API de divisas escribe su snapshot FIX después del bronze sembrado: otra corrida, solo con esa key
+        fix_runs = [i for i in fx_runs if all(k.startswith("banxico/divisas/") for k in i["event"]["keys"])]
+        seeded_runs = [i for i in fx_runs if i not in fix_runs]
+        check("los CSV de FX de un lote: una sola corrida del cleaner de FX", len(seeded_runs) == 1,
+              f"{len(seeded_runs)} corridas, {len(seeded_runs[0]['event']['keys']) if seeded_runs else 0} archivos")
+        check("el snapshot FIX de la API dispara el cleaner de FX", len(fix_runs) == 1
+              and len(fix_runs[0]["event"]["keys"]) == 1 and fix_runs[0]["result"]["statusCode"] == 200,
+              str([i["event"] for i in fix_runs]))
+        manifest = json.loads(s3.get_object(Bucket=bucket, Key=f"silver/_manifests/{meta['date']}.json")["Body"].read())
+        sources = {f["entity"]: f.get("source") for f in manifest["files"]}
+        check("Silver registra el objeto de bronze de cada entidad",
+              all(sources.get(e) for e in ("klar", "nu", "stori")), str(sorted(sources)))
+        print("\nbronze -> Silver por evento:")
+        for function, invocations in sorted(by_function.items()):
+            latency = max(i["latency"] for i in invocations)
+            rows = sum(i["result"].get("records_count", 0) for i in invocations)
+            print(f"  {function:<16} {len(invocations)} invocaciones  {rows:>4} filas  "
+                  f"latencia máx {latency * 1000:.1f} ms")
+        print()
+
+        # Duplicados y poll sin nada nuevo: Silver no cambia
+        before = silver_state(s3, bucket)
+        count = len(lambdas.invocations)
+        lambdas.duplicate = True
+        for key in ("klar/", "nu/", "stori/", "banxico/cetes/"):
+            for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=key):
+                for obj in page.get("Contents", []):
+                    head = s3.head_object(Bucket=bucket, Key=obj["Key"])
+                    lambdas.queue.append((time.perf_counter(),
+                                          notification(bucket, obj["Key"], head["ContentLength"], head["ETag"], 0)))
+        lambdas.drain()
+        lambdas.duplicate = False
+        repeated = lambdas.invocations[count:]
+        check("eventos duplicados: los cleaners se los saltan", repeated and all(i["result"].get("skipped")
+                                                                                 for i in repeated),
+              f"{len(repeated)} invocaciones")
+        polled = {}
+        for function in ("banxico-cleaner", "klar-cleaner", "nu-cleaner", "stori-cleaner"):
+            polled[function] = lambdas.call(function, {"bucket": bucket})
+        check("poll programado sin nada nuevo: no reprocesa", all(r.get("skipped") for r in polled.values()))
+        check("Silver no cambió", silver_state(s3, bucket) == before)
+
+        # Un evento que se pierde: el poll programado lo recoge
+        lambdas.s3.enabled = False
+        klar = s3.get_object(Bucket=bucket, Key=f"klar/{meta['date']}/data.csv")["Body"].read().decode("utf-8-sig")
+        lines = klar.splitlines()
+        s3.put_object(Bucket=bucket, Key=f"klar/{meta['date']}/data.csv",
+                      Body="\n".join(lines[:2]).encode("utf-8-sig"))
+        lambdas.s3.enabled = True
+        check("sin evento no pasa nada", lambdas.drain() == 0)
+        result = lambdas.call("klar-cleaner", {"bucket": bucket})
+        check("el poll programado procesa la versión nueva", result["statusCode"] == 200
+              and not result.get("skipped") and result["records_count"] == 1, str(result.get("records_count")))
+
+        # Ruteo
+        dispatcher = lambdas.dispatcher
+        check("ruteo por prefijo", [dispatcher.route(key) for key in (
+            "banxico/cetes/banxico_cetes_20251106_000500.csv", "klar/2025-11-06/data.csv", "nu/2025-11-06/data.csv",
+            "stori/2025-11-06/data.csv", "banamex/banamex_divisas_20251106_090500.csv", "html/klar/klar.html",
+            "silver/klar/2025-11-06/fact_rates_staging.parquet", "banamex/banamex_raw_20251106_090500.html.gz",
+            "banxico/divisas/banxico_divisas_20251106_000500.csv")] == [
+            "banxico-cleaner", "klar-cleaner", "nu-cleaner", "stori-cleaner", "fx-cleaner", None, None, None, "fx-cleaner"])
+        with lambdas.output():
+            result = dispatcher.lambda_handler(notification(bucket, "klar/sin fecha/data.csv", 0, '"x"', 0), None)
+        lambdas.drain()
+        check("key con espacios llega decodificada", result["dispatched"][0]["keys"] == ["klar/sin fecha/data.csv"])
+        check("key sin fecha -> 400 del cleaner", lambdas.invocations[-1]["result"]["statusCode"] == 400)
+        result = lambdas.call("fx-cleaner", {"bucket": bucket, "sources": ["wise"], "dates": ["2020-01-01"]})
+        check("día sin archivos FX -> 200 no_data", result["statusCode"] == 200 and result["status"] == "no_data"
+              and result["written"] == [])
+        check("evento None no rompe el cleaner de FX", lambdas.call("fx-cleaner", None)["statusCode"] == 200)
+
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--selftest", action="store_true", help="(default) la prueba completa")
+    parser.add_argument("--recording", help="grabación de pipeline_harness.py (default: una sintética)")
+    parser.add_argument("--verbose", action="store_true", help="mostrar el log de las Lambdas")
+    args = parser.parse_args()
+    return run_selftest(args.recording, args.verbose)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
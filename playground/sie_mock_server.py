@@ -0,0 +1,316 @@
+"""
+Servidor local que imita la API SIE de Banxico, para probar sie_client sin red.
+
+Responde con datos deterministas a:
+
+    /SieAPIRest/service/v1/series/<ids>/datos/<inicio>/<fin>
+    /SieAPIRest/service/v1/series/<ids>/datos/oportuno
+
+Comprime con gzip si el cliente lo pide y puede inyectar fallas (503 o 429
+con Retry-After, o cuerpos cortados a la mitad) para ejercitar los
+reintentos. --selftest también cubre la caché en disco (sie_cache) y el
+decodificador en streaming (sie_stream).
+
+Uso:
+    python playground/sie_mock_server.py --port 8099          # solo servidor
+    python playground/sie_mock_server.py --selftest           # pruebas del cliente
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "api", "banxico-divisas"))
+
+ROOT = "/SieAPIRest/service/v1"
+
+
+def observation(serie_id, day):
+    """Valor determinista por serie y fecha; los días 13 se publican como N/E."""
+    if day.day == 13:
+        return "N/E"
+    base = 10 + sum(ord(c) for c in serie_id) % 20
+    return f"{base + (day.toordinal() % 100) / 100:.4f}"
+
+
+def build_series(serie_id, start, end):
+    datos = []
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            datos.append({"fecha": day.strftime("%d/%m/%Y"), "dato": observation(serie_id, day)})
+        day += timedelta(days=1)
+    serie = {"idSerie": serie_id, "titulo": f"Serie de prueba {serie_id}"}
+    if datos:
+        serie["datos"] = datos
+    return serie
+
+
+class MockState:
+    """Configuración y registro de peticiones, compartidos por los handlers."""
+
+    def __init__(self, latency=0.0, fail_first=0, fail_status=503, retry_after=None, truncate_first=0):
+        self.latency = latency
+        self.fail_first = fail_first
+        self.truncate_first = truncate_first
+        self.fail_status = fail_status
+        self.retry_after = retry_after
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def record(self, entry):
+        with self.lock:
+            self.requests.append(entry)
+            return len(self.requests)
+
+
+class SIEHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, para que el pool se note
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None, truncate=False):
+        body = json.dumps(payload).encode("utf-8")
+        gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+        if gzipped:
+            body = gzip.compress(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if truncate:
+            # Content-Length completo pero solo la mitad del cuerpo: el cliente
+            # lo nota al leer, ya con los encabezados recibidos
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def do_GET(self):
+        state = self.state
+        count = state.record({
+            "path": self.path,
+            "client_port": self.client_address[1],
+            "token": self.headers.get("Bmx-Token"),
+            "accept_encoding": self.headers.get("Accept-Encoding", ""),
+            "at": time.monotonic(),
+        })
+        if state.latency:
+            time.sleep(state.latency)
+
+        if count <= state.fail_first:
+            headers = {"Retry-After": str(state.retry_after)} if state.retry_after is not None else {}
+            return self._send(state.fail_status, {"error": "falla inyectada"}, headers)
+
+        if not self.path.startswith(ROOT + "/series/"):
+            return self._send(404, {"error": "ruta desconocida"})
+        parts = self.path[len(ROOT) + len("/series/"):].split("/")
+        ids = parts[0].split(",")
+        if len(ids) > 20:
+            return self._send(400, {"error": "máximo 20 series por consulta"})
+
+        if parts[1:] == ["datos", "oportuno"]:
+            today = date(2025, 11, 6)
+            series = [build_series(i, today, today) for i in ids]
+        elif len(parts) == 4 and parts[1] == "datos":
+            start, end = date.fromisoformat(parts[2]), date.fromisoformat(parts[3])
+            series = [build_series(i, start, end) for i in ids]
+        else:
+            return self._send(404, {"error": "ruta desconocida"})
+        self._send(200, {"bmx": {"series": series}}, truncate=count <= state.fail_first + state.truncate_first)
+
+
+def start_server(state, port=0):
+    """Arranca el servidor en un hilo y devuelve (server, base_url)."""
+    handler = type("Handler", (SIEHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}{ROOT}"
+
+
+def run_selftest():
+    import sie_client
+    import sie_stream
+
+    failures = []
+
+    def check(name, condition, detail=""):
+        print(f"{'PASS' if condition else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+        if not condition:
+            failures.append(name)
+
+    # 1) Pool, gzip y reparto en consultas de 20 series en paralelo
+    state = MockState(latency=0.2)
+    server, base_url = start_server(state)
+    ids = [f"SF{i}" for i in range(50)]
+    with sie_client.SIEClient("token-prueba", base_url=base_url, max_workers=3) as client:
+        started = time.perf_counter()
+        series = client.get_series(ids, "2025-10-01", "2025-10-31")
+        elapsed = time.perf_counter() - started
+        client.get_series(ids[:5], "2025-10-01", "2025-10-31")
+        summary = client.summary()
+    server.shutdown()
+    check("todas las series regresan", sorted(s["idSerie"] for s in series) == sorted(ids))
+    check("50 series = 3 consultas", sum("/datos/2025" in r["path"] for r in state.requests[:3]) == 3)
+    check("consultas en paralelo", elapsed < 0.5, f"{elapsed:.2f}s para 3 consultas de 0.2s")
+    check("pide gzip", all("gzip" in r["accept_encoding"] for r in state.requests))
+    check("manda el token", all(r["token"] == "token-prueba" for r in state.requests))
+    ports = {r["client_port"] for r in state.requests}
+    check("reutiliza conexiones", len(ports) < len(state.requests), f"{len(ports)} conexiones, {len(state.requests)} peticiones")
+    check("registra latencias", summary["requests"] == 4 and summary["latency_ms_p50"] >= 200, str(summary))
+
+    # 2) Reintentos con backoff ante 503
+    state = MockState(fail_first=2)
+    server, base_url = start_server(state)
+    with sie_client.SIEClient("t", base_url=base_url, backoff_base=0.05) as client:
+        client.get_oportuno(["SF60633"])
+        stats = client.stats
+    server.shutdown()
+    check("reintenta 503", len(state.requests) == 3 and stats[0]["retries"] == 2, str(stats))
+
+    # 3) 429 con Retry-After
+    state = MockState(fail_first=1, fail_status=429, retry_after=0.3)
+    server, base_url = start_server(state)
+    with sie_client.SIEClient("t", base_url=base_url) as client:
+        client.get_oportuno(["SF60633"])
+    server.shutdown()
+    gap = state.requests[1]["at"] - state.requests[0]["at"]
+    check("respeta Retry-After", gap >= 0.3, f"{gap:.2f}s")
+
+    # 4) Se rinde después de max_retries
+    state = MockState(fail_first=100)
+    server, base_url = start_server(state)
+    with sie_client.SIEClient("t", base_url=base_url, max_retries=2, backoff_base=0.01) as client:
+        try:
+            client.get_oportuno(["SF60633"])
+            raised = False
+        except Exception:
+            raised = True
+        stats = client.stats
+    server.shutdown()
+    check("falla tras max_retries", raised and len(state.requests) == 3 and stats[0]["retries"] == 2)
+
+    # 4b) Los 503 reintentados en streaming se cierran antes de esperar
+    state = MockState(fail_first=3)
+    server, base_url = start_server(state)
+    with sie_client.SIEClient("t", base_url=base_url, backoff_base=0.01) as client:
+        responses = []
+        session_get = client.session.get
+        client.session.get = lambda *a, **kw: responses.append(session_get(*a, **kw)) or responses[-1]
+        table, _ = sie_stream.fetch_series_table(client, ["SF1"], "2025-01-01", "2025-01-31")
+    server.shutdown()
+    check("cierra respuestas reintentadas", table.num_rows > 0 and len(responses) == 4
+          and all(r.raw.closed for r in responses[:-1]), str([r.raw.closed for r in responses]))
+
+    # 4c) Corte a mitad del cuerpo en streaming: se repite la descarga completa
+    state = MockState(truncate_first=2)
+    server, base_url = start_server(state)
+    with sie_client.SIEClient("t", base_url=base_url, backoff_base=0.01) as client:
+        table, _ = sie_stream.fetch_series_table(client, ["SF1", "SF2"], "2025-01-01", "2025-01-31")
+        summary = client.summary()
+    server.shutdown()
+    expected = sum(len(build_series(i, date(2025, 1, 1), date(2025, 1, 31))["datos"]) for i in ["SF1", "SF2"])
+    check("reintenta cuerpo incompleto", table.num_rows == expected and len(state.requests) == 3 and summary["retries"] == 2,
+          f"{table.num_rows} filas, {summary}")
+
+    # 5) Token bucket: 3 consultas cada segundo
+    state = MockState()
+    server, base_url = start_server(state)
+    quotas = {"rango": [(3, 1.0)], "oportuno": [(3, 1.0)]}
+    with sie_client.SIEClient("t", base_url=base_url, quotas=quotas) as client:
+        started = time.perf_counter()
+        for _ in range(6):
+            client.get_oportuno(["SF60633"])
+        elapsed = time.perf_counter() - started
+        summary = client.summary()
+    server.shutdown()
+    check("limita a la cuota", 0.9 <= elapsed < 1.5 and summary["throttled_s"] > 0.5, f"{elapsed:.2f}s, {summary}")
+
+    # 6) Caché: rangos traslapados solo piden los huecos; oportuno con TTL
+    import sie_cache
+
+    state = MockState()
+    server, base_url = start_server(state)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = sie_cache.SIECache(os.path.join(tmp, "cache.sqlite"), oportuno_ttl=60)
+        with sie_client.SIEClient("t", base_url=base_url, cache=cache) as client:
+            client.get_series(["SF1", "SF2"], "2025-01-01", "2025-01-31")
+            client.get_series(["SF1", "SF2"], "2025-01-10", "2025-01-20")
+            check("rango repetido no llama a la API", len(state.requests) == 1)
+            client.get_series(["SF1", "SF2"], "2025-01-15", "2025-02-15")
+            paths = [r["path"] for r in state.requests]
+            check("solo pide el hueco", len(paths) == 2 and paths[1].endswith("/2025-02-01/2025-02-15"), paths[-1])
+            merged = client.get_series(["SF1"], "2025-01-01", "2025-02-15")
+            expected = build_series("SF1", date(2025, 1, 1), date(2025, 2, 15))["datos"]
+            check("mezcla caché y API", merged[0]["datos"] == expected and len(state.requests) == 2)
+            client.get_series(["SF1", "SF3"], "2025-01-01", "2025-01-31")
+            check("serie nueva se pide sola", state.requests[-1]["path"].startswith(ROOT + "/series/SF3/"))
+            client.get_oportuno(["SF60633", "SF60634"])
+            client.get_oportuno(["SF60633", "SF60634"])
+            check("oportuno dentro del TTL", sum("oportuno" in r["path"] for r in state.requests) == 1, str(client.summary()["cache"]))
+            cache.oportuno_ttl = 0
+            client.get_oportuno(["SF60633"])
+            check("oportuno vencido se vuelve a pedir", sum("oportuno" in r["path"] for r in state.requests) == 2)
+        cache.close()
+    server.shutdown()
+
+    # 7) Streaming (sie_stream) a través de la caché: solo los huecos y mismo resultado
+    state = MockState()
+    server, base_url = start_server(state)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = sie_cache.SIECache(os.path.join(tmp, "cache.sqlite"))
+        with sie_client.SIEClient("t", base_url=base_url, cache=cache) as client:
+            direct, direct_ids = sie_stream.fetch_series_table(client, ["SF1", "SF2"], "2025-01-01", "2025-02-15")
+            state.requests.clear()
+            sie_stream.get_series_table(client, ["SF1", "SF2"], "2025-01-01", "2025-01-31")
+            table, ids = sie_stream.get_series_table(client, ["SF1", "SF2"], "2025-01-01", "2025-02-15")
+            paths = [r["path"] for r in state.requests]
+            check("stream con caché pide solo el hueco", len(paths) == 2 and paths[1].endswith("/2025-02-01/2025-02-15"), str(paths))
+            expected = direct.sort_by([("serie_id", "ascending"), ("fecha", "ascending")])
+            check("stream con caché = stream directo", table.equals(expected) and sorted(ids) == sorted(direct_ids),
+                  f"{table.num_rows} vs {direct.num_rows} filas")
+            sie_stream.get_series_table(client, ["SF1", "SF2"], "2025-01-05", "2025-02-10")
+            check("rango cubierto no llama a la API", len(state.requests) == 2)
+        cache.close()
+    server.shutdown()
+
+    print(f"\n{'OK' if not failures else 'FALLAS: ' + ', '.join(failures)}")
+    return 0 if not failures else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de espera por petición")
+    parser.add_argument("--fail-first", type=int, default=0, help="las primeras N peticiones fallan")
+    parser.add_argument("--selftest", action="store_true", help="ejecutar las pruebas de sie_client")
+    args = parser.parse_args()
+
+    if args.selftest:
+        sys.exit(run_selftest())
+
+    state = MockState(latency=args.latency, fail_first=args.fail_first)
+    server, base_url = start_server(state, args.port)
+    print(f"SIE de prueba en {base_url} (BANXICO_BASE_URL={base_url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
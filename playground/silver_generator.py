@@ -0,0 +1,197 @@
+"""
+Generador de Silver sintético con el layout y el esquema que escriben los
+cleaners:
+
+    <root>/entity=<entidad>/dt=<YYYY-MM-DD>/part-<ts>-<id>.parquet
+    <root>/_manifests/<YYYY-MM-DD>.json
+
+Con `parts` > 1 el día de cada entidad se reparte en varios parts, como los
+que agregan los cleaners a lo largo del día; con layout="legacy" escribe el
+layout anterior (<root>/<entidad>/<YYYY-MM-DD>/fact_rates_staging.parquet).
+
+Por cada entidad y día publica `products` productos; cada producto se
+muestrea `samples` veces en el día (scrapes intradía: misma clave de negocio
+con ingestion_ts creciente). La tasa de un producto cambia en un día dado con
+probabilidad `change_rate` (a partir de una muestra al azar; el resto del
+tiempo repite la del día anterior, como los depósitos), más copias exactas con
+probabilidad `dup_rate` y filas inválidas con probabilidad `invalid_rate`
+(rate nulo, fuera de rango o product__id nulo, repartidas por igual). Una
+fracción `late_rate` de las filas trae `date` del día hábil anterior, como
+Banxico.
+
+Con `fx` publica tipos de cambio en lugar de tasas (productos de
+fact_rules.FX_PRODUCTS): Banxico el FIX de cada divisa y cada banco su compra
+y venta, alrededor de un mid por divisa con un diferencial propio del banco.
+Los cambios diarios son de hasta 1%.
+
+Uso:
+    python playground/silver_generator.py --root /tmp/silver --entities 8 --products 60 --days 30 --samples 4
+    python playground/silver_generator.py --root /tmp/silver --fx --days 120
+    python playground/silver_generator.py --root /tmp/silver --parts 6
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "cleaning", "klar"))
+sys.path.insert(0, os.path.join(REPO_ROOT, "fact-build"))
+
+# Esquema y business_hash de los cleaners
+from silver_manifest import to_silver_table  # noqa: E402
+from fact_rules import BANXICO_ENTITY_ID, FX_CURRENCIES, fx_product_id  # noqa: E402
+from silver_dataset import part_path  # noqa: E402
+
+ENTITIES = ["banxico", "klar", "nu", "stori", "banamex", "bbva", "banregio", "wise"]
+# Pesos por unidad de divisa para arrancar el random walk de `fx`
+FX_MIDS = {"USD": 18.5, "EUR": 20.1, "GBP": 23.6, "JPY": 0.125, "CAD": 13.4, "CHF": 21.3, "AUD": 12.1, "CNY": 2.55}
+SILVER_FILE = "fact_rates_staging.parquet"
+MANIFEST_DIR = "_manifests"
+
+
+def entity_names(n):
+    """Los nombres reales primero; después entity_009, entity_010, ..."""
+    return ENTITIES[:n] + [f"entity_{i:03d}" for i in range(len(ENTITIES) + 1, n + 1)]
+
+
+def fx_products(rng, entity_id):
+    """(product_ids, tasas iniciales) de `fx`: FIX para Banxico, compra y venta para los bancos."""
+    if entity_id == BANXICO_ENTITY_ID:
+        return (np.array([fx_product_id(c, "fix") for c in FX_CURRENCIES], dtype=np.int64),
+                np.array([FX_MIDS[c] for c in FX_CURRENCIES]))
+    spread = rng.uniform(0.01, 0.04)
+    ids, rates = [], []
+    for currency in FX_CURRENCIES:
+        mid = FX_MIDS[currency] * rng.uniform(0.99, 1.01)
+        ids += [fx_product_id(currency, "compra"), fx_product_id(currency, "venta")]
+        rates += [mid * (1 - spread), mid * (1 + spread)]
+    return np.array(ids, dtype=np.int64), np.round(np.array(rates), 4)
+
+
+def silver_day(rng, entity, entity_id, dt, current, samples, change_rate, dup_rate, invalid_rate, late_rate,
+               ids=None, step=0.1):
+    """
+    Tabla Silver de una entidad y un día. `current` son las tasas vigentes por
+    producto (`ids`, default 1..n); se actualiza con las que cambien en el día,
+    hasta ±`step` relativo.
+    """
+    day = date.fromisoformat(dt)
+    products = len(current)
+    changed = rng.random(products) < change_rate
+    new = np.where(changed, np.round(current * rng.uniform(1 - step, 1 + step, products), 4), current)
+    change_at = rng.integers(0, samples, products)
+
+    ids = np.arange(1, products + 1, dtype=np.int64) if ids is None else ids
+    product_ids = np.repeat(ids, samples)
+    sample = np.tile(np.arange(samples), products)
+    rates = np.where(sample >= np.repeat(change_at, samples), np.repeat(new, samples), np.repeat(current, samples))
+    current[:] = new
+    # Scrapes repartidos en el día: la muestra i cae en la franja i
+    slot = 86400 // samples
+    seconds = sample * slot + rng.integers(0, slot, len(product_ids))
+
+    dup = rng.random(len(product_ids)) < dup_rate
+    product_ids = np.concatenate([product_ids, product_ids[dup]])
+    rates = np.concatenate([rates, rates[dup]])
+    seconds = np.concatenate([seconds, seconds[dup]])
+    n = len(product_ids)
+
+    dates = np.full(n, dt, dtype=object)
+    dates[rng.random(n) < late_rate] = (day - timedelta(days=1 if day.weekday() else 3)).isoformat()
+
+    rate_col = rates.astype(float)
+    kind = rng.integers(0, 3, n)
+    invalid = rng.random(n) < invalid_rate
+    rate_null = invalid & (kind == 0)
+    rate_col[invalid & (kind == 1)] = -1.0  # rate_out_of_range
+    product_null = invalid & (kind == 2)
+    product_col = pa.array(product_ids, mask=product_null)
+
+    ingestion = (np.datetime64(dt, "s") + seconds.astype("timedelta64[s]")).astype(str)
+    table = pa.table({
+        "date": pa.array(dates.tolist(), pa.string()),
+        "entity__id": pa.array(np.full(n, entity_id, dtype=np.int64)),
+        "product__id": product_col,
+        "rate": pa.array(rate_col, mask=rate_null),
+        "ingestion_ts": pa.array(ingestion.tolist(), pa.string()),
+        "source_file": pa.array([f"s3://scrapping-divisas/{entity}/{dt}.csv"] * n, pa.string()),
+    })
+    return to_silver_table(table.to_pandas())
+
+
+def generate_silver(root, entities=8, products=60, days=30, samples=4, change_rate=0.05, dup_rate=0.05,
+                    invalid_rate=0.02, late_rate=0.05, start=date(2025, 1, 1), seed=7, fx=False, parts=1,
+                    layout="hive"):
+    """
+    Escribe Silver y sus manifests bajo `root`.
+
+    Returns:
+        dict: dts, archivos, filas y bytes escritos
+    """
+    rng = np.random.default_rng(seed)
+    root = os.path.abspath(root)
+    dts = [(start + timedelta(days=i)).isoformat() for i in range(days)]
+    manifests = {dt: [] for dt in dts}
+    rows = size = 0
+    for entity_id, entity in enumerate(entity_names(entities), start=1):
+        if fx:
+            ids, current = fx_products(rng, entity_id)
+        else:
+            ids, current = None, np.round(rng.uniform(1, 30, products), 4)
+        for dt in dts:
+            table = silver_day(rng, entity, entity_id, dt, current, samples, change_rate, dup_rate,
+                               invalid_rate, late_rate, ids, 0.01 if fx else 0.1)
+            if layout == "legacy":
+                pieces = [(os.path.join(root, entity, dt, SILVER_FILE), table)]
+            else:
+                bounds = np.linspace(0, table.num_rows, parts + 1).astype(int)
+                pieces = [(part_path(root, entity, dt), table.slice(a, b - a)) for a, b in zip(bounds, bounds[1:])]
+            for path, piece in pieces:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                pq.write_table(piece, path)
+                rows += piece.num_rows
+                size += os.path.getsize(path)
+                manifests[dt].append({"path": path, "entity": entity, "rows": piece.num_rows,
+                                      "bytes": os.path.getsize(path), "written_at": datetime.now().isoformat()})
+
+    os.makedirs(os.path.join(root, MANIFEST_DIR), exist_ok=True)
+    for dt, files in manifests.items():
+        with open(os.path.join(root, MANIFEST_DIR, f"{dt}.json"), "w") as f:
+            json.dump({"dt": dt, "files": files}, f, indent=2)
+    return {"dts": dts, "files": sum(len(files) for files in manifests.values()), "rows": rows, "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", required=True)
+    parser.add_argument("--entities", type=int, default=8)
+    parser.add_argument("--products", type=int, default=60, help="productos por entidad")
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--samples", type=int, default=4, help="scrapes intradía por producto")
+    parser.add_argument("--change-rate", type=float, default=0.05, help="prob. de que una tasa cambie en un día")
+    parser.add_argument("--dup-rate", type=float, default=0.05, help="copias exactas")
+    parser.add_argument("--invalid-rate", type=float, default=0.02)
+    parser.add_argument("--late-rate", type=float, default=0.05, help="filas con date del día hábil anterior")
+    parser.add_argument("--start", default="2025-01-01")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--fx", action="store_true", help="tipos de cambio (FIX, compra y venta) en lugar de tasas")
+    parser.add_argument("--parts", type=int, default=1, help="parts por entidad y día")
+    parser.add_argument("--layout", choices=["hive", "legacy"], default="hive")
+    args = parser.parse_args()
+
+    result = generate_silver(
+        args.root, args.entities, args.products, args.days, args.samples, args.change_rate, args.dup_rate,
+        args.invalid_rate, args.late_rate, date.fromisoformat(args.start), args.seed, args.fx, args.parts, args.layout,
+    )
+    print(json.dumps({**result, "dts": [result["dts"][0], result["dts"][-1]]}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,21 @@ from playwright.async_api import async_playwright
 
 import boto3
 
+# Bucket de todas las capas; la variable BUCKET_NAME apunta la Lambda a otro
+# (p. ej. el del arnés local, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Cliente S3 compartido entre invocaciones del mismo contenedor
+_s3_client = None
+
+
+def get_s3_client():
+    """Crea el cliente S3 la primera vez que se necesita y lo reutiliza."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
 
 async def download_page_content(url):
     async with async_playwright() as p:
@@ -128,7 +143,7 @@ async def download_page_content(url):
 async def main(event):
     # Extract parameters from the event payload
     url = event.get('url', 'https://www.banamex.com/economia-finanzas/es/mercado-de-divisas/index.html')
-    bucket_name = event.get('bucket', 'scrapping-divisas')
+    bucket_name = event.get('bucket', BUCKET_NAME)
     
     if not url:
         raise ValueError('Error: Missing required parameter (url).')
@@ -157,7 +172,7 @@ async def main(event):
         csv_key = f"banamex/banamex_divisas_{timestamp}.csv"
         html_key = f"banamex/banamex_raw_{timestamp}.html.gz"
         
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
         
         # Upload CSV
         s3_client.upload_file(csv_path, bucket_name, csv_key)
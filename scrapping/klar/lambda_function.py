@@ -1,14 +1,27 @@
-import requests
-from bs4 import BeautifulSoup
 import csv
 from datetime import datetime
 import os
 import boto3
 import re
-from datetime import datetime
+
+# Bucket de todas las capas; la variable BUCKET_NAME apunta la Lambda a otro
+# (p. ej. el del arnés local, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Cliente S3 compartido entre invocaciones del mismo contenedor
+_s3_client = None
+
+
+def get_s3_client():
+    """Crea el cliente S3 la primera vez que se necesita y lo reutiliza."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
 
 def get_most_recent_file_from_s3(bucket_name, parent_folder):
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=parent_folder)
     
     # Sort objects by LastModified in descending order (most recent first)
@@ -26,16 +39,18 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
     else:
         return None   
 
-def scrape_klar_rates():
+def scrape_klar_rates(bucket_name=BUCKET_NAME):
     """
     Core business logic for scraping Klar rates from S3-stored HTML
     and saving results to S3.
     
+    Args:
+        bucket_name: Bucket with the HTML (html/klar/) and the output CSVs (klar/)
+    
     Returns:
         dict: Response dictionary with statusCode, body, and optional error details
     """
     source_url = "https://www.klar.mx/inversion"
-    bucket_name = 'scrapping-divisas'
     parent_folder = 'html/klar/'
     
     try:
@@ -53,11 +68,12 @@ def scrape_klar_rates():
         print(f"Processing file: {object_key} (date: {extracted_date})")
 
         # Download HTML from S3
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
         response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
         html_content = response['Body'].read().decode('utf-8')
 
         # Parse HTML
+        from bs4 import BeautifulSoup  # import diferido: solo si hay HTML que parsear
         soup = BeautifulSoup(html_content, 'html.parser')
 
         chart_component = soup.find("div", class_="layout508_component")
@@ -159,13 +175,6 @@ def scrape_klar_rates():
             }
         }
 
-    except requests.exceptions.RequestException as e:
-        error_msg = f"Error al hacer la petición HTTP: {str(e)}"
-        print(error_msg)
-        return {
-            "statusCode": 500,
-            "body": {"error": error_msg}
-        }
     except Exception as e:
         error_msg = f"Ocurrió un error inesperado: {str(e)}"
         print(error_msg)
@@ -189,7 +198,7 @@ def lambda_handler(event, context):
     print("Lambda function started")
     print(f"Event: {event}")
     
-    result = scrape_klar_rates()
+    result = scrape_klar_rates(event.get('bucket', BUCKET_NAME) if event else BUCKET_NAME)
     
     print(f"Lambda function completed with status: {result.get('statusCode')}")
     return result
@@ -1,5 +1,3 @@
-import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 import gzip
 import os
@@ -8,6 +6,22 @@ import boto3
 import csv
 from io import BytesIO
 
+# Bucket de todas las capas; la variable BUCKET_NAME apunta la Lambda a otro
+# (p. ej. el del arnés local, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Cliente S3 compartido entre invocaciones del mismo contenedor
+_s3_client = None
+
+
+def get_s3_client():
+    """Crea el cliente S3 la primera vez que se necesita y lo reutiliza."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
 def get_most_recent_file_from_s3(bucket_name, parent_folder):
     """
     Get the most recent file from S3 bucket.
@@ -19,7 +33,7 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
     Returns:
         tuple: (extracted_date, object_key) or None if no files found
     """
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=parent_folder)
     
     # Sort objects by LastModified in descending order (most recent first)
@@ -37,16 +51,18 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
     else:
         return None
 
-def scrape_nu_rendimientos():
+def scrape_nu_rendimientos(bucket_name=BUCKET_NAME):
     """
     Core business logic for scraping Nu rendimientos from S3-stored HTML
     and saving results to S3.
     
+    Args:
+        bucket_name: Bucket with the HTML (html/nu/) and the output CSVs (nu/)
+    
     Returns:
         dict: Response dictionary with statusCode, body, and optional error details
     """
     source_url = "https://nu.com.mx/cuenta/rendimientos/"
-    bucket_name = 'scrapping-divisas'
     parent_folder = 'html/nu/'
     
     try:
@@ -64,7 +80,7 @@ def scrape_nu_rendimientos():
         print(f"Processing file: {object_key} (date: {extracted_date})")
 
         # Download HTML from S3
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
         response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
         
         # Handle gzipped content if the file is compressed
@@ -75,6 +91,7 @@ def scrape_nu_rendimientos():
             html_content = response['Body'].read().decode('utf-8')
 
         print("Parsing HTML content...")
+        from bs4 import BeautifulSoup  # import diferido: solo si hay HTML que parsear
         soup = BeautifulSoup(html_content, "html.parser")
 
         # Buscar los contenedores principales
@@ -181,7 +198,7 @@ def lambda_handler(event, context):
     print("Lambda function started")
     print(f"Event: {event}")
     
-    result = scrape_nu_rendimientos()
+    result = scrape_nu_rendimientos(event.get('bucket', BUCKET_NAME) if event else BUCKET_NAME)
     
     print(f"Lambda function completed with status: {result.get('statusCode')}")
     return result
@@ -1,11 +1,27 @@
-from bs4 import BeautifulSoup
 from datetime import datetime
 import gzip
+import os
 import re
 import boto3
 import csv
 from io import BytesIO
 
+# Bucket de todas las capas; la variable BUCKET_NAME apunta la Lambda a otro
+# (p. ej. el del arnés local, playground/pipeline_harness.py)
+BUCKET_NAME = os.getenv('BUCKET_NAME', 'scrapping-divisas')
+
+# Cliente S3 compartido entre invocaciones del mismo contenedor
+_s3_client = None
+
+
+def get_s3_client():
+    """Crea el cliente S3 la primera vez que se necesita y lo reutiliza."""
+    global _s3_client
+    if _s3_client is None:
+        _s3_client = boto3.client('s3')
+    return _s3_client
+
+
 def get_most_recent_file_from_s3(bucket_name, parent_folder):
     """
     Get the most recent file from S3 bucket.
@@ -17,7 +33,7 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
     Returns:
         tuple: (extracted_date, object_key) or None if no files found
     """
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=parent_folder)
     
     # Sort objects by LastModified in descending order (most recent first)
@@ -35,16 +51,18 @@ def get_most_recent_file_from_s3(bucket_name, parent_folder):
     else:
         return None
 
-def scrape_stori_cuentamas():
+def scrape_stori_cuentamas(bucket_name=BUCKET_NAME):
     """
     Core business logic for scraping Stori Cuenta Más from S3-stored HTML
     and saving results to S3.
     
+    Args:
+        bucket_name: Bucket with the HTML (html/stori/) and the output CSVs (stori/)
+    
     Returns:
         dict: Response dictionary with statusCode, body, and optional error details
     """
     source_url = "https://www.storicard.com/stori-cuentamas"
-    bucket_name = 'scrapping-divisas'
     parent_folder = 'html/stori/'
     
     try:
@@ -62,7 +80,7 @@ def scrape_stori_cuentamas():
         print(f"Processing file: {object_key} (date: {extracted_date})")
 
         # Download HTML from S3
-        s3_client = boto3.client('s3')
+        s3_client = get_s3_client()
         response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
         
         # Handle gzipped content if the file is compressed
@@ -73,6 +91,7 @@ def scrape_stori_cuentamas():
             html_content = response['Body'].read().decode('utf-8')
 
         print("Parsing HTML content...")
+        from bs4 import BeautifulSoup  # import diferido: solo si hay HTML que parsear
         soup = BeautifulSoup(html_content, "html.parser")
 
         # Buscar los bloques de "plazo" y "rendimiento"
@@ -177,7 +196,7 @@ def lambda_handler(event, context):
     print("Lambda function started")
     print(f"Event: {event}")
     
-    result = scrape_stori_cuentamas()
+    result = scrape_stori_cuentamas(event.get('bucket', BUCKET_NAME) if event else BUCKET_NAME)
     
     print(f"Lambda function completed with status: {result.get('statusCode')}")
     return result
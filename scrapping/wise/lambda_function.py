@@ -1,24 +1,170 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-import pandas as pd
+import csv
 import os
 import re
 import gzip
 
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/118.0.5993.70 Safari/537.36"
+    )
+}
+
+# Endpoint público que usa el convertidor de wise.com; responde
+# {"source": "USD", "target": "MXN", "value": 18.41, "time": 1730000000000}
+LIVE_RATE_URL = "https://wise.com/rates/live"
+
+# Pares por defecto; se pueden sobrescribir con WISE_PAIRS="USD-MXN,EUR-MXN,..."
+DEFAULT_PAIRS = [
+    ("USD", "MXN"),
+    ("EUR", "MXN"),
+    ("GBP", "MXN"),
+    ("JPY", "MXN"),
+    ("CAD", "MXN"),
+    ("CHF", "MXN"),
+    ("AUD", "MXN"),
+    ("CNY", "MXN"),
+]
+
+CSV_COLUMNS = ["base_currency", "quote_currency", "exchange_rate", "source_url", "fetched_at"]
+
+# Máximo de peticiones simultáneas (también es el tamaño del pool de conexiones)
+MAX_IN_FLIGHT = int(os.getenv("WISE_MAX_IN_FLIGHT", "4"))
+
+
+def parse_pairs(value):
+    """Convierte "USD-MXN,EUR-MXN" (o "USD/MXN") en [("USD", "MXN"), ("EUR", "MXN")]."""
+    pairs = []
+    for item in value.split(","):
+        item = item.strip().upper()
+        if not item:
+            continue
+        match = re.fullmatch(r"([A-Z]{3})\s*[-/]\s*([A-Z]{3})", item)
+        if not match:
+            raise ValueError(f"Par de divisas inválido: '{item}'")
+        pairs.append(match.groups())
+    return pairs
+
+
+def get_configured_pairs():
+    """Pares a consultar: WISE_PAIRS si está definido, si no DEFAULT_PAIRS."""
+    env_pairs = os.getenv("WISE_PAIRS")
+    return parse_pairs(env_pairs) if env_pairs else list(DEFAULT_PAIRS)
+
+
+def build_session(max_in_flight=MAX_IN_FLIGHT):
+    """Sesión compartida con un pool de conexiones del tamaño de la concurrencia."""
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_pair_rate(session, base_currency, quote_currency):
+    """Consulta la tasa en vivo de un solo par."""
+    params = {"source": base_currency, "target": quote_currency}
+    response = session.get(LIVE_RATE_URL, params=params, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+
+    return {
+        "base_currency": data.get("source", base_currency),
+        "quote_currency": data.get("target", quote_currency),
+        "exchange_rate": float(data["value"]),
+        "source_url": response.url,
+        "fetched_at": datetime.now().isoformat()
+    }
+
+
+def fetch_wise_rows(pairs=None, max_in_flight=MAX_IN_FLIGHT):
+    """
+    Descarga varios pares de divisas de Wise de forma concurrente.
+
+    Todas las peticiones comparten una sesión (reutilizan conexiones TLS) y
+    nunca hay más de `max_in_flight` en vuelo, así que el tiempo total crece
+    con len(pairs) / max_in_flight y no con len(pairs).
+
+    Args:
+        pairs: Lista de tuplas (base, cotizada). Por defecto get_configured_pairs().
+        max_in_flight: Número máximo de peticiones simultáneas.
+
+    Returns:
+        list[dict]: Una fila por par, en el mismo orden que `pairs`.
+    """
+    pairs = pairs if pairs is not None else get_configured_pairs()
+    if not pairs:
+        raise ValueError("No se especificaron pares de divisas.")
+
+    print(f"Consultando {len(pairs)} pares en Wise (max {max_in_flight} en paralelo)...")
+
+    results = {}
+    session = build_session(max_in_flight)
+    try:
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            futures = {
+                executor.submit(fetch_pair_rate, session, base, quote): (base, quote)
+                for base, quote in pairs
+            }
+            for future in as_completed(futures):
+                base, quote = futures[future]
+                try:
+                    results[(base, quote)] = future.result()
+                except Exception as e:
+                    print(f"Warning: Failed to fetch {base}/{quote}: {e}")
+    finally:
+        session.close()
+
+    rows = [results[pair] for pair in pairs if pair in results]
+    if not rows:
+        raise ValueError("No se pudo obtener ningún tipo de cambio de Wise.")
+
+    return rows
+
+
+def fetch_wise_rates(pairs=None, max_in_flight=MAX_IN_FLIGHT):
+    """Igual que fetch_wise_rows pero devuelve un pandas.DataFrame."""
+    import pandas as pd  # import diferido: el camino principal no necesita pandas
+
+    rows = fetch_wise_rows(pairs, max_in_flight)
+    return pd.DataFrame(rows, columns=CSV_COLUMNS)
+
+
+def scrape_wise_rates(pairs=None):
+    """Descarga los pares configurados y guarda un CSV con todos ellos."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+
+    rows = fetch_wise_rows(pairs)
+
+    # Pocas filas: se escriben con csv, sin construir un DataFrame
+    csv_path = os.path.join(output_dir, f"wise_rates_{timestamp}.csv")
+    with open(csv_path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f" CSV guardado en: {csv_path}")
+
+    for row in rows:
+        print(f"  {row['base_currency']}/{row['quote_currency']}: {row['exchange_rate']}")
+    return rows
+
+
 def scrape_wise_usd_to_mxn():
+    from bs4 import BeautifulSoup
+    import pandas as pd
+
     url = "https://wise.com/"
     print("Cargando página de Wise...")
 
-    headers = {
-        "User-Agent": (
-            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-            "AppleWebKit/537.36 (KHTML, like Gecko) "
-            "Chrome/118.0.5993.70 Safari/537.36"
-        )
-    }
-
-    response = requests.get(url, headers=headers, timeout=30)
+    response = requests.get(url, headers=HEADERS, timeout=30)
     response.raise_for_status()
 
     # Guardar el HTML crudo (capa bronze)
@@ -61,4 +207,4 @@ def scrape_wise_usd_to_mxn():
     print(df)
 
 if __name__ == "__main__":
-    scrape_wise_usd_to_mxn()
\ No newline at end of file
+    scrape_wise_rates()